@@ -1,11 +1,11 @@
 from time import time
 from numpy import mean, std
-from twisted.internet.task import LoopingCall
 from twisted.internet.defer import inlineCallbacks
 
 from EGGS_labrad.clients import GUIClient, createTrunk
 from EGGS_labrad.clients.ARTIQ_client.ADC_gui import ADC_gui
 
+ADCID = 648391
 
 class ADC_client(GUIClient):
 
@@ -17,17 +17,19 @@ class ADC_client(GUIClient):
             self.gui = ADC_gui()
         return self.gui
 
+    @inlineCallbacks
     def initClient(self):
         # set recording stuff
         self.c_record = self.cxn.context()
         self.recording = False
         self.starttime = 0
-        # create polling loop
-        self.refresher = LoopingCall(self.update_counts_continually)
+        # samples are streamed by the server
+        self.streaming = False
         self._channel = 0
-        self._sample_time_us = 0
-        self._num_samples = 0
-        self._time_per_data = 0
+        self._last_update = 0
+        # connect to signals
+        yield self.aq.signal__adc_updated(ADCID)
+        yield self.aq.addListener(listener=self.update_counts_continually, source=None, ID=ADCID)
 
     def initData(self):
         # set default values
@@ -82,50 +84,57 @@ class ADC_client(GUIClient):
             self.gui.count_display.setText("{:.4f} \u00B1 {:.4f}".format(mean(count_list), std(count_list)))
 
     @inlineCallbacks
-    def update_counts_continually(self):
+    def update_counts_continually(self, c, msg):
         """
-        Main function that actually gets counts from artiq.
-        Gets values continually.
+        Receives values streamed from artiq.
+        Display is updated at most once per poll interval.
         """
-        # get counts
-        count_list = yield self.aq.sampler_read_list([self._channel], int(1e6 / self.sample_time_us), self.num_samples)
+        if (not self.streaming) or (time() - self._last_update < self.poll_interval_s):
+            return
+        self._last_update = time()
+
+        # get the mean and stdev of the most recent samples
+        (value_mean, value_std), = yield self.aq.sampler_stream_stats(self.num_samples)
 
         # update display
         # todo: clean up display
         if self.gui.sample_std_off.isChecked():
-            self.gui.count_display.setText("{:.3f}".format(mean(count_list)))
+            self.gui.count_display.setText("{:.3f}".format(value_mean))
         else:
-            self.gui.count_display.setText("{:.3f} \u00B1 {:.3f}".format(mean(count_list), std(count_list)))
+            self.gui.count_display.setText("{:.3f} \u00B1 {:.3f}".format(value_mean, value_std))
         # store data if recording
         if self.recording:
-            yield self.dv.add(time() - self.starttime, mean(count_list), context=self.c_record)
+            yield self.dv.add(time() - self.starttime, value_mean, context=self.c_record)
 
     @inlineCallbacks
     def toggle_polling(self, status):
-        print('h0')
         # start if not running
-        if status and (not self.refresher.running):
+        if status and (not self.streaming):
             # set channel gain
             gain = 10 ** int(self.gui.channel_gain.currentIndex())
             self._channel = self.gui.channel_select.currentIndex()
             yield self.aq.sampler_gain(self._channel, gain)
-            print('h1')
             # get timing values
-            poll_interval_s = self.gui.poll_interval.value()
-            self.sample_time_us = int(self.gui.sample_time.value())
+            self.poll_interval_s = self.gui.poll_interval.value()
+            sample_time_us = int(self.gui.sample_time.value())
             self.num_samples = int(self.gui.sample_num.value())
-            time_per_data = self.sample_time_us * self.num_samples * 1e-6
-            print('h1')
+            time_per_data = sample_time_us * self.num_samples * 1e-6
 
             # ensure valid timing
-            if (time_per_data > poll_interval_s) or (time_per_data > 1):
+            if (time_per_data > self.poll_interval_s) or (time_per_data > 1):
                 raise Exception("Error: invalid timing.")
-            # set up display and start polling
+            # set up display and start streaming
+            # note: server requires an even block size of at most 1024 samples,
+            # but stats are taken over the last num_samples values in the buffer
+            block_size = min(self.num_samples + (self.num_samples % 2), 1024)
             self.gui.count_display.setStyleSheet('color: green')
-            self.refresher.start(poll_interval_s, now=True)
+            self.streaming = True
+            yield self.aq.sampler_stream_start([self._channel], 1e6 / sample_time_us,
+                                               block_size, 1, max(self.num_samples, 1000))
         # stop if running
-        elif (not status) and (self.refresher.running):
-            self.refresher.stop()
+        elif (not status) and (self.streaming):
+            self.streaming = False
+            yield self.aq.sampler_stream_stop()
             self.gui.count_display.setStyleSheet('color: red')
 
         # set gui element status
@@ -1,6 +1,5 @@
 from numpy import mean, std
 from time import time, sleep
-from twisted.internet.task import LoopingCall
 from twisted.internet.defer import inlineCallbacks
 
 from PyQt5.QtGui import QFont
@@ -9,6 +8,7 @@ from EGGS_labrad.clients import GUIClient, createTrunk
 from EGGS_labrad.clients.PMT_client.PMT_gui import PMT_gui
 
 EXPID = 564324
+COUNTID = 564325
 # todo: clean up display; make more programmatic
 # todo: make ttl counter # a variable
 # todo: subscribe to signals so we know when aperture is open or closed
@@ -36,15 +36,16 @@ class PMT_client(GUIClient):
         self.recording =    False
         self.starttime =    0
 
-        # create polling loop
-        self.refresher =        LoopingCall(self.update_counts_continually)
-        self._sample_time_us =  0
-        self._num_samples =     0
-        self._time_per_data =   0
+        # counts are streamed by the server
+        self.ttl_name =         'ttl{:d}_counter'.format(0)
+        self.streaming =        False
+        self._last_update =     0
 
         # connect to signals
         yield self.aq.signal__exp_running(EXPID)
         yield self.aq.addListener(listener=self.experimentRunning, source=None, ID=EXPID)
+        yield self.aq.signal__counts_updated(COUNTID)
+        yield self.aq.addListener(listener=self.update_counts_continually, source=None, ID=COUNTID)
 
         # connect to labjack
         self.flipper_port_name = "DIO3"
@@ -95,7 +96,7 @@ class PMT_client(GUIClient):
         # get counts
         try:
             self._lock(False)
-            counts_avg, counts_std = yield self.aq.ttl_counts('ttl{:d}_counter'.format(0), sample_time_us, num_samples)
+            counts_avg, counts_std = yield self.aq.ttl_counts(self.ttl_name, sample_time_us, num_samples)
         except Exception as e:
             print("Error while getting values:")
             print(repr(e))
@@ -109,13 +110,17 @@ class PMT_client(GUIClient):
             self.gui.count_display.setText("{:.2f} \u00B1 {:.2f}".format(counts_avg, counts_std))
 
     @inlineCallbacks
-    def update_counts_continually(self):
+    def update_counts_continually(self, c, msg):
         """
-        Main function that actually gets counts from artiq.
-        Gets values continually.
+        Receives counts streamed from artiq.
+        Display is updated at most once per poll interval.
         """
-        # get counts
-        counts_avg, counts_std = yield self.aq.ttl_counts('ttl{:d}_counter'.format(0), self.sample_time_us, self.num_samples)
+        ttl_name, num_bins, counts_avg, counts_std = msg
+        if (not self.streaming) or (ttl_name != self.ttl_name):
+            return
+        if time() - self._last_update < self.poll_interval_s:
+            return
+        self._last_update = time()
 
         # update display
         if self.gui.sample_std_off.isChecked():
@@ -128,26 +133,29 @@ class PMT_client(GUIClient):
         if self.recording:
             yield self.dv.add(time() - self.starttime, counts_avg, context=self.c_record)
 
+    @inlineCallbacks
     def toggle_polling(self, status):
         # start if not running
-        if status and (not self.refresher.running):
+        if status and (not self.streaming):
             # get timing values
-            poll_interval_s =       self.gui.poll_interval.value()
-            self.sample_time_us =   int(self.gui.sample_time.value())
-            self.num_samples =      int(self.gui.sample_num.value())
-            time_per_data =         (self.sample_time_us * 1e-6) * self.num_samples
+            self.poll_interval_s =  self.gui.poll_interval.value()
+            sample_time_us =        int(self.gui.sample_time.value())
+            num_samples =           int(self.gui.sample_num.value())
+            time_per_data =         (sample_time_us * 1e-6) * num_samples
 
             # ensure valid timing
-            if (time_per_data > poll_interval_s) or (time_per_data > 1):
+            if (time_per_data > self.poll_interval_s) or (time_per_data > 1):
                 raise Exception("Error: invalid timing.")
 
-            # set up display and start polling
+            # set up display and start streaming
             self.gui.count_display.setStyleSheet('color: green')
-            self.refresher.start(poll_interval_s, now=True)
+            self.streaming = True
+            yield self.aq.count_stream_start(self.ttl_name, sample_time_us, num_samples)
 
         # stop if running
-        elif (not status) and (self.refresher.running):
-            self.refresher.stop()
+        elif (not status) and (self.streaming):
+            self.streaming = False
+            yield self.aq.count_stream_stop(self.ttl_name)
             self.gui.count_display.setStyleSheet('color: red')
 
         # set gui element status
@@ -194,7 +202,7 @@ class PMT_client(GUIClient):
 
     def experimentRunning(self, c, msg):
         # stop polling
-        if self.refresher.running:
+        if self.streaming:
             self.gui.read_cont_switch.click()
 
         # set artiq monitor status
@@ -18,3 +18,13 @@ class config(object):
     }
     
     launch_history = 1000
+
+    # number of labrad connections kept open for running experiments
+    connection_pool_size = 4
+    # servers looked up in advance by the pooled connections
+    connection_pool_servers = ['Script Scanner', 'Parameter Vault', 'Data Vault']
+    # pooled connections idle for longer than this (in s) are checked before being used
+    connection_pool_check_interval = 10.0
+
+    # minimum time (in s) between progress updates from running experiments
+    progress_interval = 0.5
@@ -24,7 +24,7 @@ class vibration_measurement(experiment):
     def initialize(self, cxn, context, ident):
         #properties
         self.ident = ident
-        self.cxn = labrad.connect(name = self.name)
+        self.cxn = cxn
 
         #base servers
         self.dv = self.cxn.data_vault
@@ -67,8 +67,8 @@ class vibration_measurement(experiment):
             #get data
             pressure = self.pump.pressure()
             tempK = self.tempcontroller.read_temperature('0')
-            trace = self.oscope.get_trace(1)
-            trace = np.array([trace[0], trace[1]]).transpose()
+            trace = self.oscope.traces([1])
+            trace = np.array(trace).transpose()
 
             try:
                 self.dv.add(elapsedtime, tempK[0], tempK[1], tempK[2], tempK[3], context = self.c_temp)
@@ -79,7 +79,7 @@ class vibration_measurement(experiment):
 
 
     def finalize(self, cxn, context):
-        self.cxn.disconnect()
+        pass
 
     def set_up_datavault(self):
         #set up folder
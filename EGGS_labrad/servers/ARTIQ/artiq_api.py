@@ -1,4 +1,7 @@
 import numpy as np
+from time import time
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
 
 from artiq.language import *
 from artiq.coredevice import *
@@ -11,6 +14,52 @@ from artiq.coredevice.ad9910 import (_AD9910_REG_PROFILE0, _AD9910_REG_PROFILE1,
 
 from builtins import ConnectionAbortedError, ConnectionResetError
 
+from artiq_state import BATCH_TTL, BATCH_DDS_WAVE, BATCH_DDS_ATT, BATCH_DDS_SW, BATCH_RECORD_LENGTH
+from artiq_kernel_cache import KernelCache
+from artiq_waveform import chunkDACWaveform
+
+
+# kernels which are precompiled on first use, keyed by name
+# note: the precompiled function is accessed as self._precompile_func_<name>
+PRECOMPILED_KERNELS = {
+    'get_wave':         '_getDDSFastWave',
+    'get_att':          '_getDDSFastATT',
+    'get_sw':           '_getDDSFastSW',
+    'set_freq':         '_setDDSFastFTW',
+    'set_ampl':         '_setDDSFastASF',
+    'set_att':          '_setDDSFastATT',
+    'set_sw':           '_setDDSFastSW',
+    'get_ttlcounts':    '_getTTLCountFastCounts',
+    'set_batch':        '_setStateBatch',
+}
+
+
+class _LazyDeviceDict(dict):
+    """
+    A dictionary of device names to device objects.
+    Devices are only created (via the device manager) the first time they are accessed.
+    """
+
+    def __init__(self, device_manager):
+        super().__init__()
+        self._device_manager = device_manager
+
+    def __getitem__(self, name):
+        device = super().__getitem__(name)
+        if device is None:
+            device = self._device_manager.get(name)
+            super().__setitem__(name, device)
+        return device
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def values(self):
+        return [self[name] for name in self.keys()]
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
 
 class ARTIQ_API(object):
     """
@@ -82,15 +131,114 @@ class ARTIQ_API(object):
     INITIALIZATION
     '''
     def __init__(self, ddb_filepath):
+        # startup time of each phase (in seconds)
+        self.timing = dict()
+        self._precompile_locks = {name: Lock() for name in PRECOMPILED_KERNELS}
+
         # get devices and device manager
+        time_start = time()
         devices =               DeviceDB(ddb_filepath)
         self.ddb_filepath =     ddb_filepath
         self.device_manager =   DeviceManager(devices)
         self.device_db =        devices.get_device_db()
-        self._getDevices()
+        self.timing['device_db'] = time() - time_start
+
+        # get core
+        time_start = time()
+        self.core = self.device_manager.get("core")
+        self.timing['core'] = time() - time_start
 
-        # get precompiled functions
-        self._getPrecompiledFunctions()
+        # sort devices by type
+        # note: device objects are only created when they are first used
+        time_start = time()
+        self._getDevices()
+        self.timing['devices'] = time() - time_start
+
+        # set up holder variables for precompiled functions
+        # note: kernels are only precompiled when they are first called
+        self._setHolderVariables()
+        # compiled kernels are cached on disk and reused across restarts
+        self.kernel_cache = KernelCache(ddb_filepath)
+        # DMA sequence names of each recorded DAC waveform
+        self._dac_waveforms = dict()
+
+    def __getattr__(self, name):
+        """
+        Lazily create device objects, device lists, and precompiled kernels
+            the first time they are accessed (either from the host or by the compiler).
+        """
+        # note: use __dict__ to avoid recursion if called during initialization
+        lazy_attributes = self.__dict__.get('_lazy_attributes', {})
+
+        # devices
+        if name in lazy_attributes:
+            dev_name = lazy_attributes[name]
+            device = self.device_manager.get(dev_name) if (dev_name is not None) else None
+            setattr(self, name, device)
+            return device
+
+        # device lists for kernels
+        elif name in ('_dds_channels', '_dds_boards', '_ttlcount_channels', '_ttlout_channels'):
+            dev_dict = {
+                '_dds_channels':        self.dds_dict,
+                '_dds_boards':          self.urukul_dict,
+                '_ttlcount_channels':   self.ttlcounter_dict,
+                '_ttlout_channels':     self.ttlout_dict
+            }[name]
+            dev_list = list(dev_dict.values())
+            setattr(self, name, dev_list)
+            return dev_list
+
+        # precompiled kernels
+        elif name.startswith('_precompile_func_') and (name[17:] in PRECOMPILED_KERNELS):
+            return self._precompile(name[17:])
+
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+    def _precompile(self, kernel_name):
+        """
+        Precompile a kernel in PRECOMPILED_KERNELS and store it as self._precompile_func_<name>.
+        Arguments:
+            kernel_name (str)   : the key of the kernel in PRECOMPILED_KERNELS.
+        Returns:
+                        (func)  : the precompiled kernel.
+        """
+        attr_name = '_precompile_func_' + kernel_name
+        with self._precompile_locks[kernel_name]:
+            # check kernel wasn't compiled while we waited for the lock
+            if attr_name in self.__dict__:
+                return self.__dict__[attr_name]
+
+            time_start = time()
+            func = self.kernel_cache.precompile(self.core, getattr(self, PRECOMPILED_KERNELS[kernel_name]))
+            self.timing['precompile_' + kernel_name] = time() - time_start
+            setattr(self, attr_name, func)
+            return func
+
+    def precompileAll(self, workers=4):
+        """
+        Precompile all kernels in PRECOMPILED_KERNELS that haven't been compiled yet.
+            Kernels are independent of each other, so they are compiled concurrently.
+        Arguments:
+            workers     (int)   : the number of kernels to compile at once.
+        """
+        # create device lists beforehand, since the device manager isn't thread-safe
+        for name in ('_dds_channels', '_dds_boards', '_ttlcount_channels', '_ttlout_channels'):
+            getattr(self, name)
+        time_start = time()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(self._precompile, PRECOMPILED_KERNELS.keys()))
+        self.timing['precompile_all'] = time() - time_start
+
+    def timingReport(self):
+        """
+        Returns:
+            (str): the time taken by each startup phase.
+        """
+        report = ['\t{:<30s}{:.3f} s'.format(phase, duration) for phase, duration in self.timing.items()]
+        report.append('\t{:<30s}{:.3f} s ({:d} hits, {:d} misses)'.format('kernel cache saved', self.kernel_cache.time_saved,
+                                                                       self.kernel_cache.hits, self.kernel_cache.misses))
+        return '\n'.join(report)
 
     def close_connection(self):
         """
@@ -104,9 +252,10 @@ class ARTIQ_API(object):
 
 
     '''new faster functions meant to be used with precompile'''
-    def _getPrecompiledFunctions(self) -> TNone:
+    def _setHolderVariables(self) -> TNone:
         """
-        todo: document
+        Create the variables used to pass values between the
+            host and the precompiled kernels via RPC.
         """
         '''
         DDS PRECOMPILE
@@ -124,17 +273,6 @@ class ARTIQ_API(object):
         self._dds_att_set_mu =      np.int32(0)
         self._dds_sw_set_status =   False
 
-        ## precompile hardware functions
-        # getters
-        self._precompile_func_get_wave =    self.core.precompile(self._getDDSFastWave)
-        self._precompile_func_get_att =     self.core.precompile(self._getDDSFastATT)
-        self._precompile_func_get_sw =      self.core.precompile(self._getDDSFastSW)
-        # setters
-        self._precompile_func_set_freq =    self.core.precompile(self._setDDSFastFTW)
-        self._precompile_func_set_ampl =    self.core.precompile(self._setDDSFastASF)
-        self._precompile_func_set_att =     self.core.precompile(self._setDDSFastATT)
-        self._precompile_func_set_sw =      self.core.precompile(self._setDDSFastSW)
-
         '''
         TTL PRECOMPILE
         '''
@@ -146,9 +284,11 @@ class ARTIQ_API(object):
         self._ttlcount_time_set_mu =    np.int32(0)
         self._ttlcount_samples_set_mu = np.int32(0)
 
-        ## precompile hardware functions
-        # getters
-        self._precompile_func_get_ttlcounts =   self.core.precompile(self._getTTLCountFastCounts)
+        '''
+        BATCH PRECOMPILE
+        '''
+        # set holder variables for batch updates
+        self._batch_updates =   np.zeros(0, dtype=np.int32)
 
     @autoreload
     def getDDSFastWave(self, device_name: TStr) -> TTuple([TInt32, TInt32]):
@@ -540,10 +680,14 @@ class ARTIQ_API(object):
         _count_store = [0] * num_samples
 
         # count!
-        for i in range(num_samples):
+        # note: each gate is scheduled before the previous bin is fetched, so bins are
+        # back-to-back and we don't have to break realtime for every sample
+        self.core.break_realtime()
+        ttlcount_dev.gate_rising_mu(time_count_mu)
+        for i in range(num_samples - 1):
             ttlcount_dev.gate_rising_mu(time_count_mu)
             _count_store[i] = ttlcount_dev.fetch_count()
-            self.core.break_realtime()
+        _count_store[num_samples - 1] = ttlcount_dev.fetch_count()
 
         # get existing waveform from device
         self._store_getter_ttlcount_counts(_count_store)
@@ -561,6 +705,99 @@ class ARTIQ_API(object):
         return self._ttlcount_samples_set_mu, self._ttlcount_time_set_mu
     '''ttl precompile functions'''
 
+    '''batch precompile functions'''
+    @autoreload
+    def setStateBatch(self, updates: TArray(TInt32, 2)) -> TNone:
+        """
+        Apply many TTL/DDS updates in a single kernel.
+        Arguments:
+            updates     (np.array)  : an (N, BATCH_RECORD_LENGTH) array of records in the form
+                                        (kind, index, a, b, c), where kind is one of
+                                        (BATCH_TTL, BATCH_DDS_WAVE, BATCH_DDS_ATT, BATCH_DDS_SW),
+                                        index is the device number, and (a, b, c) are the values
+                                        (in machine units):
+                                            BATCH_TTL:      (state, -, -)
+                                            BATCH_DDS_WAVE: (ftw, asf, pow)
+                                            BATCH_DDS_ATT:  (att_mu, -, -)
+                                            BATCH_DDS_SW:   (state, -, -)
+        """
+        # store updates as a flat array so they can be sent in a single rpc
+        self._batch_updates = np.ascontiguousarray(updates, dtype=np.int32).flatten()
+        if len(self._batch_updates) == 0:
+            return
+
+        # call precompiled batch setter
+        self._precompile_func_set_batch()
+
+    @kernel(flags={"fast-math"})
+    def _setStateBatch(self) -> TNone:
+        self.core.break_realtime()
+
+        # get all updates at once
+        updates = self._return_setter_batch()
+        self.core.break_realtime()
+
+        for i in range(len(updates) // BATCH_RECORD_LENGTH):
+            offset = i * BATCH_RECORD_LENGTH
+            kind = updates[offset]
+            index = updates[offset + 1]
+
+            if kind == BATCH_TTL:
+                ttl_dev = self._ttlout_channels[index]
+                if updates[offset + 2]:
+                    ttl_dev.on()
+                else:
+                    ttl_dev.off()
+
+            elif kind == BATCH_DDS_WAVE:
+                dds_dev = self._dds_channels[index]
+                dds_cpld = dds_dev.cpld
+
+                # set default profile without overwriting the existing switch configuration
+                reg_sw = urukul_sta_rf_sw(dds_cpld.sta_read())
+                reg_cfg_current = (dds_cpld.cfg_reg & ~0xF) | reg_sw
+                self.core.break_realtime()
+                reg_cfg_update = reg_cfg_current & ~(7 << CFG_PROFILE)
+                reg_cfg_update |= (DEFAULT_PROFILE & 7) << CFG_PROFILE
+                dds_cpld.cfg_write(reg_cfg_update)
+                dds_cpld.io_update.pulse_mu(64)
+                self.core.break_realtime()
+
+                # update waveform
+                dds_dev.set_mu(updates[offset + 2], pow_=updates[offset + 4],
+                               asf=updates[offset + 3], profile=DEFAULT_PROFILE)
+
+            elif kind == BATCH_DDS_ATT:
+                dds_dev = self._dds_channels[index]
+                # read attenuation register so existing attenuations are kept
+                dds_dev.get_att_mu()
+                self.core.break_realtime()
+                dds_dev.set_att_mu(updates[offset + 2])
+
+            elif kind == BATCH_DDS_SW:
+                dds_dev = self._dds_channels[index]
+                channel_num = dds_dev.chip_select - 4
+                sw_state = updates[offset + 2]
+
+                # read CPLD status register so existing switch states are kept
+                sw_reg = urukul_sta_rf_sw(dds_dev.cpld.sta_read())
+                self.core.break_realtime()
+                sw_reg &= ~(0x1 << channel_num)
+                if sw_state:
+                    sw_reg |= (0x1 << channel_num)
+                dds_dev.cpld.cfg_switches(sw_reg)
+                if sw_state:
+                    dds_dev.sw.on()
+                else:
+                    dds_dev.sw.off()
+
+            self.core.break_realtime()
+
+    @rpc
+    def _return_setter_batch(self) -> TArray(TInt32, 1):
+        return self._batch_updates
+    '''batch precompile functions'''
+
     def stopAPI(self):
         """
         Closes any opened devices.
@@ -569,19 +806,20 @@ class ARTIQ_API(object):
 
     def reset_connection(self):
         """
-        Reestablishes a connection to artiq_master.
+        Reestablishes a connection to the core device.
+        Only the core is re-acquired, since the kernel decorator only looks for it
+            inside the class object. Other devices and precompiled kernels are kept.
         """
-        devices = DeviceDB(self.ddb_filepath)
-        self.device_manager = DeviceManager(devices)
-        self.device_db = devices.get_device_db()
-        self._getDevices()
+        time_start = time()
+        self.close_connection()
+        core = self.device_manager.get("core")
 
-        # # note: only the core needs to be re-acquired
-        # # since the kernel decorator looks for only it inside the class object
-        self.core = self.device_manager.get("core")
-
-        # re-precompile relevant functions
-        self._getPrecompiledFunctions()
+        # precompiled kernels are bound to the core they were compiled with
+        if core is not self.core:
+            self.core = core
+            for kernel_name in PRECOMPILED_KERNELS:
+                self.__dict__.pop('_precompile_func_' + kernel_name, None)
+        self.timing['reset_connection'] = time() - time_start
 
 
     '''
@@ -589,23 +827,28 @@ class ARTIQ_API(object):
     '''
     def _getDevices(self):
         """
-        Gets necessary device objects.
+        Sorts device names by type.
+        Device objects are not created here; they are created
+            by the device manager the first time they are accessed.
         """
-        # get core
-        self.core = self.device_manager.get("core")
-
         # store devices in dictionary where device
         # name is key and device itself is value
-        self.ttlout_dict =          dict()
-        self.ttlin_dict =           dict()
-        self.ttlcounter_dict =      dict()
-        self.dds_dict =             dict()
-        self.urukul_dict =          dict()
-        self.zotino =               None
-        self.fastino =              None
+        self.ttlout_dict =          _LazyDeviceDict(self.device_manager)
+        self.ttlin_dict =           _LazyDeviceDict(self.device_manager)
+        self.ttlcounter_dict =      _LazyDeviceDict(self.device_manager)
+        self.dds_dict =             _LazyDeviceDict(self.device_manager)
+        self.urukul_dict =          _LazyDeviceDict(self.device_manager)
         self.dacType =              None
-        self.sampler =              None
-        self.phaser =               None
+
+        # attribute name: device name for devices that are
+        # created on first access (see __getattr__)
+        self._lazy_attributes = {
+            'zotino':   None,
+            'fastino':  None,
+            'sampler':  None,
+            'phaser':   None,
+            'core_dma': 'core_dma'
+        }
 
         # tmp remove
         _dds_dict_search_counter =      0
@@ -613,24 +856,31 @@ class ARTIQ_API(object):
 
         _ttlcount_dict_search_counter = 0
         self.ttlcount_dict_search_num = dict()
+
+        _ttlout_dict_search_counter =   0
+        self.ttlout_dict_search_num =   dict()
         # tmp remove
 
-        # assign names and devices
+        # assign names
         for name, params in self.device_db.items():
 
             # only get devices with named class
             if 'class' not in params:
                 continue
 
-            # set device as attribute
             devicetype = params['class']
-            device = self.device_manager.get(name)
             if devicetype == 'TTLInOut':
-                self.ttlin_dict[name] =     device
+                self.ttlin_dict[name] =     None
             elif devicetype == 'TTLOut':
-                self.ttlout_dict[name] =    device
+                self.ttlout_dict[name] =    None
+
+                # tmp remove
+                self.ttlout_dict_search_num[name] = _ttlout_dict_search_counter
+                _ttlout_dict_search_counter += 1
+                # tmp remove
+
             elif devicetype == 'EdgeCounter':
-                self.ttlcounter_dict[name] = device
+                self.ttlcounter_dict[name] = None
 
                 # tmp remove
                 self.ttlcount_dict_search_num[name] = _ttlcount_dict_search_counter
@@ -638,7 +888,7 @@ class ARTIQ_API(object):
                 # tmp remove
 
             elif devicetype == 'AD9910':
-                self.dds_dict[name] = device
+                self.dds_dict[name] = None
 
                 # tmp remove
                 self.dds_dict_search_num[name] = _dds_dict_search_counter
@@ -646,32 +896,21 @@ class ARTIQ_API(object):
                 # tmp remove
 
             elif devicetype == 'CPLD':
-                self.urukul_dict[name] = device
-            elif devicetype == 'Zotino':
+                self.urukul_dict[name] = None
+            elif devicetype in ('Zotino', 'Fastino'):
                 # need to specify both device types since
                 # all kernel functions need to be valid
-                self.zotino =   device
-                self.fastino =  device
-                self.dacType =  devicetype
-            elif devicetype == 'Fastino':
-                self.fastino =  device
-                self.zotino =   device
+                self._lazy_attributes['zotino'] =   name
+                self._lazy_attributes['fastino'] =  name
                 self.dacType =  devicetype
             elif devicetype == 'Sampler':
-                self.sampler =  device
+                self._lazy_attributes['sampler'] =  name
             elif devicetype == 'Phaser':
-                self.phaser =   device
-
-        # holder objects for dds channels
-        # these are needed so we can iterate devices in kernel functions
-        # todo: ensure somehow that values still correspond to their index
-        self._dds_channels =    list(self.dds_dict.values())
-        self._dds_boards =      list(self.urukul_dict.values())
-        self._ttlcount_channels =   list(self.ttlcounter_dict.values())
+                self._lazy_attributes['phaser'] =   name
 
-        # set all DDSs and Urukuls as class attributes
+        # set all DDSs and Urukuls as (lazy) class attributes
         for dev_name in (list(self.dds_dict.keys()) + list(self.urukul_dict.keys())):
-            setattr(self, dev_name, self.device_manager.get(dev_name))
+            self._lazy_attributes[dev_name] = dev_name
 
 
     '''
@@ -1172,6 +1411,100 @@ class ARTIQ_API(object):
         self.fastino.set_continuous(1 << channel_num)
 
 
+    '''
+    DAC WAVEFORMS
+    '''
+    @autoreload
+    def recordDACWaveform(self, handle_name, channels, waveform_mu, interval_s):
+        """
+        Record a DAC waveform into DMA so it can be played back later.
+            Large waveforms are split into multiple DMA sequences.
+        Arguments:
+            handle_name (str)       : the waveform name.
+            channels    (np.array)  : the DAC channels.
+            waveform_mu (np.array)  : the waveform (in mu), with shape (num_samples, len(channels)).
+            interval_s  (float)     : the time between samples (in s).
+        Returns:
+                        (int)       : the number of DMA sequences recorded.
+        """
+        # remove any existing waveform with the same name
+        if handle_name in self._dac_waveforms:
+            self.eraseDACWaveform(handle_name)
+
+        channels = np.array(channels, dtype=np.int32)
+        interval_mu = self.core.seconds_to_mu(interval_s)
+        chunks = chunkDACWaveform(handle_name, np.asarray(waveform_mu, dtype=np.int32))
+        for chunk_name, chunk_mu in chunks:
+            if self.dacType == 'Zotino':
+                self._recordZotinoWaveform(chunk_name, channels, chunk_mu, interval_mu)
+            elif self.dacType == 'Fastino':
+                self._recordFastinoWaveform(chunk_name, channels, chunk_mu, interval_mu)
+        self._dac_waveforms[handle_name] = [chunk_name for chunk_name, _ in chunks]
+        return len(chunks)
+
+    @autoreload
+    def playDACWaveform(self, handle_name, repetitions=1):
+        """
+        Play back a recorded DAC waveform. Returns once playback is complete.
+        Arguments:
+            handle_name (str)   : the waveform name.
+            repetitions (int)   : the number of times to play the waveform.
+        """
+        self._playDMASequences(self._dac_waveforms[handle_name], repetitions)
+
+    @autoreload
+    def eraseDACWaveform(self, handle_name):
+        """
+        Remove a recorded DAC waveform from DMA.
+        """
+        for chunk_name in self._dac_waveforms.pop(handle_name):
+            self._eraseDMASequence(chunk_name)
+
+    @kernel
+    def _recordZotinoWaveform(self, name: TStr, channels: TArray(TInt32, 1),
+                              waveform_mu: TArray(TInt32, 1), interval_mu: TInt64) -> TNone:
+        num_channels = len(channels)
+        num_samples = len(waveform_mu) // num_channels
+        self.core.break_realtime()
+        with self.core_dma.record(name):
+            for i in range(num_samples):
+                time_start_mu = now_mu()
+                for j in range(num_channels):
+                    self.zotino.write_dac_mu(channels[j], waveform_mu[i * num_channels + j])
+                self.zotino.load()
+                at_mu(time_start_mu + interval_mu)
+
+    @kernel
+    def _recordFastinoWaveform(self, name: TStr, channels: TArray(TInt32, 1),
+                               waveform_mu: TArray(TInt32, 1), interval_mu: TInt64) -> TNone:
+        num_channels = len(channels)
+        num_samples = len(waveform_mu) // num_channels
+        update_mask = 0
+        for j in range(num_channels):
+            update_mask |= 1 << channels[j]
+        self.core.break_realtime()
+        with self.core_dma.record(name):
+            for i in range(num_samples):
+                time_start_mu = now_mu()
+                for j in range(num_channels):
+                    self.fastino.set_dac_mu(channels[j], waveform_mu[i * num_channels + j])
+                self.fastino.update(update_mask)
+                at_mu(time_start_mu + interval_mu)
+
+    @kernel
+    def _playDMASequences(self, names: TList(TStr), repetitions: TInt32) -> TNone:
+        self.core.break_realtime()
+        for i in range(repetitions):
+            for name in names:
+                self.core_dma.playback(name)
+        # wait until playback has finished
+        self.core.wait_until_mu(now_mu())
+
+    @kernel
+    def _eraseDMASequence(self, name: TStr) -> TNone:
+        self.core_dma.erase(name)
+
+
     '''
     SAMPLER
     '''
@@ -1228,34 +1561,43 @@ class ARTIQ_API(object):
 
     @autoreload
     def readSampler(self, rate_hz: TFloat, samples: TInt32) -> TArray(TInt32, 1):
-        # create structures to hold results
-        setattr(self, "sampler_dataset", np.zeros((samples, 8), dtype=np.int32))
-        setattr(self, "sampler_holder", np.zeros(8, dtype=np.int32))
+        """
+        Read a block of samples from all Sampler channels.
+        Returns:
+            (np.array): the samples (in machine units), with shape (samples, 8).
+        """
+        # create structure to hold results
+        self.sampler_dataset = np.zeros((samples, 8), dtype=np.int32)
         # convert rate to mu
         time_delay_mu = self.core.seconds_to_mu(1 / rate_hz)
         # read samples!
         self._readSampler(time_delay_mu, samples)
         # delete holding structure
         tmp_arr = self.sampler_dataset
-        delattr(self, "sampler_dataset")
-        delattr(self, "sampler_holder")
+        del self.sampler_dataset
         return tmp_arr
 
     @kernel(flags={"fast-math"})
     def _readSampler(self, time_delay_mu: TInt64, samples: TInt32) -> TNone:
+        # note: samples are stored on the core device and returned in a single rpc
+        # at the end instead of one rpc per sample
+        sample_holder = [0] * 8
+        sample_store = [0] * (8 * samples)
         self.core.break_realtime()
 
         for i in range(samples):
             with parallel:
-                with sequential:
-                    self.sampler.sample_mu(self.sampler_holder)
-                    self._recordSamplerValues(i, self.sampler_holder)
+                self.sampler.sample_mu(sample_holder)
                 delay_mu(time_delay_mu)
+            for j in range(8):
+                sample_store[8 * i + j] = sample_holder[j]
 
-    @rpc(flags={"async"})
-    def _recordSamplerValues(self, i: TInt32, value_arr: TArray(TInt32, 1)) -> TNone:
+        self._recordSamplerValues(sample_store)
+
+    @rpc
+    def _recordSamplerValues(self, value_arr: TList(TInt32)) -> TNone:
         """
-        Records values via rpc to minimize kernel overhead.
+        Records the block of values via a single rpc.
         """
-        self.sampler_dataset[i] = value_arr
+        self.sampler_dataset[:] = np.array(value_arr, dtype=np.int32).reshape(-1, 8)
 
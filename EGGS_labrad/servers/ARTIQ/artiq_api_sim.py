@@ -0,0 +1,346 @@
+import numpy as np
+from time import sleep, time
+from runpy import run_path
+from threading import get_ident
+
+from artiq_state import BATCH_TTL, BATCH_DDS_WAVE, BATCH_DDS_ATT, BATCH_DDS_SW, BATCH_RECORD_LENGTH
+from artiq_waveform import chunkDACWaveform
+from artiq_stream import SAMPLER_MAX_BLOCK
+
+
+class ARTIQ_API_Sim(object):
+    """
+    A simulated version of ARTIQ_API.
+    Has the same host-side interface as ARTIQ_API, but stores device state
+        in memory instead of talking to hardware.
+    Calls block for a configurable amount of time to emulate kernel
+        compilation/execution, so it can be used to test the server's
+        scheduling behaviour without an ARTIQ box.
+    Does not require artiq to be installed.
+    """
+
+    def __init__(self, ddb_filepath, kernel_time=0.01, time_scale=1., count_rate=1000., dac_type=None):
+        """
+        Arguments:
+            ddb_filepath    (str)   : the path to the device_db file.
+            kernel_time     (float) : the time (in seconds) each simulated kernel call takes.
+            time_scale      (float) : scales the duration of timed operations (e.g. counting, sampling).
+            count_rate      (float) : the simulated TTL count rate (in Hz).
+            dac_type        (str)   : simulate a DAC of this type ('Zotino' or 'Fastino')
+                                        even if there isn't one in the device_db.
+        """
+        self.ddb_filepath =     ddb_filepath
+        self.device_db =        run_path(ddb_filepath)['device_db']
+        self.kernel_time =      kernel_time
+        self.time_scale =       time_scale
+        self.count_rate =       count_rate
+
+        # keep track of calls for testing
+        self.call_log =         list()
+        self.call_threads =     set()
+        self.connected =        True
+
+        self.timing =           dict()
+        time_start = time()
+        self._getDevices()
+        self.timing['devices'] = time() - time_start
+        if dac_type is not None:
+            self.dacType =      dac_type
+
+        # recorded DMA sequences, and the sequences of each DAC waveform
+        self.dma_sequences =    dict()
+        self._dac_waveforms =   dict()
+
+    def _getDevices(self):
+        """
+        Sort devices by class and create their simulated state.
+        """
+        self.ttlout_dict =          dict()
+        self.ttlin_dict =           dict()
+        self.ttlcounter_dict =      dict()
+        self.dds_dict =             dict()
+        self.urukul_dict =          dict()
+        self.zotino =               None
+        self.fastino =              None
+        self.dacType =              None
+        self.sampler =              None
+        self.phaser =               None
+
+        for name, params in self.device_db.items():
+            if 'class' not in params:
+                continue
+            devicetype = params['class']
+            if devicetype == 'TTLInOut':
+                self.ttlin_dict[name] =         name
+            elif devicetype == 'TTLOut':
+                self.ttlout_dict[name] =        name
+            elif devicetype == 'EdgeCounter':
+                self.ttlcounter_dict[name] =    name
+            elif devicetype == 'AD9910':
+                self.dds_dict[name] =           name
+            elif devicetype == 'CPLD':
+                self.urukul_dict[name] =        name
+            elif devicetype in ('Zotino', 'Fastino'):
+                self.zotino =   name
+                self.fastino =  name
+                self.dacType =  devicetype
+            elif devicetype == 'Sampler':
+                self.sampler =  name
+            elif devicetype == 'Phaser':
+                self.phaser =   name
+
+        self.dds_dict_search_num = {name: i for i, name in enumerate(self.dds_dict)}
+        self.ttlcount_dict_search_num = {name: i for i, name in enumerate(self.ttlcounter_dict)}
+        self.ttlout_dict_search_num = {name: i for i, name in enumerate(self.ttlout_dict)}
+
+        # simulated device state
+        self._ttl_state =       {name: False for name in list(self.ttlout_dict) + list(self.ttlin_dict)}
+        # columns: ftw, asf, pow, att_mu, sw
+        self._dds_state =       np.zeros((len(self.dds_dict), 5), dtype=np.int32)
+        self._dds_state[:, 3] = 0xFF
+        self._dac_state =       {'dac': np.zeros(32, dtype=np.int32), 'gain': np.zeros(32, dtype=np.int32),
+                                 'off': np.zeros(32, dtype=np.int32), 'ofs': 0}
+        self._sampler_gains =   [0] * 8
+
+    def _kernel(self, name, duration=None):
+        """
+        Emulate a kernel call.
+        """
+        self.call_log.append(name)
+        self.call_threads.add(get_ident())
+        self.connected = True
+        sleep(self.kernel_time if duration is None else duration * self.time_scale)
+
+    def _ddsNum(self, dds_name):
+        try:
+            return self.dds_dict_search_num[dds_name]
+        except KeyError:
+            raise Exception("Error: desired device not found.")
+
+
+    # CONNECTION
+    def close_connection(self):
+        self.call_log.append('close_connection')
+        self.connected = False
+
+    def reset_connection(self):
+        self.connected = True
+
+    def stopAPI(self):
+        self.connected = False
+
+    def precompileAll(self, workers=4):
+        self.call_log.append('precompileAll')
+
+    def timingReport(self):
+        return '\n'.join('\t{:<30s}{:.3f} s'.format(phase, duration) for phase, duration in self.timing.items())
+
+
+    # TTL
+    def setTTL(self, ttlname, state):
+        if ttlname not in self.ttlout_dict:
+            raise Exception('Invalid device name.')
+        self._kernel('setTTL')
+        self._ttl_state[ttlname] = bool(state)
+
+    def getTTL(self, ttlname):
+        if ttlname not in self.ttlin_dict:
+            raise Exception('Invalid device name.')
+        self._kernel('getTTL')
+        return self._ttl_state[ttlname]
+
+    def getTTLCountFastCounts(self, ttlcount_name, time_count_us, num_samples):
+        if ttlcount_name not in self.ttlcounter_dict:
+            raise Exception('Error: Invalid device name.')
+        self._kernel('getTTLCountFastCounts', time_count_us * 1e-6 * num_samples)
+        return np.random.poisson(self.count_rate * time_count_us * 1e-6, num_samples).astype(np.int32)
+
+    def counterTTL(self, ttlname, time_us, trials):
+        return self.getTTLCountFastCounts(ttlname, time_us, trials)
+
+
+    # BATCH
+    def setStateBatch(self, updates):
+        updates = np.asarray(updates, dtype=np.int32).reshape(-1, BATCH_RECORD_LENGTH)
+        if len(updates) == 0:
+            return
+        self._kernel('setStateBatch')
+        ttl_names = list(self.ttlout_dict)
+        for kind, index, a, b, c in updates:
+            if kind == BATCH_TTL:
+                self._ttl_state[ttl_names[index]] = bool(a)
+            elif kind == BATCH_DDS_WAVE:
+                self._dds_state[index, :3] = (a, b, c)
+            elif kind == BATCH_DDS_ATT:
+                self._dds_state[index, 3] = a
+            elif kind == BATCH_DDS_SW:
+                self._dds_state[index, 4] = bool(a)
+
+
+    # DDS
+    def initializeDDSAll(self):
+        self._kernel('initializeDDSAll')
+
+    def initializeDDS(self, dds_name):
+        self._ddsNum(dds_name)
+        self._kernel('initializeDDS')
+
+    def getDDSFastWave(self, device_name):
+        num = self._ddsNum(device_name)
+        self._kernel('getDDSFastWave')
+        return self._dds_state[num, 0], self._dds_state[num, 1]
+
+    def getDDSFastATT(self, device_name):
+        num = self._ddsNum(device_name)
+        self._kernel('getDDSFastATT')
+        return self._dds_state[num, 3]
+
+    def getDDSFastSW(self, device_name):
+        num = self._ddsNum(device_name)
+        self._kernel('getDDSFastSW')
+        return bool(self._dds_state[num, 4])
+
+    def setDDSFastFTW(self, device_name, freq_ftw):
+        num = self._ddsNum(device_name)
+        self._kernel('setDDSFastFTW')
+        self._dds_state[num, 0] = freq_ftw
+
+    def setDDSFastASF(self, device_name, ampl_asf):
+        num = self._ddsNum(device_name)
+        self._kernel('setDDSFastASF')
+        self._dds_state[num, 1] = ampl_asf
+
+    def setDDSFastATT(self, device_name, att_mu):
+        num = self._ddsNum(device_name)
+        self._kernel('setDDSFastATT')
+        self._dds_state[num, 3] = att_mu
+
+    def setDDSFastSW(self, device_name, sw_state):
+        num = self._ddsNum(device_name)
+        self._kernel('setDDSFastSW')
+        self._dds_state[num, 4] = bool(sw_state)
+
+    def getDDSsw(self, dds_name):
+        return int(self.getDDSFastSW(dds_name))
+
+    def setDDSsw(self, dds_name, state):
+        self.setDDSFastSW(dds_name, state)
+
+    def getDDS(self, dds_name):
+        num = self._ddsNum(dds_name)
+        self._kernel('getDDS')
+        ftw, asf, pow = self._dds_state[num, :3]
+        return np.int32(ftw), np.int32(asf), np.int32(pow)
+
+    def setDDS(self, dds_name, param, val):
+        num = self._ddsNum(dds_name)
+        self._kernel('setDDS')
+        self._dds_state[num, ('ftw', 'asf', 'pow').index(param)] = val
+
+    def getDDSatt(self, dds_name):
+        return self.getDDSFastATT(dds_name)
+
+    def setDDSatt(self, dds_name, att_mu):
+        self.setDDSFastATT(dds_name, att_mu)
+
+    def readDDS(self, dds_name, reg, length):
+        self._ddsNum(dds_name)
+        self._kernel('readDDS')
+        return 0
+
+    def getDDSAll(self):
+        self._kernel('getDDSAll')
+        return self._dds_state[:, [0, 1, 3, 4]].copy()
+
+
+    # URUKUL
+    def initializeUrukul(self, urukul_name):
+        if urukul_name not in self.urukul_dict:
+            raise Exception('Invalid device name.')
+        self._kernel('initializeUrukul')
+
+
+    # DAC
+    def initializeDAC(self):
+        self._kernel('initializeDAC')
+
+    def setZotino(self, channel_num, volt_mu):
+        self._kernel('setZotino')
+        self._dac_state['dac'][channel_num] = volt_mu
+
+    def setZotinoGain(self, channel_num, gain_mu):
+        self._kernel('setZotinoGain')
+        self._dac_state['gain'][channel_num] = gain_mu
+
+    def setZotinoOffset(self, channel_num, volt_mu):
+        self._kernel('setZotinoOffset')
+        self._dac_state['off'][channel_num] = volt_mu
+
+    def setZotinoGlobal(self, word):
+        self._kernel('setZotinoGlobal')
+        self._dac_state['ofs'] = word
+
+    def readZotino(self, channel_num, address):
+        self._kernel('readZotino')
+        return self._dac_state['dac'][channel_num]
+
+    def initializeFastino(self):
+        self._kernel('initializeFastino')
+
+    def setFastino(self, channel_num, volt_mu):
+        self._kernel('setFastino')
+        self._dac_state['dac'][channel_num] = volt_mu
+
+    def readFastino(self, addr):
+        self._kernel('readFastino')
+        return 0
+
+    def continuousFastino(self, channel_num):
+        self._kernel('continuousFastino')
+
+
+    # DAC WAVEFORMS
+    def recordDACWaveform(self, handle_name, channels, waveform_mu, interval_s):
+        if handle_name in self._dac_waveforms:
+            self.eraseDACWaveform(handle_name)
+        chunks = chunkDACWaveform(handle_name, np.asarray(waveform_mu, dtype=np.int32))
+        channels = np.array(channels, dtype=np.int32)
+        for chunk_name, chunk_mu in chunks:
+            self._kernel('recordDACWaveform')
+            self.dma_sequences[chunk_name] = (channels, chunk_mu.reshape(-1, len(channels)), interval_s)
+        self._dac_waveforms[handle_name] = [chunk_name for chunk_name, _ in chunks]
+        return len(chunks)
+
+    def playDACWaveform(self, handle_name, repetitions=1):
+        chunk_names = self._dac_waveforms[handle_name]
+        num_samples = sum(len(self.dma_sequences[chunk_name][1]) for chunk_name in chunk_names)
+        self._kernel('playDACWaveform', num_samples * self.dma_sequences[chunk_names[0]][2] * repetitions)
+        # DACs hold the last value of the waveform
+        channels, chunk_mu, _ = self.dma_sequences[chunk_names[-1]]
+        self._dac_state['dac'][channels] = chunk_mu[-1]
+
+    def eraseDACWaveform(self, handle_name):
+        for chunk_name in self._dac_waveforms.pop(handle_name):
+            self._kernel('eraseDMASequence')
+            del self.dma_sequences[chunk_name]
+
+
+    # SAMPLER
+    def initializeSampler(self):
+        self._kernel('initializeSampler')
+
+    def setSamplerGain(self, channel_num, gain_mu):
+        self._kernel('setSamplerGain')
+        self._sampler_gains[channel_num] = gain_mu
+
+    def getSamplerGains(self):
+        self._kernel('getSamplerGains')
+        return list(self._sampler_gains)
+
+    def readSampler(self, rate_hz, samples):
+        self._kernel('readSampler', samples / rate_hz)
+        # the real kernel stores the whole block on the core device stack
+        if samples > SAMPLER_MAX_BLOCK:
+            raise Exception('Error: too many samples for the core device stack.')
+        # gaussian noise around zero, in 16-bit machine units
+        return np.random.normal(0, 100, (samples, 8)).astype(np.int32)
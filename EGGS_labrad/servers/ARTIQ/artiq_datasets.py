@@ -0,0 +1,71 @@
+"""
+Access to the ARTIQ master's datasets through a local mirror.
+"""
+
+__all__ = ["ARTIQ_Datasets", "changedDatasets"]
+
+
+def changedDatasets(mod):
+    """
+    Get the datasets changed by a dataset subscriber notification.
+    Arguments:
+        mod     (dict)  : the sync_struct modification.
+    Returns:
+                (set)   : the top-level keys of the changed datasets.
+    """
+    if mod['action'] == 'init':
+        return set(mod['struct'].keys())
+    elif mod['path']:
+        return {mod['path'][0]}
+    return {mod['key']}
+
+
+class ARTIQ_Datasets(object):
+    """
+    Reads datasets from a local mirror of the master's datasets, and writes them to the master.
+    The mirror is only ever modified by the dataset subscriber (which runs in its own thread),
+        so writes are sent to the master, and show up in the mirror once the master
+        notifies the subscriber of the change.
+    """
+
+    def __init__(self, dataset_db, mirror_getter):
+        """
+        Arguments:
+            dataset_db      (Client)    : the master's dataset_db rpc client.
+            mirror_getter   (func)      : returns the subscriber's mirror of the datasets, or None if not available.
+        """
+        self.dataset_db = dataset_db
+        self._mirror_getter = mirror_getter
+
+    def mirror(self):
+        """
+        Returns:
+            (dict): the local mirror of the master's datasets, or None if not available.
+        """
+        return self._mirror_getter()
+
+    def get(self, dataset_key):
+        """
+        Get a dataset from the local mirror, falling back to an rpc if
+            the mirror isn't available.
+        """
+        mirror = self.mirror()
+        if mirror is None:
+            return self.dataset_db.get(dataset_key)
+        try:
+            # note: mirror entries are (persist, value, ...)
+            return mirror[dataset_key][1]
+        except KeyError:
+            raise Exception('Error: dataset does not exist.')
+
+    def set(self, dataset_key, dataset_value, persist=True):
+        """
+        Set a dataset on the master.
+        """
+        self.dataset_db.set(dataset_key, dataset_value, persist)
+
+    def delete(self, dataset_key):
+        """
+        Delete a dataset on the master.
+        """
+        self.dataset_db.delete(dataset_key)
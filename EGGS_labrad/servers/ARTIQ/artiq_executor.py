@@ -0,0 +1,223 @@
+"""
+A dedicated worker thread for core device calls.
+"""
+from time import time
+from itertools import count
+from threading import Thread, Lock
+from queue import PriorityQueue
+
+from twisted.internet.defer import Deferred
+
+__all__ = ["ARTIQ_Executor", "PRIORITY_HIGH", "PRIORITY_NORMAL", "PRIORITY_LOW"]
+
+
+# lower values are run first
+PRIORITY_HIGH =     0
+PRIORITY_NORMAL =   5
+PRIORITY_LOW =      10
+
+# sentinel used to stop the worker thread
+_STOP = object()
+
+
+class _Command(object):
+    """
+    A queued call to the core device.
+    """
+    __slots__ = ('func', 'args', 'kwargs', 'priority', 'context', 'deferred', 'time_submitted', 'cancelled')
+
+    def __init__(self, func, args, kwargs, priority, context):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.context = context
+        self.deferred = Deferred(self._cancel)
+        self.time_submitted = time()
+        self.cancelled = False
+
+    def _cancel(self, d):
+        # the worker thread skips cancelled commands when it dequeues them
+        self.cancelled = True
+
+
+class ARTIQ_Executor(object):
+    """
+    Runs all core device calls on a single worker thread.
+    The core device can only do one thing at a time, and kernel calls
+        can block for a long time (e.g. counting or sampling), so calls are
+        serialized on a dedicated thread instead of blocking the reactor.
+    Calls are queued by priority (then by submission order) and
+        each call returns a Deferred that fires on the reactor thread.
+    """
+
+    def __init__(self, reactor=None, name='ARTIQ Executor'):
+        """
+        Arguments:
+            reactor     : the twisted reactor to return results on.
+                            Defaults to the global reactor.
+            name (str)  : the name of the worker thread.
+        """
+        if reactor is None:
+            from twisted.internet import reactor
+        self._reactor = reactor
+        self._queue = PriorityQueue()
+        self._counter = count()
+        self._lock = Lock()
+        # queued (not yet started) commands, keyed by context
+        self._pending = dict()
+        self.running = None
+
+        # metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.max_depth = 0
+        self.total_wait = 0.
+        self.max_wait = 0.
+        self.total_exec = 0.
+        self.max_exec = 0.
+
+        self._thread = Thread(target=self._work, name=name, daemon=True)
+        self._thread.start()
+
+
+    # API
+    def submit(self, func, *args, priority=PRIORITY_NORMAL, context=None, **kwargs):
+        """
+        Queue a call to be run on the worker thread.
+        Arguments:
+            func        (callable)  : the function to run.
+            priority    (int)       : the call priority. Lower values are run first.
+            context                 : the context ID of the caller. Used to cancel
+                                        the call if the context expires.
+        Returns:
+                        (Deferred)  : fires with the return value of the call.
+        """
+        cmd = _Command(func, args, kwargs, priority, context)
+        with self._lock:
+            self._pending.setdefault(context, set()).add(cmd)
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize() + 1)
+        self._queue.put((priority, next(self._counter), cmd))
+        return cmd.deferred
+
+    def cancel(self, context):
+        """
+        Cancel all queued calls belonging to a context.
+        Calls which have already started are allowed to finish.
+        Arguments:
+            context     : the context ID.
+        Returns:
+                (int)   : the number of calls cancelled.
+        """
+        with self._lock:
+            cmds = self._pending.pop(context, set())
+        for cmd in cmds:
+            cmd.deferred.cancel()
+        return len(cmds)
+
+    def stop(self):
+        """
+        Cancel all queued calls and stop the worker thread.
+        """
+        with self._lock:
+            contexts = list(self._pending.keys())
+        for context in contexts:
+            self.cancel(context)
+        self._queue.put((float('inf'), next(self._counter), _STOP))
+
+    def depth(self):
+        """
+        Returns:
+            (int): the number of queued calls.
+        """
+        return self._queue.qsize()
+
+    def metrics(self):
+        """
+        Returns:
+            (dict): queue depth, call counts, and wait/execution latencies (in seconds).
+        """
+        with self._lock:
+            finished = max(self.completed + self.failed, 1)
+            return {
+                'depth':        self.depth(),
+                'max_depth':    self.max_depth,
+                'submitted':    self.submitted,
+                'completed':    self.completed,
+                'failed':       self.failed,
+                'cancelled':    self.cancelled,
+                'mean_wait':    self.total_wait / finished,
+                'max_wait':     self.max_wait,
+                'mean_exec':    self.total_exec / finished,
+                'max_exec':     self.max_exec,
+            }
+
+    def resetMetrics(self):
+        """
+        Reset the counters and latencies.
+        """
+        with self._lock:
+            self.submitted = self.completed = self.failed = self.cancelled = 0
+            self.max_depth = 0
+            self.total_wait = self.max_wait = 0.
+            self.total_exec = self.max_exec = 0.
+
+
+    # WORKER
+    def _work(self):
+        while True:
+            _, _, cmd = self._queue.get()
+            if cmd is _STOP:
+                return
+
+            # remove from pending so it can no longer be cancelled
+            with self._lock:
+                pending = self._pending.get(cmd.context)
+                if pending is not None:
+                    pending.discard(cmd)
+                    if not pending:
+                        del self._pending[cmd.context]
+                if cmd.cancelled:
+                    self.cancelled += 1
+                    continue
+            self.running = cmd.func
+
+            # run call
+            time_start = time()
+            try:
+                result = cmd.func(*cmd.args, **cmd.kwargs)
+                success = True
+            except Exception as e:
+                result = e
+                success = False
+            time_end = time()
+            self.running = None
+
+            # update metrics
+            with self._lock:
+                if success:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                wait = time_start - cmd.time_submitted
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                exec_time = time_end - time_start
+                self.total_exec += exec_time
+                self.max_exec = max(self.max_exec, exec_time)
+
+            # return result on the reactor thread
+            self._reactor.callFromThread(self._fire, cmd.deferred, success, result)
+
+    @staticmethod
+    def _fire(d, success, result):
+        # deferred may have been cancelled while the call was running
+        if d.called:
+            return
+        if success:
+            d.callback(result)
+        else:
+            d.errback(result)
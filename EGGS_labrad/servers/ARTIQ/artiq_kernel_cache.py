@@ -0,0 +1,223 @@
+"""
+A persistent on-disk cache of compiled ARTIQ kernels.
+
+Usage:
+    python artiq_kernel_cache.py warm [DEVICE_DB]     compile all precompiled kernels into the cache.
+    python artiq_kernel_cache.py clear                delete all cached kernels.
+    python artiq_kernel_cache.py info                 list cached kernels.
+
+The cache directory defaults to ~/.artiq/kernel_cache and can be changed
+    with the ARTIQ_KERNEL_CACHE environment variable.
+"""
+import os
+import json
+import inspect
+import hashlib
+from time import time
+from functools import wraps
+from threading import Lock
+
+__all__ = ["KernelCache"]
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.artiq', 'kernel_cache')
+
+
+def _packageHash():
+    """
+    Hash the source of every module in the ARTIQ server directory.
+    Returns:
+        (bytes): the hash digest.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    h = hashlib.sha256()
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.py'):
+            h.update(filename.encode())
+            with open(os.path.join(directory, filename), 'rb') as f:
+                h.update(f.read())
+    return h.digest()
+
+
+class KernelCache(object):
+    """
+    Stores compiled kernel libraries on disk so they don't have to be recompiled on every startup.
+    Each kernel is keyed by a hash of its source (and the source of the module defining it),
+        the sources of the ARTIQ server modules, the device_db contents, and the ARTIQ version,
+        so the cache is invalidated automatically whenever any of these change.
+    Kernels still have to be stitched (type-inferred against the host objects) to rebuild the
+        embedding map, but code generation and linking (most of the compile time) are skipped.
+    """
+
+    def __init__(self, ddb_filepath, directory=None):
+        """
+        Arguments:
+            ddb_filepath    (str)   : the path to the device_db file.
+            directory       (str)   : the cache directory.
+        """
+        self.directory = directory or os.environ.get('ARTIQ_KERNEL_CACHE', DEFAULT_CACHE_DIR)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # hash of the non-kernel key components
+        from artiq import __version__ as artiq_version
+        h = hashlib.sha256()
+        with open(ddb_filepath, 'rb') as f:
+            h.update(f.read())
+        h.update(artiq_version.encode())
+        # include the ARTIQ server modules, since kernels use constants and
+        # helpers imported from them (e.g. artiq_state, artiq_waveform)
+        h.update(_packageHash())
+        self._base_hash = h.digest()
+
+        # statistics
+        # note: kernels may be precompiled concurrently
+        self._stats_lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.
+
+    def key(self, function):
+        """
+        Get the cache key of a kernel.
+        Arguments:
+            function    (func)  : the kernel function.
+        Returns:
+                        (str)   : the cache key.
+        """
+        function = inspect.unwrap(getattr(function, '__func__', function))
+        h = hashlib.sha256(self._base_hash)
+        h.update(function.__qualname__.encode())
+        h.update(inspect.getsource(function).encode())
+        # include the defining module since kernels call other kernels and rpcs
+        h.update(inspect.getsource(inspect.getmodule(function)).encode())
+        return h.hexdigest()
+
+    def precompile(self, core, function):
+        """
+        Precompile a kernel, loading the compiled library from the cache if possible.
+            Drop-in replacement for core.precompile for kernels without arguments.
+            Falls back to core.precompile if the compiler internals aren't compatible.
+        Arguments:
+            core        (Core)  : the core device.
+            function    (func)  : the (bound) kernel function.
+        Returns:
+                        (func)  : the precompiled kernel.
+        """
+        name = getattr(function, '__name__', repr(function))
+        key = self.key(function)
+        library_path = os.path.join(self.directory, key + '.elf')
+        metadata_path = os.path.join(self.directory, key + '.json')
+        time_start = time()
+
+        try:
+            from artiq.compiler.module import Module
+            from artiq.compiler.embedding import Stitcher
+            from artiq.coredevice.core import _DiagnosticEngine
+
+            # stitch kernel to get the embedding map
+            # note: mirrors core.compile, but lets us skip code generation on a cache hit
+            args = (function.__self__,) if hasattr(function, '__self__') else ()
+            engine = _DiagnosticEngine(all_errors_are_fatal=True)
+            stitcher = Stitcher(engine=engine, core=core, dmgr=core.dmgr)
+            stitcher.stitch_call(inspect.unwrap(getattr(function, '__func__', function)), args, {}, None)
+            stitcher.finalize()
+            target = core.target_cls()
+
+            # load compiled library from cache
+            if os.path.exists(library_path) and os.path.exists(metadata_path):
+                with open(library_path, 'rb') as f:
+                    library = f.read()
+                with open(metadata_path, 'r') as f:
+                    metadata = json.load(f)
+                time_load = time() - time_start
+                with self._stats_lock:
+                    self.hits += 1
+                    self.time_saved += max(metadata['compile_time'] - time_load, 0.)
+                print('Kernel cache hit: {:s} loaded in {:.3f} s (compile time: {:.3f} s).'.format(
+                    name, time_load, metadata['compile_time']))
+
+            # otherwise, compile and store the library
+            else:
+                module = Module(stitcher, ref_period=core.ref_period, attribute_writeback=False)
+                library = target.compile_and_link([module])
+                time_compile = time() - time_start
+                self._write(library_path, metadata_path, library, {'name': name, 'compile_time': time_compile})
+                with self._stats_lock:
+                    self.misses += 1
+                print('Kernel cache miss: {:s} compiled in {:.3f} s.'.format(name, time_compile))
+
+        except Exception as e:
+            print('Unable to use kernel cache for {:s}, compiling normally: {}'.format(name, repr(e)))
+            return core.precompile(function)
+
+        stripped_library = target.strip(library)
+        embedding_map = stitcher.embedding_map
+        symbolizer = lambda addresses: target.symbolize(library, addresses)
+        demangler = lambda symbols: target.demangle(symbols)
+
+        @wraps(function)
+        def run_precompiled():
+            core._run_compiled(stripped_library, embedding_map, symbolizer, demangler)
+        return run_precompiled
+
+    def _write(self, library_path, metadata_path, library, metadata):
+        """
+        Atomically write a compiled library and its metadata to the cache.
+        """
+        for path, mode, data in ((library_path, 'wb', library), (metadata_path, 'w', json.dumps(metadata))):
+            tmp_path = path + '.tmp{:d}'.format(os.getpid())
+            with open(tmp_path, mode) as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+    def entries(self):
+        """
+        Returns:
+            *(str, dict): the (key, metadata) of all cached kernels.
+        """
+        entries = []
+        for filename in sorted(os.listdir(self.directory)):
+            if filename.endswith('.json'):
+                with open(os.path.join(self.directory, filename), 'r') as f:
+                    entries.append((filename[:-5], json.load(f)))
+        return entries
+
+    def clear(self):
+        """
+        Delete all cached kernels.
+        Returns:
+            (int): the number of files deleted.
+        """
+        num_deleted = 0
+        for filename in os.listdir(self.directory):
+            if filename.endswith(('.elf', '.json')) or ('.tmp' in filename):
+                os.remove(os.path.join(self.directory, filename))
+                num_deleted += 1
+        return num_deleted
+
+
+if __name__ == '__main__':
+    import sys
+    from EGGS_labrad.config import device_db as device_db_module
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    ddb_filepath = sys.argv[2] if len(sys.argv) > 2 else device_db_module.__file__
+    if command not in ('warm', 'clear', 'info'):
+        print(__doc__)
+        sys.exit(1)
+
+    cache = KernelCache(ddb_filepath)
+    if command == 'clear':
+        print('Deleted {:d} files from {:s}.'.format(cache.clear(), cache.directory))
+    elif command == 'info':
+        for key, metadata in cache.entries():
+            print('{:s}\t{:<30s}{:.3f} s'.format(key[:12], metadata['name'], metadata['compile_time']))
+    elif command == 'warm':
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from artiq_api import ARTIQ_API
+        api = ARTIQ_API(ddb_filepath)
+        # note: compile serially so the cache statistics are accurate
+        api.precompileAll(workers=1)
+        print(api.timingReport())
+        print('Cache hits: {:d}, misses: {:d}, time saved: {:.3f} s.'.format(
+            api.kernel_cache.hits, api.kernel_cache.misses, api.kernel_cache.time_saved))
@@ -0,0 +1,61 @@
+"""
+Tracks running experiments from artiq_master schedule notifications.
+"""
+
+__all__ = ["ARTIQ_ScheduleTracker"]
+
+
+class ARTIQ_ScheduleTracker(object):
+    """
+    Maintains the set of running experiment RIDs by applying each
+        schedule notification (i.e. sync_struct mod) incrementally,
+        instead of rescanning the entire schedule.
+    """
+
+    def __init__(self):
+        self.running = set()
+        # (experiment running, rid) as last reported
+        self.state = (False, -1)
+
+    def update(self, mod):
+        """
+        Apply a schedule mod.
+        Arguments:
+            mod     (dict)  : the sync_struct mod.
+        Returns:
+                    (bool, int) : the new (experiment running, rid) state if it changed, otherwise None.
+                                    The rid is the earliest running experiment (or -1 if none are running).
+        """
+        action = mod['action']
+        path = mod.get('path', [])
+
+        # whole schedule
+        if action == 'init':
+            self.running = {rid for rid, exp_params in mod['struct'].items()
+                            if exp_params['status'] == 'running'}
+
+        # experiment added or removed
+        elif not path:
+            rid = mod['key']
+            if (action == 'setitem') and (mod['value']['status'] == 'running'):
+                self.running.add(rid)
+            else:
+                self.running.discard(rid)
+
+        # experiment status changed
+        elif (len(path) == 1) and (mod.get('key') == 'status') and (action == 'setitem'):
+            rid = path[0]
+            if mod['value'] == 'running':
+                self.running.add(rid)
+            else:
+                self.running.discard(rid)
+
+        # other parameters (e.g. priority, due date) don't affect running status
+        else:
+            return None
+
+        state = (True, min(self.running)) if self.running else (False, -1)
+        if state == self.state:
+            return None
+        self.state = state
+        return state
@@ -2,7 +2,7 @@
 ### BEGIN NODE INFO
 [info]
 name = ARTIQ Server
-version = 1.1.0
+version = 1.2.0
 description = A bridge to use LabRAD for ARTIQ.
 instancename = ARTIQ Server
 
@@ -17,13 +17,21 @@ timeout = 20
 """
 import logging
 import numpy as np
+from time import time
 
 from labrad.server import LabradServer, setting, Signal
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall, deferLater
 from twisted.internet.threads import deferToThread
 from twisted.internet.defer import DeferredLock, inlineCallbacks, returnValue
 
-from artiq_api import ARTIQ_API
 from artiq_subscriber import ARTIQ_subscriber
+from artiq_schedule import ARTIQ_ScheduleTracker
+from artiq_executor import ARTIQ_Executor, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from artiq_state import ARTIQ_State, StateBatch, getDDSParam, applyStateBatch, dds_frequency_to_ftw, dds_amplitude_to_asf, dds_turns_to_pow, dds_att_to_mu
+from artiq_stream import CountStream, SamplerStream, readSamplerBlocks, COUNT_SIGNAL_TYPE, ADC_SIGNAL_TYPE, SAMPLER_MAX_BLOCK
+from artiq_waveform import validateDACWaveform
+from artiq_datasets import ARTIQ_Datasets, changedDatasets
 from EGGS_labrad.servers import ContextServer
 from EGGS_labrad.config import device_db as device_db_module
 
@@ -42,6 +50,8 @@ DACSIGNAL_ID = 828175
 ADCSIGNAL_ID = 828174
 EXPSIGNAL_ID = 828173
 DDSSIGNAL_ID = 828172
+COUNTSIGNAL_ID = 828171
+DATASETSIGNAL_ID = 828170
 # todo: move all mu stuff to api since api has better access to conversion stuff than we do and can call it in a nonkernel function
 # todo: use dds name helper to allow board number and channel number to be used for settings
 
@@ -51,17 +61,36 @@ class ARTIQ_Server(ContextServer):
     A bridge between LabRAD and ARTIQ.
     Allows us to easily incorporate ARTIQ into LabRAD for most things.
     Can run without the existence of an ARTIQ Master.
+    All core device calls are run on a single worker thread (see ARTIQ_Executor)
+        so that long kernels (e.g. counting, sampling) don't block the reactor.
     """
     name = 'ARTIQ Server'
     regKey = 'ARTIQ Server'
 
+    # interval (in seconds) to reconcile the state cache with hardware (None to disable)
+    STATE_RECONCILE_INTERVAL = None
+    # minimum interval (in seconds) between count/sampler stream signals
+    STREAM_SIGNAL_INTERVAL = 0.1
+    # time (in seconds) with no experiments running before clients are told experiments have stopped
+    EXP_IDLE_DEBOUNCE = 0.5
+
+    def __init__(self, simulate=False):
+        """
+        Arguments:
+            simulate    (bool)  : use a simulated ARTIQ_API instead of the hardware.
+        """
+        super().__init__()
+        self.simulate = simulate
+
 
     # SIGNALS
     ttlChanged = Signal(TTLSIGNAL_ID, 'signal: ttl changed', '(sb)')
     ddsChanged = Signal(DDSSIGNAL_ID, 'signal: dds changed', '(ssv)')
     dacChanged = Signal(DACSIGNAL_ID, 'signal: dac changed', '(isv)')
-    adcUpdated = Signal(ADCSIGNAL_ID, 'signal: adc updated', '(*v)')
+    adcUpdated = Signal(ADCSIGNAL_ID, 'signal: adc updated', ADC_SIGNAL_TYPE)
     expRunning = Signal(EXPSIGNAL_ID, 'signal: exp running', '(bi)')
+    countsUpdated = Signal(COUNTSIGNAL_ID, 'signal: counts updated', COUNT_SIGNAL_TYPE)
+    datasetChanged = Signal(DATASETSIGNAL_ID, 'signal: dataset changed', 's')
 
 
     # STARTUP
@@ -76,10 +105,29 @@ class ARTIQ_Server(ContextServer):
         #     print('logger_name: {}\t\tlogger_obj: {}'.format(logger_name, logger_object))
 
         # set up ARTIQ stuff
-        self.api = ARTIQ_API(device_db_module.__file__)
-        yield self._setClients()
-        yield self._setVariables()
-        yield self._setDevices()
+        # note: api is created on the executor thread since it talks to the core device
+        self.timing = dict()
+        time_start = time()
+        self.executor = ARTIQ_Executor()
+        if self.simulate:
+            from artiq_api_sim import ARTIQ_API_Sim as api_class
+        else:
+            from artiq_api import ARTIQ_API as api_class
+        self.api = yield self.executor.submit(api_class, device_db_module.__file__, priority=PRIORITY_HIGH)
+        self.timing['api'] = time() - time_start
+
+        # time each startup phase
+        for phase, func in (('clients', self._setClients), ('variables', self._setVariables),
+                            ('devices', self._setDevices), ('state', self._setState)):
+            time_start = time()
+            yield func()
+            self.timing[phase] = time() - time_start
+
+        # print startup timing report
+        print('ARTIQ Server startup times:')
+        print('\n'.join('\t{:<30s}{:.3f} s'.format(phase, duration) for phase, duration in self.timing.items()))
+        print('ARTIQ API startup times:')
+        print(self.api.timingReport())
 
     def _setClients(self):
         """
@@ -91,18 +139,27 @@ class ARTIQ_Server(ContextServer):
         try:
             self.scheduler = Client('192.168.1.48', 3251, 'schedule')
             self.datasets = Client('192.168.1.48', 3251, 'dataset_db')
+            self.dataset_mirror = ARTIQ_Datasets(self.datasets, self._datasetMirror)
         except Exception as e:
             print("Unable to connect to ARTIQ Master. Scheduler and datasets disabled.")
             print(repr(e))
 
         # connect to master notifications
+        self._exp_running = False
+        self._exp_rid = -1
+        self._exp_idle_call = None
+        self.schedule_tracker = ARTIQ_ScheduleTracker()
         try:
             # set up ARTIQ subscriber
             from asyncio import get_event_loop, set_event_loop, Event
-            self._exp_running = False
             self.subscriber_exp = ARTIQ_subscriber('schedule', self._process_subscriber_update, self)
             self.subscriber_exp.connect('::1', 3250)
 
+            # mirror datasets locally so reads don't need an rpc
+            # note: mirror is stored as self.struct_holder_datasets once the subscriber is initialized
+            self.subscriber_datasets = ARTIQ_subscriber('datasets', self._process_dataset_update, self)
+            self.subscriber_datasets.connect('::1', 3250)
+
             # set up event loop for ARTIQ_subscriber
             loop = get_event_loop()
             stop_event = Event()
@@ -125,21 +182,54 @@ class ARTIQ_Server(ContextServer):
 
     def _process_subscriber_update(self, mod):
         """
-        Checks if any experiments are running and sends a Signal
-        to clients accordingly.
-        """
-        # check if any experiments are running
-        for rid, exp_params in self.struct_holder_schedule.backing_store.items():
-            run_status = exp_params['status']
-
-            # send experiment details to clients if experiment is running
-            if run_status == 'running':
+        Tracks running experiments and informs clients
+        when an experiment starts or stops running.
+        """
+        # note: subscriber runs in its own thread, so schedule on the reactor
+        transition = self.schedule_tracker.update(mod)
+        if transition is not None:
+            reactor.callFromThread(self._expRunningChanged, *transition)
+
+    def _expRunningChanged(self, exp_running, rid):
+        """
+        Handle a change in running experiments.
+            Stopping is debounced by EXP_IDLE_DEBOUNCE so that experiments
+            run back-to-back don't cause the core connection to be reopened in between.
+        """
+        # cancel pending idle transition
+        if (self._exp_idle_call is not None) and self._exp_idle_call.active():
+            self._exp_idle_call.cancel()
+        self._exp_idle_call = None
+
+        if exp_running:
+            # release the core device for the experiment
+            if not self._exp_running:
+                self._exp_running = True
+                self.executor.submit(self.api.close_connection, priority=PRIORITY_HIGH)
+            # send experiment details to clients
+            if rid != self._exp_rid:
+                self._exp_rid = rid
                 self.expRunning((True, rid))
-                self.api.close_connection()
-                return
+        elif self._exp_running:
+            self._exp_idle_call = reactor.callLater(self.EXP_IDLE_DEBOUNCE, self._expIdle)
 
-        # otherwise, no experiment running, so inform clients
+    def _expIdle(self):
+        """
+        Called once no experiments have been running for EXP_IDLE_DEBOUNCE.
+        """
+        self._exp_idle_call = None
+        self._exp_running = False
+        self._exp_rid = -1
         self.expRunning((False, -1))
+        # experiments may have changed device state, so update the state cache
+        self._reconcileState()
+
+    def _process_dataset_update(self, mod):
+        """
+        Notifies clients watching any datasets which changed.
+        """
+        # note: subscriber runs in its own thread, so schedule on the reactor
+        reactor.callFromThread(self._notifyDatasetWatchers, changedDatasets(mod))
 
     def _setVariables(self):
         """
@@ -148,12 +238,23 @@ class ARTIQ_Server(ContextServer):
         # used to ensure atomicity
         self.inCommunication = DeferredLock()
 
+        # contexts watching datasets
+        self.dataset_watchers = dict()
+
+        # recorded DAC waveforms
+        self.dac_waveforms = dict()
+
+        # count/sampler streams
+        self.count_streams = dict()
+        self.sampler_stream = None
+        self.stream_signaller = LoopingCall(self._sendStreamSignals)
+
         # conversions
         # DDS - val to mu
-        self.dds_frequency_to_ftw = lambda freq: np.int32(freq * 4.294967295) # 0xFFFFFFFF / 1GHz
-        self.dds_amplitude_to_asf = lambda ampl: np.int32(ampl * 0x3FFF)
-        self.dds_turns_to_pow =     lambda phase: np.int32(phase * 0xFFFF)
-        self.dds_att_to_mu =        lambda dbm: np.int32(0xFF) - np.int32(round(dbm * 8))
+        self.dds_frequency_to_ftw = dds_frequency_to_ftw
+        self.dds_amplitude_to_asf = dds_amplitude_to_asf
+        self.dds_turns_to_pow =     dds_turns_to_pow
+        self.dds_att_to_mu =        dds_att_to_mu
 
         # DDS - mu to val
         self.dds_ftw_to_frequency = lambda freq: freq / 4.2949673
@@ -175,6 +276,137 @@ class ARTIQ_Server(ContextServer):
         """
         self.dacType = self.api.dacType
 
+    @inlineCallbacks
+    def _setState(self):
+        """
+        Create the state cache and seed it from hardware.
+        """
+        self.state = ARTIQ_State(list(self.api.dds_dict.keys()), list(self.api.ttlout_dict.keys()))
+        self.state_reconciler = LoopingCall(self._reconcileState)
+        yield self._reconcileState(notify=False)
+        if self.STATE_RECONCILE_INTERVAL:
+            self.state_reconciler.start(self.STATE_RECONCILE_INTERVAL, now=False)
+
+    def stopServer(self):
+        # cancel pending experiment idle transition
+        if getattr(self, '_exp_idle_call', None) is not None and self._exp_idle_call.active():
+            self._exp_idle_call.cancel()
+        # stop reconciling state
+        if hasattr(self, 'state_reconciler') and self.state_reconciler.running:
+            self.state_reconciler.stop()
+        # stop streaming counts and samples
+        if hasattr(self, 'count_streams'):
+            for stream in self.count_streams.values():
+                stream.running = False
+            if self.sampler_stream is not None:
+                self.sampler_stream.running = False
+            self._updateStreamSignaller()
+        # cancel queued calls and stop the worker thread
+        if hasattr(self, 'executor'):
+            self.executor.stop()
+        super().stopServer()
+
+
+    # CONTEXT
+    def expireContext(self, c):
+        """
+        Cancel any calls from the context that haven't started yet.
+        """
+        super().expireContext(c)
+        if hasattr(self, 'executor'):
+            self.executor.cancel(c.ID)
+        if hasattr(self, 'dataset_watchers'):
+            self.dataset_watchers.pop(c.ID, None)
+
+
+    # EXECUTOR
+    def _run(self, c, func, *args, priority=PRIORITY_NORMAL, **kwargs):
+        """
+        Queue a core device call on the executor thread.
+        Arguments:
+            c           (context)   : the context of the caller. Queued calls are
+                                        cancelled if the context expires.
+            func        (callable)  : the ARTIQ_API function to call.
+            priority    (int)       : the call priority. Lower values are run first.
+        Returns:
+                        (Deferred)  : fires with the return value of func.
+        """
+        context = c.ID if c is not None else None
+        return self.executor.submit(func, *args, priority=priority, context=context, **kwargs)
+
+    @setting(41, "Executor Status", reset='b', returns='*(sv)')
+    def executorStatus(self, c, reset=False):
+        """
+        Get the core device call queue metrics.
+        Arguments:
+            reset   (bool)  : reset the metrics after reading them.
+        Returns:
+                    *(str, float)   : (metric name, value) pairs. Latencies are in seconds.
+        """
+        metrics = list(self.executor.metrics().items())
+        if reset:
+            self.executor.resetMetrics()
+        return [(name, float(value)) for name, value in metrics]
+
+
+    # STATE
+    @inlineCallbacks
+    def _reconcileState(self, notify=True):
+        """
+        Update the state cache with the current hardware DDS values.
+        Clients are notified of any values which changed.
+        Arguments:
+            notify  (bool)  : whether to send signals for changed values.
+        """
+        try:
+            dds_all = yield self.executor.submit(self.api.getDDSAll, priority=PRIORITY_LOW)
+        except Exception as e:
+            print('Unable to read DDS state: {}'.format(repr(e)))
+            return
+        # note: ARTIQ_API returns None if the read failed
+        if dds_all is None:
+            return
+        changes = self.state.updateDDSAll(dds_all)
+        if notify:
+            for change in changes:
+                self.notifyOtherListeners(None, change, self.ddsChanged)
+
+    @setting(51, "State Reconcile", interval='v', returns='')
+    def stateReconcile(self, c, interval=None):
+        """
+        Update the state cache from hardware.
+        Arguments:
+            interval    (float) : if specified, reconcile periodically at this
+                                    interval (in seconds) instead. Set to 0 to stop.
+        """
+        if interval is None:
+            yield self._reconcileState()
+            return
+        if self.state_reconciler.running:
+            self.state_reconciler.stop()
+        if interval > 0:
+            self.state_reconciler.start(interval, now=True)
+
+    def _getDDSParam(self, c, dds_name, param, force=False):
+        """
+        Get a DDS parameter from the state cache, reading it from
+            hardware only if it is unknown or force is set.
+        Arguments:
+            dds_name    (str)   : the name of the DDS.
+            param       (str)   : one of ('ftw', 'asf', 'pow', 'att', 'onoff').
+            force       (bool)  : read the value from hardware.
+        Returns:
+                        (Deferred): fires with the parameter value (in machine units).
+        """
+        return getDDSParam(self.api, self.state, dds_name, param, force=force, run=self._runner(c))
+
+    def _runner(self, c):
+        """
+        Returns:
+            (callable): queues core device calls for the given context (see _run).
+        """
+        return lambda func, *args: self._run(c, func, *args)
+
 
     # CORE
     @setting(11, "Close Core", returns='')
@@ -182,7 +414,27 @@ class ARTIQ_Server(ContextServer):
         """
         Closes the API connection to the hardware.
         """
-        self.api.close_connection()
+        yield self._run(c, self.api.close_connection, priority=PRIORITY_HIGH)
+
+    @setting(12, "Precompile", returns='')
+    def precompile(self, c):
+        """
+        Precompile all kernels which haven't been compiled yet.
+            Kernels are otherwise compiled the first time they are used.
+        """
+        yield self._run(c, self.api.precompileAll, priority=PRIORITY_LOW)
+
+    @setting(13, "Startup Timing", returns='*(sv)')
+    def startupTiming(self, c):
+        """
+        Get the time taken by each startup phase of the server and API,
+            as well as the compile time of each precompiled kernel.
+        Returns:
+            *(str, float): (phase, duration) pairs. Durations are in seconds.
+        """
+        server_timing = [('server: ' + phase, duration) for phase, duration in self.timing.items()]
+        api_timing = [('api: ' + phase, duration) for phase, duration in self.api.timing.items()]
+        return server_timing + api_timing
 
     @setting(21, "Get Devices", returns='*s')
     def getDevices(self, c):
@@ -195,12 +447,13 @@ class ARTIQ_Server(ContextServer):
     def datasetGet(self, c, dataset_key):
         """
         Returns a dataset.
+            Datasets are read from the local mirror if possible.
         Arguments:
             dataset_key (str)   : the name of the dataset.
         Returns:
             the dataset values
         """
-        return self.datasets.get(dataset_key)
+        return self.dataset_mirror.get(dataset_key)
 
     @setting(32, 'Dataset Set', dataset_key='s', dataset_value='?', persist='b', returns='')
     def datasetSet(self, c, dataset_key, dataset_value, persist=True):
@@ -208,13 +461,13 @@ class ARTIQ_Server(ContextServer):
         Sets the values of a dataset.
             If the dataset does not exist, a new one will be created.
             If the dataset already exists, the old value will completely overwritten.
+            The local mirror is updated once the master notifies the server of the change.
         Arguments:
             dataset_key (str)   : the name of the dataset.
             dataset_value       : the values for the dataset.
             persist     (bool)  : whether the data should persist between master reboots.
         """
-        print('\tds set: {}\n'.format(dataset_value))
-        self.datasets.set(dataset_key, dataset_value, persist)
+        self.dataset_mirror.set(dataset_key, dataset_value, persist)
 
     @setting(33, 'Dataset Delete', dataset_key='s', returns='')
     def datasetDelete(self, c, dataset_key):
@@ -223,7 +476,125 @@ class ARTIQ_Server(ContextServer):
         Arguments:
             dataset_key (str)   : the name of the dataset.
         """
-        self.datasets.delete(dataset_key)
+        self.dataset_mirror.delete(dataset_key)
+
+    @setting(34, 'Dataset Get Multiple', dataset_keys='*s', returns='?')
+    def datasetGetMultiple(self, c, dataset_keys):
+        """
+        Returns multiple datasets at once.
+        Arguments:
+            dataset_keys    (*str)  : the names of the datasets.
+        Returns:
+            a cluster of the dataset values, in the same order as dataset_keys.
+        """
+        return tuple(self.dataset_mirror.get(dataset_key) for dataset_key in dataset_keys)
+
+    @setting(35, 'Dataset Set Multiple', dataset_keys='*s', dataset_values='?', persist='b', returns='')
+    def datasetSetMultiple(self, c, dataset_keys, dataset_values, persist=True):
+        """
+        Sets the values of multiple datasets at once.
+        Arguments:
+            dataset_keys    (*str)  : the names of the datasets.
+            dataset_values          : a cluster (or list) of values for each dataset.
+            persist         (bool)  : whether the data should persist between master reboots.
+        """
+        if len(dataset_keys) != len(dataset_values):
+            raise Exception('Error: number of dataset keys and values must be the same.')
+        for dataset_key, dataset_value in zip(dataset_keys, dataset_values):
+            self.dataset_mirror.set(dataset_key, dataset_value, persist)
+
+    @setting(36, 'Dataset Watch', dataset_keys='*s', returns='*s')
+    def datasetWatch(self, c, dataset_keys=None):
+        """
+        Set the datasets to be notified about.
+            Clients listening to the datasetChanged signal will receive
+            the name of any watched dataset when it changes.
+        Arguments:
+            dataset_keys    (*str)  : the names of the datasets to watch. Replaces
+                                        any previously watched datasets.
+        Returns:
+                            (*str)  : the names of the watched datasets.
+        """
+        if dataset_keys is not None:
+            if len(dataset_keys):
+                self.dataset_watchers[c.ID] = set(dataset_keys)
+            else:
+                self.dataset_watchers.pop(c.ID, None)
+        return sorted(self.dataset_watchers.get(c.ID, set()))
+
+    @setting(37, 'Schedule', returns='*(isssi)')
+    def schedule(self, c):
+        """
+        Get the current artiq_master schedule from the local mirror.
+        Returns:
+            *(int, str, str, str, int): (rid, pipeline, status, experiment, priority) of each scheduled experiment.
+        """
+        holder = getattr(self, 'struct_holder_schedule', None)
+        if holder is None:
+            raise Exception('Error: schedule not available.')
+        schedule = []
+        for rid, exp_params in sorted(holder.backing_store.items()):
+            expid = exp_params['expid']
+            experiment = expid.get('class_name') or expid.get('file', '')
+            schedule.append((rid, exp_params['pipeline'], exp_params['status'], experiment, exp_params['priority']))
+        return schedule
+
+    @setting(38, 'Experiment Running', returns='(bi)')
+    def experimentRunning(self, c):
+        """
+        Check whether an experiment is running.
+        Returns:
+            (bool, int): whether an experiment is running, and its rid (-1 if none).
+        """
+        return (self._exp_running, self._exp_rid)
+
+    def _datasetMirror(self):
+        """
+        Returns:
+            (dict): the local mirror of the master's datasets, or None if not available.
+        """
+        holder = getattr(self, 'struct_holder_datasets', None)
+        return holder.backing_store if holder is not None else None
+
+    def _notifyDatasetWatchers(self, dataset_keys):
+        """
+        Send a datasetChanged signal to the contexts watching each dataset.
+        """
+        for dataset_key in dataset_keys:
+            watchers = [context for context, watched in self.dataset_watchers.items() if dataset_key in watched]
+            if watchers:
+                self.datasetChanged(dataset_key, watchers)
+
+    # BATCH
+    @setting(61, "Apply State", updates='*(ssv)', returns='*b')
+    def applyState(self, c, updates):
+        """
+        Apply many device updates at once.
+            All TTL and DDS updates are applied in a single kernel.
+            Updates to the same DDS channel are merged, with later updates taking precedence.
+        Arguments:
+            updates *(str, str, float): a list of (device, parameter, value) updates. Valid parameters are:
+                TTL outputs:    'state' (0 or 1).
+                DDS channels:   'freq' (Hz), 'ampl' (fractional), 'phase' (turns), 'att' (dB), 'onoff' (0 or 1).
+                DAC channels:   'v' (volts) or 'mu'. The device name is the channel number
+                                    prefixed by 'dac' (e.g. 'dac3').
+        Returns:
+                    *bool: whether each update was valid and applied.
+        """
+        if len(updates) == 0:
+            returnValue([])
+        batch = StateBatch(updates, self.api.ttlout_dict_search_num, self.api.dds_dict_search_num, self.dacType)
+        ttl_updates, dds_updates, dac_updates = yield applyStateBatch(self.api, self.state, batch, run=self._runner(c))
+
+        # notify other listeners
+        for ttl_name, state in ttl_updates:
+            self.notifyOtherListeners(c, (ttl_name, state), self.ttlChanged)
+        for dds_name, param, value_mu in dds_updates:
+            self.notifyOtherListeners(c, (dds_name, param, value_mu), self.ddsChanged)
+        for dac_num, value_mu in dac_updates:
+            self.notifyOtherListeners(c, (dac_num, 'dac', value_mu), self.dacChanged)
+
+        returnValue(batch.status().tolist())
 
 
     # TTL
@@ -250,7 +621,8 @@ class ARTIQ_Server(ContextServer):
             raise Exception('Error: device does not exist.')
         if (type(state) == int) and (state not in (0, 1)):
             raise Exception('Error: invalid state.')
-        yield self.api.setTTL(ttl_name, state)
+        yield self._run(c, self.api.setTTL, ttl_name, state)
+        self.state.setTTL(ttl_name, state)
         self.notifyOtherListeners(c, (ttl_name, state), self.ttlChanged)
 
     @setting(222, "TTL Get", ttl_name='s', returns='b')
@@ -264,9 +636,26 @@ class ARTIQ_Server(ContextServer):
         """
         if ttl_name not in self.api.ttlin_dict:
             raise Exception('Error: device does not exist.')
-        state = yield self.api.getTTL(ttl_name)
+        state = yield self._run(c, self.api.getTTL, ttl_name)
         returnValue(bool(state))
 
+    @setting(223, "TTL State", ttl_name='s', returns='b')
+    def ttlState(self, c, ttl_name):
+        """
+        Get the last set state of a TTL output from the state cache.
+            Does not access hardware.
+        Arguments:
+            ttl_name    (str)   : name of the ttl
+        Returns:
+                        (bool)  : ttl power state
+        """
+        if ttl_name not in self.api.ttlout_dict:
+            raise Exception('Error: device does not exist.')
+        state = self.state.getTTL(ttl_name)
+        if state is None:
+            raise Exception('Error: TTL state unknown. TTL has not been set.')
+        return state
+
     @setting(231, "TTL Counts", ttl_name='s', time_us='i', trials='i', returns='(vv)')
     def ttlCounts(self, c, ttl_name, time_us=3000, trials=10):
         """
@@ -288,8 +677,8 @@ class ARTIQ_Server(ContextServer):
         if (time_us * 1e-6 * trials > 20) or (time_us < 10):
             raise Exception('Error: invalid total counting time.')
 
-        counts_list = self.api.getTTLCountFastCounts(ttl_name, time_us, trials)
-        return (np.mean(counts_list), np.std(counts_list))
+        counts_list = yield self._run(c, self.api.getTTLCountFastCounts, ttl_name, time_us, trials, priority=PRIORITY_LOW)
+        returnValue((np.mean(counts_list), np.std(counts_list)))
 
     @setting(232, "TTL Count List", ttl_name='s', time_us='i', trials='i', returns='*v')
     def ttlCountList(self, c, ttl_name, time_us=3000, trials=10):
@@ -312,8 +701,139 @@ class ARTIQ_Server(ContextServer):
         if (time_us * 1e-6 * trials > 20) or (time_us < 10):
             raise Exception('Error: invalid total counting time.')
 
-        counts_list = self.api.getTTLCountFastCounts(ttl_name, time_us, trials)
-        return counts_list
+        counts_list = yield self._run(c, self.api.getTTLCountFastCounts, ttl_name, time_us, trials, priority=PRIORITY_LOW)
+        returnValue(counts_list)
+
+    @setting(233, "Count Stream Start", ttl_name='s', gate_us='v', block_size='i', buffer_size='i', returns='')
+    def countStreamStart(self, c, ttl_name, gate_us=3000, block_size=10, buffer_size=10000):
+        """
+        Continuously count on a TTL in the background.
+            Counts are taken in blocks of back-to-back gates and stored in a ring buffer.
+            Clients are sent a countsUpdated signal at most every STREAM_SIGNAL_INTERVAL seconds.
+            Restarts the stream if the TTL is already streaming.
+            TTL must be of class EdgeCounter.
+        Arguments:
+            ttl_name    (str)   : name of the ttl.
+            gate_us     (float) : the gate time of each bin (in us).
+            block_size  (int)   : the number of bins to count per kernel call.
+            buffer_size (int)   : the number of bins to store.
+        """
+        # check device is valid
+        if ttl_name not in self.api.ttlcounter_dict:
+            raise Exception('Error: device does not exist.')
+
+        # ensure blocks aren't too long so we don't hog the core device
+        if (gate_us < 10) or (block_size < 1) or (gate_us * 1e-6 * block_size > 1):
+            raise Exception('Error: invalid counting time.')
+
+        # stop existing stream
+        if ttl_name in self.count_streams:
+            self.count_streams[ttl_name].running = False
+
+        # start streaming
+        stream = CountStream(ttl_name, gate_us, block_size, buffer_size)
+        stream.running = True
+        self.count_streams[ttl_name] = stream
+        self._runStream(stream, self.api.getTTLCountFastCounts, ttl_name, gate_us, block_size)
+        self._updateStreamSignaller()
+
+    @setting(234, "Count Stream Stop", ttl_name='s', returns='')
+    def countStreamStop(self, c, ttl_name):
+        """
+        Stop continuously counting on a TTL.
+            Stored counts are kept until the stream is restarted.
+        Arguments:
+            ttl_name    (str)   : name of the ttl.
+        """
+        self._getCountStream(ttl_name).running = False
+        self._updateStreamSignaller()
+
+    @setting(235, "Count Stream Latest", ttl_name='s', num='i', returns='*2v')
+    def countStreamLatest(self, c, ttl_name, num=None):
+        """
+        Get the most recent count bins of a stream.
+        Arguments:
+            ttl_name    (str)   : name of the ttl.
+            num         (int)   : the number of bins to get. Defaults to all stored bins.
+        Returns:
+                        (*2v)   : (timestamp, counts) for each bin, oldest first.
+        """
+        timestamps, counts = self._getCountStream(ttl_name).latest(num)
+        return np.column_stack((timestamps, counts))
+
+    @setting(236, "Count Stream Stats", ttl_name='s', num='i', returns='(vv)')
+    def countStreamStats(self, c, ttl_name, num=None):
+        """
+        Get the rolling mean and standard deviation of a stream.
+        Arguments:
+            ttl_name    (str)   : name of the ttl.
+            num         (int)   : the number of bins to use. Defaults to all stored bins.
+        Returns:
+                        (float, float)  : the mean and stdev of the TTL counts.
+        """
+        return self._getCountStream(ttl_name).stats(num)
+
+    def _getCountStream(self, ttl_name):
+        try:
+            return self.count_streams[ttl_name]
+        except KeyError:
+            raise Exception('Error: TTL is not streaming.')
+
+
+    # STREAMS
+    def _updateStreamSignaller(self):
+        """
+        Only send stream signals while a stream is running.
+        """
+        streams = list(self.count_streams.values()) + [self.sampler_stream]
+        running = any(stream.running for stream in streams if stream is not None)
+        if running and (not self.stream_signaller.running):
+            self.stream_signaller.start(self.STREAM_SIGNAL_INTERVAL, now=False)
+        elif (not running) and self.stream_signaller.running:
+            self.stream_signaller.stop()
+
+    @inlineCallbacks
+    def _runStream(self, stream, func, *args):
+        """
+        Repeatedly acquire blocks on the executor until the stream is stopped.
+            Blocks run at low priority, so other calls are run between blocks.
+        Arguments:
+            stream      : the CountStream/SamplerStream to add blocks to.
+            func        : the ARTIQ_API function which acquires a block.
+            args        : arguments to func.
+        """
+        while stream.running:
+            # don't reopen the core connection while an experiment is running
+            if self._exp_running:
+                yield deferLater(reactor, 0.5, lambda: None)
+                continue
+
+            try:
+                block = yield self.executor.submit(func, *args, priority=PRIORITY_LOW)
+            except Exception as e:
+                print('Error while streaming: {}'.format(repr(e)))
+                stream.running = False
+                self._updateStreamSignaller()
+                return
+
+            # note: ARTIQ_API returns None if the kernel failed, so wait before retrying
+            if block is None:
+                yield deferLater(reactor, 0.5, lambda: None)
+            elif stream.running:
+                stream.add(block)
+
+    def _sendStreamSignals(self):
+        """
+        Send a single signal per stream summarizing the data received since the last signal.
+        """
+        for stream in self.count_streams.values():
+            summary = stream.popSignal()
+            if summary is not None:
+                self.notifyOtherListeners(None, summary, self.countsUpdated)
+        if self.sampler_stream is not None:
+            summary = self.sampler_stream.popSignal()
+            if summary is not None:
+                self.notifyOtherListeners(None, summary, self.adcUpdated)
 
 
     # DDS
@@ -335,15 +855,17 @@ class ARTIQ_Server(ContextServer):
         """
         if dds_name not in self.api.dds_dict:
             raise Exception('Error: device does not exist.')
-        yield self.api.initializeDDS(dds_name)
+        yield self._run(c, self.api.initializeDDS, dds_name)
+        self.state.invalidateDDS(dds_name)
 
-    @setting(322, "DDS Toggle", dds_name='s', state=['b', 'i'], returns='b')
-    def DDStoggle(self, c, dds_name, state=None):
+    @setting(322, "DDS Toggle", dds_name='s', state=['b', 'i'], force='b', returns='b')
+    def DDStoggle(self, c, dds_name, state=None, force=False):
         """
         Manually toggle a DDS via the RF switch.
         Arguments:
             dds_name    (str)           : the name of the DDS.
             state       [bool, int]     : the DDS rf switch state.
+            force       (bool)          : read the state from hardware instead of the state cache.
         Returns:
                         (bool)          :
         """
@@ -354,10 +876,11 @@ class ARTIQ_Server(ContextServer):
         if state is not None:
             if (type(state) == int) and (state not in (0, 1)):
                 raise Exception('Error: invalid input. Value must be a boolean, 0, or 1.')
-            yield self.api.setDDSFastSW(dds_name, state)
+            yield self._run(c, self.api.setDDSFastSW, dds_name, state)
+            self.state.setDDS(dds_name, 'onoff', state)
 
         # getter
-        state = yield self.api.getDDSFastSW(dds_name)
+        state = yield self._getDDSParam(c, dds_name, 'onoff', force)
         self.notifyOtherListeners(c, (dds_name, 'onoff', state), self.ddsChanged)
         returnValue(bool(state))
 
@@ -365,13 +888,14 @@ class ARTIQ_Server(ContextServer):
     PRECOMPILE TESTING
     '''
     # @setting(88888, "DDS Frequency Fast", dds_name='s', freq='v', returns='i')
-    @setting(323, "DDS Frequency", dds_name='s', freq='v', returns='i')
-    def DDSfrequency(self, c, dds_name, freq=None):
+    @setting(323, "DDS Frequency", dds_name='s', freq='v', force='b', returns='i')
+    def DDSfrequency(self, c, dds_name, freq=None, force=False):
         """
         Manually set the frequency of a DDS.
         Arguments:
             dds_name    (str)   : the name of the DDS.
             freq        (float) : the frequency (in Hz).
+            force       (bool)  : read the value from hardware instead of the state cache.
         Returns:
                         (int)   : the 32-bit frequency tuning word.
         """
@@ -384,21 +908,23 @@ class ARTIQ_Server(ContextServer):
             if (freq > 4e8) or (freq < 0):
                 raise Exception('Error: frequency must be within [0 Hz, 400 MHz].')
             ftw = self.dds_frequency_to_ftw(freq)
-            self.api.setDDSFastFTW(dds_name, ftw)
+            yield self._run(c, self.api.setDDSFastFTW, dds_name, ftw)
+            self.state.setDDS(dds_name, 'ftw', ftw)
 
         # getter
-        ftw, asf = self.api.getDDSFastWave(dds_name)
+        ftw = yield self._getDDSParam(c, dds_name, 'ftw', force)
         self.notifyOtherListeners(c, (dds_name, 'ftw', ftw), self.ddsChanged)
-        return np.int32(ftw)
+        returnValue(np.int32(ftw))
 
     # @setting(88889, "DDS Amplitude Fast", dds_name='s', ampl='v', returns='i')
-    @setting(324, "DDS Amplitude", dds_name='s', ampl='v', returns='i')
-    def DDSamplitude(self, c, dds_name, ampl=None):
+    @setting(324, "DDS Amplitude", dds_name='s', ampl='v', force='b', returns='i')
+    def DDSamplitude(self, c, dds_name, ampl=None, force=False):
         """
         Manually set the amplitude of a DDS.
         Arguments:
             dds_name    (str)   : the name of the DDS.
             ampl        (float) : the fractional amplitude.
+            force       (bool)  : read the value from hardware instead of the state cache.
         Returns:
                         (int)   : the 14-bit amplitude scaling factor.
         """
@@ -411,23 +937,25 @@ class ARTIQ_Server(ContextServer):
             if (ampl > 1.) or (ampl < 0.):
                 raise Exception('Error: amplitude must be within [0, 1].')
             asf = self.dds_amplitude_to_asf(ampl)
-            self.api.setDDSFastASF(dds_name, asf)
+            yield self._run(c, self.api.setDDSFastASF, dds_name, asf)
+            self.state.setDDS(dds_name, 'asf', asf)
 
         # getter
-        ftw, asf = self.api.getDDSFastWave(dds_name)
+        asf = yield self._getDDSParam(c, dds_name, 'asf', force)
         self.notifyOtherListeners(c, (dds_name, 'asf', asf), self.ddsChanged)
-        return np.int32(asf)
+        returnValue(np.int32(asf))
     '''
     PRECOMPILE TESTING
     '''
 
-    @setting(325, "DDS Phase", dds_name='s', phase='v', returns='i')
-    def DDSphase(self, c, dds_name, phase=None):
+    @setting(325, "DDS Phase", dds_name='s', phase='v', force='b', returns='i')
+    def DDSphase(self, c, dds_name, phase=None, force=False):
         """
         Manually set the phase of a DDS.
         Arguments:
             dds_name    (str)   : the name of the dds
             phase       (float) : the phase in rotations (1 is a full rotation, value must be between [0, 1)).
+            force       (bool)  : read the value from hardware instead of the state cache.
         Returns:
                         (int)   : the 16-bit phase offset word.
         """
@@ -437,19 +965,21 @@ class ARTIQ_Server(ContextServer):
             if (phase >= 1) or (phase < 0):
                 raise Exception('Error: phase must be within [0, 1).')
             pow = self.dds_turns_to_pow(phase)
-            yield self.api.setDDS(dds_name, 'pow', pow)
+            yield self._run(c, self.api.setDDS, dds_name, 'pow', pow)
+            self.state.setDDS(dds_name, 'pow', pow)
         # getter
-        _, _, pow = yield self.api.getDDS(dds_name)
+        pow = yield self._getDDSParam(c, dds_name, 'pow', force)
         self.notifyOtherListeners(c, (dds_name, 'pow', pow), self.ddsChanged)
         returnValue(np.int32(pow))
 
-    @setting(326, "DDS Attenuation", dds_name='s', att='v', returns='i')
-    def DDSatt(self, c, dds_name, att=None):
+    @setting(326, "DDS Attenuation", dds_name='s', att='v', force='b', returns='i')
+    def DDSatt(self, c, dds_name, att=None, force=False):
         """
         Manually set a DDS to the given parameters.
         Arguments:
             dds_name    (str)   : the name of the DDS.
             att         (float) : the channel attenuation (in dBm).
+            force       (bool)  : read the value from hardware instead of the state cache.
         Returns:
                         (int)   : the channel attenuation (in machine units).
         """
@@ -461,14 +991,14 @@ class ARTIQ_Server(ContextServer):
             if (att < 0) or (att > 31.5):
                 raise Exception('Error: attenuation must be within [0, 31.5].')
             att_mu = self.dds_att_to_mu(att)
-            self.api.setDDSFastATT(dds_name, int(att_mu))
+            yield self._run(c, self.api.setDDSFastATT, dds_name, int(att_mu))
             # self.api.setDDSatt(dds_name, int(att_mu))
+            self.state.setDDS(dds_name, 'att', att_mu)
 
         # getter
-        att_mu = self.api.getDDSFastATT(dds_name)
-        # att_mu = self.api.getDDSatt(dds_name)
+        att_mu = yield self._getDDSParam(c, dds_name, 'att', force)
         self.notifyOtherListeners(c, (dds_name, 'att', att_mu), self.ddsChanged)
-        return att_mu
+        returnValue(att_mu)
 
     @setting(331, "DDS Read", dds_name='s', addr='i', length='i', returns=['i', '(ii)'])
     def DDSread(self, c, dds_name, addr, length):
@@ -485,7 +1015,7 @@ class ARTIQ_Server(ContextServer):
             raise Exception('Error: device does not exist.')
         elif length not in (16, 32, 64):
             raise Exception('Error: invalid read length. Must be one of (16, 32, 64).')
-        reg_val = yield self.api.readDDS(dds_name, addr, length)
+        reg_val = yield self._run(c, self.api.readDDS, dds_name, addr, length)
         if length != 64:
             returnValue(reg_val)
         else:
@@ -496,17 +1026,23 @@ class ARTIQ_Server(ContextServer):
             resp = (reg_val1, reg_val2)
             returnValue(resp)
 
-    @setting(332, "DDS Get All", returns='*2i')
-    def DDSGetAll(self, c):
+    @setting(332, "DDS Get All", force='b', returns='*2i')
+    def DDSGetAll(self, c, force=False):
         """
         Quickly get frequency, amplitude, attenuation, and switch values
             (in SI units) for all DDS channels.
             Doesn't return pow (phase offset word).
             Should only be used by DDS Client.
+        Arguments:
+            force   (bool)  : read the values from hardware instead of the state cache.
         Returns:
             list(tuple(int, int, int, bool)) : a list of dds parameters for all DDSs in the format (asf, ftw, att, sw)
         """
-        dds_data = yield self.api.getDDSAll()
+        dds_data = self.state.getDDSAll()
+        if force or (dds_data is None):
+            dds_data = yield self._run(c, self.api.getDDSAll)
+            if dds_data is not None:
+                self.state.updateDDSAll(dds_data)
         returnValue(dds_data)
 
     def _ddsNameHelper(self, dds_name):
@@ -542,7 +1078,8 @@ class ARTIQ_Server(ContextServer):
         """
         if urukul_name not in self.api.urukul_list:
             raise Exception('Error: device does not exist.')
-        yield self.api.initializeUrukul(urukul_name)
+        yield self._run(c, self.api.initializeUrukul, urukul_name)
+        self.state.invalidateDDS()
 
 
     # DAC
@@ -551,7 +1088,8 @@ class ARTIQ_Server(ContextServer):
         """
         Manually initialize the DAC.
         """
-        yield self.api.initializeDAC()
+        yield self._run(c, self.api.initializeDAC)
+        self.state.invalidateDAC()
 
     @setting(421, "DAC Set", dac_num='i', value='v', units='s', returns='')
     def DACset(self, c, dac_num, value, units='mu'):
@@ -577,9 +1115,10 @@ class ARTIQ_Server(ContextServer):
             raise Exception('Error: invalid units.')
         # send to correct device
         if self.dacType == 'Zotino':
-            yield self.api.setZotino(dac_num, voltage_mu)
+            yield self._run(c, self.api.setZotino, dac_num, voltage_mu)
         elif self.dacType == 'Fastino':
-            yield self.api.setFastino(dac_num, voltage_mu)
+            yield self._run(c, self.api.setFastino, dac_num, voltage_mu)
+        self.state.setDAC(dac_num, 'dac', voltage_mu)
         self.notifyOtherListeners(c, (dac_num, 'dac', voltage_mu), self.dacChanged)
 
     @setting(422, "DAC Gain", dac_num='i', gain='v', units='s', returns='')
@@ -606,7 +1145,8 @@ class ARTIQ_Server(ContextServer):
         # check that gain is valid
         if (gain < 0) or (gain > 0xffff):
             raise Exception('Error: gain outside bounds of [0,1]')
-        yield self.api.setZotinoGain(dac_num, gain_mu)
+        yield self._run(c, self.api.setZotinoGain, dac_num, gain_mu)
+        self.state.setDAC(dac_num, 'gain', gain_mu)
         self.notifyOtherListeners(c, (dac_num, 'gain', gain_mu), self.dacChanged)
 
     @setting(423, "DAC Offset", dac_num='i', value='v', units='s', returns='')
@@ -632,7 +1172,8 @@ class ARTIQ_Server(ContextServer):
             voltage_mu = int(value)
         else:
             raise Exception('Error: invalid units.')
-        yield self.api.setZotinoOffset(dac_num, voltage_mu)
+        yield self._run(c, self.api.setZotinoOffset, dac_num, voltage_mu)
+        self.state.setDAC(dac_num, 'off', voltage_mu)
         self.notifyOtherListeners(c, (dac_num, 'off', voltage_mu), self.dacChanged)
 
     @setting(424, "DAC OFS", value='v', units='s', returns='')
@@ -655,9 +1196,30 @@ class ARTIQ_Server(ContextServer):
             voltage_mu = int(value)
         else:
             raise Exception('Error: invalid units.')
-        yield self.api.setZotinoGlobal(voltage_mu)
+        yield self._run(c, self.api.setZotinoGlobal, voltage_mu)
+        self.state.setDAC(-1, 'ofs', voltage_mu)
         self.notifyOtherListeners(c, (-1, 'ofs', voltage_mu), self.dacChanged)
 
+    @setting(425, "DAC State", dac_num='i', param='s', returns='i')
+    def DACstate(self, c, dac_num, param='dac'):
+        """
+        Get the last set value of a DAC channel register from the state cache.
+            Does not access hardware.
+        Arguments:
+            dac_num (int)   : the DAC channel number. Ignored for 'ofs'.
+            param   (str)   : the register. Must be one of ('dac', 'gain', 'off', 'ofs').
+        Returns:
+                    (int)   : the register value (in machine units).
+        """
+        if param not in ('dac', 'gain', 'off', 'ofs'):
+            raise Exception("Error: invalid register. Must be one of ('dac', 'gain', 'off', 'ofs').")
+        if (dac_num > 31) or (dac_num < 0):
+            raise Exception('Error: device does not exist.')
+        value_mu = self.state.getDAC(dac_num, param)
+        if value_mu is None:
+            raise Exception('Error: DAC register value unknown. Register has not been set.')
+        return value_mu
+
     @setting(431, "DAC Read", dac_num='i', reg='s', returns='i')
     def DACread(self, c, dac_num, reg):
         """
@@ -672,11 +1234,78 @@ class ARTIQ_Server(ContextServer):
             raise Exception('Error: invalid register. Must be one of ' + str(tuple(AD53XX_REGISTERS.keys())))
         # send to correct device
         if self.dacType == 'Zotino':
-            reg_val = yield self.api.readZotino(dac_num, AD53XX_REGISTERS[reg])
+            reg_val = yield self._run(c, self.api.readZotino, dac_num, AD53XX_REGISTERS[reg])
         elif self.dacType == 'Fastino':
-            reg_val = yield self.api.readFastino(dac_num, AD53XX_REGISTERS[reg])
+            reg_val = yield self._run(c, self.api.readFastino, dac_num, AD53XX_REGISTERS[reg])
         returnValue(reg_val)
 
+    @setting(441, "DAC Waveform Record", handle_name='s', channels='*i', waveform=['*2v', '*v'],
+             interval='v', units='s', returns='i')
+    def DACwaveformRecord(self, c, handle_name, channels, waveform, interval, units='v'):
+        """
+        Record a voltage waveform for one or more DAC channels into DMA
+            so it can be played back later with DAC Waveform Play.
+            Replaces any existing waveform with the same name.
+        Arguments:
+            handle_name (str)   : the waveform name.
+            channels    (*int)  : the DAC channel numbers.
+            waveform    (*2v)   : the waveform, with shape (num_samples, len(channels)).
+                                    May be a list if only one channel is given.
+            interval    (float) : the time between samples (in s).
+            units       (str)   : the waveform units, either 'v' or 'mu'.
+        Returns:
+                        (int)   : the number of DMA sequences used to store the waveform.
+        """
+        channels, waveform_mu = validateDACWaveform(channels, waveform, interval, self.dacType, units)
+        num_chunks = yield self._run(c, self.api.recordDACWaveform, handle_name, channels, waveform_mu, interval)
+        # note: ARTIQ_API returns None if recording failed
+        if num_chunks is None:
+            self.dac_waveforms.pop(handle_name, None)
+            raise Exception('Error: unable to record waveform.')
+        # store final values so we can update the state cache after playback
+        self.dac_waveforms[handle_name] = (channels, waveform_mu[-1])
+        returnValue(num_chunks)
+
+    @setting(442, "DAC Waveform Play", handle_name='s', repetitions='i', returns='')
+    def DACwaveformPlay(self, c, handle_name, repetitions=1):
+        """
+        Play a recorded DAC waveform. Returns once playback is complete.
+        Arguments:
+            handle_name (str)   : the waveform name.
+            repetitions (int)   : the number of times to play the waveform.
+        """
+        if handle_name not in self.dac_waveforms:
+            raise Exception('Error: waveform does not exist.')
+        elif repetitions < 1:
+            raise Exception('Error: invalid number of repetitions.')
+        yield self._run(c, self.api.playDACWaveform, handle_name, repetitions)
+        # DACs hold the last value of the waveform
+        channels, final_mu = self.dac_waveforms[handle_name]
+        for dac_num, voltage_mu in zip(channels, final_mu):
+            self.state.setDAC(int(dac_num), 'dac', int(voltage_mu))
+            self.notifyOtherListeners(c, (int(dac_num), 'dac', int(voltage_mu)), self.dacChanged)
+
+    @setting(443, "DAC Waveform Erase", handle_name='s', returns='')
+    def DACwaveformErase(self, c, handle_name):
+        """
+        Remove a recorded DAC waveform.
+        Arguments:
+            handle_name (str)   : the waveform name.
+        """
+        if handle_name not in self.dac_waveforms:
+            raise Exception('Error: waveform does not exist.')
+        del self.dac_waveforms[handle_name]
+        yield self._run(c, self.api.eraseDACWaveform, handle_name)
+
+    @setting(444, "DAC Waveform List", returns='*s')
+    def DACwaveformList(self, c):
+        """
+        Get the names of all recorded DAC waveforms.
+        Returns:
+            (*str)  : the waveform names.
+        """
+        return sorted(self.dac_waveforms.keys())
+
 
     # SAMPLER
     @setting(511, "Sampler Initialize", returns='')
@@ -684,7 +1313,7 @@ class ARTIQ_Server(ContextServer):
         """
         Initialize the Sampler.
         """
-        yield self.api.initializeSampler()
+        yield self._run(c, self.api.initializeSampler)
 
     @setting(512, "Sampler Gain", channel='i', gain='i', returns='i')
     def samplerGain(self, c, channel, gain=None):
@@ -701,9 +1330,9 @@ class ARTIQ_Server(ContextServer):
             if gain not in (1, 10, 100, 1000):
                 raise Exception('Error: invalid gain. Must be one of (1, 10, 100, 1000).')
             gain_mu = int(np.log10(gain))
-            yield self.api.setSamplerGain(channel, gain_mu)
+            yield self._run(c, self.api.setSamplerGain, channel, gain_mu)
         # getter
-        sampler_gains = yield self.api.getSamplerGains()
+        sampler_gains = yield self._run(c, self.api.getSamplerGains)
         gain = int(10 ** sampler_gains[channel])
         returnValue(gain)
 
@@ -719,22 +1348,8 @@ class ARTIQ_Server(ContextServer):
         Returns:
                         list(float): the average values for each channel (in volts).
         """
-        if samples % 2 == 1:
-            raise Exception('Error: number of samples must be even')
-        elif (rate < 10) or (rate > 1e4):
-            raise Exception('Error: number of samples must be even')
-        # get channel gains
-        sampler_gains = yield self.api.getSamplerGains()
-        gain_arr_mu = np.array([sampler_gains[channel_num] for channel_num in channels])
-        # acquire samples
-        samples = yield self.api.readSampler(rate, samples)
-        # keep values only for channels of interest
-        samples = np.array([samples[:, channel_num] for channel_num in channels])
-        # average values
-        sample_mean = np.mean(samples, axis=1)
-        # convert mu to volts
-        sample_mean_volts = [self.adc_mu_to_volt(sample_mean[i], gain_arr_mu[i]) for i in range(len(channels))]
-        returnValue(sample_mean_volts)
+        samples_volts = yield self._samplerRead(c, channels, rate, samples)
+        returnValue(np.mean(samples_volts, axis=1))
 
     @setting(522, "Sampler Read List", channels='*i', rate='v', samples='i', returns='*2v')
     def samplerReadList(self, c, channels, rate, samples):
@@ -748,22 +1363,119 @@ class ARTIQ_Server(ContextServer):
         Returns:
                         list(float): the sampler values for each channel (in volts).
         """
+        samples_volts = yield self._samplerRead(c, channels, rate, samples)
+        returnValue(samples_volts)
+
+    @inlineCallbacks
+    def _samplerRead(self, c, channels, rate, samples):
+        """
+        Acquire a block of samples and convert it to volts.
+        Returns:
+            (np.array): the values (in volts), with shape (len(channels), samples).
+        """
         if samples % 2 == 1:
             raise Exception('Error: number of samples must be even')
         elif (rate < 10) or (rate > 1e4):
-            raise Exception('Error: number of samples must be even')
-        # get channel gains
-        sampler_gains = yield self.api.getSamplerGains()
-        gain_arr_mu = np.array([sampler_gains[channel_num] for channel_num in channels])
+            raise Exception('Error: sample rate must be in [10, 1e4].')
+        # get channel conversion factors
+        volts_per_mu = yield self._samplerVoltsPerMu(c)
         # acquire samples
-        samples_mu = yield self.api.readSampler(rate, samples)
-        # keep values only for channels of interest
-        samples_mu = np.array([samples_mu[:, channel_num] for channel_num in channels])
-        # convert mu to volts
-        samples_volts = np.array([self.adc_mu_to_volt(samples_mu[i], gain_arr_mu[i]) for i in range(len(channels))])
-        returnValue(samples_volts)
+        # note: each kernel call stores its samples on the core device stack, so large reads are split up
+        samples_mu = yield self._run(c, readSamplerBlocks, self.api.readSampler, rate, samples, priority=PRIORITY_LOW)
+        # keep values only for channels of interest and convert mu to volts
+        returnValue((samples_mu[:, channels] * volts_per_mu[channels]).T)
+
+    @inlineCallbacks
+    def _samplerVoltsPerMu(self, c):
+        """
+        Get the mu to volts conversion factor of each Sampler channel from the channel gains.
+        Returns:
+            (np.array): the conversion factor of each channel (in volts per mu).
+        """
+        sampler_gains = yield self._run(c, self.api.getSamplerGains)
+        # note: conversion is linear, so we only need to look up the factor once per gain
+        volts_per_mu = {gain_mu: self.adc_mu_to_volt(1., gain_mu) for gain_mu in set(sampler_gains)}
+        returnValue(np.array([volts_per_mu[gain_mu] for gain_mu in sampler_gains]))
+
+    @setting(531, "Sampler Stream Start", channels='*i', rate='v', block_size='i', decimation='i',
+             buffer_size='i', returns='')
+    def samplerStreamStart(self, c, channels, rate, block_size=1000, decimation=1, buffer_size=10000):
+        """
+        Continuously acquire samples from the Sampler in the background.
+            Samples are acquired in blocks, converted to volts, decimated, and stored in a ring buffer.
+            Clients are sent an adcUpdated signal with the mean of each channel
+            at most every STREAM_SIGNAL_INTERVAL seconds.
+            Restarts the stream if it is already running.
+            Channel gains are read once at the start, so restart the stream after changing them.
+        Arguments:
+            channels    list(int)   : the channels to acquire. Channels must be in [0, 7].
+            rate        (float)     : the sample rate (in Hz). Must be in [10, 1e4].
+            block_size  (int)       : the number of samples to acquire per kernel call.
+                                        Must be at most SAMPLER_MAX_BLOCK (1024), since each block
+                                        is stored on the core device stack.
+            decimation  (int)       : the number of samples to average into each stored value.
+                                        Must divide block_size.
+            buffer_size (int)       : the number of (decimated) values to store.
+        """
+        if (len(channels) == 0) or any((channel < 0) or (channel > 7) for channel in channels):
+            raise Exception('Error: channels must be in [0, 7].')
+        elif (rate < 10) or (rate > 1e4):
+            raise Exception('Error: sample rate must be in [10, 1e4].')
+        # ensure blocks aren't too long so we don't hog the core device or overflow its stack
+        elif (block_size < 2) or (block_size % 2 == 1) or (block_size / rate > 1) or (block_size > SAMPLER_MAX_BLOCK):
+            raise Exception('Error: invalid block size.')
+
+        # stop existing stream
+        if self.sampler_stream is not None:
+            self.sampler_stream.running = False
+
+        # start streaming
+        volts_per_mu = yield self._samplerVoltsPerMu(c)
+        stream = SamplerStream(channels, rate, block_size, volts_per_mu, decimation, buffer_size)
+        stream.running = True
+        self.sampler_stream = stream
+        self._runStream(stream, self.api.readSampler, rate, block_size)
+        self._updateStreamSignaller()
+
+    @setting(532, "Sampler Stream Stop", returns='')
+    def samplerStreamStop(self, c):
+        """
+        Stop continuously acquiring samples.
+            Stored values are kept until the stream is restarted.
+        """
+        self._getSamplerStream().running = False
+        self._updateStreamSignaller()
+
+    @setting(533, "Sampler Stream Latest", num='i', returns='*2v')
+    def samplerStreamLatest(self, c, num=None):
+        """
+        Get the most recent (decimated) values of the Sampler stream.
+        Arguments:
+            num         (int)   : the number of values to get. Defaults to all stored values.
+        Returns:
+                        (*2v)   : (timestamp, channel values...) for each value, oldest first.
+        """
+        timestamps, values = self._getSamplerStream().latest(num)
+        return np.column_stack((timestamps, values))
+
+    @setting(534, "Sampler Stream Stats", num='i', returns='*2v')
+    def samplerStreamStats(self, c, num=None):
+        """
+        Get the rolling mean and standard deviation of each channel in the Sampler stream.
+        Arguments:
+            num         (int)   : the number of values to use. Defaults to all stored values.
+        Returns:
+                        (*2v)   : (mean, stdev) of each streamed channel (in volts).
+        """
+        return np.column_stack(self._getSamplerStream().stats(num))
 
+    def _getSamplerStream(self):
+        if self.sampler_stream is None:
+            raise Exception('Error: Sampler is not streaming.')
+        return self.sampler_stream
 
 if __name__ == '__main__':
+    # set ARTIQ_SIMULATE=1 to run without hardware
+    from os import environ
     from labrad import util
-    util.runServer(ARTIQ_Server())
+    util.runServer(ARTIQ_Server(simulate=(environ.get('ARTIQ_SIMULATE', '0') == '1')))
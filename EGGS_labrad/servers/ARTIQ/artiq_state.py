@@ -0,0 +1,391 @@
+"""
+A shadow copy of the ARTIQ device state.
+"""
+import numpy as np
+from twisted.internet.defer import inlineCallbacks, returnValue
+
+from artiq_waveform import dac_voltage_to_mu
+
+__all__ = ["ARTIQ_State", "StateBatch", "DDS_PARAMS", "dac_channel", "getDDSParam", "applyStateBatch",
+           "dds_frequency_to_ftw", "dds_amplitude_to_asf", "dds_turns_to_pow", "dds_att_to_mu",
+           "BATCH_TTL", "BATCH_DDS_WAVE", "BATCH_DDS_ATT", "BATCH_DDS_SW", "BATCH_RECORD_LENGTH"]
+
+
+# DDS parameters (in machine units), in column order
+DDS_PARAMS = ('ftw', 'asf', 'pow', 'att', 'onoff')
+# columns returned by ARTIQ_API.getDDSAll
+_DDS_ALL_COLUMNS = [DDS_PARAMS.index(param) for param in ('ftw', 'asf', 'att', 'onoff')]
+
+# record kinds for batched updates (see ARTIQ_API.setStateBatch)
+# each record has the form (kind, index, a, b, c)
+BATCH_TTL =             0
+BATCH_DDS_WAVE =        1
+BATCH_DDS_ATT =         2
+BATCH_DDS_SW =          3
+BATCH_RECORD_LENGTH =   5
+
+# signal parameter (in machine units) of each update parameter
+_DDS_UPDATE_PARAMS = {'freq': 'ftw', 'ampl': 'asf', 'phase': 'pow', 'att': 'att', 'onoff': 'onoff'}
+
+
+# DDS - val to mu
+dds_frequency_to_ftw = lambda freq: np.int32(freq * 4.294967295) # 0xFFFFFFFF / 1GHz
+dds_amplitude_to_asf = lambda ampl: np.int32(ampl * 0x3FFF)
+dds_turns_to_pow =     lambda phase: np.int32(phase * 0xFFFF)
+dds_att_to_mu =        lambda dbm: np.int32(0xFF) - np.int32(np.round(dbm * 8))
+
+
+def dac_channel(device_name):
+    """
+    Get the DAC channel number from a device name of the form 'dacN'.
+    Returns -1 if the name is not a valid DAC channel.
+    """
+    if not device_name.lower().startswith('dac'):
+        return -1
+    try:
+        channel = int(device_name[3:])
+    except ValueError:
+        return -1
+    return channel if (0 <= channel <= 31) else -1
+
+
+class ARTIQ_State(object):
+    """
+    Holds the last known values of all DDS channels, TTL outputs, and DAC channels.
+    Lets the server answer getters without launching a kernel.
+    Values which have never been set or read are marked as unknown.
+    """
+
+    def __init__(self, dds_names, ttl_names=()):
+        """
+        Arguments:
+            dds_names   (*str)  : the DDS channel names, in the order used by ARTIQ_API.getDDSAll.
+            ttl_names   (*str)  : the TTL output names.
+        """
+        self.dds_names = list(dds_names)
+        self._dds_index = {name: i for i, name in enumerate(self.dds_names)}
+        self.dds = np.zeros((len(self.dds_names), len(DDS_PARAMS)), dtype=np.int64)
+        self.dds_known = np.zeros(self.dds.shape, dtype=bool)
+
+        self.ttl = dict.fromkeys(ttl_names)
+        self.dac = {param: dict() for param in ('dac', 'gain', 'off')}
+        self.dac_ofs = None
+
+
+    # DDS
+    def _ddsIndex(self, dds_name, param):
+        try:
+            return self._dds_index[dds_name], DDS_PARAMS.index(param)
+        except (KeyError, ValueError):
+            raise Exception('Error: invalid DDS channel or parameter.')
+
+    def setDDS(self, dds_name, param, value):
+        """
+        Update a DDS parameter.
+        Arguments:
+            dds_name    (str)   : the DDS channel name.
+            param       (str)   : the parameter. Must be one of DDS_PARAMS.
+            value       (int)   : the parameter value (in machine units).
+        """
+        row, col = self._ddsIndex(dds_name, param)
+        self.dds[row, col] = int(value)
+        self.dds_known[row, col] = True
+
+    def getDDS(self, dds_name, param):
+        """
+        Get a DDS parameter.
+        Arguments:
+            dds_name    (str)   : the DDS channel name.
+            param       (str)   : the parameter. Must be one of DDS_PARAMS.
+        Returns:
+                        (int)   : the parameter value (in machine units), or None if unknown.
+        """
+        row, col = self._ddsIndex(dds_name, param)
+        if not self.dds_known[row, col]:
+            return None
+        return int(self.dds[row, col])
+
+    def invalidateDDS(self, dds_name=None):
+        """
+        Mark the parameters of a DDS channel as unknown (e.g. after it is reinitialized).
+        Arguments:
+            dds_name    (str)   : the DDS channel name. Invalidates all channels if None.
+        """
+        if dds_name is None:
+            self.dds_known[:] = False
+        else:
+            self.dds_known[self._ddsIndex(dds_name, 'ftw')[0]] = False
+
+    def getDDSAll(self):
+        """
+        Get the (ftw, asf, att, onoff) values of all DDS channels,
+            in the same format as ARTIQ_API.getDDSAll.
+        Returns:
+            (np.array): the DDS values, or None if any are unknown.
+        """
+        if not np.all(self.dds_known[:, _DDS_ALL_COLUMNS]):
+            return None
+        return self.dds[:, _DDS_ALL_COLUMNS].astype(np.int32)
+
+    def updateDDSAll(self, dds_all):
+        """
+        Update all DDS channels from the output of ARTIQ_API.getDDSAll.
+        Arguments:
+            dds_all     (np.array)  : the (ftw, asf, att, onoff) values of all DDS channels.
+        Returns:
+                        *(str, str, int): the (dds_name, param, value) of every value that changed.
+        """
+        dds_all = np.asarray(dds_all, dtype=np.int64)
+        old_vals = self.dds[:, _DDS_ALL_COLUMNS]
+        old_known = self.dds_known[:, _DDS_ALL_COLUMNS]
+        changed_rows, changed_cols = np.nonzero((old_vals != dds_all) | ~old_known)
+
+        self.dds[:, _DDS_ALL_COLUMNS] = dds_all
+        self.dds_known[:, _DDS_ALL_COLUMNS] = True
+        return [(self.dds_names[row], DDS_PARAMS[_DDS_ALL_COLUMNS[col]], int(dds_all[row, col]))
+                for row, col in zip(changed_rows, changed_cols)]
+
+
+    # TTL
+    def setTTL(self, ttl_name, state):
+        self.ttl[ttl_name] = bool(state)
+
+    def getTTL(self, ttl_name):
+        """
+        Returns:
+            (bool): the TTL output state, or None if unknown.
+        """
+        return self.ttl.get(ttl_name)
+
+
+    # DAC
+    def setDAC(self, dac_num, param, value_mu):
+        """
+        Update a DAC channel register.
+        Arguments:
+            dac_num     (int)   : the DAC channel number. Use -1 for the global OFS register.
+            param       (str)   : the register. Must be one of ('dac', 'gain', 'off', 'ofs').
+            value_mu    (int)   : the register value (in machine units).
+        """
+        if param == 'ofs':
+            self.dac_ofs = int(value_mu)
+        else:
+            self.dac[param][dac_num] = int(value_mu)
+
+    def invalidateDAC(self):
+        """
+        Mark all DAC registers as unknown (e.g. after the DAC is reinitialized).
+        """
+        self.dac = {param: dict() for param in ('dac', 'gain', 'off')}
+        self.dac_ofs = None
+
+    def getDAC(self, dac_num, param='dac'):
+        """
+        Returns:
+            (int): the DAC channel register value (in machine units), or None if unknown.
+        """
+        if param == 'ofs':
+            return self.dac_ofs
+        return self.dac[param].get(dac_num)
+
+
+class StateBatch(object):
+    """
+    Validates a list of (device, parameter, value) updates and converts them
+        to machine units, so they can be applied with ARTIQ_API.setStateBatch.
+    Updates to the frequency, amplitude, or phase of a DDS channel are merged
+        into a single waveform record, with later updates taking precedence.
+    """
+
+    def __init__(self, updates, ttl_nums, dds_nums, dac_type=None):
+        """
+        Arguments:
+            updates     *(str, str, float)  : a list of (device, parameter, value) updates.
+            ttl_nums    {str: int}          : the number of each TTL output.
+            dds_nums    {str: int}          : the number of each DDS channel.
+            dac_type    (str)               : the DAC type ('Zotino' or 'Fastino'), if there is one.
+        """
+        num = len(updates)
+        self.dac_type = dac_type
+        self.devices = [update[0] for update in updates]
+        self.params = np.array([update[1].lower() for update in updates], dtype=str)
+        values = np.array([update[2] for update in updates], dtype=float)
+
+        # get device indices (-1 if device doesn't exist)
+        self.ttl_index = np.array([ttl_nums.get(dev, -1) for dev in self.devices], dtype=np.int32)
+        self.dds_index = np.array([dds_nums.get(dev, -1) for dev in self.devices], dtype=np.int32)
+        self.dac_index = np.array([dac_channel(dev) for dev in self.devices], dtype=np.int32)
+        is_dds = self.dds_index >= 0
+        is_dac = (self.dac_index >= 0) & (dac_type in ('Zotino', 'Fastino'))
+        params = self.params
+
+        # validate updates
+        self.ttl_mask = (self.ttl_index >= 0) & (params == 'state') & np.isin(values, (0, 1))
+        freq_mask = is_dds & (params == 'freq') & (values >= 0) & (values <= 4e8)
+        ampl_mask = is_dds & (params == 'ampl') & (values >= 0) & (values <= 1)
+        phase_mask = is_dds & (params == 'phase') & (values >= 0) & (values < 1)
+        self.att_mask = is_dds & (params == 'att') & (values >= 0) & (values <= 31.5)
+        self.sw_mask = is_dds & (params == 'onoff') & np.isin(values, (0, 1))
+        dac_v_mask = is_dac & (params == 'v') & (values >= -10.) & (values < 10.)
+        dac_mu_mask = is_dac & (params == 'mu') & (values >= 0) & (values <= 0xFFFF)
+        self.dac_mask = dac_v_mask | dac_mu_mask
+
+        # convert to machine units in bulk
+        self.values_mu = np.zeros(num, dtype=np.int64)
+        self.values_mu[self.ttl_mask | self.sw_mask] = values[self.ttl_mask | self.sw_mask]
+        self.values_mu[freq_mask] = dds_frequency_to_ftw(values[freq_mask])
+        self.values_mu[ampl_mask] = dds_amplitude_to_asf(values[ampl_mask])
+        self.values_mu[phase_mask] = dds_turns_to_pow(values[phase_mask])
+        self.values_mu[self.att_mask] = dds_att_to_mu(values[self.att_mask])
+        self.values_mu[dac_v_mask] = dac_voltage_to_mu(values[dac_v_mask])
+        self.values_mu[dac_mu_mask] = values[dac_mu_mask]
+
+        # waveform parameter of each update (-1 if not a waveform update)
+        self.wave_params = np.full(num, -1)
+        self.wave_params[freq_mask], self.wave_params[ampl_mask], self.wave_params[phase_mask] = 0, 1, 2
+        self.wave_mask = self.wave_params >= 0
+
+    def status(self):
+        """
+        Returns:
+            (np.array): whether each update is valid.
+        """
+        return self.ttl_mask | self.wave_mask | self.att_mask | self.sw_mask | self.dac_mask
+
+    def waveformDevices(self):
+        """
+        Returns:
+            *str: the DDS channels whose current waveform is needed to build the records, in update order.
+        """
+        return list(dict.fromkeys(self.devices[i] for i in np.nonzero(self.wave_mask)[0]))
+
+    def records(self, waveforms):
+        """
+        Create the TTL and DDS update records.
+        Arguments:
+            waveforms   {str: (int, int, int)}  : the current (ftw, asf, pow) of each DDS channel in waveformDevices.
+        Returns:
+                        (np.array): the (N, BATCH_RECORD_LENGTH) update records.
+        """
+        # merge waveform updates with the current waveform of each channel,
+        # since the frequency, amplitude, and phase are all written at once
+        merged = dict()
+        for i in np.nonzero(self.wave_mask)[0]:
+            dds_num = self.dds_index[i]
+            if dds_num not in merged:
+                merged[dds_num] = list(waveforms[self.devices[i]])
+            merged[dds_num][self.wave_params[i]] = self.values_mu[i]
+
+        def _records(kind, mask, index):
+            records = np.zeros((np.count_nonzero(mask), BATCH_RECORD_LENGTH), dtype=np.int32)
+            records[:, 0] = kind
+            records[:, 1] = index[mask]
+            records[:, 2] = self.values_mu[mask]
+            return records
+        wave_records = np.zeros((len(merged), BATCH_RECORD_LENGTH), dtype=np.int32)
+        wave_records[:, 0] = BATCH_DDS_WAVE
+        wave_records[:, 1] = list(merged.keys())
+        wave_records[:, 2:] = np.array(list(merged.values()), dtype=np.int64).reshape(-1, 3)
+        return np.concatenate((_records(BATCH_TTL, self.ttl_mask, self.ttl_index), wave_records,
+                               _records(BATCH_DDS_ATT, self.att_mask, self.dds_index),
+                               _records(BATCH_DDS_SW, self.sw_mask, self.dds_index)))
+
+    def dacUpdates(self):
+        """
+        Returns:
+            *(int, int): the (channel, value_mu) of each DAC update.
+        """
+        return [(int(self.dac_index[i]), int(self.values_mu[i])) for i in np.nonzero(self.dac_mask)[0]]
+
+    def applied(self):
+        """
+        Get the updated values, e.g. to update the state cache and notify listeners.
+        Returns:
+            (*(str, bool), *(str, str, int), *(int, int)): the (ttl_name, state) of each TTL update,
+                the (dds_name, param, value_mu) of each DDS update, and the (channel, value_mu) of each DAC update.
+        """
+        ttl = [(self.devices[i], bool(self.values_mu[i])) for i in np.nonzero(self.ttl_mask)[0]]
+        dds = [(self.devices[i], _DDS_UPDATE_PARAMS[self.params[i]], int(self.values_mu[i]))
+               for i in np.nonzero(self.wave_mask | self.att_mask | self.sw_mask)[0]]
+        return ttl, dds, self.dacUpdates()
+
+
+def _call(func, *args):
+    return func(*args)
+
+
+@inlineCallbacks
+def getDDSParam(api, state, dds_name, param, force=False, run=_call):
+    """
+    Get a DDS parameter from the state cache, reading it from
+        hardware only if it is unknown or force is set.
+    Arguments:
+        api         (ARTIQ_API) : the API used to read the hardware.
+        state       (ARTIQ_State): the state cache.
+        dds_name    (str)       : the name of the DDS.
+        param       (str)       : one of ('ftw', 'asf', 'pow', 'att', 'onoff').
+        force       (bool)      : read the value from hardware.
+        run         (callable)  : calls an API function, i.e. run(func, *args).
+                                    May return a Deferred (e.g. to queue the call on the executor).
+    Returns:
+                    (int)       : the parameter value (in machine units).
+    """
+    value = state.getDDS(dds_name, param)
+    if (value is not None) and (not force):
+        returnValue(value)
+
+    # read from hardware
+    if param in ('ftw', 'asf'):
+        ftw, asf = yield run(api.getDDSFastWave, dds_name)
+        state.setDDS(dds_name, 'ftw', ftw)
+        state.setDDS(dds_name, 'asf', asf)
+    elif param == 'pow':
+        ftw, asf, pow = yield run(api.getDDS, dds_name)
+        state.setDDS(dds_name, 'pow', pow)
+    elif param == 'att':
+        att_mu = yield run(api.getDDSFastATT, dds_name)
+        state.setDDS(dds_name, 'att', att_mu)
+    elif param == 'onoff':
+        sw_state = yield run(api.getDDSFastSW, dds_name)
+        state.setDDS(dds_name, 'onoff', sw_state)
+    returnValue(state.getDDS(dds_name, param))
+
+
+@inlineCallbacks
+def applyStateBatch(api, state, batch, run=_call):
+    """
+    Apply a StateBatch to the hardware and update the state cache.
+        All TTL and DDS updates are applied in a single kernel, followed by the DAC updates.
+    Arguments:
+        api         (ARTIQ_API) : the API used to apply the updates.
+        state       (ARTIQ_State): the state cache.
+        batch       (StateBatch): the updates to apply.
+        run         (callable)  : calls an API function, i.e. run(func, *args).
+                                    May return a Deferred (e.g. to queue the call on the executor).
+    Returns:
+        (*(str, bool), *(str, str, int), *(int, int)): the applied updates (see StateBatch.applied).
+    """
+    # get the current waveform of DDS channels whose waveform is being changed
+    waveforms = dict()
+    for dds_name in batch.waveformDevices():
+        ftw = yield getDDSParam(api, state, dds_name, 'ftw', run=run)
+        asf = yield getDDSParam(api, state, dds_name, 'asf', run=run)
+        pow = yield getDDSParam(api, state, dds_name, 'pow', run=run)
+        waveforms[dds_name] = (ftw, asf, pow)
+
+    # apply TTL and DDS updates in a single kernel
+    yield run(api.setStateBatch, batch.records(waveforms))
+    # apply DAC updates
+    dac_func = api.setZotino if batch.dac_type == 'Zotino' else api.setFastino
+    for dac_num, value_mu in batch.dacUpdates():
+        yield run(dac_func, dac_num, value_mu)
+
+    # update state cache
+    ttl_updates, dds_updates, dac_updates = batch.applied()
+    for ttl_name, ttl_state in ttl_updates:
+        state.setTTL(ttl_name, ttl_state)
+    for dds_name, param, value_mu in dds_updates:
+        state.setDDS(dds_name, param, value_mu)
+    for dac_num, value_mu in dac_updates:
+        state.setDAC(dac_num, 'dac', value_mu)
+    returnValue((ttl_updates, dds_updates, dac_updates))
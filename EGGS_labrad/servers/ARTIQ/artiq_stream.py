@@ -0,0 +1,246 @@
+"""
+Host-side buffers for continuously streamed ARTIQ data.
+"""
+import numpy as np
+from time import time
+
+from EGGS_labrad.servers import RingBuffer
+
+__all__ = ["CountStream", "SamplerStream", "readSamplerBlocks",
+           "COUNT_SIGNAL_TYPE", "ADC_SIGNAL_TYPE", "SAMPLER_MAX_BLOCK"]
+
+
+# labrad types of the signals sent with the stream summaries
+COUNT_SIGNAL_TYPE = '(sivv)'
+ADC_SIGNAL_TYPE = '(*v)'
+
+# maximum number of Sampler samples per kernel call, since each block is
+# stored on the core device stack (8 channels x 4 bytes per sample) before being sent
+SAMPLER_MAX_BLOCK = 1024
+
+
+def readSamplerBlocks(read_func, rate_hz, samples):
+    """
+    Read any number of Sampler samples, split into kernel calls of at most SAMPLER_MAX_BLOCK samples.
+    Arguments:
+        read_func   (callable)  : the ARTIQ_API readSampler function.
+        rate_hz     (float)     : the sample rate (in Hz).
+        samples     (int)       : the total number of samples to read.
+    Returns:
+                    (np.array)  : the samples (in machine units), with shape (samples, 8).
+    """
+    blocks = list()
+    for start in range(0, samples, SAMPLER_MAX_BLOCK):
+        block = read_func(rate_hz, min(SAMPLER_MAX_BLOCK, samples - start))
+        # note: ARTIQ_API returns None if the kernel failed
+        if block is None:
+            raise Exception('Error: unable to read Sampler.')
+        blocks.append(block)
+    return np.concatenate(blocks)
+
+
+class CountStream(object):
+    """
+    Holds the counts from a continuously gated TTL EdgeCounter.
+    Counts arrive from the core device in blocks of consecutive gates
+        and are stored in a bounded ring buffer with per-bin timestamps.
+    Also accumulates the bins received since the last signal was sent,
+        so that GUI updates can be coalesced.
+    """
+
+    def __init__(self, ttl_name, gate_us, block_size, buffer_size=10000):
+        """
+        Arguments:
+            ttl_name    (str)   : the EdgeCounter name.
+            gate_us     (float) : the gate time of each bin (in us).
+            block_size  (int)   : the number of bins counted per kernel call.
+            buffer_size (int)   : the maximum number of bins to store.
+        """
+        self.ttl_name =     ttl_name
+        self.gate_us =      gate_us
+        self.block_size =   block_size
+        self.buffer =       RingBuffer(buffer_size, dtype=np.int32)
+        self.running =      False
+        self.blocks =       0
+
+        # bins received since the last signal
+        self._pending = list()
+
+    def add(self, counts, time_end=None):
+        """
+        Add a block of consecutive count bins.
+            Bins are timestamped backwards from the end of the block.
+        Arguments:
+            counts      (np.array)  : the counts in each bin.
+            time_end    (float)     : the time the block finished. Defaults to the current time.
+        """
+        counts = np.asarray(counts, dtype=np.int32)
+        if time_end is None:
+            time_end = time()
+        timestamps = time_end - (self.gate_us * 1e-6) * np.arange(len(counts) - 1, -1, -1)
+        self.buffer.extend(counts, timestamps)
+        self._pending.append(counts)
+        self.blocks += 1
+
+    def latest(self, num=None):
+        """
+        Get the most recent count bins.
+        Arguments:
+            num     (int)   : the number of bins to get. Defaults to all stored bins.
+        Returns:
+            (np.array, np.array): the timestamps and counts of each bin.
+        """
+        return self.buffer.latest(num)
+
+    def stats(self, num=None):
+        """
+        Get the mean and standard deviation of the most recent count bins.
+        Arguments:
+            num     (int)   : the number of bins to use. Defaults to all stored bins.
+        Returns:
+            (float, float): the mean and standard deviation of the counts.
+        """
+        _, counts = self.buffer.latest(num)
+        if len(counts) == 0:
+            return 0., 0.
+        return float(np.mean(counts)), float(np.std(counts))
+
+    def popPending(self):
+        """
+        Summarize and clear the bins received since the last call.
+        Returns:
+            (int, float, float): the number of new bins, and their mean and standard deviation.
+                                    Returns None if there are no new bins.
+        """
+        if not self._pending:
+            return None
+        counts = np.concatenate(self._pending)
+        self._pending = list()
+        return len(counts), float(np.mean(counts)), float(np.std(counts))
+
+    def popSignal(self):
+        """
+        Summarize and clear the bins received since the last call, for the countsUpdated signal.
+        Returns:
+            (str, int, float, float): the EdgeCounter name, and the popPending summary (see COUNT_SIGNAL_TYPE).
+                                        Returns None if there are no new bins.
+        """
+        summary = self.popPending()
+        if summary is None:
+            return None
+        return (self.ttl_name,) + summary
+
+
+class SamplerStream(object):
+    """
+    Holds the values from continuous Sampler acquisition.
+    Samples arrive from the core device in blocks (in machine units),
+        are converted to volts and decimated (averaged) a whole block at a time,
+        then stored in a bounded ring buffer with timestamps.
+    """
+
+    def __init__(self, channels, rate_hz, block_size, volts_per_mu, decimation=1, buffer_size=10000):
+        """
+        Arguments:
+            channels        (*int)      : the ADC channels to keep.
+            rate_hz         (float)     : the sample rate (in Hz).
+            block_size      (int)       : the number of samples acquired per kernel call.
+                                            Must be a multiple of decimation, and at most SAMPLER_MAX_BLOCK.
+            volts_per_mu    (np.array)  : the conversion factor of each of the ADC channels
+                                            (i.e. for all channels, not only the kept ones).
+            decimation      (int)       : the number of samples to average into each stored value.
+            buffer_size     (int)       : the maximum number of (decimated) values to store.
+        """
+        if (decimation < 1) or (block_size % decimation != 0):
+            raise Exception('Error: block size must be a multiple of the decimation.')
+        if block_size > SAMPLER_MAX_BLOCK:
+            raise Exception('Error: block size must be at most {:d}.'.format(SAMPLER_MAX_BLOCK))
+        self.channels =     np.array(channels, dtype=int)
+        self.rate_hz =      rate_hz
+        self.block_size =   block_size
+        self.decimation =   decimation
+        self.buffer =       RingBuffer(buffer_size, shape=(len(self.channels),), dtype=float)
+        self.running =      False
+        self.blocks =       0
+
+        # conversion factors for the kept channels
+        self._volts_per_mu = np.asarray(volts_per_mu, dtype=float)[self.channels]
+
+        # values received since the last signal
+        self._pending = list()
+
+    def convert(self, samples_mu):
+        """
+        Convert a block of samples to volts and decimate it.
+        Arguments:
+            samples_mu  (np.array)  : the samples (in machine units), with shape (num_samples, num_adc_channels).
+        Returns:
+                        (np.array)  : the decimated values (in volts), with shape (num_samples / decimation, len(channels)).
+        """
+        samples_volts = np.asarray(samples_mu)[:, self.channels] * self._volts_per_mu
+        num_values = len(samples_volts) // self.decimation
+        samples_volts = samples_volts[:num_values * self.decimation]
+        return samples_volts.reshape(num_values, self.decimation, len(self.channels)).mean(axis=1)
+
+    def add(self, samples_mu, time_end=None):
+        """
+        Add a block of consecutive samples.
+            Values are timestamped backwards from the end of the block.
+        Arguments:
+            samples_mu  (np.array)  : the samples (in machine units), with shape (num_samples, num_adc_channels).
+            time_end    (float)     : the time the block finished. Defaults to the current time.
+        """
+        values = self.convert(samples_mu)
+        if time_end is None:
+            time_end = time()
+        timestamps = time_end - (self.decimation / self.rate_hz) * np.arange(len(values) - 1, -1, -1)
+        self.buffer.extend(values, timestamps)
+        self._pending.append(values)
+        self.blocks += 1
+
+    def latest(self, num=None):
+        """
+        Get the most recent values.
+        Arguments:
+            num     (int)   : the number of values to get. Defaults to all stored values.
+        Returns:
+            (np.array, np.array): the timestamps and the values of each channel (in volts).
+        """
+        return self.buffer.latest(num)
+
+    def stats(self, num=None):
+        """
+        Get the mean and standard deviation of each channel over the most recent values.
+        Arguments:
+            num     (int)   : the number of values to use. Defaults to all stored values.
+        Returns:
+            (np.array, np.array): the mean and standard deviation of each channel (in volts).
+        """
+        _, values = self.buffer.latest(num)
+        if len(values) == 0:
+            return np.zeros(len(self.channels)), np.zeros(len(self.channels))
+        return np.mean(values, axis=0), np.std(values, axis=0)
+
+    def popPending(self):
+        """
+        Summarize and clear the values received since the last call.
+        Returns:
+            (*float): the mean of each channel (in volts). Returns None if there are no new values.
+        """
+        if not self._pending:
+            return None
+        values = np.concatenate(self._pending)
+        self._pending = list()
+        return np.mean(values, axis=0)
+
+    def popSignal(self):
+        """
+        Summarize and clear the values received since the last call, for the adcUpdated signal.
+        Returns:
+            (*float,): the mean of each channel (in volts), as a cluster (see ADC_SIGNAL_TYPE).
+                        Returns None if there are no new values.
+        """
+        summary = self.popPending()
+        if summary is None:
+            return None
+        return (summary.tolist(),)
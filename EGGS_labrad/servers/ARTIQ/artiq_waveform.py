@@ -0,0 +1,95 @@
+"""
+Host-side preparation of DAC waveforms for DMA playback.
+"""
+import numpy as np
+
+__all__ = ["DAC_WAVEFORM_CHUNK_SAMPLES", "DAC_MIN_INTERVAL_S",
+           "dac_voltage_to_mu", "validateDACWaveform", "chunkDACWaveform"]
+
+
+# maximum number of samples (of all channels) recorded into a single DMA sequence
+# note: waveform data has to be sent to the kernel and held in DMA memory, so large waveforms are split up
+DAC_WAVEFORM_CHUNK_SAMPLES = 4096
+
+# minimum time (in s) to update a single channel
+DAC_MIN_INTERVAL_S = {'Zotino': 1.5e-6, 'Fastino': 0.5e-6}
+
+
+def dac_voltage_to_mu(voltage):
+    """
+    Convert DAC voltages to machine units.
+        Valid for both Zotino (with the default offset) and Fastino.
+    Arguments:
+        voltage     (np.array)  : the voltages (in V). Must be in [-10, 10).
+    Returns:
+                    (np.array)  : the voltages (in mu).
+    """
+    voltage = np.asarray(voltage, dtype=float)
+    if np.any(~((voltage >= -10.) & (voltage < 10.))):
+        raise Exception('Error: DAC voltage must be in [-10, 10) V.')
+    # note: voltages just below 10 V round up to 0x10000
+    voltage_mu = np.round(voltage * (0x8000 / 10.)).astype(np.int64) + 0x8000
+    return np.minimum(voltage_mu, 0xFFFF).astype(np.int32)
+
+
+def validateDACWaveform(channels, waveform, interval_s, dac_type, units='v'):
+    """
+    Check a DAC waveform and convert it to machine units.
+    Arguments:
+        channels    (*int)      : the DAC channels.
+        waveform    (np.array)  : the waveform, with shape (num_samples, len(channels)).
+        interval_s  (float)     : the time between samples (in s).
+        dac_type    (str)       : the DAC type. Must be one of ('Zotino', 'Fastino').
+        units       (str)       : the waveform units, either 'v' or 'mu'.
+    Returns:
+                    (np.array, np.array): the channels and the waveform (in mu).
+    """
+    if dac_type not in DAC_MIN_INTERVAL_S:
+        raise Exception('Error: no DAC available.')
+
+    # check channels
+    channels = np.asarray(channels, dtype=np.int32)
+    if (channels.ndim != 1) or (len(channels) == 0):
+        raise Exception('Error: at least one DAC channel must be given.')
+    elif np.any((channels < 0) | (channels > 31)):
+        raise Exception('Error: device does not exist.')
+    elif len(np.unique(channels)) != len(channels):
+        raise Exception('Error: DAC channels must be unique.')
+
+    # check waveform shape
+    waveform = np.asarray(waveform)
+    if waveform.ndim == 1 and len(channels) == 1:
+        waveform = waveform[:, np.newaxis]
+    if (waveform.ndim != 2) or (waveform.shape[1] != len(channels)) or (len(waveform) == 0):
+        raise Exception('Error: waveform must have shape (num_samples, num_channels).')
+
+    # check timing
+    if interval_s < DAC_MIN_INTERVAL_S[dac_type] * len(channels):
+        raise Exception('Error: sample interval too short for {:d} channels.'.format(len(channels)))
+
+    # convert waveform
+    if units.lower() in ('v', 'volt', 'voltage'):
+        waveform_mu = dac_voltage_to_mu(waveform)
+    elif units.lower() == 'mu':
+        if np.any((waveform < 0) | (waveform > 0xFFFF)):
+            raise Exception('Error: invalid DAC voltage.')
+        waveform_mu = waveform.astype(np.int32)
+    else:
+        raise Exception('Error: invalid units.')
+    return channels, waveform_mu
+
+
+def chunkDACWaveform(handle_name, waveform_mu, chunk_samples=DAC_WAVEFORM_CHUNK_SAMPLES):
+    """
+    Split a waveform into chunks which are each recorded into their own DMA sequence.
+    Arguments:
+        handle_name     (str)       : the waveform name.
+        waveform_mu     (np.array)  : the waveform (in mu), with shape (num_samples, num_channels).
+        chunk_samples   (int)       : the maximum number of channel updates per chunk.
+    Returns:
+                        *(str, np.array): the DMA sequence name and the (flattened) chunk waveform.
+    """
+    num_samples, num_channels = waveform_mu.shape
+    samples_per_chunk = max(chunk_samples // num_channels, 1)
+    return [('{:s}_{:d}'.format(handle_name, i), np.ascontiguousarray(waveform_mu[start: start + samples_per_chunk]).ravel())
+            for i, start in enumerate(range(0, num_samples, samples_per_chunk))]
@@ -0,0 +1,92 @@
+import os
+import sys
+
+import pytest
+
+# ARTIQ server modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artiq_datasets import ARTIQ_Datasets, changedDatasets
+
+
+class fake_dataset_db(object):
+    """
+    Stands in for the master's dataset_db, and records the notifications
+    the dataset subscriber would receive.
+    """
+
+    def __init__(self):
+        self.datasets = {'a': (True, 1.)}
+        self.mods = []
+
+    def get(self, key):
+        return self.datasets[key][1]
+
+    def set(self, key, value, persist):
+        self.datasets[key] = (persist, value)
+        self.mods.append({'action': 'setitem', 'path': [], 'key': key, 'value': (persist, value)})
+
+    def delete(self, key):
+        del self.datasets[key]
+        self.mods.append({'action': 'delitem', 'path': [], 'key': key})
+
+
+def process_mods(dataset_db, mirror):
+    """
+    Apply the pending notifications to the mirror, like the dataset subscriber.
+    """
+    changed = set()
+    for mod in dataset_db.mods:
+        if mod['action'] == 'setitem':
+            mirror[mod['key']] = mod['value']
+        elif mod['action'] == 'delitem':
+            del mirror[mod['key']]
+        changed |= changedDatasets(mod)
+    dataset_db.mods.clear()
+    return changed
+
+
+@pytest.fixture
+def dataset_db():
+    return fake_dataset_db()
+
+
+@pytest.fixture
+def mirror(dataset_db):
+    return dict(dataset_db.datasets)
+
+
+def test_set(dataset_db, mirror):
+    datasets = ARTIQ_Datasets(dataset_db, lambda: mirror)
+    datasets.set('b', [1, 2], False)
+    assert dataset_db.datasets['b'] == (False, [1, 2])
+    # the mirror is only modified by the subscriber
+    assert 'b' not in mirror
+    assert process_mods(dataset_db, mirror) == {'b'}
+    assert datasets.get('b') == [1, 2]
+
+    datasets.set('a', 2.)
+    process_mods(dataset_db, mirror)
+    assert datasets.get('a') == 2.
+
+
+def test_delete(dataset_db, mirror):
+    datasets = ARTIQ_Datasets(dataset_db, lambda: mirror)
+    datasets.delete('a')
+    assert 'a' not in dataset_db.datasets
+    assert 'a' in mirror
+    assert process_mods(dataset_db, mirror) == {'a'}
+    with pytest.raises(Exception):
+        datasets.get('a')
+
+
+def test_without_mirror(dataset_db):
+    datasets = ARTIQ_Datasets(dataset_db, lambda: None)
+    assert datasets.get('a') == 1.
+    datasets.set('a', 3.)
+    assert datasets.get('a') == 3.
+
+
+def test_changed_datasets():
+    assert changedDatasets({'action': 'init', 'struct': {'a': 1, 'b': 2}}) == {'a', 'b'}
+    assert changedDatasets({'action': 'setitem', 'path': ['a', 1], 'key': 0, 'value': 1}) == {'a'}
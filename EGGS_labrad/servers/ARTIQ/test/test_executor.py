@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+# ARTIQ server modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artiq_executor import ARTIQ_Executor, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from artiq_api_sim import ARTIQ_API_Sim
+
+DEVICE_DB = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'config', 'device_db.py')
+
+
+class _ImmediateReactor(object):
+    """
+    Stands in for the reactor by firing results directly from the worker thread.
+    """
+    def callFromThread(self, f, *args, **kwargs):
+        f(*args, **kwargs)
+
+
+def _wait(d, timeout=5.):
+    """
+    Block until a deferred fires and return its result.
+    """
+    done = threading.Event()
+    result = {}
+
+    def _store(res):
+        result['value'] = res
+        done.set()
+    d.addBoth(_store)
+    assert done.wait(timeout)
+    return result['value']
+
+
+@pytest.fixture
+def api():
+    return ARTIQ_API_Sim(DEVICE_DB, kernel_time=0.001, time_scale=0.01)
+
+
+@pytest.fixture
+def executor():
+    executor = ARTIQ_Executor(reactor=_ImmediateReactor())
+    yield executor
+    executor.stop()
+
+
+def test_calls_run_on_single_worker_thread(api, executor):
+    dds_name = list(api.dds_dict)[0]
+    _wait(executor.submit(api.setDDSFastFTW, dds_name, 1234))
+    ftw, asf = _wait(executor.submit(api.getDDSFastWave, dds_name))
+    assert ftw == 1234
+    assert api.call_threads == {executor._thread.ident}
+
+
+def test_priority_ordering(api, executor):
+    # block the worker so later calls queue up
+    gate = threading.Event()
+    executor.submit(gate.wait)
+    order = []
+    for priority, name in ((PRIORITY_LOW, 'low'), (PRIORITY_NORMAL, 'normal'), (PRIORITY_HIGH, 'high')):
+        executor.submit(order.append, name, priority=priority)
+    last = executor.submit(lambda: None, priority=PRIORITY_LOW + 1)
+    gate.set()
+    _wait(last)
+    assert order == ['high', 'normal', 'low']
+
+
+def test_cancel_queued_calls(api, executor):
+    gate = threading.Event()
+    executor.submit(gate.wait, context=(1, 1))
+    ttl_name = list(api.ttlout_dict)[0]
+    queued = [executor.submit(api.setTTL, ttl_name, True, context=(1, 2)) for _ in range(3)]
+    other = executor.submit(api.setTTL, ttl_name, False, context=(1, 3))
+
+    assert executor.cancel((1, 2)) == 3
+    gate.set()
+    _wait(other)
+    for d in queued:
+        assert d.called
+    assert 'setTTL' in api.call_log
+    assert api.call_log.count('setTTL') == 1
+    assert executor.metrics()['cancelled'] == 3
+
+
+def test_errors_and_metrics(api, executor):
+    res = _wait(executor.submit(api.getDDSFastWave, 'not_a_dds'))
+    assert 'not found' in str(res.value)
+    _wait(executor.submit(api.getTTLCountFastCounts, list(api.ttlcounter_dict)[0], 1000, 10))
+    metrics = executor.metrics()
+    assert metrics['failed'] == 1
+    assert metrics['completed'] == 1
+    assert metrics['depth'] == 0
+    assert metrics['max_exec'] > 0
@@ -0,0 +1,50 @@
+import os
+import sys
+
+# ARTIQ server modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artiq_schedule import ARTIQ_ScheduleTracker
+
+
+def _exp(status):
+    return {'pipeline': 'main', 'expid': {'file': 'exp.py', 'class_name': 'Exp'},
+            'priority': 0, 'due_date': None, 'flush': False, 'status': status}
+
+
+def test_transitions_only():
+    tracker = ARTIQ_ScheduleTracker()
+    assert tracker.update({'action': 'init', 'struct': {1: _exp('pending')}}) is None
+
+    # experiment starts running
+    mods = [
+        {'action': 'setitem', 'path': [1], 'key': 'status', 'value': 'preparing'},
+        {'action': 'setitem', 'path': [1], 'key': 'status', 'value': 'prepare_done'},
+        {'action': 'setitem', 'path': [1], 'key': 'status', 'value': 'running'},
+    ]
+    assert [tracker.update(mod) for mod in mods] == [None, None, (True, 1)]
+
+    # queueing and preparing another experiment doesn't change anything
+    mods = [
+        {'action': 'setitem', 'path': [], 'key': 2, 'value': _exp('pending')},
+        {'action': 'setitem', 'path': [2], 'key': 'status', 'value': 'preparing'},
+        {'action': 'setitem', 'path': [2], 'key': 'priority', 'value': 5},
+        {'action': 'setitem', 'path': [1], 'key': 'status', 'value': 'running'},
+    ]
+    assert [tracker.update(mod) for mod in mods] == [None] * 4
+
+    # first experiment finishes and second starts
+    mods = [
+        {'action': 'setitem', 'path': [1], 'key': 'status', 'value': 'run_done'},
+        {'action': 'setitem', 'path': [2], 'key': 'status', 'value': 'running'},
+        {'action': 'delitem', 'path': [], 'key': 1},
+        {'action': 'delitem', 'path': [], 'key': 2},
+    ]
+    assert [tracker.update(mod) for mod in mods] == [(False, -1), (True, 2), None, (False, -1)]
+    assert tracker.running == set()
+
+
+def test_init_running():
+    tracker = ARTIQ_ScheduleTracker()
+    assert tracker.update({'action': 'init', 'struct': {3: _exp('running'), 4: _exp('pending')}}) == (True, 3)
+    assert tracker.update({'action': 'init', 'struct': {3: _exp('running')}}) is None
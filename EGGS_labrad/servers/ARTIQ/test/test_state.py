@@ -0,0 +1,159 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# ARTIQ server modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artiq_state import ARTIQ_State, StateBatch, applyStateBatch
+from artiq_api_sim import ARTIQ_API_Sim
+
+DEVICE_DB = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'config', 'device_db.py')
+
+
+@pytest.fixture
+def api():
+    return ARTIQ_API_Sim(DEVICE_DB, kernel_time=0., dac_type='Zotino')
+
+
+@pytest.fixture
+def state(api):
+    state = ARTIQ_State(list(api.dds_dict.keys()), list(api.ttlout_dict.keys()))
+    state.updateDDSAll(api.getDDSAll())
+    return state
+
+
+def test_seed_from_hardware(api, state):
+    dds_name = state.dds_names[0]
+    assert state.getDDS(dds_name, 'att') == 0xFF
+    assert state.getDDS(dds_name, 'onoff') == 0
+    # phase isn't returned by getDDSAll
+    assert state.getDDS(dds_name, 'pow') is None
+    assert np.array_equal(state.getDDSAll(), api.getDDSAll())
+
+
+def test_getters_do_not_access_hardware(api, state):
+    dds_name = state.dds_names[1]
+    api.setDDSFastFTW(dds_name, 1000)
+    state.setDDS(dds_name, 'ftw', 1000)
+    api.call_log.clear()
+    assert state.getDDS(dds_name, 'ftw') == 1000
+    assert state.getDDSAll()[1, 0] == 1000
+    assert api.call_log == []
+
+
+def test_reconcile_reports_changes(api, state):
+    dds_name = state.dds_names[2]
+    # change hardware behind the server's back (e.g. from an experiment)
+    api.setDDSFastASF(dds_name, 0x3FFF)
+    api.setDDSFastSW(dds_name, True)
+    changes = state.updateDDSAll(api.getDDSAll())
+    assert sorted(changes) == [(dds_name, 'asf', 0x3FFF), (dds_name, 'onoff', 1)]
+    assert state.updateDDSAll(api.getDDSAll()) == []
+
+
+def test_invalidate(state):
+    dds_name = state.dds_names[0]
+    state.invalidateDDS(dds_name)
+    assert state.getDDS(dds_name, 'ftw') is None
+    assert state.getDDSAll() is None
+
+
+def test_ttl_and_dac(state):
+    ttl_name = list(state.ttl.keys())[0]
+    assert state.getTTL(ttl_name) is None
+    state.setTTL(ttl_name, 1)
+    assert state.getTTL(ttl_name) is True
+    state.setDAC(3, 'dac', 0x8000)
+    state.setDAC(-1, 'ofs', 0x2000)
+    assert state.getDAC(3) == 0x8000
+    assert state.getDAC(-1, 'ofs') == 0x2000
+    state.invalidateDAC()
+    assert state.getDAC(3) is None
+
+
+def apply_state(api, state, updates):
+    """
+    Apply updates with the same function as the server's Apply State setting,
+        calling the API directly instead of through the executor.
+    """
+    batch = StateBatch(updates, api.ttlout_dict_search_num, api.dds_dict_search_num, api.dacType)
+    # note: the API is called directly, so the Deferred has already fired
+    failures = list()
+    applyStateBatch(api, state, batch).addErrback(failures.append)
+    if failures:
+        failures[0].raiseException()
+    return batch.status().tolist()
+
+
+def test_apply_state(api, state):
+    ttl_name = list(api.ttlout_dict.keys())[1]
+    dds_name, other_dds = state.dds_names[:2]
+    dds_num = api.dds_dict_search_num[dds_name]
+    state.setDDS(dds_name, 'pow', 0)
+    api.setDDSFastASF(dds_name, 0x1000)
+    state.updateDDSAll(api.getDDSAll())
+    api.call_log.clear()
+
+    status = apply_state(api, state, [
+        (ttl_name, 'state', 1),
+        (dds_name, 'freq', 100e6),
+        (dds_name, 'phase', 0.5),
+        (other_dds, 'att', 10.),
+        (other_dds, 'onoff', 1),
+        ('dac3', 'v', 5.),
+        ('dac4', 'mu', 0x1234),
+        # invalid updates
+        (ttl_name, 'state', 2),
+        ('nonexistent', 'freq', 1e6),
+        (dds_name, 'ampl', 1.5),
+        ('dac5', 'v', 10.),
+        ('dac40', 'mu', 0),
+    ])
+    assert status == [True] * 7 + [False] * 5
+    # all TTL and DDS updates are applied in a single kernel
+    assert api.call_log == ['setStateBatch', 'setZotino', 'setZotino']
+
+    # TTL
+    assert api._ttl_state[ttl_name] is True
+    assert state.getTTL(ttl_name) is True
+    # DDS: waveform updates are merged with the current amplitude
+    assert tuple(api._dds_state[dds_num, :3]) == (429496729, 0x1000, 0x7FFF)
+    assert state.getDDS(dds_name, 'ftw') == 429496729
+    other_num = api.dds_dict_search_num[other_dds]
+    assert tuple(api._dds_state[other_num, 3:]) == (0xFF - 80, 1)
+    assert state.getDDS(other_dds, 'att') == 0xFF - 80
+    # DAC
+    assert api._dac_state['dac'][3] == 0xC000
+    assert api._dac_state['dac'][4] == 0x1234
+    assert state.getDAC(3) == 0xC000
+    assert state.getDAC(5) is None
+
+
+def test_apply_state_unknown_waveform():
+    api = ARTIQ_API_Sim(DEVICE_DB, kernel_time=0., dac_type='Fastino')
+    state = ARTIQ_State(list(api.dds_dict.keys()), list(api.ttlout_dict.keys()))
+    dds_name = state.dds_names[0]
+    for param, value_mu in (('ftw', 1000), ('asf', 0x2000), ('pow', 0x100)):
+        api.setDDS(dds_name, param, value_mu)
+    api.call_log.clear()
+
+    status = apply_state(api, state, [(dds_name, 'freq', 100e6), ('dac3', 'mu', 0x4000)])
+    assert status == [True, True]
+    # the current waveform is read from hardware since it isn't known,
+    # and the DAC is written with the DAC type's function
+    assert api.call_log == ['getDDSFastWave', 'getDDS', 'setStateBatch', 'setFastino']
+    dds_num = api.dds_dict_search_num[dds_name]
+    assert tuple(api._dds_state[dds_num, :3]) == (429496729, 0x2000, 0x100)
+    assert state.getDDS(dds_name, 'pow') == 0x100
+    assert api._dac_state['dac'][3] == 0x4000
+    assert state.getDAC(3) == 0x4000
+
+
+def test_apply_state_without_dac():
+    api = ARTIQ_API_Sim(DEVICE_DB, kernel_time=0.)
+    batch = StateBatch([('dac3', 'v', 1.)], api.ttlout_dict_search_num, api.dds_dict_search_num, api.dacType)
+    assert batch.status().tolist() == [False]
+    assert batch.dacUpdates() == []
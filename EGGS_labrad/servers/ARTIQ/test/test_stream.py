@@ -0,0 +1,122 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# ARTIQ server modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from labrad import types as T
+
+from artiq_stream import CountStream, SamplerStream, readSamplerBlocks, COUNT_SIGNAL_TYPE, ADC_SIGNAL_TYPE, SAMPLER_MAX_BLOCK
+from artiq_api_sim import ARTIQ_API_Sim
+
+DEVICE_DB = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'config', 'device_db.py')
+
+
+@pytest.fixture
+def api():
+    return ARTIQ_API_Sim(DEVICE_DB, kernel_time=0., time_scale=0., count_rate=1e5)
+
+
+def test_count_stream_blocks(api):
+    ttl_name = list(api.ttlcounter_dict.keys())[0]
+    stream = CountStream(ttl_name, gate_us=1000, block_size=50, buffer_size=120)
+    for i in range(3):
+        stream.add(api.getTTLCountFastCounts(ttl_name, stream.gate_us, stream.block_size), time_end=10. + i)
+
+    # buffer is bounded and keeps the most recent bins
+    timestamps, counts = stream.latest()
+    assert len(counts) == 120
+    assert timestamps[-1] == pytest.approx(12.)
+    assert np.all(np.diff(timestamps) > 0)
+    # bins within a block are spaced by the gate time
+    assert timestamps[-1] - timestamps[-2] == pytest.approx(1e-3)
+
+    # poisson counts at 100 counts per bin
+    mean, std = stream.stats()
+    assert mean == pytest.approx(100, rel=0.2)
+    assert std == pytest.approx(10, rel=0.5)
+
+
+def test_count_stream_pending(api):
+    ttl_name = list(api.ttlcounter_dict.keys())[0]
+    stream = CountStream(ttl_name, gate_us=1000, block_size=10)
+    assert stream.popPending() is None
+
+    stream.add(np.full(10, 4))
+    stream.add(np.full(10, 6))
+    num_bins, mean, std = stream.popPending()
+    assert (num_bins, mean, std) == (20, 5., 1.)
+    # pending bins are cleared, but the buffer is kept
+    assert stream.popPending() is None
+    assert stream.stats(10) == (6., 0.)
+
+
+def test_sampler_stream_conversion(api):
+    # channel 0 at 2 V/mu, channel 3 at 0.5 V/mu
+    volts_per_mu = np.ones(8)
+    volts_per_mu[0], volts_per_mu[3] = 2., 0.5
+    stream = SamplerStream([0, 3], rate_hz=1000, block_size=8, volts_per_mu=volts_per_mu, decimation=4)
+    samples_mu = np.tile(np.arange(8), (8, 1)) * np.arange(8)[:, np.newaxis]
+    stream.add(samples_mu, time_end=5.)
+
+    timestamps, values = stream.latest()
+    # values are averaged over groups of 4 samples
+    np.testing.assert_allclose(values, [[0., 1.5 * 3 * 0.5], [0., 5.5 * 3 * 0.5]])
+    np.testing.assert_allclose(timestamps, [4.996, 5.])
+    np.testing.assert_allclose(stream.popPending(), np.mean(values, axis=0))
+
+    with pytest.raises(Exception):
+        SamplerStream([0], rate_hz=1000, block_size=10, volts_per_mu=volts_per_mu, decimation=4)
+    # blocks are stored on the core device stack, so their size is limited
+    with pytest.raises(Exception):
+        SamplerStream([0], rate_hz=1e4, block_size=2 * SAMPLER_MAX_BLOCK, volts_per_mu=volts_per_mu)
+
+
+def test_sampler_read_blocks(api):
+    # reads larger than a single kernel call are split into blocks
+    samples = 10 * SAMPLER_MAX_BLOCK + 2
+    with pytest.raises(Exception):
+        api.readSampler(1e4, samples)
+    samples_mu = readSamplerBlocks(api.readSampler, 1e4, samples)
+    assert samples_mu.shape == (samples, 8)
+    # (including the rejected read above)
+    assert api.call_log.count('readSampler') == 1 + 11
+
+    # a failed kernel doesn't return a partial read
+    with pytest.raises(Exception):
+        readSamplerBlocks(lambda rate_hz, num: None, 1e4, samples)
+
+
+def test_signal_payloads(api):
+    # the signal payloads must flatten to the types the server declares for the signals
+    ttl_name = list(api.ttlcounter_dict.keys())[0]
+    count_stream = CountStream(ttl_name, gate_us=1000, block_size=10)
+    count_stream.add(np.full(10, 4))
+    T.flatten(count_stream.popSignal(), COUNT_SIGNAL_TYPE)
+    assert count_stream.popSignal() is None
+
+    sampler_stream = SamplerStream([0, 3], rate_hz=1000, block_size=8, volts_per_mu=np.ones(8))
+    sampler_stream.add(np.ones((8, 8)))
+    payload = sampler_stream.popSignal()
+    T.flatten(payload, ADC_SIGNAL_TYPE)
+    assert payload == ([1., 1.],)
+    assert sampler_stream.popSignal() is None
+
+
+def test_sampler_stream_throughput(api):
+    # convert many blocks from the simulated backend
+    stream = SamplerStream(range(8), rate_hz=1e4, block_size=1000, volts_per_mu=np.full(8, 1e-3),
+                           decimation=10, buffer_size=2000)
+    for i in range(100):
+        stream.add(api.readSampler(stream.rate_hz, stream.block_size))
+
+    timestamps, values = stream.latest()
+    assert values.shape == (2000, 8)
+    assert stream.buffer.count == 100 * 100
+    # decimation averages down the simulated noise (sigma = 100 mu)
+    mean, std = stream.stats()
+    np.testing.assert_allclose(mean, 0, atol=0.01)
+    assert np.all(std < 100 * 1e-3 / np.sqrt(10) * 1.5)
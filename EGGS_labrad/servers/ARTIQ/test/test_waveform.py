@@ -0,0 +1,64 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# ARTIQ server modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artiq_waveform import dac_voltage_to_mu, validateDACWaveform, chunkDACWaveform
+from artiq_api_sim import ARTIQ_API_Sim
+
+DEVICE_DB = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'config', 'device_db.py')
+
+
+def test_voltage_to_mu():
+    np.testing.assert_array_equal(dac_voltage_to_mu([-10., 0., 5., 9.9997]), [0, 0x8000, 0xC000, 0xFFFF])
+    with pytest.raises(Exception):
+        dac_voltage_to_mu([0., 10.])
+
+
+def test_validate():
+    channels, waveform_mu = validateDACWaveform([3], np.linspace(-1, 1, 5), 1e-5, 'Zotino')
+    assert waveform_mu.shape == (5, 1)
+    assert waveform_mu[2, 0] == 0x8000
+
+    # invalid channels, shape, timing, and units
+    with pytest.raises(Exception):
+        validateDACWaveform([32], np.zeros((5, 1)), 1e-5, 'Zotino')
+    with pytest.raises(Exception):
+        validateDACWaveform([1, 1], np.zeros((5, 2)), 1e-5, 'Zotino')
+    with pytest.raises(Exception):
+        validateDACWaveform([1, 2], np.zeros((5, 3)), 1e-5, 'Zotino')
+    with pytest.raises(Exception):
+        validateDACWaveform(list(range(10)), np.zeros((5, 10)), 1e-5, 'Zotino')
+    with pytest.raises(Exception):
+        validateDACWaveform([1], np.zeros((5, 1)), 1e-5, 'Zotino', units='mv')
+    with pytest.raises(Exception):
+        validateDACWaveform([1], np.zeros((5, 1)), 1e-5, None)
+
+
+def test_chunking():
+    waveform_mu = np.arange(3 * 1000, dtype=np.int32).reshape(1000, 3)
+    chunks = chunkDACWaveform('ramp', waveform_mu, chunk_samples=300)
+    assert [name for name, _ in chunks] == ['ramp_{:d}'.format(i) for i in range(10)]
+    # chunks hold whole samples and join back into the waveform
+    assert all(len(chunk) == 300 for _, chunk in chunks)
+    np.testing.assert_array_equal(np.concatenate([chunk for _, chunk in chunks]), waveform_mu.ravel())
+
+
+def test_sim_playback():
+    api = ARTIQ_API_Sim(DEVICE_DB, kernel_time=0., time_scale=0., dac_type='Fastino')
+    channels, waveform_mu = validateDACWaveform([0, 5], np.random.uniform(-5, 5, (10000, 2)), 1e-5, api.dacType)
+    num_chunks = api.recordDACWaveform('noise', channels, waveform_mu, 1e-5)
+    assert num_chunks == len(api.dma_sequences) == 5
+
+    # re-recording replaces the old sequences
+    api.recordDACWaveform('noise', channels, waveform_mu[:10], 1e-5)
+    assert list(api.dma_sequences.keys()) == ['noise_0']
+
+    api.playDACWaveform('noise', 3)
+    np.testing.assert_array_equal(api._dac_state['dac'][channels], waveform_mu[9])
+    api.eraseDACWaveform('noise')
+    assert len(api.dma_sequences) == 0
@@ -12,7 +12,8 @@ __all__.extend(["Signal", "LabradServer", "setting"])
 
 # gpib and device servers
 from labrad.devices import DeviceWrapper
-from labrad.gpib import GPIBDeviceWrapper, GPIBManagedServer, ManagedDeviceServer
+from labrad.gpib import GPIBManagedServer, ManagedDeviceServer
+from EGGS_labrad.servers.gpib.gpib_device_wrapper import GPIBDeviceWrapper
 __all__.extend(["DeviceWrapper", "ManagedDeviceServer", "GPIBDeviceWrapper", "GPIBManagedServer"])
 
 # serial servers
@@ -24,3 +25,8 @@ __all__.extend(serialdeviceserver.__all__)
 from EGGS_labrad.servers import server_classes
 from EGGS_labrad.servers.server_classes import *
 __all__.extend(server_classes.__all__)
+
+# utilities
+from EGGS_labrad.servers import ring_buffer
+from EGGS_labrad.servers.ring_buffer import *
+__all__.extend(ring_buffer.__all__)
@@ -11,12 +11,17 @@
 #   Removed *CLS call in lookupDeviceName
 # 1.4.3:
 #   Added support for pattern matching to allow wrappers to cover a broader range of devices.
+# 1.5.0:
+#   Devices and identification servers are now queried concurrently (bounded by MAX_CONCURRENT_IDENT).
+#   The client is refreshed once per identification round instead of before every ident attempt.
+#   *IDN? -> device name results from ident functions are cached in the registry.
+#   Identification timing is recorded and available via 'Identification Times'.
 #
 """
 ### BEGIN NODE INFO
 [info]
 name = GPIB Device Manager
-version = 1.4.3
+version = 1.5.0
 description = Manages discovery and lookup of GPIB devices
 
 [startup]
@@ -29,8 +34,9 @@ timeout = 5
 ### END NODE INFO
 """
 import re
+from time import time
 from twisted.internet.reactor import callLater
-from twisted.internet.defer import DeferredList, DeferredLock
+from twisted.internet.defer import DeferredList, DeferredSemaphore
 
 from labrad.units import Value
 from labrad.server import LabradServer, setting, inlineCallbacks, returnValue
@@ -67,7 +73,12 @@ class GPIBDeviceManager(LabradServer):
     by the device manager to properly identify the device.
     """
     name = 'GPIB Device Manager'
-    
+
+    # registry directory holding the identification cache
+    registryDirectory = ['', 'Servers', 'GPIB Device Manager']
+    # maximum number of identification queries to run at once
+    MAX_CONCURRENT_IDENT = 4
+
     @inlineCallbacks
     def initServer(self):
         """
@@ -77,7 +88,13 @@ class GPIBDeviceManager(LabradServer):
         self.deviceServers =    {}      # maps device name to list of interested servers.
                                         # each interested server is {'target':<>,'context':<>,'messageID':<>}
         self.identFunctions =   {}      # maps server to (setting, ctx) for ident
-        self.identLock = DeferredLock()
+        self.identCache =       {}      # maps *IDN? response to device name found by an ident function
+        self.identTimes =       {}      # maps (server, channel) to the time taken to identify the device
+        self.identSemaphore = DeferredSemaphore(self.MAX_CONCURRENT_IDENT)
+
+        # load identification cache from the registry
+        self._regContext = self.client.context()
+        yield self._loadIdentCache()
         
         # named messages are sent with source ID first, which we ignore
         # python 3 no longer supports tuple unpacking, so we have to unpack it manually
@@ -109,13 +126,20 @@ class GPIBDeviceManager(LabradServer):
         serverNames = [s.name for s in servers]
         print('Pinging servers: {}'.format(serverNames))
         resp = yield DeferredList([s.list_devices() for s in servers])
+
+        # refresh the client once, then identify all devices concurrently
+        start_time = time()
+        yield self.client.refresh()
+        connections = []
         for serverName, (success, addrs) in zip(serverNames, resp):
             if not success:
                 print('Failed to get device list for: {}'.format(serverName))
             else:
                 print('{} has devices: {}'.format(serverName, addrs))
                 for addr in addrs:
-                    self.gpib_device_connect(serverName, addr)
+                    connections.append(self.gpib_device_connect(serverName, addr, refresh=False))
+        yield DeferredList(connections)
+        print('Identified {:d} devices in {:.3f} s.'.format(len(connections), time() - start_time))
 
     @inlineCallbacks
     def lookupDeviceName(self, server, channel):
@@ -131,7 +155,7 @@ class GPIBDeviceManager(LabradServer):
         print('Sending *IDN? to: {}'.format((server, channel)))
         resp = None
         try:
-            resp = (yield p.send()).query
+            resp = (yield self.identSemaphore.run(p.send)).query
             name = parseIDNResponse(resp)
         except Exception as e:
             print('Error sending *IDN? to: {}'.format((server, channel)))
@@ -139,38 +163,61 @@ class GPIBDeviceManager(LabradServer):
             name = UNKNOWN
         returnValue((name, resp))
 
+    @inlineCallbacks
     def identifyDevice(self, server, channel, idn):
         """
         Try to identify a new device with all ident functions.
 
-        Returns the first name returned by a successful identification.
+        The cached result for the *IDN? response is used if one exists.
+        Otherwise, all ident functions are tried concurrently, and the name
+        returned by the first successful identification (in order of
+        registration) is returned.
         """
-        @inlineCallbacks
-        def _doIdentifyDevice():
-            for identifier in list(self.identFunctions.keys()):
-                name = yield self.tryIdentFunc(server, channel, idn, identifier)
-                if name is not None:
-                    returnValue(name)
-            returnValue(UNKNOWN)
-        return self.identLock.run(_doIdentifyDevice)
+        # check the cache first
+        if (idn is not None) and (idn in self.identCache):
+            name = self.identCache[idn]
+            print('Device {} identified from cache as "{}"'.format((server, channel), name))
+            returnValue(name)
+
+        # try all ident functions at once
+        identifiers = list(self.identFunctions.keys())
+        resp = yield DeferredList([
+            self.tryIdentFunc(server, channel, idn, identifier)
+            for identifier in identifiers
+        ])
+        for success, name in resp:
+            if success and (name is not None):
+                yield self._cacheIdent(idn, name)
+                returnValue(name)
+        returnValue(UNKNOWN)
 
+    @inlineCallbacks
     def identifyDevicesWithServer(self, identifier):
         """
         Try to identify all unknown devices with a new server.
         """
+        start_time = time()
+        yield self.client.refresh()
+
         @inlineCallbacks
-        def _doServerIdentify():
-            #yield self.client.refresh()
-            for (server, channel), (device, idn) in list(self.knownDevices.items()):
-                if device != UNKNOWN:
-                    continue
-                name = yield self.tryIdentFunc(server, channel, idn, identifier)
-                if name is None:
-                    continue
-                self.knownDevices[server, channel] = (name, idn)
-                if name in self.deviceServers:
-                    self.notifyServers(name, server, channel, True)
-        return self.identLock.run(_doServerIdentify)        
+        def _doServerIdentify(server, channel, idn):
+            name = yield self.tryIdentFunc(server, channel, idn, identifier)
+            # ensure device is still connected and unidentified
+            if (name is None) or (self.knownDevices.get((server, channel)) != (UNKNOWN, idn)):
+                return
+            yield self._cacheIdent(idn, name)
+            self.knownDevices[server, channel] = (name, idn)
+            if name in self.deviceServers:
+                self.notifyServers(name, server, channel, True)
+
+        unknown_devices = [
+            (server, channel, idn)
+            for (server, channel), (device, idn) in list(self.knownDevices.items())
+            if device == UNKNOWN
+        ]
+        yield DeferredList([_doServerIdentify(*device_info) for device_info in unknown_devices])
+        print('Tried to identify {:d} unknown devices with {} in {:.3f} s.'.format(
+            len(unknown_devices), identifier, time() - start_time))
 
     @inlineCallbacks
     def tryIdentFunc(self, server, channel, idn, identifier):
@@ -179,10 +226,10 @@ class GPIBDeviceManager(LabradServer):
 
         If the identification succeeds, returns the new name,
         otherwise returns None.
+        Note: the client must have been refreshed after the
+        identification server connected.
         """
         try:
-            # todo: is this client refresh necessary?
-            yield self.client.refresh()
             s = self.client[identifier]
             setting, context = self.identFunctions[identifier]
 
@@ -191,9 +238,9 @@ class GPIBDeviceManager(LabradServer):
             print('with *IDN?:', repr(idn))
 
             if idn is None:
-                resp = yield s[setting](server, channel, context=context)
+                resp = yield self.identSemaphore.run(s[setting], server, channel, context=context)
             else:
-                resp = yield s[setting](server, channel, idn, context=context)
+                resp = yield self.identSemaphore.run(s[setting], server, channel, idn, context=context)
 
             if resp is not None:
                 print('Server {} identified device {} {} as "{}"'.format(identifier, server, channel, resp))
@@ -207,20 +254,28 @@ class GPIBDeviceManager(LabradServer):
     SIGNAL FUNCTIONS
     '''
     @inlineCallbacks
-    def gpib_device_connect(self, gpibBusServer, channel):
+    def gpib_device_connect(self, gpibBusServer, channel, refresh=True):
         """
         Handle messages when devices connect.
+        Arguments:
+            gpibBusServer   (str)   : the name of the GPIB bus server.
+            channel         (str)   : the device address.
+            refresh         (bool)  : whether to refresh the client first. Can be
+                                        False if the caller has already refreshed it.
         """
         print('Device Connect: {}'.format((gpibBusServer, channel)))
         if (gpibBusServer, channel) in self.knownDevices:
             return
 
         # attempt to identify device by querying *IDN?
-        yield self.client.refresh()
+        start_time = time()
+        if refresh:
+            yield self.client.refresh()
         device, idnResult = yield self.lookupDeviceName(gpibBusServer, channel)
         # if that fails, try other ident functions
         if device == UNKNOWN:
             device = yield self.identifyDevice(gpibBusServer, channel, idnResult)
+        self.identTimes[gpibBusServer, channel] = time() - start_time
 
         # forward message if someone cares about this device
         self.knownDevices[gpibBusServer, channel] = (device, idnResult)
@@ -238,6 +293,7 @@ class GPIBDeviceManager(LabradServer):
         # todo: document
         device, idnResult = self.knownDevices[server, channel]
         del self.knownDevices[server, channel]
+        self.identTimes.pop((server, channel), None)
 
         # forward message if someone cares about this device
         if device in self.deviceServers:
@@ -305,6 +361,39 @@ class GPIBDeviceManager(LabradServer):
             del self.identFunctions[src]
 
 
+    '''
+    IDENTIFICATION CACHE
+    '''
+    @inlineCallbacks
+    def _loadIdentCache(self):
+        """
+        Load the *IDN? -> device name cache from the registry.
+        """
+        reg = self.client.registry
+        try:
+            yield reg.cd(self.registryDirectory, True, context=self._regContext)
+            _, keys = yield reg.dir(context=self._regContext)
+            if 'Ident Cache' in keys:
+                cache = yield reg.get('Ident Cache', context=self._regContext)
+                self.identCache = dict(cache)
+            print('Loaded {:d} cached identifications.'.format(len(self.identCache)))
+        except Exception as e:
+            print('Error loading identification cache: {}'.format(e))
+
+    @inlineCallbacks
+    def _cacheIdent(self, idn, name):
+        """
+        Store an identification result in the cache and save it to the registry.
+        """
+        if (idn is None) or (self.identCache.get(idn) == name):
+            return
+        self.identCache[idn] = name
+        try:
+            yield self.client.registry.set('Ident Cache', list(self.identCache.items()), context=self._regContext)
+        except Exception as e:
+            print('Error saving identification cache: {}'.format(e))
+
+
     '''
     SETTINGS
     '''
@@ -386,6 +475,26 @@ class GPIBDeviceManager(LabradServer):
                 str(self.deviceServers),
                 str(self.identFunctions))
 
+    @setting(11, 'Identification Times', returns='*(ssv)')
+    def identification_times(self, c):
+        """
+        Returns the time taken to identify each known device.
+
+        Returns:
+            list(str, str, float):  a list of (GPIB bus server, device address, identification time in seconds).
+        """
+        return [(server, channel, ident_time) for (server, channel), ident_time in self.identTimes.items()]
+
+    @setting(12, 'Clear Ident Cache', returns='')
+    def clear_ident_cache(self, c):
+        """
+        Clear the cached *IDN? -> device name mappings, both locally and in the registry.
+        """
+        self.identCache = {}
+        _, keys = yield self.client.registry.dir(context=self._regContext)
+        if 'Ident Cache' in keys:
+            yield self.client.registry.del_('Ident Cache', context=self._regContext)
+
 
 __server__ = GPIBDeviceManager()
 
@@ -0,0 +1,90 @@
+"""
+Extends labrad's GPIBDeviceWrapper with IEEE-488.2 binary block transfers.
+"""
+import numpy as np
+from twisted.internet.defer import inlineCallbacks, returnValue
+
+from labrad.gpib import GPIBDeviceWrapper as _GPIBDeviceWrapper
+
+__all__ = ["GPIBDeviceWrapper", "parseBlockHeader", "parseBinaryBlock"]
+
+
+def parseBlockHeader(data):
+    """
+    Parse the header of an IEEE-488.2 definite length arbitrary block.
+    The block has the form #NXXXXXXXXX<payload>, where N is the number
+    of digits used to specify the payload length XXXXXXXXX (in bytes).
+    Arguments:
+        data    (bytes):    the raw block (leading whitespace/headers are skipped).
+    Returns:
+                (int, int): the index of the first payload byte and the payload length (in bytes).
+    """
+    # skip any command header (e.g. "CURV ") echoed before the block
+    start = data.find(b'#')
+    if (start < 0) or (len(data) < start + 2):
+        raise Exception('Error: response is not an IEEE-488.2 binary block.')
+
+    # get number of length digits
+    num_digits = int(data[start + 1: start + 2])
+    if num_digits == 0:
+        raise Exception('Error: indefinite length binary blocks are not supported.')
+
+    # get payload length
+    payload_start = start + 2 + num_digits
+    payload_length = int(data[start + 2: payload_start])
+    return payload_start, payload_length
+
+
+def parseBinaryBlock(data, dtype='u1'):
+    """
+    Convert an IEEE-488.2 definite length arbitrary block to an array.
+    Arguments:
+        data    (bytes):        the raw block, including the #NXXXXXXXXX header.
+        dtype   (str/dtype):    the numpy dtype of the payload, including endianness (e.g. '>i2', '<f4').
+    Returns:
+                (np.array):     the payload as an array of the given dtype.
+    """
+    payload_start, payload_length = parseBlockHeader(data)
+    payload = data[payload_start: payload_start + payload_length]
+    if len(payload) < payload_length:
+        raise Exception('Error: binary block is truncated ({:d}/{:d} bytes).'.format(len(payload), payload_length))
+    return np.frombuffer(payload, dtype=np.dtype(dtype))
+
+
+class GPIBDeviceWrapper(_GPIBDeviceWrapper):
+    """
+    A GPIBDeviceWrapper that can also read IEEE-488.2 binary blocks.
+    """
+
+    @inlineCallbacks
+    def query_binary(self, query, dtype='u1', timeout=None):
+        """
+        Query the device for a definite length binary block and convert it to an array.
+        The raw bytes are transferred as-is and only parsed once the full block has arrived,
+        which avoids the overhead of ASCII transfer and string parsing for long traces.
+        Arguments:
+            query   (str):          the query to send.
+            dtype   (str/dtype):    the numpy dtype of the payload, including endianness (e.g. '>i2', '<f4').
+            timeout (WithUnit):     the timeout to use for the transfer.
+        Returns:
+                    (np.array):     the payload as an array of the given dtype.
+        """
+        # write query and read the response in a single packet
+        p = self._packet()
+        if timeout is not None:
+            p.timeout(timeout)
+        p.write(query)
+        p.read_raw()
+        if timeout is not None:
+            p.timeout(self._timeout)
+        resp = yield p.send()
+        data = bytes(resp.read_raw)
+
+        # keep reading if the block contains a termination character and was cut short
+        payload_start, payload_length = parseBlockHeader(data)
+        while len(data) < payload_start + payload_length:
+            remaining = payload_start + payload_length - len(data)
+            chunk = yield self.read_raw(remaining, timeout=timeout)
+            data += bytes(chunk)
+
+        returnValue(parseBinaryBlock(data, dtype))
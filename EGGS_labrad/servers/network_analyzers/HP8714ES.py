@@ -1,5 +1,5 @@
 import numpy as np
-from labrad.gpib import GPIBDeviceWrapper
+from EGGS_labrad.servers import GPIBDeviceWrapper
 from twisted.internet.defer import inlineCallbacks, returnValue
 
 
@@ -216,4 +216,16 @@ class HP8714ESWrapper(GPIBDeviceWrapper):
 
     @inlineCallbacks
     def traceAcquire(self, channel):
-        raise NotImplementedError
+        # set data format to big-endian 32-bit floats
+        yield self.write('FORM:DATA REAL,32')
+        yield self.write('FORM:BORD NORM')
+
+        # get formatted trace data as a binary block
+        data = yield self.query_binary('TRAC? CH{:d}FDATA'.format(channel), dtype='>f4')
+
+        # create x-axis
+        freq_start = yield self.query('SENS{:d}:FREQ:STAR?'.format(channel))
+        freq_stop = yield self.query('SENS{:d}:FREQ:STOP?'.format(channel))
+        xAxis = np.linspace(float(freq_start), float(freq_stop), len(data))
+
+        returnValue((xAxis, data))
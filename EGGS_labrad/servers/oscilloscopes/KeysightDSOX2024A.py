@@ -2,7 +2,7 @@ import numpy as np
 from twisted.internet.defer import inlineCallbacks, returnValue
 
 
-from labrad.gpib import GPIBDeviceWrapper
+from EGGS_labrad.servers import GPIBDeviceWrapper
 
 
 class KeysightDSOX2024AWrapper(GPIBDeviceWrapper):
@@ -185,41 +185,56 @@ class KeysightDSOX2024AWrapper(GPIBDeviceWrapper):
 
     # ACQUISITION
     @inlineCallbacks
-    def trace(self, channel, points=1250000):
+    def trace(self, channel, points=None):
         """
         Get a trace for a single channel.
         Arguments:
             channel: The channel for which we want to get the trace.
+            points: The number of points to transfer. If None, transfers the entire waveform.
         Returns:
             Tuple of ((ValueArray[s]) Time axis, (ValueArray[V]) Voltages).
         """
         # first need to stop oscilloscope to record
         yield self.write(':STOP')
 
-        # set channel to take trace on
-        yield self.write(':WAV:SOUR CHAN{:d}'.format(channel))
-        # use raw mode which gives us the entire on-screen waveform with full horizontal resolution
-        yield self.write(':WAV:POIN:MODE RAW')
-        # return format (default byte), use ASC or WORD for better vertical resolution
-        yield self.write(':WAV:FORM BYTE')
+        # transfer waveform
+        yield self._setupTransfer(points)
+        preamble, yAxis = yield self._transferWaveform(channel)
 
-        # transfer waveform preamble
-        preamble = yield self.query(':WAV:PRE?')
-        # get waveform data
-        data = yield self.query(':WAV:DATA?')
+        # start oscope back up
+        yield self.write(':RUN')
+
+        xAxis = self._timeAxis(preamble, len(yAxis))
+        returnValue((xAxis, yAxis))
+
+    @inlineCallbacks
+    def traces(self, channels, points=None):
+        """
+        Get traces for multiple channels from a single acquisition.
+        Arguments:
+            channels: The channels for which we want to get the traces.
+            points: The number of points to transfer. If None, transfers the entire waveform.
+        Returns:
+            Tuple of ((ValueArray[s]) Time axis, (2D array[V]) Voltages, with one row per channel).
+        """
+        # acquire a single waveform on all channels at once; scope stops afterwards
+        yield self.write(':DIG ' + ','.join('CHAN{:d}'.format(channel) for channel in channels))
+        yield self.query('*OPC?')
+
+        # transfer each channel from the same acquisition
+        yield self._setupTransfer(points)
+        yAxes = []
+        for channel in channels:
+            preamble, yAxis = yield self._transferWaveform(channel)
+            yAxes.append(yAxis)
 
         # start oscope back up
         yield self.write(':RUN')
 
-        # parse waveform preamble
-        points, xincrement, xorigin, xreference, yincrement, yorigin, yreference = yield self._parsePreamble(preamble)
-        # parse data
-        trace = yield self._parseByteData(data)
+        # all channels share the same timebase
+        xAxis = self._timeAxis(preamble, len(yAxes[0]))
+        returnValue((xAxis, np.array(yAxes)))
 
-        # convert data to volts
-        xAxis = (np.arange(points) * xincrement + xorigin)
-        yAxis = (trace - yorigin - yreference) * yincrement
-        returnValue((xAxis, yAxis))
 
     # MEASURE
     @inlineCallbacks
@@ -259,7 +274,41 @@ class KeysightDSOX2024AWrapper(GPIBDeviceWrapper):
         returnValue(float(measure_val))
 
     # HELPER
-    def _parsePreamble(preamble):
+    @inlineCallbacks
+    def _setupTransfer(self, points=None):
+        """
+        Configure the waveform transfer format.
+        """
+        # use raw mode which gives us the entire on-screen waveform with full horizontal resolution
+        yield self.write(':WAV:POIN:MODE RAW')
+        if points is not None:
+            yield self.write(':WAV:POIN {:d}'.format(points))
+        # return format (default byte), use WORD for better vertical resolution
+        yield self.write(':WAV:FORM BYTE')
+
+    @inlineCallbacks
+    def _transferWaveform(self, channel):
+        """
+        Transfer the waveform of a single channel and convert it to volts.
+        """
+        yield self.write(':WAV:SOUR CHAN{:d}'.format(channel))
+        # transfer waveform preamble
+        preamble = yield self.query(':WAV:PRE?')
+        preamble = self._parsePreamble(preamble)
+        # get waveform data as a binary block
+        trace = yield self.query_binary(':WAV:DATA?', dtype='u1')
+        # convert data to volts
+        points, xincrement, xorigin, xreference, yincrement, yorigin, yreference = preamble
+        returnValue((preamble, (trace - yreference) * yincrement + yorigin))
+
+    def _timeAxis(self, preamble, points):
+        """
+        Create the time axis from a parsed waveform preamble.
+        """
+        _, xincrement, xorigin, xreference, _, _, _ = preamble
+        return (np.arange(points) - xreference) * xincrement + xorigin
+
+    def _parsePreamble(self, preamble):
         """
         <preamble_block> = <format 16-bit NR1>,
                          <type 16-bit NR1>,
@@ -274,19 +323,6 @@ class KeysightDSOX2024AWrapper(GPIBDeviceWrapper):
         """
         fields = preamble.split(',')
         points = int(fields[2])
-        xincrement, xorigin, xreference = float(fields[4: 7])
-        yincrement, yorigin, yreference = float(fields[7: 10])
-        # print(str((points, xincrement, xorigin, xreference, yincrement, yorigin, yreference)))
+        xincrement, xorigin, xreference = list(map(float, fields[4: 7]))
+        yincrement, yorigin, yreference = list(map(float, fields[7: 10]))
         return (points, xincrement, xorigin, xreference, yincrement, yorigin, yreference)
-
-    def _parseByteData(data):
-        """
-        Parse byte data.
-        """
-        # get tmc header in #NXXXXXXXXX format
-        tmc_N = int(data[1])
-        tmc_length = int(data[2: 2 + tmc_N])
-        # print("tmc_N: " + str(tmc_N))
-        # print("tmc_length: " + str(tmc_length))
-        # use this return if return format is in bytes, otherwise need to adjust
-        return np.frombuffer(data[2 + tmc_N:], dtype=np.uint8)
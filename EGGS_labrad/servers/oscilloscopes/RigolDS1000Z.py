@@ -1,8 +1,11 @@
 import numpy as np
-from labrad.gpib import GPIBDeviceWrapper
+from EGGS_labrad.servers import GPIBDeviceWrapper
 from twisted.internet.defer import inlineCallbacks, returnValue
 
+from labrad.util import wakeupCall
+
 _RIGOLDS1000Z_PROBE_ATTENUATIONS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+_RIGOLDS1000Z_TRIGGER_POLL_INTERVAL = 0.05
 
 
 class RigolDS1000ZWrapper(GPIBDeviceWrapper):
@@ -168,37 +171,50 @@ class RigolDS1000ZWrapper(GPIBDeviceWrapper):
 
     # ACQUISITION
     @inlineCallbacks
-    def get_trace(self, channel, points=1200):
+    def trace(self, channel, points=1200):
         # oscilloscope must be stopped to get trace
         yield self.write(':STOP')
-        # set max points
-        max_points = yield self.query(':ACQ:MDEP?')
-        max_points = int(max_points)
-        if points > max_points:
-            points = max_points
-        # configure trace
-        yield self.write(':WAV:SOUR CHAN{:d}'.format(channel))
-        yield self.write(':WAV:MODE RAW')
-        yield self.write(':WAV:FORM BYTE')
-        yield self.write(':WAV:STAR 1')
-        yield self.write(':WAV:STOP {:d}'.format(points))
 
-        # transfer waveform preamble
-        preamble = yield self.query(':WAV:PRE?')
-        # get waveform data
-        data = yield self.query(':WAV:DATA?')
+        # transfer waveform
+        yield self._setupTransfer(points)
+        preamble, yAxis = yield self._transferWaveform(channel)
+
         # start oscope back up
         yield self.write(':RUN')
 
-        # parse waveform preamble
-        points, xincrement, xorigin, xreference, yincrement, yorigin, yreference = yield self._parsePreamble(preamble)
-        # parse data
-        trace = yield self._parseByteData(data)
-        # format data
-        xAxis = np.arange(points) * xincrement + xorigin
-        yAxis = (trace - yorigin - yreference) * yincrement
+        xAxis = self._timeAxis(preamble, len(yAxis))
         returnValue((xAxis, yAxis))
 
+    @inlineCallbacks
+    def traces(self, channels, points=1200, trigger_timeout=10.):
+        # take a single acquisition and wait for the scope to stop
+        yield self.write(':SING')
+        max_polls = int(trigger_timeout / _RIGOLDS1000Z_TRIGGER_POLL_INTERVAL)
+        status = yield self.query(':TRIG:STAT?')
+        polls = 0
+        while status.strip() != 'STOP':
+            if polls >= max_polls:
+                # return the scope to its normal state before giving up
+                yield self.write(':RUN')
+                raise Exception('Timed out after {:.1f} s waiting for a trigger.'.format(trigger_timeout))
+            yield wakeupCall(_RIGOLDS1000Z_TRIGGER_POLL_INTERVAL)
+            status = yield self.query(':TRIG:STAT?')
+            polls += 1
+
+        # transfer each channel from the same acquisition
+        yield self._setupTransfer(points)
+        yAxes = []
+        for channel in channels:
+            preamble, yAxis = yield self._transferWaveform(channel)
+            yAxes.append(yAxis)
+
+        # start oscope back up
+        yield self.write(':RUN')
+
+        # all channels share the same timebase
+        xAxis = self._timeAxis(preamble, len(yAxes[0]))
+        returnValue((xAxis, np.array(yAxes)))
+
     # MEASURE
     # todo: fix measurement stuff
     @inlineCallbacks
@@ -248,7 +264,45 @@ class RigolDS1000ZWrapper(GPIBDeviceWrapper):
 
 
     # HELPER
-    def _parsePreamble(preamble):
+    @inlineCallbacks
+    def _setupTransfer(self, points):
+        """
+        Configure the waveform transfer format.
+        """
+        # set max points
+        max_points = yield self.query(':ACQ:MDEP?')
+        max_points = int(max_points)
+        if points > max_points:
+            points = max_points
+        # configure trace
+        yield self.write(':WAV:MODE RAW')
+        yield self.write(':WAV:FORM BYTE')
+        yield self.write(':WAV:STAR 1')
+        yield self.write(':WAV:STOP {:d}'.format(points))
+
+    @inlineCallbacks
+    def _transferWaveform(self, channel):
+        """
+        Transfer the waveform of a single channel and convert it to volts.
+        """
+        yield self.write(':WAV:SOUR CHAN{:d}'.format(channel))
+        # transfer waveform preamble
+        preamble = yield self.query(':WAV:PRE?')
+        preamble = self._parsePreamble(preamble)
+        # get waveform data as a binary block
+        trace = yield self.query_binary(':WAV:DATA?', dtype='u1')
+        # convert data to volts
+        points, xincrement, xorigin, xreference, yincrement, yorigin, yreference = preamble
+        returnValue((preamble, (trace - yorigin - yreference) * yincrement))
+
+    def _timeAxis(self, preamble, points):
+        """
+        Create the time axis from a parsed waveform preamble.
+        """
+        _, xincrement, xorigin, _, _, _, _ = preamble
+        return np.arange(points) * xincrement + xorigin
+
+    def _parsePreamble(self, preamble):
         """
         <preamble_block> = <format 16-bit NR1>,
                          <type 16-bit NR1>,
@@ -265,16 +319,5 @@ class RigolDS1000ZWrapper(GPIBDeviceWrapper):
         points = int(fields[2])
         xincrement, xorigin, xreference = list(map(float, fields[4: 7]))
         yincrement, yorigin, yreference = list(map(float, fields[7: 10]))
-        print(str((points, xincrement, xorigin, xreference, yincrement, yorigin, yreference)))
         return (points, xincrement, xorigin, xreference, yincrement, yorigin, yreference)
 
-    def _parseByteData(data):
-        """
-        Parse byte data.
-        """
-        # get tmc header in #NXXXXXXXXX format
-        tmc_N = int(data[1])
-        tmc_length = int(data[2: 2 + tmc_N])
-        print("tmc_N: " + str(tmc_N))
-        print("tmc_length: " + str(tmc_length))
-        return np.frombuffer(data[2 + tmc_N:], dtype=np.uint8)
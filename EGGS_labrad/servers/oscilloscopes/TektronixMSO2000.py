@@ -2,7 +2,7 @@ import numpy as np
 from twisted.internet.defer import inlineCallbacks, returnValue
 
 from labrad.units import WithUnit
-from labrad.gpib import GPIBDeviceWrapper
+from EGGS_labrad.servers import GPIBDeviceWrapper
 
 
 class TektronixMSO2000Wrapper(GPIBDeviceWrapper):
@@ -193,40 +193,34 @@ class TektronixMSO2000Wrapper(GPIBDeviceWrapper):
     # ACQUISITION
     @inlineCallbacks
     def trace(self, channel, points=1250000):
-        # ensure trace length is valid
-        if (points > 1250000) or (points < 1000):
-            raise Exception("Invalid number of points. Must be in [1000, 1.25e6].")
+        # transfer waveform
+        timeout_tmp = yield self._setupTransfer(points)
+        preamble, yAxis = yield self._transferWaveform(channel, timeout_tmp)
 
-        # configure source
-        yield self.write('DAT:SOU CH{:d}'.format(channel))
-
-        # configure incoming waveform data
-        # set SINGULAR_YT composition to get singular sample waveform
-        yield self.write('DAT:COMP SINGULAR_YT')
-        # set resolution to FULL
-        yield self.write('DAT:RESO FULL')
-        # set encoding to RIB (signed, MSB transferred first)
-        yield self.write('DAT:ENC RIB')
-        # set data width to 16 bits
-        yield self.write('DAT:WID 2')
+        xAxis = self._timeAxis(preamble, len(yAxis))
+        returnValue((xAxis, yAxis))
 
-        # set transfer length
-        yield self.write('DAT:STAR 1')
-        yield self.write('DAT:STOP {:d}'.format(points))
-        timeout_tmp = WithUnit(points / 1000, 's')
+    @inlineCallbacks
+    def traces(self, channels, points=1250000):
+        # take a single acquisition and wait for it to complete
+        yield self.write('ACQ:STOPA SEQ')
+        yield self.write('ACQ:STATE ON')
+        yield self.query('*OPC?')
 
-        # get preamble and waveform
-        preamble = yield self.query('WFMO?')
-        data = yield self.query('CURV?', timeout=timeout_tmp)
+        # transfer each channel from the same acquisition
+        timeout_tmp = yield self._setupTransfer(points)
+        yAxes = []
+        for channel in channels:
+            preamble, yAxis = yield self._transferWaveform(channel, timeout_tmp)
+            yAxes.append(yAxis)
 
-        # parse waveform preamble and data
-        points, xincrement, xorigin, yincrement, yorigin, yreference = self._parsePreamble(preamble)
-        trace = self._parseByteData(data)
+        # start oscope back up
+        yield self.write('ACQ:STOPA RUNST')
+        yield self.write('ACQ:STATE ON')
 
-        # format data
-        xAxis = np.arange(points) * xincrement + xorigin
-        yAxis = (trace - yorigin) * yincrement + yreference
-        returnValue((xAxis, yAxis))
+        # all channels share the same timebase
+        xAxis = self._timeAxis(preamble, len(yAxes[0]))
+        returnValue((xAxis, np.array(yAxes)))
 
 
     # MEASURE
@@ -256,6 +250,53 @@ class TektronixMSO2000Wrapper(GPIBDeviceWrapper):
 
 
     # HELPER
+    @inlineCallbacks
+    def _setupTransfer(self, points):
+        """
+        Configure the waveform transfer format.
+        Returns:
+            (WithUnit): the timeout to use for the transfer.
+        """
+        # ensure trace length is valid
+        if (points > 1250000) or (points < 1000):
+            raise Exception("Invalid number of points. Must be in [1000, 1.25e6].")
+
+        # configure incoming waveform data
+        # set SINGULAR_YT composition to get singular sample waveform
+        yield self.write('DAT:COMP SINGULAR_YT')
+        # set resolution to FULL
+        yield self.write('DAT:RESO FULL')
+        # set encoding to RIB (signed, MSB transferred first)
+        yield self.write('DAT:ENC RIB')
+        # set data width to 16 bits
+        yield self.write('DAT:WID 2')
+
+        # set transfer length
+        yield self.write('DAT:STAR 1')
+        yield self.write('DAT:STOP {:d}'.format(points))
+        returnValue(WithUnit(points / 1000, 's'))
+
+    @inlineCallbacks
+    def _transferWaveform(self, channel, timeout=None):
+        """
+        Transfer the waveform of a single channel and convert it to volts.
+        """
+        yield self.write('DAT:SOU CH{:d}'.format(channel))
+        # get preamble and waveform
+        preamble = yield self.query('WFMO?')
+        preamble = self._parsePreamble(preamble)
+        trace = yield self.query_binary('CURV?', dtype='>i2', timeout=timeout)
+        # convert data to volts
+        points, xincrement, xorigin, yincrement, yorigin, yreference = preamble
+        returnValue((preamble, (trace - yorigin) * yincrement + yreference))
+
+    def _timeAxis(self, preamble, points):
+        """
+        Create the time axis from a parsed waveform preamble.
+        """
+        _, xincrement, xorigin, _, _, _ = preamble
+        return np.arange(points) * xincrement + xorigin
+
     def _parsePreamble(self, preamble):
         """
         <preamble_block> ::= <format 16-bit NR1>,
@@ -273,12 +314,6 @@ class TektronixMSO2000Wrapper(GPIBDeviceWrapper):
         yincrement, yorigin, yreference = list(map(float, fields[13: 16]))
         return (points, xincrement, xorigin, yincrement, yorigin, yreference)
 
-    def _parseByteData(self, data):
-        """
-        Parse byte data
-        """
-        return np.array(data.split(','), dtype=float)
-
     def _parseMeasurementParameters(self, measurement_raw):
         """
         Parse raw response of parameters for a measurement slot.
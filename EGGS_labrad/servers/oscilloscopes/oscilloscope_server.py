@@ -2,7 +2,7 @@
 ### BEGIN NODE INFO
 [info]
 name = Oscilloscope Server
-version = 1.1.0
+version = 1.2.0
 description = Talks to oscilloscopes
 
 [startup]
@@ -14,10 +14,15 @@ message = 987654321
 timeout = 20
 ### END NODE INFO
 """
-from labrad.server import setting
+import numpy as np
+from time import time
+from twisted.internet.defer import inlineCallbacks, returnValue, DeferredLock
+
+from labrad.server import setting, Signal
 from labrad.util import wakeupCall
 from labrad.gpib import GPIBManagedServer
 from EGGS_labrad.clients import createTrunk
+from EGGS_labrad.servers import RingBuffer
 
 # import device wrappers
 from RigolDS1000Z import RigolDS1000ZWrapper
@@ -42,10 +47,22 @@ class OscilloscopeServer(GPIBManagedServer):
         'AGILENT TECHNOLOGIES DSO7054':         AgilentDSO7054Wrapper
     }
 
-    # def initServer(self):
-    #     super().__initServer__()
-    #     # get connection to data vault to save traces
-    #     self.dv = self.clients.servers['Data Vault']
+    # signal: (device name, total number of traces acquired)
+    trace_update = Signal(999999, 'signal: trace update', '(si)')
+
+
+    # STARTUP
+    def initServer(self):
+        # holds streaming state for each device, keyed by device name
+        self.streams = {}
+        # serializes communication with each device, keyed by device name
+        self.device_locks = {}
+        return super().initServer()
+
+    def stopServer(self):
+        for stream in self.streams.values():
+            stream['running'] = False
+        return super().stopServer()
 
 
     # SYSTEM
@@ -55,8 +72,13 @@ class OscilloscopeServer(GPIBManagedServer):
         Reset the oscilloscopes to factory settings.
         """
         dev = self.selectedDevice(c)
-        yield dev.reset()
-        yield wakeupCall(3.)
+        lock = self._deviceLock(dev)
+        yield lock.acquire()
+        try:
+            yield dev.reset()
+            yield wakeupCall(3.)
+        finally:
+            lock.release()
 
     @setting(12, "Clear Buffers", returns='')
     def clear_buffers(self, c):
@@ -64,7 +86,7 @@ class OscilloscopeServer(GPIBManagedServer):
         Clear device status buffers.
         """
         dev = self.selectedDevice(c)
-        yield dev.clear_buffers()
+        yield self._deviceLock(dev).run(dev.clear_buffers)
 
     @setting(13, "Autoscale", returns='')
     def autoscale(self, c):
@@ -74,7 +96,7 @@ class OscilloscopeServer(GPIBManagedServer):
         on the device front panel.
         """
         dev = self.selectedDevice(c)
-        yield dev.autoscale()
+        yield self._deviceLock(dev).run(dev.autoscale)
 
     @setting(14, "Operation Complete", returns='b')
     def operationComplete(self, c):
@@ -84,7 +106,7 @@ class OscilloscopeServer(GPIBManagedServer):
             (bool)  : whether the current operation has completed.
         """
         dev = self.selectedDevice(c)
-        return dev.operationComplete()
+        return self._deviceLock(dev).run(dev.operationComplete)
 
 
     # CHANNEL
@@ -97,7 +119,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             Tuple of (on/off, attenuation, scale, offset, coupling, invert)
         """
-        return self.selectedDevice(c).channel_info(channel)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.channel_info, channel)
 
     @setting(111, "Channel Coupling", channel='i', coup='s', returns='s')
     def channel_coupling(self, c, channel, coup=None):
@@ -110,7 +133,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             string indicating the channel's coupling.
         """
-        return self.selectedDevice(c).channel_coupling(channel, coup)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.channel_coupling, channel, coup)
 
     @setting(112, "Channel Scale", channel='i', scale='v', returns='v')
     def channel_scale(self, c, channel, scale=None):
@@ -122,7 +146,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (float): The vertical scale (in volts/div).
         """
-        return self.selectedDevice(c).channel_scale(channel, scale)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.channel_scale, channel, scale)
 
     @setting(113, "Channel Probe", channel='i', factor='v', returns='v')
     def channel_probe(self, c, channel, factor=None):
@@ -134,7 +159,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (float): the probe attenuation factor
         """
-        return self.selectedDevice(c).channel_probe(channel, factor)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.channel_probe, channel, factor)
 
     @setting(114, "Channel Toggle", channel='i', state=['i', 'b'], returns='b')
     def channel_toggle(self, c, channel, state=None):
@@ -146,7 +172,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (bool): The channel state.
         """
-        return self.selectedDevice(c).channel_toggle(channel, state)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.channel_toggle, channel, state)
 
     @setting(115, "Channel Invert", channel='i', invert=['i', 'b'], returns='b')
     def channel_invert(self, c, channel, invert=None):
@@ -158,7 +185,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (int): 0: not inverted, 1: inverted.
         """
-        return self.selectedDevice(c).channel_invert(channel, invert)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.channel_invert, channel, invert)
 
     @setting(116, "Channel Offset", channel='i', offset='v', returns='v')
     def channel_offset(self, c, channel, offset=None):
@@ -171,7 +199,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (float): Vertical offset in units of divisions.
         """
-        return self.selectedDevice(c).channel_offset(channel, offset)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.channel_offset, channel, offset)
 
     @setting(117, "Channel Position", channel='i', position='v', returns='v')
     def channel_position(self, c, channel, position=None):
@@ -184,7 +213,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (float): Vertical position in units of divisions.
         """
-        return self.selectedDevice(c).channel_position(channel, position)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.channel_position, channel, position)
 
 
     # TRIGGER
@@ -199,7 +229,8 @@ class OscilloscopeServer(GPIBManagedServer):
         """
         if source == '':
             source = None
-        return self.selectedDevice(c).trigger_channel(source)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.trigger_channel, source)
 
     @setting(132, "Trigger Slope", slope='s', returns='s')
     def trigger_slope(self, c, slope=None):
@@ -210,7 +241,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (str): the slope being triggered off
         """
-        return self.selectedDevice(c).trigger_slope(slope)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.trigger_slope, slope)
 
     @setting(133, "Trigger Level", channel='i', level='v', returns='v')
     def trigger_level(self, c, channel, level=None):
@@ -222,7 +254,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (float): the trigger level (in V).
         """
-        return self.selectedDevice(c).trigger_level(channel, level)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.trigger_level, channel, level)
 
     @setting(134, "Trigger Mode", mode='s', returns='s')
     def trigger_mode(self, c, mode=None):
@@ -233,7 +266,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (str): The trigger mode.
         """
-        return self.selectedDevice(c).trigger_mode(mode)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.trigger_mode, mode)
 
 
     # HORIZONTAL
@@ -246,7 +280,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (float): the horizontal offset in (in seconds).
         """
-        return self.selectedDevice(c).horizontal_offset(offset)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.horizontal_offset, offset)
 
     @setting(152, "Horizontal Scale", scale='v', returns='v')
     def horizontal_scale(self, c, scale=None):
@@ -257,12 +292,13 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (float): the horizontal scale (in s/div).
         """
-        return self.selectedDevice(c).horizontal_scale(scale)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.horizontal_scale, scale)
 
 
     # ACQUISITION
     @setting(201, "Trace", channel='i', points='i', save='b', returns='(*v*v)')
-    def trace(self, c, channel, points, save=True):
+    def trace(self, c, channel, points, save=False):
         """
         Get a trace for a single channel.
         Arguments:
@@ -273,22 +309,141 @@ class OscilloscopeServer(GPIBManagedServer):
             (*float, *float): (the time array, the signal array)
         """
         # get data
-        data = self.selectedDevice(c).trace(channel, points)
+        dev = self.selectedDevice(c)
+        xAxis, yAxis = yield self._deviceLock(dev).run(dev.trace, channel, points)
         # save data to datavault
         if save:
-            # create client-specific context
-            cntx_tmp = self.cxn.context()
-            # create folder
-            trunk_tmp = createTrunk(self.name)
-            self.dv.cd(trunk_tmp, True, context=cntx_tmp)
-            self.dv.new(
-                'Trace - CH{:d}'.format(channel),
-                [('Time', 's')], [('Signal', 'Voltage', 'V')],
-                context=cntx_tmp
-            )
-            # todo: add entire dataset at once somehow
-            #self.dv.add(amp_val, os_amplitude, sa_power, context=cntx_tmp)
-        return data
+            yield self._saveTraces([channel], xAxis, [yAxis])
+        returnValue((xAxis, yAxis))
+
+    @setting(202, "Traces", channels='*i', points='i', save='b', returns='*2v')
+    def traces(self, c, channels, points=None, save=False):
+        """
+        Get traces for multiple channels from a single acquisition.
+        All channels are transferred from the same trigger within a single call.
+        Arguments:
+            channels    (*int): The channels for which we want to get the traces.
+            points      (int): The number of points to transfer.
+            save        (bool): Whether to save the result to the data vault.
+        Returns:
+            (*2float): an array whose first row is the time axis and whose
+                        remaining rows are the signals of each channel (in order).
+        """
+        if len(channels) == 0:
+            raise Exception('Error: no channels specified.')
+        # get data
+        dev = self.selectedDevice(c)
+        if points is None:
+            xAxis, yAxes = yield self._deviceLock(dev).run(dev.traces, channels)
+        else:
+            xAxis, yAxes = yield self._deviceLock(dev).run(dev.traces, channels, points)
+        # save data to datavault
+        if save:
+            yield self._saveTraces(channels, xAxis, yAxes)
+        returnValue(np.vstack((xAxis, yAxes)))
+
+
+    # STREAMING
+    @setting(231, "Stream Start", channels='*i', points='i', buffer_size='i', returns='')
+    def stream_start(self, c, channels, points=None, buffer_size=100):
+        """
+        Start continuously acquiring traces from the selected device in the background.
+        Traces are acquired back-to-back as fast as the device allows and stored
+        in a bounded ring buffer; the oldest traces are overwritten once it is full.
+        A trace update signal is emitted for every new trace.
+        If a previous stream on the device is still stopping, waits for it to finish first.
+        Arguments:
+            channels    (*int)  : the channels to acquire.
+            points      (int)   : the number of points to transfer per trace.
+            buffer_size (int)   : the maximum number of traces to hold.
+        """
+        if len(channels) == 0:
+            raise Exception('Error: no channels specified.')
+        dev = self.selectedDevice(c)
+        stream = self.streams.get(dev.name)
+        if (stream is not None) and (stream['running']):
+            raise Exception('Error: device is already streaming.')
+
+        # create stream state; buffer is created once we know the trace length
+        new_stream = {
+            'running': True, 'channels': list(channels), 'points': points,
+            'buffer_size': buffer_size, 'buffer': None, 'time_axis': None, 'loop': None
+        }
+        self.streams[dev.name] = new_stream
+        # ensure only one acquisition loop runs per device
+        if (stream is not None) and (stream['loop'] is not None):
+            yield stream['loop']
+        new_stream['loop'] = self._streamLoop(dev, new_stream)
+
+    @setting(232, "Stream Stop", returns='')
+    def stream_stop(self, c):
+        """
+        Stop continuous acquisition on the selected device.
+        Returns once the trace currently being acquired has finished.
+        Traces already in the buffer remain available.
+        """
+        stream = self.streams.get(self.selectedDevice(c).name)
+        if stream is not None:
+            stream['running'] = False
+            if stream['loop'] is not None:
+                yield stream['loop']
+
+    @setting(233, "Stream Status", returns='(bi*i)')
+    def stream_status(self, c):
+        """
+        Get the streaming status of the selected device.
+        Returns:
+            (bool, int, *int): (whether the device is streaming, the total number of
+                                traces acquired, the channels being acquired).
+        """
+        stream = self.streams.get(self.selectedDevice(c).name)
+        if stream is None:
+            return (False, 0, [])
+        count = 0 if (stream['buffer'] is None) else stream['buffer'].count
+        return (stream['running'], count, stream['channels'])
+
+    @setting(234, "Stream Traces", num='i', returns='(*v*v*3v)')
+    def stream_traces(self, c, num=1):
+        """
+        Get the latest traces from the stream buffer.
+        Arguments:
+            num     (int)   : the number of traces to get.
+        Returns:
+            (*float, *float, *3float): (the acquisition timestamp of each trace, the time axis,
+                                        the traces with shape (num, channels, points)).
+        """
+        stream = self._getStream(c)
+        timestamps, traces = stream['buffer'].latest(num)
+        return (timestamps, stream['time_axis'], traces)
+
+    @setting(235, "Stream Average", num='i', returns='(*v*2v)')
+    def stream_average(self, c, num=10):
+        """
+        Get the average of the latest traces in the stream buffer.
+        Arguments:
+            num     (int)   : the number of traces to average over.
+        Returns:
+            (*float, *2float): (the time axis, the averaged trace of each channel).
+        """
+        stream = self._getStream(c)
+        _, traces = stream['buffer'].latest(num)
+        return (stream['time_axis'], np.mean(traces, axis=0))
+
+    @setting(236, "Stream FFT", num='i', returns='(*v*3v)')
+    def stream_fft(self, c, num=1):
+        """
+        Get the FFT magnitudes of the latest traces in the stream buffer.
+        Arguments:
+            num     (int)   : the number of traces to transform.
+        Returns:
+            (*float, *3float): (the frequency axis (in Hz), the FFT magnitude of each
+                                trace with shape (num, channels, frequencies)).
+        """
+        stream = self._getStream(c)
+        _, traces = stream['buffer'].latest(num)
+        time_axis = stream['time_axis']
+        freq_axis = np.fft.rfftfreq(len(time_axis), d=time_axis[1] - time_axis[0])
+        return (freq_axis, np.abs(np.fft.rfft(traces, axis=-1)))
 
 
     # MEASURE
@@ -306,7 +461,8 @@ class OscilloscopeServer(GPIBManagedServer):
         """
         if (param is not None) and (param not in ("AMP", "FREQ", "MAX", "MEAN", "MIN", "P2P", "RMS")):
             raise Exception("Invalid measurement type. Must be one of {}.".format(str(("AMP", "FREQ", "MAX", "MEAN", "MIN", "P2P", "RMS"))))
-        return self.selectedDevice(c).measure_setup(slot, channel, param)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.measure_setup, slot, channel, param)
 
     @setting(211, "Measure", slot='i', returns='v')
     def measure(self, c, slot):
@@ -318,7 +474,8 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (float): the measurement.
         """
-        return self.selectedDevice(c).measure(slot)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.measure, slot)
 
     @setting(221, "Measure Averaging", average_on='b', returns='b')
     def measure_averaging(self, c, average_on=None):
@@ -329,8 +486,77 @@ class OscilloscopeServer(GPIBManagedServer):
         Returns:
             (bool): whether averaging is on or off.
         """
-        return self.selectedDevice(c).measure_averaging(average_on)
+        dev = self.selectedDevice(c)
+        return self._deviceLock(dev).run(dev.measure_averaging, average_on)
+
+
+
+    # HELPER
+    @inlineCallbacks
+    def _streamLoop(self, dev, stream):
+        """
+        Continuously acquire traces into the stream buffer until the stream is stopped.
+        Each trace holds the device lock, so other requests are interleaved between traces.
+        """
+        lock = self._deviceLock(dev)
+        while stream['running']:
+            try:
+                if stream['points'] is None:
+                    xAxis, yAxes = yield lock.run(dev.traces, stream['channels'])
+                else:
+                    xAxis, yAxes = yield lock.run(dev.traces, stream['channels'], stream['points'])
+            except Exception as e:
+                print('Error while streaming from {}: {}'.format(dev.name, e))
+                stream['running'] = False
+                break
+
+            # (re)create buffer if the trace shape has changed
+            buffer = stream['buffer']
+            if (buffer is None) or (buffer.shape != yAxes.shape):
+                buffer = stream['buffer'] = RingBuffer(stream['buffer_size'], yAxes.shape)
+            stream['time_axis'] = xAxis
+            buffer.append(yAxes, time())
+            self.trace_update((dev.name, buffer.count))
 
+    def _deviceLock(self, dev):
+        """
+        Get the lock which serializes communication with a device.
+        """
+        return self.device_locks.setdefault(dev.name, DeferredLock())
+
+    def _getStream(self, c):
+        """
+        Get the stream state of the selected device.
+        Raises an error if no traces have been acquired.
+        """
+        stream = self.streams.get(self.selectedDevice(c).name)
+        if (stream is None) or (stream['buffer'] is None) or (len(stream['buffer']) == 0):
+            raise Exception('Error: no streamed traces available.')
+        return stream
+
+    @inlineCallbacks
+    def _saveTraces(self, channels, xAxis, yAxes):
+        """
+        Save traces to the data vault as a single dataset using a single add.
+        Arguments:
+            channels    (*int)      : the channels of the traces.
+            xAxis       (*float)    : the common time axis.
+            yAxes       (*2float)   : the signal of each channel, one row per channel.
+        """
+        # create client-specific context
+        dv = self.client.data_vault
+        cntx_tmp = self.client.context()
+        # create folder
+        trunk_tmp = createTrunk(self.name)
+        yield dv.cd(trunk_tmp, True, context=cntx_tmp)
+        yield dv.new(
+            'Trace - ' + ', '.join('CH{:d}'.format(channel) for channel in channels),
+            [('Time', 's')],
+            [('Signal', 'CH{:d}'.format(channel), 'V') for channel in channels],
+            context=cntx_tmp
+        )
+        # add entire dataset at once
+        yield dv.add(np.column_stack((xAxis, *yAxes)), context=cntx_tmp)
 
 
 if __name__ == '__main__':
@@ -136,6 +136,7 @@ class ParameterVault(LabradServer):
         """
         yield self._save_parameters()
         yield self._load_parameters()
+        self._notifyAllParameters(c)
 
     @setting(5, "Reload Parameters", returns='')
     def reload_parameters(self, c):
@@ -143,6 +144,7 @@ class ParameterVault(LabradServer):
         Discards current parameters and reloads them from registry.
         """
         yield self._load_parameters()
+        self._notifyAllParameters(c)
 
     @setting(6, "Save Parameters To Registry", returns='')
     def saveParametersToRegistry(self, c):
@@ -150,9 +152,77 @@ class ParameterVault(LabradServer):
         Saves all currently stored parameters to the registry.
         """
         yield self._save_parameters()
-        
-    
+
+    @setting(7, "Get Parameters", keys='*(ss)', checked='b', returns='?')
+    def getParameters(self, c, keys, checked=True):
+        """
+        Get the values of many parameters at once.
+        Arguments:
+            keys    (list(str, str))    : the (collection, parameter name) of each parameter to get.
+            checked (bool)              : whether to check that the parameters meet the rules for their parameter types.
+        Returns:
+            tuple: the parameter values, in the same order as the keys.
+        """
+        if not keys:
+            return None
+        return tuple(self._get_values(keys, checked))
+
+    @setting(8, "Get Collection Parameters", collections='*s', checked='b', returns='?')
+    def getCollectionParameters(self, c, collections, checked=True):
+        """
+        Get all parameters within the given collections at once.
+        Arguments:
+            collections (list(str)) : the collections to get parameters from.
+            checked     (bool)      : whether to check that the parameters meet the rules for their parameter types.
+        Returns:
+            tuple(str, str, value): the collection, name, and value of each parameter.
+        """
+        collections = set(collections)
+        keys = [key for key in self.parameters.keys() if key[0] in collections]
+        if not keys:
+            return None
+        values = self._get_values(keys, checked)
+        return tuple((key[0], key[1], value) for key, value in zip(keys, values))
+
+
     # HELPERS
+    def _get_values(self, keys, checked):
+        """
+        Get the values of the given parameters.
+        Raises a single exception listing every parameter which couldn't be found or failed its check.
+        Arguments:
+            keys    (list(str, str))    : the (collection, parameter name) of each parameter to get.
+            checked (bool)              : whether to check that the parameters meet the rules for their parameter types.
+        Returns:
+            list: the parameter values.
+        """
+        values = []
+        errors = []
+        for key in keys:
+            key = tuple(key)
+            try:
+                value = self.parameters[key]
+                if checked:
+                    value = self._check_parameter(key, value)
+            except KeyError:
+                errors.append("Parameter Not Found: {}".format(key))
+            except AssertionError as e:
+                errors.append(str(e))
+            else:
+                values.append(value)
+        if errors:
+            raise Exception('\n'.join(errors))
+        return values
+
+    def _notifyAllParameters(self, c):
+        """
+        Send a parameter change signal for every parameter, since
+        reloading from the registry can change any of them.
+        """
+        notified = self.getOtherListeners(c)
+        for key in self.parameters.keys():
+            self.onParameterChange((key[0], key[1]), notified)
+
     @inlineCallbacks
     def _load_parameters(self):
         """
@@ -0,0 +1,203 @@
+"""
+Content-addressed cache of pulse sequences recorded into core device DMA.
+"""
+from hashlib import sha1
+from collections import OrderedDict
+
+import numpy as np
+
+__all__ = ["DMASequenceCache", "sequenceKey", "sequenceSize"]
+
+
+# keys of the compiled sequence (see EventTable.compile) which determine the recorded sequence
+SEQUENCE_KEYS = ('ttl_times', 'ttl_on_masks', 'ttl_off_masks',
+                 'dds_times', 'dds_channels', 'dds_params', 'dds_states', 'end_time')
+
+# estimated DMA memory used by a single RTIO event (in bytes)
+DMA_BYTES_PER_EVENT = 32
+# estimated number of RTIO events needed to start a DDS pulse (i.e. set_mu and cfg_sw)
+DDS_START_EVENTS = 8
+
+
+def sequenceKey(sequence_rep):
+    """
+    Hash a compiled sequence.
+    Arguments:
+        sequence_rep    (dict)  : the compiled sequence (from Sequence.progRepresentation).
+    Returns:
+                        (str)   : the hex digest of the sequence.
+    """
+    digest = sha1()
+    for key in SEQUENCE_KEYS:
+        value = np.ascontiguousarray(sequence_rep[key])
+        digest.update(key.encode())
+        digest.update(str(value.dtype).encode())
+        digest.update(str(value.shape).encode())
+        digest.update(value.tobytes())
+    return digest.hexdigest()
+
+
+def sequenceSize(sequence_rep):
+    """
+    Estimate the DMA memory needed to record a compiled sequence.
+    Arguments:
+        sequence_rep    (dict)  : the compiled sequence (from Sequence.progRepresentation).
+    Returns:
+                        (int)   : the estimated size (in bytes).
+    """
+    # each set bit of the TTL masks is a separate RTIO event
+    ttl_masks = np.concatenate((sequence_rep['ttl_on_masks'], sequence_rep['ttl_off_masks'])).astype(np.uint64)
+    ttl_events = int(np.unpackbits(ttl_masks.view(np.uint8)).sum())
+    dds_states = np.asarray(sequence_rep['dds_states'], dtype=bool)
+    dds_events = int(np.sum(dds_states)) * DDS_START_EVENTS + int(np.sum(~dds_states))
+    return (ttl_events + dds_events) * DMA_BYTES_PER_EVENT
+
+
+class DMASequenceCache(object):
+    """
+    Keeps track of the pulse sequences recorded into DMA, keyed by their contents,
+        so identical sequences don't have to be recorded again.
+    The number of sequences and their (estimated) total size are bounded;
+        the least recently used sequences are erased to make space for new ones.
+    Sequences which are in use (e.g. currently being played) can be pinned so they aren't evicted.
+    """
+
+    def __init__(self, max_sequences=32, max_bytes=16 * 1024 * 1024):
+        """
+        Arguments:
+            max_sequences   (int)   : the maximum number of sequences to keep recorded.
+            max_bytes       (int)   : the maximum total (estimated) DMA memory to use (in bytes).
+        """
+        self.max_sequences = max_sequences
+        self.max_bytes = max_bytes
+        # sequence key: (handle name, size in bytes), ordered from least to most recently used
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        # handle names of sequences which must not be evicted
+        self.pinned = set()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, handle_name):
+        return any(handle == handle_name for handle, _ in self.entries.values())
+
+    def lookup(self, key):
+        """
+        Get the handle of a recorded sequence.
+        Arguments:
+            key     (str)   : the sequence key.
+        Returns:
+                    (str)   : the DMA handle name, or None if the sequence isn't recorded.
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0]
+        self.misses += 1
+        return None
+
+    def insert(self, key, size):
+        """
+        Add a sequence to the cache, evicting the least recently used (unpinned) sequences if necessary.
+            Pinned sequences may temporarily take the number of sequences above max_sequences.
+        Arguments:
+            key     (str)   : the sequence key.
+            size    (int)   : the estimated size of the sequence (in bytes).
+        Returns:
+            (str, *str): the DMA handle name for the sequence, and the handle names
+                            of evicted sequences (which must be erased).
+        """
+        if size > self.max_bytes:
+            raise Exception('Error: sequence too large for DMA ({:d} bytes).'.format(size))
+        pinned_bytes = sum(handle_size for handle, handle_size in self.entries.values() if handle in self.pinned)
+        if pinned_bytes + size > self.max_bytes:
+            raise Exception('Error: not enough DMA memory while sequences are in use ({:d} bytes).'.format(size))
+        evicted = []
+        for old_key, (handle_name, handle_size) in list(self.entries.items()):
+            if (len(self.entries) < self.max_sequences) and (self.total_bytes + size <= self.max_bytes):
+                break
+            if handle_name in self.pinned:
+                continue
+            del self.entries[old_key]
+            self.total_bytes -= handle_size
+            evicted.append(handle_name)
+        handle_name = 'ps_{:s}'.format(key[:16])
+        self.entries[key] = (handle_name, size)
+        self.total_bytes += size
+        return handle_name, evicted
+
+    def pin(self, handle_name):
+        """
+        Prevent a sequence from being evicted (e.g. while it is being played).
+        Arguments:
+            handle_name     (str)   : the DMA handle name.
+        """
+        self.pinned.add(handle_name)
+
+    def unpin(self, handle_name=None):
+        """
+        Allow a pinned sequence to be evicted again.
+        Arguments:
+            handle_name     (str)   : the DMA handle name. Unpins all sequences if None.
+        """
+        if handle_name is None:
+            self.pinned.clear()
+        else:
+            self.pinned.discard(handle_name)
+
+    def discard(self, handle_name):
+        """
+        Remove a sequence from the cache (e.g. if it was erased, or recording failed).
+        Arguments:
+            handle_name     (str)   : the DMA handle name.
+        """
+        for key, (handle, size) in list(self.entries.items()):
+            if handle == handle_name:
+                del self.entries[key]
+                self.total_bytes -= size
+        self.pinned.discard(handle_name)
+
+    def clear(self):
+        """
+        Remove all sequences from the cache.
+        Returns:
+            *str: the handle names of all removed sequences (which must be erased).
+        """
+        handle_names = [handle for handle, _ in self.entries.values()]
+        self.entries.clear()
+        self.total_bytes = 0
+        self.pinned.clear()
+        return handle_names
+
+    def stats(self):
+        """
+        Returns:
+            (int, int, int, int): the number of cache hits and misses, and the
+                                    number and total (estimated) size of the recorded sequences.
+        """
+        return self.hits, self.misses, len(self.entries), self.total_bytes
+
+    def record(self, api, sequence_rep):
+        """
+        Record a compiled sequence into DMA, unless an identical sequence is already recorded.
+            Blocks while talking to the core device, so should be called in a separate thread.
+        Arguments:
+            api             : the pulser API (or its simulated version).
+            sequence_rep    (dict)  : the compiled sequence (from Sequence.progRepresentation).
+        Returns:
+            (str, bool): the DMA handle name, and whether the sequence was already recorded.
+        """
+        key = sequenceKey(sequence_rep)
+        handle_name = self.lookup(key)
+        if handle_name is not None:
+            return handle_name, True
+
+        handle_name, evicted = self.insert(key, sequenceSize(sequence_rep))
+        try:
+            for evicted_name in evicted:
+                api.eraseSequence(evicted_name)
+            api.record2(sequence_rep, handle_name)
+        except Exception:
+            self.discard(handle_name)
+            raise
+        return handle_name, False
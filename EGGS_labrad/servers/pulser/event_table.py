@@ -0,0 +1,218 @@
+"""
+Columnar storage and compilation of pulse sequence events.
+"""
+import numpy as np
+
+__all__ = ["EventTable", "KIND_TTL", "KIND_DDS", "KIND_END"]
+
+
+# event kinds
+KIND_TTL = 0    # value is 1 to switch on, -1 to switch off
+KIND_DDS = 1    # value is 1 to start (payload is (ftw, asf, pow)), 0 to stop
+KIND_END = 2    # marks the end of the sequence
+
+
+class EventTable(object):
+    """
+    Stores pulse sequence events in growable numpy columns.
+    Each event is a row of (time, channel, kind, value, payload), where times are in machine units.
+    Events can be added in any order; they are only sorted and checked for
+        double switches and overlapping pulses (all at once) when the table is compiled.
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        Arguments:
+            capacity    (int)   : the initial number of events to allocate space for.
+        """
+        capacity = max(int(capacity), 1)
+        self._time =    np.zeros(capacity, dtype=np.int64)
+        self._channel = np.zeros(capacity, dtype=np.int32)
+        self._kind =    np.zeros(capacity, dtype=np.int8)
+        self._value =   np.zeros(capacity, dtype=np.int8)
+        self._payload = np.zeros((capacity, 3), dtype=np.int64)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, num):
+        """
+        Ensure there is space for num more events, growing the columns geometrically.
+        """
+        required = self.size + num
+        capacity = len(self._time)
+        if required <= capacity:
+            return
+        while capacity < required:
+            capacity *= 2
+        for name in ('_time', '_channel', '_kind', '_value', '_payload'):
+            column = getattr(self, name)
+            new_column = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+            new_column[:self.size] = column[:self.size]
+            setattr(self, name, new_column)
+
+    def columns(self):
+        """
+        Returns:
+            (np.array, np.array, np.array, np.array, np.array): views of the
+                (time, channel, kind, value, payload) columns of all events.
+        """
+        return (self._time[:self.size], self._channel[:self.size], self._kind[:self.size],
+                self._value[:self.size], self._payload[:self.size])
+
+
+    # ADDING EVENTS
+    def extend(self, times_mu, channels, kinds, values, payloads=None):
+        """
+        Add a block of events. Arguments are broadcast against each other.
+        Arguments:
+            times_mu    (np.array)  : the event times (in mu).
+            channels    (np.array)  : the event channel numbers.
+            kinds       (np.array)  : the event kinds (one of KIND_TTL, KIND_DDS, KIND_END).
+            values      (np.array)  : the event values.
+            payloads    (np.array)  : the event payloads, with shape (num_events, 3).
+        """
+        times_mu, channels, kinds, values = np.broadcast_arrays(times_mu, channels, kinds, values)
+        num = times_mu.size
+        if num == 0:
+            return
+        self._reserve(num)
+        rows = slice(self.size, self.size + num)
+        self._time[rows] = times_mu.ravel()
+        self._channel[rows] = channels.ravel()
+        self._kind[rows] = kinds.ravel()
+        self._value[rows] = values.ravel()
+        self._payload[rows] = 0 if payloads is None else payloads
+        self.size += num
+
+    def addTTLPulses(self, channels, starts_mu, durations_mu):
+        """
+        Add TTL pulses.
+        Arguments:
+            channels        (np.array)  : the TTL channel numbers.
+            starts_mu       (np.array)  : the pulse start times (in mu).
+            durations_mu    (np.array)  : the pulse durations (in mu).
+        """
+        channels, starts_mu, durations_mu = np.broadcast_arrays(channels, starts_mu, durations_mu)
+        num = channels.size
+        self.extend(np.concatenate((starts_mu.ravel(), (starts_mu + durations_mu).ravel())),
+                    np.tile(channels.ravel(), 2), KIND_TTL, np.repeat(np.int8([1, -1]), num))
+
+    def addDDSPulses(self, channels, starts_mu, durations_mu, params_mu):
+        """
+        Add DDS pulses.
+        Arguments:
+            channels        (np.array)  : the DDS channel numbers.
+            starts_mu       (np.array)  : the pulse start times (in mu).
+            durations_mu    (np.array)  : the pulse durations (in mu).
+            params_mu       (np.array)  : the (ftw, asf, pow) of each pulse, with shape (num_pulses, 3).
+        """
+        channels, starts_mu, durations_mu = np.broadcast_arrays(channels, starts_mu, durations_mu)
+        num = channels.size
+        params_mu = np.broadcast_to(params_mu, (num, 3))
+        self.extend(np.concatenate((starts_mu.ravel(), (starts_mu + durations_mu).ravel())),
+                    np.tile(channels.ravel(), 2), KIND_DDS, np.repeat(np.int8([1, 0]), num),
+                    np.concatenate((params_mu, np.zeros((num, 3), dtype=np.int64))))
+
+    def extendLength(self, end_time_mu):
+        """
+        Ensure the sequence lasts until at least the given time.
+        Arguments:
+            end_time_mu     (int)   : the sequence end time (in mu).
+        """
+        self.extend(end_time_mu, 0, KIND_END, 0)
+
+
+    # COMPILING
+    def _switches(self, kind):
+        """
+        Get the switches of a given kind sorted by (channel, time, value), and check that
+            no channel is switched twice in the same direction at the same time,
+            and that pulses on the same channel don't overlap.
+        Returns:
+            (np.array, np.array, np.array, np.array): the sorted (time, channel, sign, index) of each switch,
+                                                        where sign is 1 for on and -1 for off.
+        """
+        time, channel, kinds, value, _ = self.columns()
+        index = np.flatnonzero(kinds == kind)
+        time, channel = time[index], channel[index]
+        sign = np.where(value[index] > 0, 1, -1).astype(np.int64)
+
+        # note: offs are sorted before ons so back-to-back pulses don't count as overlapping
+        order = np.lexsort((sign, time, channel))
+        time, channel, sign, index = time[order], channel[order], sign[order], index[order]
+        if len(time) == 0:
+            return time, channel, sign, index
+
+        # check for double switches
+        same = (channel[1:] == channel[:-1]) & (time[1:] == time[:-1])
+        double = np.flatnonzero(same & (sign[1:] == sign[:-1]))
+        if len(double):
+            raise Exception('Double switch at time {} for channel {}'.format(time[double[0]], channel[double[0]]))
+
+        # check that each channel is only ever on or off
+        # note: level is the cumulative sum of switches, reset at the start of each channel
+        level = np.cumsum(sign)
+        channel_start = np.flatnonzero(np.r_[True, channel[1:] != channel[:-1]])
+        channel_offset = (level - sign)[channel_start]
+        level -= np.repeat(channel_offset, np.diff(np.r_[channel_start, len(channel)]))
+        invalid = np.flatnonzero((level < 0) | (level > 1))
+        if len(invalid):
+            raise Exception('Overlapping pulses at time {} for channel {}'.format(time[invalid[0]], channel[invalid[0]]))
+        return time, channel, sign, index
+
+    def compile(self):
+        """
+        Validate the sequence and convert it into a compact, time-sorted representation for DMA recording.
+            TTL switches at the same time are combined into channel bitmasks,
+            and back-to-back pulses on the same channel are merged.
+        Returns:
+            (dict): the compiled sequence, with keys:
+                ttl_times       (np.array)  : the TTL switching times (in mu).
+                ttl_on_masks    (np.array)  : bitmask of TTL channels to switch on at each time.
+                ttl_off_masks   (np.array)  : bitmask of TTL channels to switch off at each time.
+                dds_times       (np.array)  : the DDS event times (in mu).
+                dds_channels    (np.array)  : the DDS channel of each event.
+                dds_params      (np.array)  : the (ftw, asf, pow) of each event, with shape (num_events, 3).
+                dds_states      (np.array)  : whether each event starts (True) or stops (False) a pulse.
+                end_time        (int)       : the sequence end time (in mu).
+        """
+        # TTLs
+        time, channel, sign, _ = self._switches(KIND_TTL)
+        if np.any((channel < 0) | (channel > 63)):
+            raise Exception('Error: TTL channel must be in [0, 63].')
+        # back-to-back pulses: off immediately followed by on at the same time and channel
+        merged = np.flatnonzero((channel[1:] == channel[:-1]) & (time[1:] == time[:-1]))
+        keep = np.ones(len(time), dtype=bool)
+        keep[merged] = False
+        keep[merged + 1] = False
+        time, channel, sign = time[keep], channel[keep], sign[keep]
+
+        ttl_times, ttl_index = np.unique(time, return_inverse=True)
+        ttl_on_masks = np.zeros(len(ttl_times), dtype=np.int64)
+        ttl_off_masks = np.zeros(len(ttl_times), dtype=np.int64)
+        channel_bits = np.left_shift(np.int64(1), channel.astype(np.int64))
+        np.bitwise_or.at(ttl_on_masks, ttl_index[sign > 0], channel_bits[sign > 0])
+        np.bitwise_or.at(ttl_off_masks, ttl_index[sign < 0], channel_bits[sign < 0])
+
+        # DDSs
+        time, channel, sign, index = self._switches(KIND_DDS)
+        # back-to-back pulses: keep the start (so the new parameters are set) but not the stop
+        merged = np.flatnonzero((channel[1:] == channel[:-1]) & (time[1:] == time[:-1]))
+        keep = np.ones(len(time), dtype=bool)
+        keep[merged] = False
+        order = np.lexsort((channel[keep], time[keep]))
+        index = index[keep][order]
+
+        all_times = self.columns()[0]
+        return {
+            'ttl_times':        ttl_times,
+            'ttl_on_masks':     ttl_on_masks,
+            'ttl_off_masks':    ttl_off_masks,
+            'dds_times':        self._time[index],
+            'dds_channels':     self._channel[index],
+            'dds_params':       self._payload[index],
+            'dds_states':       self._value[index] > 0,
+            'end_time':         int(all_times.max()) if len(all_times) else 0
+        }
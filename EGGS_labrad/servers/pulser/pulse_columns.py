@@ -0,0 +1,168 @@
+"""
+Vectorised checking and conversion of pulses given as column arrays.
+"""
+import numpy as np
+
+__all__ = ["PulseColumns"]
+
+
+# maximum number of invalid rows to list in an error message
+MAX_ERROR_ROWS = 20
+
+
+class PulseColumns(object):
+    """
+    Checks and converts whole columns of TTL and DDS pulses at once,
+        using lookup arrays built from the hardware configuration.
+    All invalid rows are collected and reported in a single exception.
+    """
+
+    def __init__(self, ttl_dict, dds_dict, time_range, time_resolution):
+        """
+        Arguments:
+            ttl_dict        (dict)  : TTL channel configurations (i.e. channelConfiguration), keyed by name.
+            dds_dict        (dict)  : DDS channel configurations (i.e. ddsConfiguration), keyed by name.
+            time_range      (float, float): the allowed range of pulse times (in s).
+            time_resolution (float) : the minimum pulse duration (in s).
+        """
+        self.time_range = time_range
+        self.time_resolution = time_resolution
+
+        # TTLs
+        self.ttl_names = np.array(list(ttl_dict.keys()), dtype=str)
+        self.ttl_numbers = np.array([config.channelnumber for config in ttl_dict.values()], dtype=np.int32)
+
+        # DDSs
+        dds_configs = list(dds_dict.values())
+        self.dds_names = np.array(list(dds_dict.keys()), dtype=str)
+        self.dds_numbers = np.array([config.channelnumber for config in dds_configs], dtype=np.int32)
+        self.dds_freq_range = np.array([config.allowedfreqrange for config in dds_configs], dtype=float).reshape(-1, 2)
+        self.dds_ampl_range = np.array([config.allowedamplrange for config in dds_configs], dtype=float).reshape(-1, 2)
+        self.dds_off = np.array([config.off_parameters for config in dds_configs], dtype=float).reshape(-1, 2)
+
+    def _lookup(self, channels, names, numbers):
+        """
+        Find the configuration index of each channel.
+        Arguments:
+            channels    (np.array)  : the channel names, or channel numbers.
+            names       (np.array)  : the configured channel names.
+            numbers     (np.array)  : the configured channel numbers.
+        Returns:
+            (np.array, np.array): the configuration index of each channel, and whether the channel exists.
+        """
+        channels = np.asarray(channels)
+        keys = names if channels.dtype.kind in 'US' else numbers
+        if len(keys) == 0:
+            return np.zeros(len(channels), dtype=int), np.zeros(len(channels), dtype=bool)
+        order = np.argsort(keys)
+        position = np.clip(np.searchsorted(keys[order], channels), 0, len(keys) - 1)
+        index = order[position]
+        return index, keys[index] == channels
+
+    def _raiseErrors(self, channels, checks):
+        """
+        Raise a single exception listing every invalid row.
+        Arguments:
+            channels    (np.array)  : the channel of each row.
+            checks      *(np.array, str): a boolean array of invalid rows, and the reason they are invalid.
+        """
+        errors = []
+        for invalid, reason in checks:
+            errors.extend((row, reason) for row in np.flatnonzero(invalid))
+        if not errors:
+            return
+        errors.sort()
+        messages = ['row {:d} ({}): {}'.format(row, channels[row], reason) for row, reason in errors[:MAX_ERROR_ROWS]]
+        if len(errors) > MAX_ERROR_ROWS:
+            messages.append('... and {:d} more'.format(len(errors) - MAX_ERROR_ROWS))
+        raise Exception('Error: {:d} invalid pulses:\n'.format(len(errors)) + '\n'.join(messages))
+
+    def _broadcast(self, *columns):
+        """
+        Broadcast the pulse columns to the same length (i.e. so a single value can be given for all pulses).
+        """
+        try:
+            return [np.atleast_1d(column) for column in np.broadcast_arrays(*columns)]
+        except ValueError:
+            raise Exception('Error: pulse columns must all have the same length.')
+
+    def checkTTLPulses(self, channels, starts, durations):
+        """
+        Check TTL pulses and get their channel numbers.
+        Arguments:
+            channels    (np.array)  : the TTL channel names (or numbers).
+            starts      (np.array)  : the pulse start times (in s).
+            durations   (np.array)  : the pulse durations (in s).
+        Returns:
+                        (np.array)  : the TTL channel numbers.
+        """
+        channels, starts, durations = self._broadcast(np.asarray(channels), np.asarray(starts, dtype=float),
+                                                      np.asarray(durations, dtype=float))
+        index, exists = self._lookup(channels, self.ttl_names, self.ttl_numbers)
+        time_min, time_max = self.time_range
+        self._raiseErrors(channels, [
+            (~exists,                                                       'unknown channel'),
+            ((starts < time_min) | (starts + durations > time_max),         'time boundaries are out of range'),
+            (durations < self.time_resolution,                              'incorrect duration')
+        ])
+        return self.ttl_numbers[index]
+
+    def checkDDSPulses(self, channels, starts, durations, freqs, ampls, phases):
+        """
+        Check DDS pulses, get their channel numbers, and replace the parameters
+            of pulses with zero frequency or amplitude with the channel's off parameters.
+            Zero-length pulses are removed.
+        Arguments:
+            channels    (np.array)  : the DDS channel names (or numbers).
+            starts      (np.array)  : the pulse start times (in s).
+            durations   (np.array)  : the pulse durations (in s).
+            freqs       (np.array)  : the pulse frequencies (in MHz).
+            ampls       (np.array)  : the pulse amplitudes (in dBm).
+            phases      (np.array)  : the pulse phases (in deg).
+        Returns:
+            (np.array, np.array, np.array, np.array, np.array, np.array): the DDS channel numbers,
+                start times, durations, frequencies, amplitudes, and phases of the non-zero-length pulses.
+        """
+        channels, starts, durations, freqs, ampls, phases = self._broadcast(
+            np.asarray(channels), *(np.asarray(column, dtype=float) for column in (starts, durations, freqs, ampls, phases)))
+        index, exists = self._lookup(channels, self.dds_names, self.dds_numbers)
+
+        # use the off parameters if the dds won't be on, and only check range otherwise
+        off = (freqs == 0) | (ampls == 0)
+        freqs = np.where(off, self.dds_off[index, 0], freqs)
+        ampls = np.where(off, self.dds_off[index, 1], ampls)
+        freq_range, ampl_range = self.dds_freq_range[index], self.dds_ampl_range[index]
+
+        # note: start can not be at the minimum time, since this would change the dds before the sequence is launched
+        time_min, time_max = self.time_range
+        self._raiseErrors(channels, [
+            (~exists,                                                                       'unknown channel'),
+            (exists & ~off & ((freqs < freq_range[:, 0]) | (freqs > freq_range[:, 1])),     'frequency is outside the allowed range'),
+            (exists & ~off & ((ampls < ampl_range[:, 0]) | (ampls > ampl_range[:, 1])),     'amplitude is outside the allowed range'),
+            (~((time_min < starts) & (starts <= time_max)),                                 'start time is out of range'),
+            (~((time_min < starts + durations) & (starts + durations <= time_max)),         'stop time is out of range'),
+            (durations < 0,                                                                 'incorrect duration')
+        ])
+
+        # ignore zero-length pulses
+        keep = durations != 0
+        return (self.dds_numbers[index][keep], starts[keep], durations[keep],
+                freqs[keep], ampls[keep], phases[keep])
+
+    @staticmethod
+    def ddsParamsToMu(freqs, ampls, phases, ftw_per_hz):
+        """
+        Convert DDS parameters to machine units (for an AD9910).
+        Arguments:
+            freqs       (np.array)  : the frequencies (in MHz).
+            ampls       (np.array)  : the amplitudes (in dBm).
+            phases      (np.array)  : the phases (in deg).
+            ftw_per_hz  (float)     : the frequency tuning word per Hz.
+        Returns:
+                        (np.array)  : the (ftw, asf, pow) of each pulse, with shape (num_pulses, 3).
+        """
+        params_mu = np.empty((len(freqs), 3), dtype=np.int64)
+        params_mu[:, 0] = np.round(np.asarray(freqs) * 1e6 * ftw_per_hz)
+        params_mu[:, 1] = np.round(np.minimum(10 ** (np.asarray(ampls) / 10), 1.) * 0x3fff)
+        params_mu[:, 2] = np.round((np.asarray(phases) / 360.) * 0x10000).astype(np.int64) & 0xffff
+        return params_mu
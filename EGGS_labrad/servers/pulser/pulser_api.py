@@ -123,51 +123,50 @@ class Pulser_api(EnvExperiment):
                     self.ttlout_list[1].pulse(1*ms)
                 delay(1.0*ms)
 
-    def record2(self, ttl_seq, dds_seq, sequencename):
+    def record2(self, sequence_rep, sequencename):
         """
-        Processes the TTL and DDS sequence into a format
-        more easily readable and processable by ARTIQ.
+        Processes the compiled sequence (from Sequence.progRepresentation)
+        into a format more easily readable and processable by ARTIQ.
         """
         #TTLs
-        ttl_times = list(ttl_seq.keys())
-        ttl_commands = list(ttl_seq.values())
+        ttl_times = sequence_rep['ttl_times'].tolist()
+        ttl_on_masks = sequence_rep['ttl_on_masks'].tolist()
+        ttl_off_masks = sequence_rep['ttl_off_masks'].tolist()
         #DDSs
-        dds_times = list(dds_seq.keys())
-        dds_commands = list(dds_seq.values())
+        dds_times = sequence_rep['dds_times'].tolist()
+        dds_channels = sequence_rep['dds_channels'].tolist()
+        dds_params = sequence_rep['dds_params'].ravel().tolist()
+        dds_states = sequence_rep['dds_states'].tolist()
         #send to kernel
-        self._record(ttl_times, ttl_commands, dds_times, dds_commands, sequencename)
+        self._record(ttl_times, ttl_on_masks, ttl_off_masks,
+                     dds_times, dds_channels, dds_params, dds_states,
+                     sequence_rep['end_time'], sequencename)
 
     @kernel
-    def _record(self, ttl_times, ttl_commands, dds_times, dds_commands, sequencename):
+    def _record(self, ttl_times, ttl_on_masks, ttl_off_masks, dds_times, dds_channels, dds_params, dds_states, end_time_mu, sequencename):
         #record pulse sequence in memory
         with self.core_dma.record(sequencename):
             #program ttl sequence
             for i in range(len(ttl_times)):
                 at_mu(ttl_times[i])
-                ttl_command_tmp = ttl_commands[i]
                 #iterate over each TTL
-                with parallel:
-                    for j in range(len(ttl_command_tmp)):
-                        if j == 1:
-                            self.ttlout_list[j].on()
-                        elif j == -1:
-                            self.ttlout_list[j].off()
+                for j in range(len(self.ttlout_list)):
+                    if (ttl_on_masks[i] >> j) & 1:
+                        self.ttlout_list[j].on()
+                    elif (ttl_off_masks[i] >> j) & 1:
+                        self.ttlout_list[j].off()
             #program DDS sequence
             for i in range(len(dds_times)):
                 at_mu(dds_times[i])
-                dds_command_tmp = dds_commands[i]
-                dds_device = self.dds_list[dds_command_tmp[0]]
-                params = dds_command_tmp[1]
-                start_or_stop = dds_command_tmp[-1]
-                if start_or_stop == 'start':
-                    dds_device.set_mu(ftw=params[0], asf=params[0], pow=params[0], profile=0)
+                dds_device = self.dds_list[dds_channels[i]]
+                if dds_states[i]:
+                    dds_device.set_mu(ftw=dds_params[3 * i], asf=dds_params[3 * i + 1], pow=dds_params[3 * i + 2], profile=0)
                     dds_device.cfg_sw(True)
                 else:
                     dds_device.cfg_sw(False)
             #program PMT input
-            max_time_mu = ttl_times[-1]
             PMT_device = self.pmt_list[0]
-            for i in range(0, max_time_mu, self.pmt_interval_mu):
+            for i in range(0, end_time_mu, self.pmt_interval_mu):
                 at_mu(i)
                 time_pmt = PMT_device.gate_rising_mu(self.pmt_interval_mu)
                 counts_pmt = PMT_device.count(time_pmt)
@@ -0,0 +1,132 @@
+import numpy as np
+from time import sleep
+
+
+class _CoreSim(object):
+    """
+    A simulated core device (only handles time conversions).
+    """
+
+    def __init__(self, ref_period=1e-9):
+        self.ref_period = ref_period
+
+    def seconds_to_mu(self, seconds):
+        return np.int64(np.asarray(seconds) // self.ref_period)
+
+    def mu_to_seconds(self, mu):
+        return np.asarray(mu) * self.ref_period
+
+
+class _DDSSim(object):
+    """
+    A simulated AD9910 (only handles unit conversions).
+    """
+
+    def __init__(self, sysclk=1e9):
+        self.ftw_per_hz = (1 << 32) / sysclk
+
+    def frequency_to_ftw(self, frequency):
+        return int(round(self.ftw_per_hz * frequency))
+
+    def amplitude_to_asf(self, amplitude):
+        return int(round(amplitude * 0x3fff))
+
+    def turns_to_pow(self, turns):
+        return int(round(turns * 0x10000)) & 0xffff
+
+
+class _SchedulerSim(object):
+    """
+    A simulated ARTIQ scheduler, which runs submitted pulse sequences immediately.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self.rid = 0
+
+    def submit(self, pipeline_name=None, expid=None, priority=0):
+        self.rid += 1
+        arguments = expid['arguments']
+        self.api.playSequence(arguments.get('sequencename', 'default'), arguments['maxRuns'])
+        return self.rid
+
+    def delete(self, rid):
+        pass
+
+    def get_status(self):
+        return dict()
+
+
+class Pulser_API_Sim(object):
+    """
+    A simulated version of Pulser_api.
+    Has the same host-side interface as Pulser_api, but stores recorded
+        DMA sequences in memory instead of talking to hardware.
+    Does not require artiq to be installed.
+    """
+
+    def __init__(self, num_ttl=8, num_dds=4, kernel_time=0.):
+        """
+        Arguments:
+            num_ttl         (int)   : the number of TTL outputs.
+            num_dds         (int)   : the number of DDSs.
+            kernel_time     (float) : the time (in seconds) each simulated kernel call takes.
+        """
+        self.kernel_time = kernel_time
+        self.core = _CoreSim()
+        self.scheduler = _SchedulerSim(self)
+        self.ttlout_list = list(range(num_ttl))
+        self.dds_list = [_DDSSim() for i in range(num_dds)]
+        self.pmt_interval_mu = 0
+
+        # keep track of calls for testing
+        self.call_log = list()
+        # recorded DMA sequences
+        self.dma_sequences = dict()
+        self.runs = 0
+
+    def _kernel(self, name):
+        self.call_log.append(name)
+        sleep(self.kernel_time)
+
+    def record2(self, sequence_rep, sequencename):
+        if np.any(sequence_rep['ttl_on_masks'] >> len(self.ttlout_list)):
+            raise Exception('Error: TTL does not exist.')
+        if np.any(sequence_rep['dds_channels'] >= len(self.dds_list)):
+            raise Exception('Error: DDS does not exist.')
+        self._kernel('record')
+        self.dma_sequences[sequencename] = sequence_rep
+
+    def playSequence(self, sequencename, maxruns):
+        if sequencename not in self.dma_sequences:
+            raise Exception('Error: DMA handle {} does not exist.'.format(sequencename))
+        self._kernel('playback')
+        self.runs = maxruns
+
+    def runsCompleted(self):
+        return self.runs
+
+    def eraseSequence(self, sequencename):
+        self._kernel('erase')
+        del self.dma_sequences[sequencename]
+
+    def disconnect(self):
+        pass
+
+    def setTTL(self, ttlnum, state):
+        self._kernel('setTTL')
+
+    def initializeDDS(self):
+        self._kernel('initializeDDS')
+
+    def toggleDDS(self, ddsnum, state):
+        self._kernel('toggleDDS')
+
+    def setDDS(self, ddsnum, params, _profile):
+        self._kernel('setDDS')
+
+    def setPMTMode(self, mode):
+        self.pmt_mode = mode
+
+    def setPMTInterval(self, time_mu):
+        self.pmt_interval_mu = time_mu
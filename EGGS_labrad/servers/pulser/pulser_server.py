@@ -21,6 +21,8 @@ from labrad.server import LabradServer, setting, Signal
 from labrad.units import WithUnit
 from artiq.experiment import *
 from sequence import Sequence
+from pulse_columns import PulseColumns
+from dma_cache import DMASequenceCache
 
 #async imports
 from twisted.internet import reactor, task
@@ -57,11 +59,14 @@ class Pulser_server(LabradServer):
         self.ps_rid = None
         self.ps_is_programmed = False
         self.ps_programmed_sequence = None
+        self.ps_programmed_handle = None
+        #recorded sequences, keyed by their contents
+        self.dma_cache = DMASequenceCache()
 
         #TTL variables
         self.ttlDict = hardwareConfiguration.channelDict
-        #self.timeResolution = float(hardwareConfiguration.timeResolution)
-        #self.sequenceTimeRange = hardwareConfiguration.sequenceTimeRange
+        self.timeResolution = float(hardwareConfiguration.timeResolution)
+        self.sequenceTimeRange = hardwareConfiguration.sequenceTimeRange
 
         #DDS variables
         self.ddsDict = hardwareConfiguration.ddsDict
@@ -88,6 +93,9 @@ class Pulser_server(LabradServer):
             self.frequency_to_ftw = self.api.dds_list[0].frequency_to_ftw
             self.turns_to_pow = self.api.dds_list[0].turns_to_pow
             self.dbm_to_fampl = lambda dbm: 10**(float(dbm/10))
+            self.ftw_per_hz = self.api.dds_list[0].ftw_per_hz
+        #vectorised pulse checking
+        self.pulse_columns = PulseColumns(self.ttlDict, self.ddsDict, self.sequenceTimeRange, self.timeResolution)
         # todo: get io update alignment
 
     #Pulse sequencing
@@ -96,55 +104,54 @@ class Pulser_server(LabradServer):
         """
         Create New Pulse Sequence
         """
-        c['sequence'] = Sequence()
+        c['sequence'] = Sequence(self.seconds_to_mu)
 
-    @setting(1, "Record Sequence", sequencename = 's', returns = '')
+    @setting(1, "Record Sequence", sequencename = 's', returns = 's')
     def record(self, c, sequencename = None):
         """
         Programs Pulser with the current sequence.
         Saves the current sequence to self.programmed_sequence.
+        If no sequence name is given, the sequence is only recorded if an identical
+            sequence isn't already recorded, and is stored under a name derived from its contents.
+        Arguments:
+            sequencename (str): the name to record the sequence under
+        Returns:
+                         (str): the DMA handle name of the sequence
         """
-        if not sequencename:
-            sequencename = 'default'
-        yield self.inCommunication.acquire()
-        yield deferToThread(self.api.record, sequencename)
-        self.inCommunication.release()
-        #todo: fix programmed sequence
-        self.ps_is_programmed = True
-
-    def _record(self, sequencename = None):
-        """
-        Programs Pulser with the current sequence.
-        Saves the current sequence to self.programmed_sequence.
-        """
-        #set sequencename to default if not specified
-        if not sequencename:
-            sequencename = 'default'
-
         #get sequence and check to see we have a sequence
         sequence = c.get('sequence')
         if not sequence: raise Exception("Please create new sequence first")
-        self.ps_programmed_sequence = sequence
-        ttl_seq, dds_seq = self.sequence.progRepresentation()
+        #compile (and check) the sequence before sending it
+        sequence_rep = sequence.progRepresentation()
 
         #send to API
         yield self.inCommunication.acquire()
-        yield deferToThread(self.api.record, ttl_seq, dds_seq, sequencename)
-        self.inCommunication.release()
+        try:
+            if sequencename:
+                yield deferToThread(self.api.record2, sequence_rep, sequencename)
+            else:
+                sequencename, _ = yield deferToThread(self.dma_cache.record, self.api, sequence_rep)
+        finally:
+            self.inCommunication.release()
 
         #set global variables
         self.ps_is_programmed = True
         self.ps_programmed_sequence = sequence
+        self.ps_programmed_handle = sequencename
+        returnValue(sequencename)
 
-    @setting(2, "Run Sequence", maxruns = 'i', returns='')
-    def runSequence(self, c, maxruns):
+    @setting(2, "Run Sequence", maxruns = 'i', sequencename = 's', returns='')
+    def runSequence(self, c, maxruns, sequencename = None):
         """
         Run the pulse sequence a given number of times.
         Argument:
-            numruns (int): number of times to run the pulse sequence
+            numruns         (int): number of times to run the pulse sequence
+            sequencename    (str): the DMA handle name of the sequence to run (as returned by Record Sequence).
+                                    Defaults to the last recorded sequence.
         """
         #check to see if a sequence has been programmed
         if not self.ps_is_programmed: raise Exception("No Programmed Sequence")
+        if not sequencename: sequencename = self.ps_programmed_handle
 
         #set pipeline, priority, and expid
         ps_pipeline = 'PS'
@@ -153,14 +160,20 @@ class Pulser_server(LabradServer):
                     'file': self.ps_filename,
                     'class_name': None,
                     'arguments': {'maxRuns': maxruns,
+                                  'sequencename': sequencename,
                                   'linetrigger_enabled': self.linetrigger_enabled,
                                   'linetrigger_delay_us': self.linetrigger_delay,
                                   'linetrigger_ttl_name': self.linetrigger_ttl}}
 
         #run sequence then wait for experiment to submit
         yield self.inCommunication.acquire()
-        self.ps_rid = yield deferToThread(self.scheduler.submit, pipeline_name = ps_pipeline, expid = ps_expid, priority = ps_priority)
-        self.inCommunication.release()
+        try:
+            self.ps_rid = yield deferToThread(self.scheduler.submit, pipeline_name = ps_pipeline, expid = ps_expid, priority = ps_priority)
+            #keep the sequence being played from being evicted from the DMA cache
+            self.dma_cache.unpin()
+            self.dma_cache.pin(sequencename)
+        finally:
+            self.inCommunication.release()
 
     @setting(3, "Stop Sequence", returns='')
     def stopSequence(self, c):
@@ -172,6 +185,7 @@ class Pulser_server(LabradServer):
         yield self.inCommunication.acquire()
         yield deferToThread(self.scheduler.delete, self.ps_rid)
         self.ps_rid = None
+        self.dma_cache.unpin()
         #todo: make resetting of ps_rid contingent on defertothread completion
         self.inCommunication.release()
 
@@ -180,17 +194,23 @@ class Pulser_server(LabradServer):
         """
         Erases the given pulse sequence from memory.
         Arguments:
-            sequencename (str): the sequence to erase
+            sequencename (str): the sequence to erase. Defaults to the last recorded sequence.
         """
         #check to see a sequence has been programmed
         if not self.ps_programmed_sequence: raise Exception("No Programmed Sequence")
-        #set sequence name to default if not specified
-        if not sequencename: sequencename = 'default'
+        #set sequence name to the last recorded sequence if not specified
+        if not sequencename: sequencename = self.ps_programmed_handle
         yield self.inCommunication.acquire()
-        yield deferToThread(self.api.eraseSequence, sequencename)
-        self.ps_programmed_sequence = None
+        try:
+            yield deferToThread(self.api.eraseSequence, sequencename)
+        finally:
+            self.inCommunication.release()
+        self.dma_cache.discard(sequencename)
+        if sequencename == self.ps_programmed_handle:
+            self.ps_programmed_sequence = None
+            self.ps_programmed_handle = None
+            self.ps_is_programmed = False
         self.ps_rid = None
-        self.inCommunication.release()
 
     @setting(5, "Runs Completed", returns='i')
     def runsCompleted(self, c):
@@ -200,35 +220,39 @@ class Pulser_server(LabradServer):
         completed_runs = yield self.api.runsCompleted()
         returnValue(completed_runs)
 
+    @setting(6, "DMA Cache Stats", returns='(iiii)')
+    def dmaCacheStats(self, c):
+        """
+        Get statistics of the recorded sequence cache.
+        Returns:
+            (int, int, int, int): the number of cache hits and misses, and the
+                                    number and total (estimated) size (in bytes) of the recorded sequences.
+        """
+        return self.dma_cache.stats()
+
+    @setting(7, "DMA Cache Clear", returns='')
+    def dmaCacheClear(self, c):
+        """
+        Erase all cached sequences from memory.
+        """
+        yield self.inCommunication.acquire()
+        try:
+            for sequencename in self.dma_cache.clear():
+                yield deferToThread(self.api.eraseSequence, sequencename)
+                if sequencename == self.ps_programmed_handle:
+                    self.ps_programmed_sequence = None
+                    self.ps_programmed_handle = None
+                    self.ps_is_programmed = False
+        finally:
+            self.inCommunication.release()
+
     #TTL functions
     @setting(111, 'Add TTL Pulse', ttl_name = 's', start = 'v[s]', duration = 'v[s]')
     def addTTLPulse(self, c, ttl_name, start, duration):
         """
         Add a TTL Pulse to the sequence, times are in seconds
         """
-        sequence = c.get('sequence')
-
-        #check to see that a sequence exists
-        if not sequence:
-            raise Exception("Please create new sequence first")
-        #check that channel exists
-        if ttl_name not in self.ttlDict.keys():
-            raise Exception("Unknown Channel {}".format(ttl_name))
-
-        #convert
-        ttl_channel = self.ttlDict[ttl_name].channelnumber
-        start = start['s']
-        duration = duration['s']
-
-        # check that pulse is within time limit
-        if not ((self.sequenceTimeRange[0] <= start <= self.sequenceTimeRange[1]) and
-                 (self.sequenceTimeRange[0] <= start + duration <= self.sequenceTimeRange[1])):
-            raise Exception("Time boundaries are out of range")
-            #check to see that pulse is not too short
-        if not duration >= self.timeResolution:
-            raise Exception("Incorrect duration")
-
-        sequence.addPulse(ttl_channel, start, duration)
+        self._addTTLPulses(c, [ttl_name], [start['s']], [duration['s']])
 
     @setting(112, 'Add TTL Pulses', pulses = '*(sv[s]v[s])')
     def addTTLPulses(self, c, pulses):
@@ -236,11 +260,22 @@ class Pulser_server(LabradServer):
         Add multiple TTL Pulses to the sequence, times are in seconds.
         The pulses are a list in the same format as 'add ttl pulse'.
         """
-        for pulse in pulses:
-            ttl_name = pulse[0]
-            start = pulse[1]
-            duration = pulse[2]
-            yield self.addTTLPulse(c, ttl_name, start, duration)
+        ttl_names = [pulse[0] for pulse in pulses]
+        starts = [pulse[1]['s'] for pulse in pulses]
+        durations = [pulse[2]['s'] for pulse in pulses]
+        self._addTTLPulses(c, ttl_names, starts, durations)
+
+    @setting(117, 'Add TTL Pulses Array', channels = ['*s', '*i'], starts = '*v[s]', durations = '*v[s]')
+    def addTTLPulsesArray(self, c, channels, starts, durations):
+        """
+        Add multiple TTL pulses to the sequence, given as columns.
+        All pulses are checked at once, and all invalid pulses are reported in a single error.
+        Arguments:
+            channels    (*str/*int) : the TTL channel names (or channel numbers).
+            starts      (*float)    : the pulse start times (in s).
+            durations   (*float)    : the pulse durations (in s).
+        """
+        self._addTTLPulses(c, channels, starts['s'], durations['s'])
 
     @setting(113, "Extend Sequence Length", end_time = 'v[s]')
     def extendSequenceLength(self, c, end_time):
@@ -324,60 +359,30 @@ class Pulser_server(LabradServer):
         Add DDS pulses to sequence.
         Input in the form of a list [(name, start, duration, frequency, amplitude, phase, ramp_rate, amp_ramp_rate)]
         '''
-        sequence = c.get('sequence')
-        #check whether a sequence exists
-        if not sequence: raise Exception("Please create new sequence first")
-        for value in values:
-            try:
-                name, start, dur, freq, ampl = value
-                phase = 0.0
-                ramp_rate = 0.0
-            except ValueError:
-                name, start, dur, freq, ampl, phase, ramp_rate, amp_ramp_rate = value
-            try:
-                channel = self.ddsDict[name]
-            except KeyError:
-                raise Exception("Unknown DDS channel {}".format(name))
-
-            #strip units
-            start = start['s']
-            dur = dur['s']
-            freq = freq['MHz']
-            ampl = ampl['dBm']
-            phase = phase['deg']
-            ramp_rate = ramp_rate['MHz']
-            amp_ramp_rate = amp_ramp_rate['dB']
-            freq_off, ampl_off = channel.off_parameters
-
-            #only check range if dds won't be off
-            if (freq == 0) or (ampl == 0):
-                freq, ampl = freq_off, ampl_off
-            else:
-                self._checkRange('frequency', channel, freq)
-                self._checkRange('amplitude', channel, ampl)
-
-            #convert parameters
-            _asf = self.dbm_to_fampl(ampl)
-            _asf = self.amplitude_to_asf(_asf)
-            _ftw = self.frequency_to_ftw(freq * 1e6)
-            _pow = self.turns_to_pow(phase / (2*np.pi))
-            num_ARTIQ = (_asf, _ftw, _pow)
-            num_off_ARTIQ = (0, 0, 0)
-
-            #check time is in range
-                #note < sign, because start can not be 0.
-                #this would overwrite the 0 position of the ram, and cause the dds to change before pulse sequence is launched
-            if not self.sequenceTimeRange[0] < start <= self.sequenceTimeRange[1]:
-                raise Exception("DDS start time out of acceptable input range for channel {0} at time {1}".format(name, start))
-            if not self.sequenceTimeRange[0] < start + dur <= self.sequenceTimeRange[1]:
-                raise Exception("DDS start time out of acceptable input range for channel {0} at time {1}".format(name, start + dur))
-
-            #ignore zero-length pulses
-            if not dur == 0:
-                #get the DDS channel number
-                dds_channel = channel.address
-                sequence.addDDS(dds_channel, start, num_ARTIQ, 'start')
-                sequence.addDDS(dds_channel, start + dur, num_off_ARTIQ, 'stop')
+        names = [value[0] for value in values]
+        starts = [value[1]['s'] for value in values]
+        durations = [value[2]['s'] for value in values]
+        freqs = [value[3]['MHz'] for value in values]
+        ampls = [value[4]['dBm'] for value in values]
+        phases = [value[5]['deg'] if len(value) > 5 else 0. for value in values]
+        self._addDDSPulses(c, names, starts, durations, freqs, ampls, phases)
+
+    @setting(213, 'Add DDS Pulses Array', channels = ['*s', '*i'], starts = '*v[s]', durations = '*v[s]',
+             freqs = '*v[MHz]', ampls = '*v[dBm]', phases = '*v[deg]')
+    def addDDSPulsesArray(self, c, channels, starts, durations, freqs, ampls, phases = None):
+        '''
+        Add multiple DDS pulses to the sequence, given as columns.
+        All pulses are checked at once, and all invalid pulses are reported in a single error.
+        Arguments:
+            channels    (*str/*int) : the DDS channel names (or channel numbers).
+            starts      (*float)    : the pulse start times (in s).
+            durations   (*float)    : the pulse durations (in s).
+            freqs       (*float)    : the pulse frequencies (in MHz).
+            ampls       (*float)    : the pulse amplitudes (in dBm).
+            phases      (*float)    : the pulse phases (in deg). Defaults to 0.
+        '''
+        phases = np.zeros(len(starts)) if phases is None else phases['deg']
+        self._addDDSPulses(c, channels, starts['s'], durations['s'], freqs['MHz'], ampls['dBm'], phases)
 
     @setting(21, "Initialize DDS", returns = '')
     def initializeDDS(self, c):
@@ -507,6 +512,26 @@ class Pulser_server(LabradServer):
         self.listeners.remove(c.ID)
 
     #Helper functions
+    def _addTTLPulses(self, c, channels, starts, durations):
+        """
+        Check TTL pulse columns and add them to the context's sequence.
+        """
+        sequence = c.get('sequence')
+        if not sequence: raise Exception("Please create new sequence first")
+        ttl_channels = self.pulse_columns.checkTTLPulses(channels, starts, durations)
+        sequence.addPulse(ttl_channels, np.asarray(starts), np.asarray(durations))
+
+    def _addDDSPulses(self, c, channels, starts, durations, freqs, ampls, phases):
+        """
+        Check DDS pulse columns, convert them to machine units, and add them to the context's sequence.
+        """
+        sequence = c.get('sequence')
+        if not sequence: raise Exception("Please create new sequence first")
+        dds_channels, starts, durations, freqs, ampls, phases = self.pulse_columns.checkDDSPulses(channels, starts, durations,
+                                                                                                    freqs, ampls, phases)
+        params_mu = self.pulse_columns.ddsParamsToMu(freqs, ampls, phases, self.ftw_per_hz)
+        sequence.addDDSPulses(dds_channels, starts, durations, params_mu)
+
     def _checkRange(self, t, channel, val):
         if t == 'amplitude':
             r = channel.allowedamplrange
@@ -6,6 +6,7 @@ class pulse_runner(EnvExperiment):
         self.setattr_device('core')
         self.setattr_device('core_dma')
         self.setattr_argument("maxRuns", NumberValue(1, ndecimals=0, step=1, type = 'int'))
+        self.setattr_argument("sequencename", StringValue('default'))
         self.setattr_argument("linetrigger_enabled", BooleanValue(False))
         self.setattr_argument("linetrigger_delay_us", NumberValue(0, ndecimals=0, step=1, type='int'))
         self.setattr_argument("linetrigger_ttl_name", StringValue())
@@ -15,7 +16,7 @@ class pulse_runner(EnvExperiment):
 
     @kernel
     def run(self):
-        handle = self.core_dma.get_handle('default')
+        handle = self.core_dma.get_handle(self.sequencename)
         self.core.reset()
         #linetrigger
         while self.linetrigger_enabled:
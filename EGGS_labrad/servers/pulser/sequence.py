@@ -1,72 +1,60 @@
 import numpy as np
-import array
 
-#from EGGS_labrad.config.hardwareConfiguration import hardwareConfiguration
+from event_table import EventTable, KIND_DDS
+
 
 class Sequence():
     """
     Sequence for programming pulses.
     Used by the Pulser server to store a pulse sequence.
+    Events are stored in an EventTable, and are only checked when the sequence is compiled.
     """
 
-    # def __init__(self, parent):
-    #     self.channelTotal = hardwareConfiguration.channelTotal
-    #     self.MAX_SWITCHES = hardwareConfiguration.maxSwitches
-    #
-    #     #dictionary in the form: {time: which channels to switch}
-    #     #which channels to switch is a channelTotal-long array with 1 to switch ON, -1 to switch OFF, 0 to do nothing
-    #     self.switchingTimes = {0: np.zeros(self.channelTotal, dtype = np.int8)}
-    #     self.switches = 1 #keeps track of how many switches are to be performed (same as the number of keys in the switching Times dictionary)
-    #
-    #     #dictionary for storing information about dds switches, in the format:
-    #     #time: {channel_name: integer representing the state}
-    #     self.ddsSettingList = dict.fromkeys(hardwareConfiguration.ddsDict.keys(), [])
-    #     self.seconds_to_mu = self.parent.seconds_to_mu
-
-    def __init__(self):
+    def __init__(self, seconds_to_mu=None):
+        """
+        Arguments:
+            seconds_to_mu   (func)  : converts times in seconds to machine units.
+                                        Defaults to a 1ns machine unit.
+        """
         self.channelTotal = 8
-        self.timeResolution = 1
-        self.MAX_SWITCHES = 1000
-
-        self.switchingTimes = {0: np.zeros(self.channelTotal, dtype = np.int8)}
-        self.switches = 1
-
-        self.ddsSettingList = {}
+        self.timeResolution = 1e-9
+        if seconds_to_mu is None:
+            seconds_to_mu = lambda t: np.int64(np.round(np.asarray(t) / self.timeResolution))
+        self.seconds_to_mu = seconds_to_mu
+        self.events = EventTable()
 
     #Sequence functions
     def progRepresentation(self):
-        """Returns the programming representation of the sequence"""
-        return self.switchingTimes, self.ddsSettingList
+        """Returns the programming representation of the sequence (see EventTable.compile)"""
+        return self.events.compile()
 
     def humanRepresentation(self):
-        """Returns the human readable version of the sequence for FPGA for debugging"""
-        ttl = self.ttlHumanRepresentation(self.ttlProgram)
-        return ttl, self.ddsSettingList
+        """Returns the human readable version of the sequence for debugging"""
+        rep = self.progRepresentation()
+        ttl = self.ttlHumanRepresentation(rep)
+        dds = [(str(channel), time_mu * self.timeResolution, float(state))
+               for time_mu, channel, state in zip(rep['dds_times'], rep['dds_channels'], rep['dds_states'])]
+        return ttl, dds
 
     def ttlHumanRepresentation(self, rep):
-        # recast rep from bytearray into string
-        rep = str(rep)
-        # does the decoding from the string
-        arr = np.fromstring(rep, dtype = np.uint16)
-        # once decoded, need to be able to manipulate large numbers
-        arr = np.array(arr, dtype = np.uint32)
-        arr = arr.reshape(-1,4)
-        times = ((arr[:, 0] << 16) + arr[:, 1]) * float(self.timeResolution)
-        channels = ((arr[:, 2] << 16) + arr[:, 3])
-
-        def expandChannel(ch):
-            '''function for getting the binary representation, i.e 2**32 is 1000...0'''
-            expand = bin(ch)[2:].zfill(32)
-            reverse = expand[::-1]
-            return reverse
-
-        channels = map(expandChannel, channels)
-        return np.vstack((times, channels)).transpose()
+        """
+        Returns the TTL switching times (in s) and the state of each channel after each switch,
+            where the channel states are given as a bitstring (i.e. '0100' means only channel 1 is on).
+        """
+        # the channel states are the cumulative effect of all previous switches
+        num_channels = max(self.channelTotal, int(rep['ttl_on_masks'].max()).bit_length() if len(rep['ttl_times']) else 0)
+        bits = np.arange(num_channels, dtype=np.int64)
+        switches = ((rep['ttl_on_masks'][:, np.newaxis] >> bits) & 1) - ((rep['ttl_off_masks'][:, np.newaxis] >> bits) & 1)
+        states = np.cumsum(switches, axis=0)
+        channels = [''.join(map(str, row)) for row in states]
+        times = rep['ttl_times'] * self.timeResolution
+        return np.array([list(map(str, times)), channels]).transpose()
 
     #TTL functions
     def addPulse(self, channel, start, duration):
         """
-        Adds TTL pulse to sequence
+        Adds TTL pulse to sequence.
+            Arguments may also be arrays to add multiple pulses at once.
         Arguments:
             channel     (int)   : the TTL channel number
             start       (float) : the start time in seconds
@@ -74,8 +62,7 @@ class Sequence():
         """
         start = self.seconds_to_mu(start)
         duration = self.seconds_to_mu(duration)
-        self._addNewSwitch(start, channel, 1)
-        self._addNewSwitch(start + duration, channel, -1)
+        self.events.addTTLPulses(channel, start, duration)
 
     def extendSequenceLength(self, endtime):
         """
@@ -83,26 +70,29 @@ class Sequence():
         Arguments:
             endtime (int): the TTL sequence endtime in seconds
         """
-        endtime_mu = self.seconds_to_mu(endtime)
-        self._addNewSwitch(endtime_mu, 0, 0)
-
-    def _addNewSwitch(self, start_time, chan, value):
-        if start_time in self.switchingTimes:
-            if self.switchingTimes[start_time][chan]: # checks if 0 or 1/-1
-                # if set to turn off, but want on, replace with zero, fixes error adding 2 TTLs back to back
-                if self.switchingTimes[start_time][chan] * value == -1:
-                    self.switchingTimes[start_time][chan] = 0
-                else:
-                    raise Exception ('Double switch at time {} for channel {}'.format(start_time, chan))
-            else:
-                self.switchingTimes[start_time][chan] = value
-        else:
-            if self.switches == self.MAX_SWITCHES: raise Exception("Exceeded maximum number of switches {}".format(self.switches))
-            self.switchingTimes[start_time] = np.zeros(self.channelTotal, dtype = np.int8)
-            self.switches += 1
-            self.switchingTimes[start_time][chan] = value
+        self.events.extendLength(self.seconds_to_mu(endtime))
 
     #DDS functions
     def addDDS(self, dds_num, start_time, params, start_or_stop):
+        """
+        Adds a DDS event to the sequence.
+            Multiple DDS events may occur at the same time (e.g. on different channels).
+        Arguments:
+            dds_num         (int)   : the DDS channel number
+            start_time      (float) : the event time in seconds
+            params          (int, int, int): the (ftw, asf, pow) of the DDS
+            start_or_stop   (str)   : 'start' to turn the DDS on, 'stop' to turn it off
+        """
         start_time_mu = self.seconds_to_mu(start_time)
-        self.ddsSettingList[start_time_mu] = (dds_num, params, start_or_stop)
+        self.events.extend(start_time_mu, dds_num, KIND_DDS, int(start_or_stop == 'start'), params)
+
+    def addDDSPulses(self, dds_nums, start_times, durations, params):
+        """
+        Adds multiple DDS pulses to the sequence at once.
+        Arguments:
+            dds_nums        (np.array)  : the DDS channel numbers
+            start_times     (np.array)  : the pulse start times in seconds
+            durations       (np.array)  : the pulse durations in seconds
+            params          (np.array)  : the (ftw, asf, pow) of each pulse, with shape (num_pulses, 3)
+        """
+        self.events.addDDSPulses(dds_nums, self.seconds_to_mu(start_times), self.seconds_to_mu(durations), params)
@@ -1,17 +1,18 @@
-__all__ = ["SequencePlotter", "pulse_sequence", "channelConfiguration", "ddsConfiguration", "dds_channel"]
+__all__ = ["SequencePlotter", "pulse_sequence", "pulse_template", "channelConfiguration", "ddsConfiguration", "dds_channel"]
 
 #sequence plotter
 from EGGS_labrad.servers.pulser.sequence.plot_sequence import SequencePlotter
 
 #programmable pulse sequence
 from EGGS_labrad.servers.pulser.sequence.pulse_sequence import pulse_sequence
+from EGGS_labrad.servers.pulser.sequence.pulse_template import pulse_template
 
 #channel configs
-from EGGS_labrad.servers.pulser.sequence.pulse_config import channelConfiguration
-from EGGS_labrad.servers.pulser.sequence.pulse_config import ddsConfiguration
+from EGGS_labrad.servers.pulser.sequence.pulser_config import channelConfiguration
+from EGGS_labrad.servers.pulser.sequence.pulser_config import ddsConfiguration
 
 #dds channel
-from EGGS_labrad.servers.pulser.sequence.pulse_sequences_config import dds_channel
+from EGGS_labrad.servers.pulser.sequence.pulser_config import dds_channel
 
 
 
@@ -1,7 +1,8 @@
 #imports
 from treedict import TreeDict
 from labrad.units import WithUnit
-from EGGS_labrad.servers.pulser.sequence.pulse_config import dds_name_dictionary as dds_config
+from EGGS_labrad.servers.pulser.sequence.pulser_config import dds_name_dictionary as dds_config
+from EGGS_labrad.servers.pulser.sequence.pulse_template import pulse_template
 
 
 class pulse_sequence(object):
@@ -43,6 +44,14 @@ class pulse_sequence(object):
 			required = required.union(additional)
 		required = list(required)
 		return required
+
+	@classmethod
+	def template(cls, parameter_dict, slots, start = WithUnit(1.0, 'us')):
+		'''
+		Build the sequence once, with the given parameters (e.g. scan parameters) left as symbolic slots.
+		Use the returned pulse_template to program the sequence for new slot values without rebuilding it.
+		'''
+		return pulse_template(cls, parameter_dict, slots, start)
 	
 	def sequence(self):
 		'''
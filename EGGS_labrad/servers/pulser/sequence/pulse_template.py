@@ -0,0 +1,314 @@
+import numpy as np
+from numbers import Number
+from operator import lt, le, gt, ge, eq, ne
+from labrad.units import WithUnit, Value, Unit
+
+
+class SlotValue(Value):
+    '''
+    A value in a pulse sequence template which depends linearly on the template slots.
+    Behaves like a labrad Value (with units) inside pulse_sequence.sequence(), but keeps track of
+        its dependence on the slots, so the sequence can be recalculated without rebuilding it.
+    Comparisons (e.g. max, if statements) use the nominal slot values and are recorded,
+        so that slot values which would change the structure of the sequence can be detected.
+    '''
+
+    def __new__(cls, context, const, coefs, unit):
+        inst = object.__new__(cls)
+        inst._context = context
+        inst._const = float(const)
+        inst._coefs = np.asarray(coefs, dtype=float)
+        inst.unit = Unit(unit)
+        inst.is_dimensionless = inst.unit.is_dimensionless
+        return inst
+
+    def __init__(self, *args):
+        pass
+
+    @property
+    def _value(self):
+        return self._const + np.dot(self._coefs, self._context.nominal)
+
+    def __repr__(self):
+        return 'SlotValue({:g} {})'.format(self._value, self.unit)
+
+    def _new(self, const, coefs, unit=None):
+        return SlotValue(self._context, const, coefs, self.unit if unit is None else unit)
+
+    def _coerce(self, other):
+        '''
+        Get the (const, coefs) of another value in the units of this value.
+        '''
+        if isinstance(other, SlotValue):
+            factor = other.unit.conversionFactorTo(self.unit)
+            return other._const * factor, other._coefs * factor
+        elif isinstance(other, WithUnit):
+            return other[self.unit], 0.
+        elif self.is_dimensionless and isinstance(other, Number):
+            return float(other), 0.
+        raise TypeError('Incompatible units: {}, {}'.format(self.unit, other))
+
+    def _nonlinear(self, *args):
+        raise TypeError('Template slots can only be used linearly (e.g. added, or scaled by a constant).')
+
+    # unit conversion
+    def __getitem__(self, unit):
+        factor = self.unit.conversionFactorTo(unit)
+        return self._new(self._const * factor, self._coefs * factor, '')
+
+    def inUnitsOf(self, unit):
+        factor = self.unit.conversionFactorTo(unit)
+        return self._new(self._const * factor, self._coefs * factor, unit)
+
+    # linear operations
+    def __add__(self, other):
+        const, coefs = self._coerce(other)
+        return self._new(self._const + const, self._coefs + coefs)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        const, coefs = self._coerce(other)
+        return self._new(self._const - const, self._coefs - coefs)
+
+    def __rsub__(self, other):
+        const, coefs = self._coerce(other)
+        return self._new(const - self._const, coefs - self._coefs)
+
+    def __neg__(self):
+        return self._new(-self._const, -self._coefs)
+
+    def __pos__(self):
+        return self
+
+    def __mul__(self, other):
+        if isinstance(other, SlotValue):
+            self._nonlinear()
+        elif isinstance(other, WithUnit):
+            return self._new(self._const * other._value, self._coefs * other._value, self.unit * other.unit)
+        elif isinstance(other, Unit):
+            return self._new(self._const, self._coefs, self.unit * other)
+        return self._new(self._const * other, self._coefs * other)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, SlotValue):
+            self._nonlinear()
+        elif isinstance(other, WithUnit):
+            return self._new(self._const / other._value, self._coefs / other._value, self.unit / other.unit)
+        return self._new(self._const / other, self._coefs / other)
+
+    __div__ = __truediv__
+    __rtruediv__ = __rdiv__ = __floordiv__ = __rfloordiv__ = __mod__ = __rmod__ = __pow__ = __rpow__ = _nonlinear
+    __float__ = __int__ = _nonlinear
+
+    def __abs__(self):
+        return self if self >= 0 * self.unit else -self
+
+    # comparisons
+    def _compare(self, other, op):
+        if isinstance(other, Number) and (other == 0):
+            const, coefs = 0., 0.
+        else:
+            const, coefs = self._coerce(other)
+        return self._context.compare(self._const - const, self._coefs - coefs, op)
+
+    def __lt__(self, other):
+        return self._compare(other, lt)
+
+    def __le__(self, other):
+        return self._compare(other, le)
+
+    def __gt__(self, other):
+        return self._compare(other, gt)
+
+    def __ge__(self, other):
+        return self._compare(other, ge)
+
+    def __eq__(self, other):
+        return self._compare(other, eq)
+
+    def __ne__(self, other):
+        return self._compare(other, ne)
+
+    __hash__ = None
+
+
+class _TemplateContext(object):
+    '''
+    Holds the nominal slot values, and the conditions on the slots
+        which were assumed while building the sequence.
+    '''
+
+    # (condition on difference, condition if comparison was True, condition if comparison was False)
+    # where conditions are: 0: d > 0, 1: d >= 0, 2: -d > 0, 3: -d >= 0, 4: d == 0, 5: d != 0
+    _CONDITIONS = {lt: (2, 1), le: (3, 0), gt: (0, 3), ge: (1, 2), eq: (4, 5), ne: (5, 4)}
+
+    def __init__(self, nominal):
+        self.nominal = np.asarray(nominal, dtype=float)
+        self.guards = []
+
+    def compare(self, const, coefs, op):
+        '''
+        Compare a difference (const + coefs . slots) to zero at the nominal slot values,
+            and record the result as a condition on the slots.
+        '''
+        result = bool(op(const + np.dot(coefs, self.nominal), 0))
+        if np.any(coefs != 0):
+            self.guards.append((const, coefs, self._CONDITIONS[op][0 if result else 1]))
+        return result
+
+    def compile(self):
+        '''
+        Returns:
+            (np.array, np.array, np.array): the (const, coefs, condition) of each guard as arrays.
+        '''
+        num_slots = len(self.nominal)
+        if not self.guards:
+            return np.zeros(0), np.zeros((0, num_slots)), np.zeros(0, dtype=int)
+        const, coefs, conditions = zip(*self.guards)
+        return np.array(const), np.array([np.broadcast_to(c, num_slots) for c in coefs]), np.array(conditions)
+
+
+def _linearColumn(values, unit, num_slots):
+    '''
+    Convert a list of values (SlotValues, labrad Values, or numbers) into the const and coefficients of each value.
+    Returns:
+        (np.array, np.array): the constant term (with shape (num_values,)) and
+                                the slot coefficients (with shape (num_values, num_slots)) in the given units.
+    '''
+    const = np.zeros(len(values))
+    coefs = np.zeros((len(values), num_slots))
+    for i, value in enumerate(values):
+        if isinstance(value, SlotValue):
+            factor = value.unit.conversionFactorTo(unit)
+            const[i], coefs[i] = value._const * factor, value._coefs * factor
+        elif isinstance(value, WithUnit):
+            const[i] = value[unit]
+        else:
+            const[i] = value
+    return const, coefs
+
+
+class pulse_template(object):
+    '''
+    A pulse sequence which is built once with some parameters left as symbolic slots.
+    The pulse times and DDS parameters are stored as linear functions of the slots,
+    so each scan point only has to substitute the new slot values (a few matrix products)
+    instead of rebuilding the sequence.
+    If new slot values would change a comparison made while building the sequence
+    (e.g. which of two subsequences ends last), the template is rebuilt at the new values.
+    '''
+
+    # units of each pulse column
+    TTL_COLUMNS = (('starts', 's', 1), ('durations', 's', 2))
+    DDS_COLUMNS = (('starts', 's', 1), ('durations', 's', 2), ('freqs', 'MHz', 3), ('ampls', 'dBm', 4), ('phases', 'deg', 5))
+
+    def __init__(self, sequence_class, parameter_dict, slots, start = WithUnit(1.0, 'us')):
+        '''
+        Arguments:
+            sequence_class  (class)     : the pulse_sequence subclass.
+            parameter_dict  (TreeDict)  : the parameters of the sequence, including nominal values for the slots.
+            slots           (*str)      : the parameter keys (e.g. 'Excitation_729.duration') which change between scan points.
+            start           (WithUnit)  : the sequence start time.
+        '''
+        self.sequence_class = sequence_class
+        self.parameter_dict = parameter_dict
+        self.slots = list(slots)
+        self.slot_units = [parameter_dict[key].unit for key in self.slots]
+        self.start = start
+        self.builds = 0
+        self._build([parameter_dict[key][unit] for key, unit in zip(self.slots, self.slot_units)])
+
+    def _build(self, nominal):
+        '''
+        Build the sequence with the slots as SlotValues, and store each pulse column as a linear function of the slots.
+        '''
+        num_slots = len(self.slots)
+        context = _TemplateContext(nominal)
+        replacement = self.parameter_dict.copy()
+        for i, (key, unit) in enumerate(zip(self.slots, self.slot_units)):
+            replacement[key] = SlotValue(context, 0., np.eye(num_slots)[i], unit)
+        sequence = self.sequence_class(replacement, start = self.start)
+
+        self.ttl_channels = [pulse[0] for pulse in sequence._ttl_pulses]
+        self.dds_channels = [pulse[0] for pulse in sequence._dds_pulses]
+        columns = [('ttl_' + name, [pulse[i] for pulse in sequence._ttl_pulses], unit) for name, unit, i in self.TTL_COLUMNS]
+        columns += [('dds_' + name, [pulse[i] for pulse in sequence._dds_pulses], unit) for name, unit, i in self.DDS_COLUMNS]
+        columns.append(('end', [sequence.end], 's'))
+
+        # stack all columns (and the guards) so they can be calculated with a single matrix product
+        const, coefs = zip(*(_linearColumn(values, unit, num_slots) for _, values, unit in columns))
+        guard_const, guard_coefs, self._guard_conditions = context.compile()
+        self._const = np.concatenate(const + (guard_const,))
+        self._coefs = np.concatenate(coefs + (guard_coefs,))
+        self._slices = dict()
+        index = 0
+        for name, values, _ in columns:
+            self._slices[name] = slice(index, index + len(values))
+            index += len(values)
+        self._guard_slice = slice(index, None)
+        self.nominal = context.nominal
+        self.builds += 1
+
+    def _slotValues(self, values):
+        '''
+        Convert the new slot values to an array. Missing slots keep their nominal values.
+        '''
+        if not isinstance(values, dict):
+            return np.asarray(values, dtype=float)
+        x = self.nominal.copy()
+        for i, (key, unit) in enumerate(zip(self.slots, self.slot_units)):
+            if key in values:
+                x[i] = values[key][unit]
+        return x
+
+    def _checkGuards(self, d):
+        '''
+        Check whether the comparisons made while building the sequence still hold for the given slot values.
+        '''
+        conditions = self._guard_conditions
+        if len(conditions) == 0:
+            return True
+        valid = np.choose(conditions, (d > 0, d >= 0, -d > 0, -d >= 0, d == 0, d != 0))
+        return bool(np.all(valid))
+
+    def fill(self, values):
+        '''
+        Calculate the pulses for the given slot values.
+        Arguments:
+            values  (dict)  : the new slot values, as {parameter key: value}.
+                                Can also be an array of values (in the units of each slot's nominal value), in slot order.
+        Returns:
+            (dict): the pulse columns, i.e. ttl_channels, ttl_starts, ttl_durations (in s),
+                        dds_channels, dds_starts, dds_durations (in s), dds_freqs (in MHz),
+                        dds_ampls (in dBm), dds_phases (in deg), and the sequence end (in s).
+        '''
+        x = self._slotValues(values)
+        y = self._const + np.dot(self._coefs, x)
+        if not self._checkGuards(y[self._guard_slice]):
+            self._build(x)
+            y = self._const + np.dot(self._coefs, x)
+        columns = {name: y[column_slice] for name, column_slice in self._slices.items()}
+        columns['end'] = float(columns['end'][0])
+        columns['ttl_channels'] = self.ttl_channels
+        columns['dds_channels'] = self.dds_channels
+        return columns
+
+    def programSequence(self, pulser, values):
+        '''
+        Program the pulser with the sequence for the given slot values.
+        Returns:
+            (str): the DMA handle name of the recorded sequence.
+        '''
+        columns = self.fill(values)
+        pulser.new_sequence()
+        if len(columns['ttl_channels']):
+            pulser.add_ttl_pulses_array(columns['ttl_channels'], WithUnit(columns['ttl_starts'], 's'),
+                                        WithUnit(columns['ttl_durations'], 's'))
+        if len(columns['dds_channels']):
+            pulser.add_dds_pulses_array(columns['dds_channels'], WithUnit(columns['dds_starts'], 's'),
+                                        WithUnit(columns['dds_durations'], 's'), WithUnit(columns['dds_freqs'], 'MHz'),
+                                        WithUnit(columns['dds_ampls'], 'dBm'), WithUnit(columns['dds_phases'], 'deg'))
+        return pulser.record_sequence()
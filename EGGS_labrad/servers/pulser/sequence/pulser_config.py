@@ -1,3 +1,6 @@
+from labrad.units import WithUnit
+
+
 class channelConfiguration(object):
     """
     Stores complete configuration for each of the channels
@@ -0,0 +1,104 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# pulser server modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_table import EventTable
+from dma_cache import DMASequenceCache, sequenceKey, sequenceSize
+from pulser_api_sim import Pulser_API_Sim
+
+
+def compiled(start_mu, channel=0):
+    table = EventTable()
+    table.addTTLPulses(channel, start_mu, 100)
+    table.addDDSPulses(1, start_mu, 50, [1, 2, 3])
+    return table.compile()
+
+
+@pytest.fixture
+def api():
+    return Pulser_API_Sim()
+
+
+def test_sequence_key():
+    # events added in a different order give the same key
+    table = EventTable()
+    table.addTTLPulses([1, 0], [200, 100], 10)
+    other = EventTable()
+    other.addTTLPulses([0, 1], [100, 200], 10)
+    assert sequenceKey(table.compile()) == sequenceKey(other.compile())
+    assert sequenceKey(compiled(100)) != sequenceKey(compiled(101))
+    # 2 ttl switches and a dds start/stop
+    assert sequenceSize(compiled(100)) == (2 + 8 + 1) * 32
+
+
+def test_cache_hits(api):
+    cache = DMASequenceCache()
+    handle, hit = cache.record(api, compiled(100))
+    assert not hit
+    assert cache.record(api, compiled(100)) == (handle, True)
+    handle_other, hit = cache.record(api, compiled(200))
+    assert (handle_other != handle) and not hit
+
+    assert api.call_log.count('record') == 2
+    assert cache.stats() == (1, 2, 2, 2 * sequenceSize(compiled(100)))
+
+    # handles can be run directly
+    api.scheduler.submit(expid={'arguments': {'maxRuns': 5, 'sequencename': handle}})
+    assert api.runsCompleted() == 5
+
+
+def test_cache_eviction(api):
+    cache = DMASequenceCache(max_sequences=2)
+    handles = [cache.record(api, compiled(100 * i))[0] for i in range(3)]
+    # least recently used sequence is erased from the core device
+    assert handles[0] not in api.dma_sequences
+    assert set(api.dma_sequences) == set(handles[1:])
+
+    # using a sequence keeps it from being evicted
+    cache.record(api, compiled(100))
+    cache.record(api, compiled(300))
+    assert set(api.dma_sequences) == {handles[1], cache.record(api, compiled(300))[0]}
+
+    # limited by size
+    cache = DMASequenceCache(max_bytes=2 * sequenceSize(compiled(0)))
+    for i in range(3):
+        cache.record(api, compiled(1000 * i))
+    assert cache.stats()[2:] == (2, 2 * sequenceSize(compiled(0)))
+    with pytest.raises(Exception, match='too large'):
+        DMASequenceCache(max_bytes=10).record(api, compiled(0))
+
+
+def test_cache_pinned(api):
+    cache = DMASequenceCache(max_sequences=2)
+    playing = cache.record(api, compiled(0))[0]
+    cache.pin(playing)
+    handles = [cache.record(api, compiled(100 * i))[0] for i in range(1, 4)]
+    # the playing sequence is never erased, even though it is the least recently used
+    assert playing in api.dma_sequences
+    assert set(api.dma_sequences) == {playing, handles[-1]}
+
+    # once unpinned, it can be evicted again
+    cache.unpin(playing)
+    cache.record(api, compiled(1000))
+    assert playing not in api.dma_sequences
+
+    # pinned sequences can't be evicted to make space
+    cache = DMASequenceCache(max_bytes=2 * sequenceSize(compiled(0)))
+    cache.pin(cache.record(api, compiled(0))[0])
+    cache.pin(cache.record(api, compiled(100))[0])
+    with pytest.raises(Exception, match='in use'):
+        cache.record(api, compiled(200))
+    assert cache.stats()[2] == 2
+
+
+def test_cache_failed_record(api):
+    cache = DMASequenceCache()
+    with pytest.raises(Exception, match='TTL does not exist'):
+        cache.record(api, compiled(100, channel=20))
+    assert cache.stats()[2] == 0
+    assert len(api.dma_sequences) == 0
@@ -0,0 +1,76 @@
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+import pytest
+
+# pulser server modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_table import EventTable, KIND_DDS
+
+
+def test_ttl_compile():
+    table = EventTable(capacity=2)
+    # added out of order; back-to-back pulses on channel 0 are merged
+    table.addTTLPulses(1, 50, 100)
+    table.addTTLPulses([0, 0], [10, 30], [20, 40])
+    table.extendLength(500)
+    rep = table.compile()
+
+    np.testing.assert_array_equal(rep['ttl_times'], [10, 50, 70, 150])
+    np.testing.assert_array_equal(rep['ttl_on_masks'], [0b01, 0b10, 0, 0])
+    np.testing.assert_array_equal(rep['ttl_off_masks'], [0, 0, 0b01, 0b10])
+    assert rep['end_time'] == 500
+
+
+def test_ttl_errors():
+    table = EventTable()
+    table.addTTLPulses([2, 2], [10, 10], [5, 20])
+    with pytest.raises(Exception, match='Double switch at time 10 for channel 2'):
+        table.compile()
+
+    table = EventTable()
+    table.addTTLPulses([2, 2], [10, 12], [5, 20])
+    with pytest.raises(Exception, match='Overlapping pulses at time 12 for channel 2'):
+        table.compile()
+
+
+def test_dds_simultaneous():
+    table = EventTable()
+    # two channels start at the same time, and a back-to-back pulse on channel 0
+    table.addDDSPulses([0, 1, 0], [10, 10, 30], [20, 50, 10], [[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+    table.extend(40, 3, KIND_DDS, 0)
+    with pytest.raises(Exception, match='Overlapping'):
+        table.compile()
+
+    table.size -= 1
+    rep = table.compile()
+    np.testing.assert_array_equal(rep['dds_times'], [10, 10, 30, 40, 60])
+    np.testing.assert_array_equal(rep['dds_channels'], [0, 1, 0, 0, 1])
+    np.testing.assert_array_equal(rep['dds_states'], [True, True, True, False, False])
+    np.testing.assert_array_equal(rep['dds_params'][:3], [[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+
+
+def test_compile_1e5_pulses():
+    num_pulses = 100000
+    rng = np.random.default_rng(0)
+    channels = rng.integers(0, 8, num_pulses)
+    # non-overlapping pulses on each channel
+    starts = np.zeros(num_pulses, dtype=np.int64)
+    for channel in range(8):
+        index = np.flatnonzero(channels == channel)
+        starts[index] = np.arange(len(index)) * 100 + rng.integers(0, 50, len(index))
+
+    time_start = perf_counter()
+    table = EventTable()
+    table.addTTLPulses(channels, starts, 10)
+    table.addDDSPulses(channels, starts + 20, 10, [1, 2, 3])
+    rep = table.compile()
+    time_elapsed = perf_counter() - time_start
+
+    assert np.all(np.diff(rep['ttl_times']) > 0)
+    assert np.all(np.diff(rep['dds_times']) >= 0)
+    assert len(rep['dds_times']) <= 2 * num_pulses
+    assert time_elapsed < 5.
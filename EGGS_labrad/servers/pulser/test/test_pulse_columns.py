@@ -0,0 +1,74 @@
+import os
+import sys
+from time import perf_counter
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+# pulser server modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_table import EventTable
+from pulse_columns import PulseColumns
+
+
+@pytest.fixture
+def columns():
+    ttl_dict = {'866DP': SimpleNamespace(channelnumber=12), 'camera': SimpleNamespace(channelnumber=5)}
+    dds_dict = {'866DP': SimpleNamespace(channelnumber=0, allowedfreqrange=(70., 90.), allowedamplrange=(-63., -5.),
+                                         off_parameters=(0., -63.)),
+                '729DP': SimpleNamespace(channelnumber=4, allowedfreqrange=(150., 250.), allowedamplrange=(-63., -5.),
+                                         off_parameters=(0., -63.))}
+    return PulseColumns(ttl_dict, dds_dict, time_range=(0., 85.), time_resolution=40e-9)
+
+
+def test_ttl_lookup(columns):
+    np.testing.assert_array_equal(columns.checkTTLPulses(['camera', '866DP'], [1e-6, 2e-6], [1e-6, 1e-6]), [5, 12])
+    np.testing.assert_array_equal(columns.checkTTLPulses([12, 5], [1e-6, 2e-6], [1e-6, 1e-6]), [12, 5])
+
+
+def test_ttl_errors_reported_together(columns):
+    with pytest.raises(Exception) as err:
+        columns.checkTTLPulses(['camera', 'laser', 'camera', 'camera'], [1e-6, 1e-6, 84.99, 1e-6], [1e-6, 1e-6, 1., 1e-9])
+    message = str(err.value)
+    assert '3 invalid pulses' in message
+    assert 'row 1 (laser): unknown channel' in message
+    assert 'row 2 (camera): time boundaries are out of range' in message
+    assert 'row 3 (camera): incorrect duration' in message
+
+
+def test_dds_check_and_convert(columns):
+    channels, starts, durations, freqs, ampls, phases = columns.checkDDSPulses(
+        ['729DP', '866DP', '866DP'], [1e-6, 1e-6, 5e-6], [1e-6, 0., 1e-6], [200., 80., 0.], [-10., -10., -10.], [90., 0., 0.])
+    # zero-length pulse removed, off parameters used for zero frequency
+    np.testing.assert_array_equal(channels, [4, 0])
+    np.testing.assert_array_equal(freqs, [200., 0.])
+    np.testing.assert_array_equal(ampls, [-10., -63.])
+
+    params_mu = PulseColumns.ddsParamsToMu(freqs, ampls, phases, ftw_per_hz=(1 << 32) / 1e9)
+    np.testing.assert_array_equal(params_mu[0], [round(200e6 * (1 << 32) / 1e9), round(0.1 * 0x3fff), 0x4000])
+
+    with pytest.raises(Exception) as err:
+        columns.checkDDSPulses(['729DP', '866DP'], [0., 1e-6], [1e-6, 1e-6], [200., 100.], [-10., -10.], [0., 0.])
+    assert 'row 0 (729DP): start time is out of range' in str(err.value)
+    assert 'row 1 (866DP): frequency is outside the allowed range' in str(err.value)
+
+
+def test_bulk_throughput(columns):
+    num_pulses = 10000
+    names = np.where(np.arange(num_pulses) % 2, 'camera', '866DP')
+    starts = np.arange(num_pulses) * 1e-6
+
+    time_start = perf_counter()
+    table = EventTable()
+    table.addTTLPulses(columns.checkTTLPulses(names, starts, 5e-7), np.round(starts * 1e9).astype(np.int64), 500)
+    dds_channels, starts, durations, freqs, ampls, phases = columns.checkDDSPulses(
+        np.where(names == 'camera', '729DP', '866DP'), starts + 1e-6, 5e-7, np.where(names == 'camera', 200., 80.), -10., 0.)
+    table.addDDSPulses(dds_channels, np.round(starts * 1e9).astype(np.int64), 500,
+                       PulseColumns.ddsParamsToMu(freqs, ampls, phases, ftw_per_hz=(1 << 32) / 1e9))
+    rep = table.compile()
+    time_elapsed = perf_counter() - time_start
+
+    assert len(rep['ttl_times']) == 2 * num_pulses
+    assert time_elapsed < 1.
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from labrad.units import WithUnit
+
+# pulse sequences need treedict
+TreeDict = pytest.importorskip('treedict').TreeDict
+
+from EGGS_labrad.servers.pulser.sequence.pulse_sequence import pulse_sequence
+
+
+class readout(pulse_sequence):
+
+    required_parameters = [('Readout', 'duration')]
+
+    def sequence(self):
+        duration = self.parameters.Readout.duration
+        self.addTTL('ReadoutCount', self.start, duration)
+        # the camera is triggered either after readout or after a fixed time, whichever is later
+        camera_start = max(self.start + duration, WithUnit(100., 'us'))
+        self.addTTL('camera', camera_start, WithUnit(10., 'us'))
+        self.end = camera_start + WithUnit(10., 'us')
+
+
+class ramsey(pulse_sequence):
+
+    required_parameters = [('Ramsey', 'pi2_time'), ('Ramsey', 'wait_time'), ('Ramsey', 'frequency'), ('Ramsey', 'phase')]
+    required_subsequences = [readout]
+    channel = '866DP'
+
+    def sequence(self):
+        # two pi/2 pulses separated by a wait time, then readout
+        p = self.parameters.Ramsey
+        second = self.start + p.pi2_time + p.wait_time
+        self.addDDS(self.channel, self.start, p.pi2_time, p.frequency, WithUnit(-10., 'dBm'))
+        self.addDDS(self.channel, second, p.pi2_time, p.frequency, WithUnit(-10., 'dBm'), p.phase)
+        self.end = second + p.pi2_time + WithUnit(5., 'us')
+        self.addSequence(readout)
+
+
+PARAMETERS = {'Ramsey.pi2_time': WithUnit(2., 'us'), 'Ramsey.wait_time': WithUnit(10., 'us'),
+              'Ramsey.frequency': WithUnit(220., 'MHz'), 'Ramsey.phase': WithUnit(0., 'deg'),
+              'Readout.duration': WithUnit(50., 'us')}
+
+
+def parameters(values=None):
+    parameter_dict = TreeDict()
+    for key, value in PARAMETERS.items():
+        parameter_dict[key] = value
+    for key, value in (values or {}).items():
+        parameter_dict[key] = value
+    return parameter_dict
+
+
+def test_template_matches_rebuild():
+    template = ramsey.template(parameters(), ['Ramsey.wait_time', 'Ramsey.phase', 'Ramsey.frequency'])
+    for wait_us, phase_deg in [(10., 0.), (25., 90.), (3.5, 180.)]:
+        values = {'Ramsey.wait_time': WithUnit(wait_us, 'us'), 'Ramsey.phase': WithUnit(phase_deg, 'deg')}
+        columns = template.fill(values)
+        sequence = ramsey(parameters(values))
+        np.testing.assert_allclose(columns['ttl_starts'], [pulse[1]['s'] for pulse in sequence._ttl_pulses])
+        np.testing.assert_allclose(columns['dds_starts'], [pulse[1]['s'] for pulse in sequence._dds_pulses])
+        np.testing.assert_allclose(columns['dds_phases'], [0., phase_deg])
+        np.testing.assert_allclose(columns['dds_freqs'], [220., 220.])
+        assert columns['end'] == pytest.approx(sequence.end['s'])
+    assert template.ttl_channels == ['ReadoutCount', 'camera']
+    # the sequence structure didn't change, so the template was only built once
+    assert template.builds == 1
+
+
+def test_template_rebuilds_on_branch_change():
+    template = ramsey.template(parameters(), ['Readout.duration'])
+    # short readout: camera is triggered at the fixed time
+    columns = template.fill({'Readout.duration': WithUnit(10., 'us')})
+    assert columns['ttl_starts'][1] == pytest.approx(100e-6)
+    assert template.builds == 1
+    # long readout: camera is triggered after readout, so the template is rebuilt
+    columns = template.fill({'Readout.duration': WithUnit(200., 'us')})
+    assert columns['ttl_starts'][1] == pytest.approx(220e-6)
+    assert columns['end'] == pytest.approx(230e-6)
+    assert template.builds == 2
+    columns = template.fill([150.])
+    assert columns['ttl_starts'][1] == pytest.approx(170e-6)
+    assert template.builds == 2
+
+
+def test_template_nonlinear():
+    class ramsey_729(ramsey):
+        # the 729 double pass wraps the phase, which isn't linear
+        channel = '729DP'
+
+    with pytest.raises(TypeError, match='linearly'):
+        ramsey_729.template(parameters(), ['Ramsey.phase'])
+    # the double pass frequency conversion is linear
+    template = ramsey_729.template(parameters(), ['Ramsey.frequency'])
+    columns = template.fill({'Ramsey.frequency': WithUnit(10., 'MHz')})
+    np.testing.assert_allclose(columns['dds_freqs'], [215., 215.])
@@ -0,0 +1,92 @@
+import numpy as np
+from time import time
+
+__all__ = ["RingBuffer"]
+
+
+"""
+Ring Buffer
+"""
+
+class RingBuffer(object):
+    """
+    A bounded, preallocated buffer of fixed-shape numpy records.
+    Once full, new records overwrite the oldest ones.
+    Each record is stored alongside a timestamp.
+    """
+
+    def __init__(self, size, shape=(), dtype=float):
+        """
+        Arguments:
+            size    (int)       : the maximum number of records to hold.
+            shape   (tuple)     : the shape of a single record.
+            dtype   (np.dtype)  : the data type of a record.
+        """
+        if size < 1:
+            raise Exception('Error: ring buffer size must be at least 1.')
+        self.size = int(size)
+        self.shape = tuple(shape)
+        self._data = np.zeros((self.size,) + self.shape, dtype=dtype)
+        self._timestamps = np.zeros(self.size, dtype=float)
+        # index of the next record to write
+        self._index = 0
+        # total number of records written since creation/clear
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def clear(self):
+        """
+        Remove all records from the buffer.
+        """
+        self._index = 0
+        self.count = 0
+
+    def append(self, record, timestamp=None):
+        """
+        Add a single record to the buffer.
+        Arguments:
+            record      (np.array)  : the record to add. Must have the buffer's record shape.
+            timestamp   (float)     : the record timestamp. Defaults to the current time.
+        """
+        self._data[self._index] = record
+        self._timestamps[self._index] = time() if timestamp is None else timestamp
+        self._index = (self._index + 1) % self.size
+        self.count += 1
+
+    def extend(self, records, timestamps=None):
+        """
+        Add a block of records to the buffer at once.
+        Arguments:
+            records     (np.array)  : the records to add, with shape (num_records,) + record shape.
+            timestamps  (*float)    : the timestamp of each record. Defaults to the current time.
+        """
+        records = np.asarray(records)
+        num = len(records)
+        if num == 0:
+            return
+        if timestamps is None:
+            timestamps = np.full(num, time())
+        timestamps = np.asarray(timestamps, dtype=float)
+
+        # only the last self.size records can be kept
+        skip = max(num - self.size, 0)
+        indices = (self._index + np.arange(skip, num)) % self.size
+        self._data[indices] = records[skip:]
+        self._timestamps[indices] = timestamps[skip:]
+        self._index = (self._index + num) % self.size
+        self.count += num
+
+    def latest(self, num=None):
+        """
+        Get the most recent records in chronological order.
+        Arguments:
+            num     (int)   : the number of records to get. Defaults to all stored records.
+        Returns:
+            (np.array, np.array): the timestamps and the records.
+        """
+        stored = len(self)
+        num = stored if (num is None) else min(max(int(num), 0), stored)
+        indices = (self._index - num + np.arange(num)) % self.size
+        return self._timestamps[indices], self._data[indices]
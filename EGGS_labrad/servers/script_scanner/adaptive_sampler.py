@@ -0,0 +1,119 @@
+"""
+Chooses the points of an adaptive 1D scan.
+"""
+import numpy as np
+from bisect import bisect
+
+__all__ = ["adaptive_sampler"]
+
+
+class adaptive_sampler(object):
+    '''
+    Chooses scan points one at a time, based on the results measured so far.
+    The scan range is first covered by a coarse grid, then the interval with
+    the largest loss (according to the refinement criterion) is split in two.
+    Intervals are only split while they are wider than the resolution
+    and their loss is above the tolerance.
+
+    Refinement criteria:
+        gradient    : refines where the result changes quickly.
+        curvature   : like gradient, but also refines where the slope changes (e.g. edges and tops of peaks).
+        peak        : like gradient, but refines the largest results down to the resolution (e.g. to find a resonance).
+    '''
+
+    criteria = ('curvature', 'gradient', 'peak')
+
+    def __init__(self, minim, maxim, budget, criterion='curvature', resolution=0., tolerance=0.01, initial_points=9):
+        '''
+        Arguments:
+            minim           (float) : the start of the scan range.
+            maxim           (float) : the end of the scan range.
+            budget          (int)   : the maximum number of points to measure.
+            criterion       (str)   : the refinement criterion (curvature, gradient, or peak).
+            resolution      (float) : the smallest allowed spacing between points (in the same units as the range).
+            tolerance       (float) : the loss below which intervals aren't split. Since losses are calculated
+                                        with the range and results scaled to [0, 1], this is also the largest
+                                        spacing between points (as a fraction of the range).
+            initial_points  (int)   : the number of points in the initial grid.
+        '''
+        if criterion not in self.criteria:
+            raise Exception("Unknown refinement criterion: {}".format(criterion))
+        if maxim <= minim:
+            raise Exception("Invalid scan range: {} to {}".format(minim, maxim))
+        self.minim = float(minim)
+        self.maxim = float(maxim)
+        self.budget = int(budget)
+        self.criterion = criterion
+        self.resolution = float(resolution)
+        self.tolerance = float(tolerance)
+        self.x = []
+        self.y = []
+        self._initial = list(np.linspace(minim, maxim, min(initial_points, self.budget)))
+
+    def __len__(self):
+        return len(self.x)
+
+    def progress(self):
+        '''
+        Returns:
+            (float): the fraction of the budget that has been used.
+        '''
+        return len(self.x) / float(self.budget)
+
+    def add(self, x, y):
+        '''
+        Add a measured point.
+        Arguments:
+            x   (float) : the scan value.
+            y   (float) : the result.
+        '''
+        i = bisect(self.x, x)
+        self.x.insert(i, float(x))
+        self.y.insert(i, float(y))
+
+    def losses(self):
+        '''
+        Calculate the loss of each interval between measured points.
+        Returns:
+            (np.array): the loss of each interval.
+        '''
+        x = (np.array(self.x) - self.minim) / (self.maxim - self.minim)
+        y = np.array(self.y)
+        y_range = np.ptp(y)
+        y = (y - y.min()) / y_range if y_range > 0 else np.zeros_like(y)
+        dx = np.diff(x)
+        dy = np.abs(np.diff(y))
+        loss = dx + dy
+
+        if self.criterion == 'curvature':
+            # area of the triangles formed by each point and its neighbours
+            area = np.zeros(len(x))
+            area[1:-1] = 0.5 * np.abs((x[1:-1] - x[:-2]) * (y[2:] - y[:-2]) - (x[2:] - x[:-2]) * (y[1:-1] - y[:-2]))
+            loss += 2 * np.sqrt(np.maximum(area[:-1], area[1:]))
+        elif self.criterion == 'peak':
+            # weight the intervals with the largest results so that they reach the resolution
+            resolution = self.resolution / (self.maxim - self.minim)
+            gain = self.tolerance / resolution if resolution > 0 else 1. / self.tolerance
+            loss *= 1. + gain * np.maximum(y[:-1], y[1:]) ** 4
+        return loss
+
+    def next_point(self):
+        '''
+        Choose the next point to measure.
+        Returns:
+            (float): the next scan value, or None if the scan is finished.
+        '''
+        if len(self.x) >= self.budget:
+            return None
+        while self._initial:
+            x = self._initial.pop(0)
+            if x not in self.x:
+                return x
+        if len(self.x) < 2:
+            return None
+        loss = self.losses()
+        loss[(np.diff(self.x) <= 2 * self.resolution) | (loss <= self.tolerance)] = -1
+        i = int(np.argmax(loss))
+        if loss[i] < 0:
+            return None
+        return 0.5 * (self.x[i] + self.x[i + 1])
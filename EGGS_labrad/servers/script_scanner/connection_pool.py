@@ -0,0 +1,216 @@
+"""
+Pool of synchronous LabRAD connections lent to running experiments.
+"""
+import labrad
+from time import time
+from threading import Condition
+from contextlib import contextmanager
+
+from EGGS_labrad.config.scriptscanner_config import config
+
+
+class pooled_connection(object):
+    '''
+    A warm connection kept by the connection pool.
+    The server wrappers are resolved once when the connection is made,
+    so experiments don't have to look up servers and settings each time they run.
+    '''
+
+    def __init__(self, cxn, servers):
+        self.cxn = cxn
+        self.servers = servers
+        self.server_list = None
+        self.last_checked = 0
+        self.resolve()
+
+    def resolve(self):
+        '''
+        Look up the servers (and their settings) in advance.
+        Servers which aren't running are skipped.
+        '''
+        self.cxn.refresh(now=True)
+        for name in self.servers:
+            try:
+                self.cxn.servers[name].refresh(now=True)
+            except KeyError:
+                pass
+        self.server_list = self._get_server_list()
+        self.last_checked = time()
+
+    def _get_server_list(self):
+        return sorted(self.cxn.manager.servers())
+
+    def check(self):
+        '''
+        Check that the connection still works, and re-resolve
+        the server wrappers if servers have started or stopped.
+        Returns:
+            (bool): whether the connection can be used.
+        '''
+        if not self.cxn.connected:
+            return False
+        try:
+            server_list = self._get_server_list()
+        except Exception:
+            return False
+        if server_list != self.server_list:
+            self.resolve()
+        self.last_checked = time()
+        return True
+
+    def disconnect(self):
+        try:
+            self.cxn.disconnect()
+        except Exception:
+            pass
+
+
+class connection_pool(object):
+    '''
+    Keeps a fixed number of synchronous LabRAD connections open for experiments.
+    Each running experiment borrows one connection (with a fresh context) and returns it once finished.
+    Connections are checked before they are lent if they haven't been used recently,
+    and broken connections are replaced.
+    '''
+
+    def __init__(self, size=None, servers=None, check_interval=None, connect=None, name='ScriptScanner Experiment'):
+        '''
+        Arguments:
+            size            (int)       : the maximum number of open connections.
+            servers         (*str)      : the servers to look up in advance.
+            check_interval  (float)     : connections which have been idle for longer than this (in s)
+                                            are checked before being lent.
+            connect         (callable)  : creates a new synchronous connection (labrad.connect by default).
+            name            (str)       : the name of the connections.
+        '''
+        self.size = size if size is not None else config.connection_pool_size
+        self.servers = servers if servers is not None else config.connection_pool_servers
+        self.check_interval = check_interval if check_interval is not None else config.connection_pool_check_interval
+        self.connect = connect if connect is not None else labrad.connect
+        self.name = name
+        self._condition = Condition()
+        self._idle = []
+        self._lent = {}
+        self._opening = 0
+        self.closed = False
+
+    def _open(self):
+        return pooled_connection(self.connect(name=self.name), self.servers)
+
+    def fill(self):
+        '''
+        Open connections until the pool is full, so the first experiments don't have to wait.
+            Blocks, so should be called in a separate thread.
+        '''
+        while True:
+            with self._condition:
+                if self.closed or (len(self._idle) + len(self._lent) + self._opening >= self.size):
+                    return
+                self._opening += 1
+            try:
+                connection = self._open()
+            except Exception as e:
+                print('Unable to open pooled connection:', e)
+                with self._condition:
+                    self._opening -= 1
+                return
+            with self._condition:
+                self._opening -= 1
+                self._idle.append(connection)
+                self._condition.notify()
+
+    def acquire(self, timeout=None):
+        '''
+        Borrow a connection, waiting for one to be returned if all of them are in use.
+            Blocks, so should be called in a separate thread.
+        Arguments:
+            timeout     (float) : the maximum time to wait (in s). Waits forever if None.
+        Returns:
+            (labrad.client.Client, context): the connection, and a new context to use.
+        '''
+        deadline = None if timeout is None else time() + timeout
+        while True:
+            with self._condition:
+                if self.closed:
+                    raise Exception("Error: connection pool is closed.")
+                if self._idle:
+                    connection = self._idle.pop()
+                elif len(self._lent) + self._opening < self.size:
+                    connection = None
+                    self._opening += 1
+                else:
+                    remaining = None if deadline is None else deadline - time()
+                    if (remaining is not None) and (remaining <= 0):
+                        raise Exception("Error: timed out waiting for a pooled connection.")
+                    self._condition.wait(remaining)
+                    continue
+
+            # open or check the connection outside of the lock
+            if connection is None:
+                try:
+                    connection = self._open()
+                finally:
+                    with self._condition:
+                        self._opening -= 1
+            elif (time() - connection.last_checked > self.check_interval) and not connection.check():
+                connection.disconnect()
+                continue
+
+            cxn = connection.cxn
+            context = cxn.context()
+            with self._condition:
+                self._lent[context] = connection
+            return cxn, context
+
+    def release(self, context):
+        '''
+        Return a borrowed connection to the pool.
+        Arguments:
+            context     : the context the connection was lent with.
+        '''
+        with self._condition:
+            connection = self._lent.pop(context)
+        # let servers clear anything stored in the context
+        try:
+            connection.cxn.manager.expire_context(context)
+            healthy = True
+        except Exception:
+            healthy = connection.check()
+        connection.last_checked = time()
+        with self._condition:
+            if healthy and not self.closed:
+                self._idle.append(connection)
+                connection = None
+            self._condition.notify()
+        if connection is not None:
+            connection.disconnect()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        '''
+        Borrow a connection for the duration of a with statement.
+        '''
+        cxn, context = self.acquire(timeout)
+        try:
+            yield cxn, context
+        finally:
+            self.release(context)
+
+    def close(self):
+        '''
+        Disconnect all idle connections. Borrowed connections are disconnected when they are returned.
+        '''
+        with self._condition:
+            self.closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for connection in idle:
+            connection.disconnect()
+
+    def stats(self):
+        '''
+        Returns:
+            (int, int, int): the pool size, and the number of idle and borrowed connections.
+        '''
+        with self._condition:
+            return self.size, len(self._idle), len(self._lent)
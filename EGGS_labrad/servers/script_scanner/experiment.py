@@ -4,6 +4,8 @@ Superclass of experiments and related classes.
 import labrad
 import traceback
 from treedict import TreeDict
+from EGGS_labrad.servers.script_scanner.parameter_snapshot import parameter_snapshot
+from EGGS_labrad.servers.script_scanner.script_control import script_control
 
 class experiment_info(object):
     '''
@@ -14,9 +16,14 @@ class experiment_info(object):
     name: str
     parameters: TreeDict
     required_parameters: list
+    resources: list
     '''
     required_parameters = []
     name = ''
+    # hardware resources used by the experiment (e.g. ['pulser', 'pmt']);
+    # experiments which don't share resources can run concurrently.
+    # None means the experiment conflicts with all others.
+    resources = None
 
     def __init__(self, name=None, required_parameters=None):
         if name is not None:
@@ -37,15 +44,22 @@ class experiment(experiment_info):
         self.cxn = cxn
         self.pv = None
         self.sc = None
+        # cache of parameter vault values (shared with subexperiments)
+        self.snapshot = None
+        # pause/stop state and progress updates (shared with subexperiments)
+        self.control = None
         self.context = None
         self.min_progress = min_progress
         self.max_progress = max_progress
         self.should_stop = False
+        # whether the connection was made by the experiment (instead of being lent to it)
+        self._owns_cxn = False
 
     def _connect(self):
         if self.cxn is None:
             try:
                 self.cxn = labrad.connect()
+                self._owns_cxn = True
             except Exception as error:
                 error_message = error + '\n' + "Not able to connect to LabRAD"
                 raise Exception(error_message)
@@ -54,13 +68,18 @@ class experiment(experiment_info):
         except KeyError as error:
             error_message = error + '\n' + "Script Scanner is not running"
             raise KeyError(error_message)
+        if self.control is None:
+            self.control = script_control(self.sc, self.cxn, self.ident)
         try:
             self.pv = self.cxn.servers['Parameter Vault']
         except KeyError as error:
             error_message = error + '\n' + "Parameter Vault is not running"
             raise KeyError(error_message)
+        if self.snapshot is None:
+            self.snapshot = parameter_snapshot(self.pv, self.cxn)
         try:
-            self.context = self.cxn.context()
+            if self.context is None:
+                self.context = self.cxn.context()
         except Exception as error:
             error_message = error + '\n' + "self.cxn.context is not available"
             raise Exception(error_message)
@@ -79,12 +98,23 @@ class experiment(experiment_info):
             reason = traceback.format_exc()
             print(reason)
             if hasattr(self, 'sc'):
+                # send the last progress before the final state, so it isn't overwritten
+                if self.control is not None:
+                    self.control.flush()
                 self.sc.error_finish_confirmed(self.ident, reason)
         finally:
-            if hasattr(self, 'cxn'):
-                if self.cxn is not None:
-                    self.cxn.disconnect()
-                    self.cxn = None
+            if self.snapshot is not None:
+                self.snapshot.close()
+                self.snapshot = None
+            if self.control is not None:
+                self.control.close()
+                self.control = None
+            # only disconnect if the connection isn't borrowed (e.g. from the connection pool)
+            if self._owns_cxn:
+                self.cxn.disconnect()
+                self._owns_cxn = False
+            self.cxn = None
+            self.context = None
 
     def _initialize(self, cxn, context, ident):
         self._load_required_parameters()
@@ -103,17 +133,16 @@ class experiment(experiment_info):
         self.parameters.update(d, overwrite=overwrite)
 
     def _load_parameters_dict(self, params):
-        '''loads the required parameter into a treedict'''
+        '''loads the required parameters into a treedict with a single parameter vault request'''
         d = TreeDict()
-        for collection, parameter_name in params:
-            try:
-                value = self.pv.get_parameter(collection, parameter_name)
-            except Exception as e:
-                print(e)
-                message = "In {}: Parameter {} not found among Parameter Vault parameters"
-                raise Exception (message.format(self.name, (collection, parameter_name)))
-            else:
-                d['{0}.{1}'.format(collection, parameter_name)] = value
+        try:
+            values = self.snapshot.get(params)
+        except Exception as e:
+            print(e)
+            message = "In {}: Parameters not found among Parameter Vault parameters:\n{}"
+            raise Exception(message.format(self.name, e))
+        for (collection, parameter_name), value in values.items():
+            d['{0}.{1}'.format(collection, parameter_name)] = value
         return d
 
     def set_parameters(self, parameter_dict):
@@ -133,14 +162,17 @@ class experiment(experiment_info):
         self.parameters.update(udpate_dict)
 
     def reload_some_parameters(self, params):
+        self.snapshot.invalidate(params)
         d = self._load_parameters_dict(params)
         self.parameters.update(d)
 
     def reload_all_parameters(self):
+        self.snapshot.invalidate()
         self._load_required_parameters(overwrite=True)
 
     def _finalize(self, cxn, context):
         self.finalize(cxn, context)
+        self.control.flush()
         self.sc.finish_confirmed(self.ident)
 
     # useful functions to be used in subclasses
@@ -150,15 +182,25 @@ class experiment(experiment_info):
 
     def pause_or_stop(self):
         '''
-        allows to pause and to stop the experiment
+        allows to pause and to stop the experiment.
+        only talks to the script scanner if a pause or stop was requested.
         '''
-        self.should_stop = self.sc.pause_or_stop(self.ident)
+        self.should_stop = self.control.pause_or_stop()
         if self.should_stop:
-            self.sc.stop_confirmed(self.ident)
+            self.sc.stop_confirmed(self.control.ident)
         return self.should_stop
 
+    def set_progress(self, progress):
+        '''
+        updates the progress of the experiment.
+        updates are sent to the script scanner at a limited rate.
+        '''
+        self.control.set_progress(progress)
+
     def make_experiment(self, subexprt_cls):
         subexprt = subexprt_cls(cxn=self.cxn)
+        subexprt.snapshot = self.snapshot
+        subexprt.control = self.control
         subexprt._connect()
         subexprt._load_required_parameters()
         return subexprt
@@ -4,9 +4,13 @@ Superclass of experiments.
 import numpy as np
 from labrad.units import WithUnit
 from experiment import experiment
+from adaptive_sampler import adaptive_sampler
+from nd_scan import nd_scan_plan
 from time import localtime, strftime
+from collections import deque
 
-__all__ = ["single", "scan_experiment_1D", "scan_experiment_1D_measure", "repeat_reload"]
+__all__ = ["single", "scan_experiment_1D", "scan_experiment_1D_measure", "scan_experiment_1D_adaptive",
+           "scan_experiment_ND", "repeat_reload"]
 
 
 """
@@ -87,7 +91,7 @@ class scan_experiment_1D(experiment):
 
     def update_progress(self, iteration):
         progress = self.min_progress + (self.max_progress - self.min_progress) * float(iteration + 1.0) / len(self.scan_points)
-        self.sc.script_set_progress(self.ident,  progress)
+        self.set_progress(progress)
 
     def finalize(self, cxn, context):
         self.script.finalize(cxn, context)
@@ -148,13 +152,161 @@ class scan_experiment_1D_measure(experiment):
     def update_progress(self, iteration):
         progress = self.min_progress + (self.max_progress - self.min_progress) * float(iteration + 1.0) / len(
             self.scan_points)
-        self.sc.script_set_progress(self.ident, progress)
+        self.set_progress(progress)
 
     def finalize(self, cxn, context):
         self.scan_script.finalize(cxn, context)
         self.measure_script.finalize(cxn, context)
 
 
+class scan_experiment_1D_adaptive(experiment):
+    '''
+    Used to scan a parameter, choosing each point based on the results so far
+    instead of measuring a fixed grid of points (see adaptive_sampler).
+    '''
+
+    def __init__(self, script_cls, parameter, minim, maxim, units, budget, criterion='curvature', resolution=0.):
+        self.script_cls = script_cls
+        self.parameter = parameter
+        self.units = units
+        self.sampler = adaptive_sampler(minim, maxim, budget, criterion, resolution)
+        scan_name = self.name_format(script_cls.name)
+        super(scan_experiment_1D_adaptive, self).__init__(scan_name)
+
+    def name_format(self, name):
+        return 'Adaptively scanning {0} in {1}'.format(self.parameter, name)
+
+    def initialize(self, cxn, context, ident):
+        self.script = self.make_experiment(self.script_cls)
+        self.script.initialize(cxn, context, ident)
+        self.navigate_data_vault(cxn, context)
+
+    def run(self, cxn, context):
+        budget = self.sampler.budget
+        while True:
+            if self.pause_or_stop(): return
+            point = self.sampler.next_point()
+            if point is None: return
+            i = len(self.sampler)
+            scan_value = WithUnit(point, self.units)
+            self.script.set_parameters({self.parameter: scan_value})
+            self.script.set_progress_limits(100.0 * i / budget, 100.0 * (i + 1) / budget)
+            result = self.script.run(cxn, context)
+            if self.script.should_stop: return
+            if result is None:
+                raise Exception("Adaptive scans need {} to return a result.".format(self.script.name))
+            self.sampler.add(point, result)
+            cxn.data_vault.add([point, result], context=context)
+            self.update_progress()
+
+    def navigate_data_vault(self, cxn, context):
+        dv = cxn.data_vault
+        local_time = localtime()
+        dataset_name = self.name + strftime("%Y%b%d_%H%M_%S", local_time)
+        directory = ['', 'ScriptScanner']
+        directory.extend([strftime("%Y%b%d", local_time), strftime("%H%M_%S", local_time)])
+        dv.cd(directory, True, context=context)
+        dv.new(dataset_name, [(self.parameter[1], self.units)], [(self.script.name, 'Arb', 'Arb')], context=context)
+        dv.add_parameter('plotLive', True, context=context)
+        dv.add_parameter('criterion', self.sampler.criterion, context=context)
+
+    def update_progress(self):
+        progress = self.min_progress + (self.max_progress - self.min_progress) * self.sampler.progress()
+        self.set_progress(progress)
+
+    def finalize(self, cxn, context):
+        self.script.finalize(cxn, context)
+
+
+class scan_experiment_ND(experiment):
+    '''
+    Used to scan several parameters over a grid, saving the results into a single N-dimensional dataset.
+    Points are ordered to change expensive (e.g. slow hardware) parameters as rarely as possible (see nd_scan_plan).
+    Can resume an interrupted scan from its data vault dataset, in which case only the missing points are measured.
+    '''
+
+    def __init__(self, script_cls, parameters, ranges, units, move_costs=None, resume=None):
+        """
+        script_cls: the experiment class
+        parameters: list of (collection, parameter name) to scan
+        ranges: list of (minim, maxim, steps) for each parameter
+        units: list of the units of each parameter
+        move_costs: list of the cost of changing each parameter (e.g. the time taken to change it)
+        resume: (directory, dataset name) of a data vault dataset to resume, or None to start a new scan
+        """
+        self.script_cls = script_cls
+        self.parameters = [tuple(parameter) for parameter in parameters]
+        self.units = units
+        self.plan = nd_scan_plan([np.linspace(minim, maxim, steps) for minim, maxim, steps in ranges], move_costs)
+        self.resume = resume
+        self.remaining = deque(range(len(self.plan)))
+        scan_name = self.name_format(script_cls.name)
+        super(scan_experiment_ND, self).__init__(scan_name)
+
+    def name_format(self, name):
+        return 'Scanning {0} in {1}'.format(', '.join(parameter[1] for parameter in self.parameters), name)
+
+    def initialize(self, cxn, context, ident):
+        self.script = self.make_experiment(self.script_cls)
+        self.script.initialize(cxn, context, ident)
+        if self.resume is None:
+            self.navigate_data_vault(cxn, context)
+        else:
+            self.resume_data_vault(cxn, context)
+
+    def run(self, cxn, context):
+        num_points = len(self.plan)
+        previous = [None] * len(self.parameters)
+        while self.remaining:
+            if self.pause_or_stop(): return
+            num_done = num_points - len(self.remaining)
+            scan_values = self.plan.values(self.remaining[0])
+            # only change the parameters which differ from the previous point
+            changed = {parameter: WithUnit(value, unit) for parameter, value, unit, last
+                       in zip(self.parameters, scan_values, self.units, previous) if value != last}
+            self.script.set_parameters(changed)
+            previous = scan_values
+            self.script.set_progress_limits(100.0 * num_done / num_points, 100.0 * (num_done + 1) / num_points)
+            result = self.script.run(cxn, context)
+            if self.script.should_stop: return
+            if result is not None:
+                cxn.data_vault.add(scan_values + [result], context=context)
+            self.remaining.popleft()
+            self.update_progress(num_done)
+
+    def navigate_data_vault(self, cxn, context):
+        dv = cxn.data_vault
+        local_time = localtime()
+        dataset_name = self.name + strftime("%Y%b%d_%H%M_%S", local_time)
+        directory = ['', 'ScriptScanner']
+        directory.extend([strftime("%Y%b%d", local_time), strftime("%H%M_%S", local_time)])
+        dv.cd(directory, True, context=context)
+        independents = [(parameter[1], unit) for parameter, unit in zip(self.parameters, self.units)]
+        path, dataset_name = dv.new(dataset_name, independents, [(self.script.name, 'Arb', 'Arb')], context=context)
+        dv.add_parameter('plotLive', True, context=context)
+        dv.add_parameter('shape', list(self.plan.shape), context=context)
+        # keep track of the dataset in case the scan has to be resumed
+        self.resume = (list(path), dataset_name)
+
+    def resume_data_vault(self, cxn, context):
+        '''
+        Open the dataset of an interrupted scan, and find the points which haven't been measured.
+        '''
+        dv = cxn.data_vault
+        directory, dataset_name = self.resume
+        dv.cd(directory, context=context)
+        dv.open(dataset_name, True, context=context)
+        measured = dv.get(context=context)
+        self.remaining = deque(self.plan.remaining(measured))
+
+    def update_progress(self, iteration):
+        progress = self.min_progress + (self.max_progress - self.min_progress) * float(iteration + 1.0) / len(self.plan)
+        self.set_progress(progress)
+
+    def finalize(self, cxn, context):
+        self.script.finalize(cxn, context)
+
+
 class repeat_reload(experiment):
     '''
     Used to repeat an experiment multiple times, while reloading the parameters every repeatition
@@ -199,7 +351,7 @@ class repeat_reload(experiment):
     def update_progress(self, iteration):
         progress = self.min_progress + (self.max_progress - self.min_progress) * float(
             iteration + 1.0) / self.repetitions
-        self.sc.script_set_progress(self.ident, progress)
+        self.set_progress(progress)
 
     def finalize(self, cxn, context):
         self.script.finalize(cxn, context)
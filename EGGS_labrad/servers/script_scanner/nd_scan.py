@@ -0,0 +1,100 @@
+"""
+Orders the points of an N-dimensional scan.
+"""
+import numpy as np
+
+__all__ = ["nd_scan_plan"]
+
+
+class nd_scan_plan(object):
+    '''
+    The points of an N-dimensional grid scan, in the order they should be measured.
+    Parameters which are expensive to change (e.g. slow hardware) are put in the outer loops,
+    so they change as rarely as possible. With snake (boustrophedon) ordering, the inner loops
+    reverse direction each time an outer parameter changes, so only one parameter
+    changes (by a single step) between consecutive points.
+    '''
+
+    def __init__(self, axes, move_costs=None, snake=True):
+        '''
+        Arguments:
+            axes        (list(np.array))    : the values of each parameter.
+            move_costs  (list(float))       : the cost of changing each parameter once (all equal by default).
+            snake       (bool)              : whether to reverse the inner loops each time an outer parameter changes.
+        '''
+        self.axes = [np.atleast_1d(np.asarray(axis, dtype=float)) for axis in axes]
+        self.shape = tuple(len(axis) for axis in self.axes)
+        if move_costs is None:
+            move_costs = np.ones(len(self.axes))
+        self.move_costs = np.asarray(move_costs, dtype=float)
+        if len(self.move_costs) != len(self.axes):
+            raise Exception("Error: need one move cost per scan parameter.")
+        self.snake = snake
+        # parameters from the outermost to the innermost loop (stable, so equal costs keep the given order)
+        self.loop_order = np.argsort(-self.move_costs, kind='stable')
+        self.indices = self._order()
+
+    def __len__(self):
+        return len(self.indices)
+
+    def _order(self):
+        '''
+        Returns:
+            (np.array): the grid indices of each point (in parameter order), with shape (num_points, num_parameters).
+        '''
+        loop_shape = tuple(self.shape[i] for i in self.loop_order)
+        loop_indices = np.indices(loop_shape).reshape(len(loop_shape), -1).T
+        if self.snake:
+            snaked = loop_indices.copy()
+            for k in range(1, len(loop_shape)):
+                # reverse this loop each time any of the outer loops steps
+                outer_count = np.ravel_multi_index(tuple(loop_indices[:, :k].T), loop_shape[:k])
+                reverse = (outer_count % 2) == 1
+                snaked[reverse, k] = loop_shape[k] - 1 - loop_indices[reverse, k]
+            loop_indices = snaked
+        indices = np.empty_like(loop_indices)
+        indices[:, self.loop_order] = loop_indices
+        return indices
+
+    def values(self, position):
+        '''
+        Returns:
+            (list(float)): the parameter values of the point at the given position in the scan order.
+        '''
+        return [axis[i] for axis, i in zip(self.axes, self.indices[position])]
+
+    def cost(self, indices=None):
+        '''
+        Calculate the total cost of moving between consecutive points.
+        Arguments:
+            indices     (np.array)  : the grid indices of each point (uses the planned order by default).
+        Returns:
+            (float): the total move cost.
+        '''
+        if indices is None:
+            indices = self.indices
+        changed = np.diff(indices, axis=0) != 0
+        return float(np.sum(changed * self.move_costs))
+
+    def remaining(self, measured):
+        '''
+        Find the points which haven't been measured yet (e.g. to resume a scan).
+        Arguments:
+            measured    (np.array)  : the parameter values of each measured point (e.g. from the data vault),
+                                        with shape (num_measured, num_parameters). Extra columns are ignored.
+        Returns:
+            (list(int)): the positions (in the scan order) of the points which still need to be measured.
+        '''
+        measured = np.atleast_2d(np.asarray(measured, dtype=float))
+        done = np.zeros(self.shape, dtype=bool)
+        if measured.size:
+            grid_indices = []
+            for k, axis in enumerate(self.axes):
+                # find the nearest grid value, and ignore values which aren't on the grid
+                index = np.abs(measured[:, k, np.newaxis] - axis).argmin(axis=1)
+                spacing = np.min(np.diff(np.sort(axis))) if len(axis) > 1 else 1.
+                tolerance = 1e-6 * max(spacing, np.max(np.abs(axis)))
+                grid_indices.append((index, np.abs(axis[index] - measured[:, k]) <= tolerance))
+            on_grid = np.all([valid for _, valid in grid_indices], axis=0)
+            done[tuple(index[on_grid] for index, _ in grid_indices)] = True
+        return np.flatnonzero(~done[tuple(self.indices.T)]).tolist()
@@ -0,0 +1,130 @@
+"""
+Experiment-side cache of Parameter Vault parameters.
+"""
+from threading import Lock
+
+# ID of the parameter vault onParameterChange signal
+PARAMETER_CHANGE_ID = 612512
+
+
+class parameter_snapshot(object):
+    '''
+    Holds the values of Parameter Vault parameters used by an experiment.
+    Missing parameters are loaded with a single bulk request, and the cache
+    listens for the parameter vault's onParameterChange signal, so that
+    only parameters which have changed are requested again.
+    '''
+
+    def __init__(self, pv, cxn=None):
+        '''
+        Arguments:
+            pv      : the parameter vault server wrapper.
+            cxn     : the synchronous labrad connection. If given, the snapshot subscribes to parameter
+                        changes; otherwise all cached parameters are requested again on refresh.
+        '''
+        self.pv = pv
+        self.values = {}
+        self._lock = Lock()
+        self._changed = set()
+        self._listening = False
+        self._listener = None
+        self._cxn = cxn
+        if cxn is not None:
+            self._subscribe(cxn)
+
+    def _subscribe(self, cxn):
+        try:
+            self._context = cxn.context()
+            # use the underlying asynchronous connection, since synchronous clients don't support listeners
+            self._listener = cxn._backend.cxn
+            self._listener.addListener(self._on_parameter_change, source=self.pv.ID,
+                                       ID=PARAMETER_CHANGE_ID, context=self._context)
+            self.pv.signal__parameter_change(PARAMETER_CHANGE_ID, context=self._context)
+            self._listening = True
+        except Exception as e:
+            print('Unable to subscribe to parameter changes:', e)
+            self._listener = None
+
+    def _on_parameter_change(self, c, key):
+        with self._lock:
+            self._changed.add(tuple(key))
+
+    def close(self):
+        '''
+        Stop listening for parameter changes, and release the signal context.
+        '''
+        if self._listener is not None:
+            try:
+                self._listener.removeListener(self._on_parameter_change, source=self.pv.ID,
+                                              ID=PARAMETER_CHANGE_ID, context=self._context)
+            except Exception:
+                pass
+            # unsubscribe and expire the context, since pooled connections outlive the snapshot
+            try:
+                self.pv.signal__parameter_change(context=self._context)
+                self._cxn.manager.expire_context(self._context)
+            except Exception as e:
+                print('Unable to unsubscribe from parameter changes:', e)
+            self._listener = None
+            self._listening = False
+
+    def _fetch(self, keys):
+        '''
+        Request parameters from the parameter vault in a single call and store them.
+        '''
+        if not keys:
+            return
+        values = self.pv.get_parameters(keys)
+        self.values.update(zip(keys, values))
+
+    def refresh(self):
+        '''
+        Request any cached parameters which have changed.
+        '''
+        if self._listening:
+            with self._lock:
+                changed, self._changed = self._changed, set()
+        else:
+            changed = set(self.values.keys())
+        self._fetch([key for key in changed if key in self.values])
+
+    def invalidate(self, keys=None):
+        '''
+        Discard cached parameters, so they are requested again when next used.
+        Arguments:
+            keys    (list(str, str))    : the (collection, parameter name) of the parameters. Discards all if None.
+        '''
+        if keys is None:
+            self.values.clear()
+        else:
+            for key in keys:
+                self.values.pop(tuple(key), None)
+
+    def get(self, keys):
+        '''
+        Get parameter values, requesting any which aren't cached or have changed.
+        Arguments:
+            keys    (list(str, str))    : the (collection, parameter name) of each parameter.
+        Returns:
+            dict: the parameter values, keyed by (collection, parameter name).
+        '''
+        keys = [tuple(key) for key in keys]
+        self.refresh()
+        self._fetch(list(set(key for key in keys if key not in self.values)))
+        return {key: self.values[key] for key in keys}
+
+    def get_collections(self, collections):
+        '''
+        Get all parameters within the given collections.
+        Arguments:
+            collections     (list(str)) : the collection names.
+        Returns:
+            dict: the parameter values, keyed by (collection, parameter name).
+        '''
+        self.refresh()
+        result = self.pv.get_collection_parameters(collections)
+        if result is None:
+            return {}
+        values = {(collection, name): value for collection, name, value in result}
+        self.values.update(values)
+        return values
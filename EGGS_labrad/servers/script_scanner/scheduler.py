@@ -3,65 +3,192 @@ Superclass of all scheduler and related objects.
 Needed to manage the queueing and submission of experiments.
 """
 
+from heapq import heappush, heappop
+
 from twisted.internet.task import LoopingCall
 from twisted.internet.threads import deferToThread
 from twisted.internet.defer import inlineCallbacks, DeferredLock, Deferred, DeferredList
 
 from EGGS_labrad.config.scriptscanner_config import config
+from connection_pool import connection_pool
 
 
 class priority_queue(object):
     '''
-    A normal queue data structure, but with levels of priority.
-    Designed for ease of use, not speed.
+    A queue with levels of priority (lower values go first), ordered with a heap.
+    Objects are tuples whose first element is a unique ID, and are first-in-first-out within a priority.
+    Removed objects are only marked as removed, and are discarded once they reach the top of the heap.
     '''
 
     priorities = [0, 1]
 
     def __init__(self):
-        self.d = {}
-        for priority in self.priorities:
-            self.d[priority] = []
-
-    def put_last(self,  priority, obj):
-        insert_order = 0
-        for i in range(priority + 1):
-            insert_order += len(self.d[i])
-        self.d[priority].append(obj)
+        # heap entries are [priority, order, obj]; obj is set to None when removed
+        self._heap = []
+        self._entries = {}
+        self._counts = dict.fromkeys(self.priorities, 0)
+        # order counters for adding to the back and front of each priority
+        self._last = 0
+        self._first = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _push(self, priority, order, obj):
+        if obj[0] in self._entries:
+            raise ValueError("Object with ID {} already in queue".format(obj[0]))
+        entry = [priority, order, obj]
+        self._entries[obj[0]] = entry
+        self._counts[priority] += 1
+        heappush(self._heap, entry)
+
+    def _discard_removed(self):
+        while self._heap and self._heap[0][2] is None:
+            heappop(self._heap)
+
+    def put_last(self, priority, obj):
+        insert_order = sum(self._counts[i] for i in self.priorities if i <= priority)
+        self._last += 1
+        self._push(priority, self._last, obj)
         return insert_order
 
     def put_first(self, priority, obj):
-        insert_order = 0
-        for i in range(priority):
-            insert_order += len(self.d[i])
-        self.d[priority].insert(0, obj)
+        insert_order = sum(self._counts[i] for i in self.priorities if i < priority)
+        self._first -= 1
+        self._push(priority, self._first, obj)
         return insert_order
 
     def pop_next(self):
-        next_priority = [priority for priority in self.priorities if self.d[priority]]
-        return self.d[next_priority].pop()
+        self._discard_removed()
+        if not self._heap:
+            raise IndexError("Queue is empty")
+        priority, _, obj = heappop(self._heap)
+        del self._entries[obj[0]]
+        self._counts[priority] -= 1
+        return obj
 
     def peek_next(self):
-        try:
-            next_priority = [priority for priority in self.priorities if self.d[priority]][0]
-            return self.d[next_priority][0]
-        except ValueError:
-            raise ValueError
+        self._discard_removed()
+        if not self._heap:
+            raise IndexError("Queue is empty")
+        return self._heap[0][2]
 
     def get_all(self):
-        ordered = []
-        for priority in self.priorities:
-            ordered.extend(self.d[priority])
-        return ordered
+        return [obj for _, _, obj in sorted(self._entries.values())]
+
+    def remove_id(self, ident):
+        try:
+            entry = self._entries.pop(ident)
+        except KeyError:
+            raise ValueError("Object not found")
+        obj = entry[2]
+        entry[2] = None
+        self._counts[entry[0]] -= 1
+        self._discard_removed()
+        return obj
 
     def remove_object(self, obj):
-        for priority in self.priorities:
-            try:
-                self.d[priority].remove(obj)
-                return obj
-            except ValueError:
-                pass
-        raise ValueError("Object not found")
+        return self.remove_id(obj[0])
+
+
+class resource_table(object):
+    '''
+    Precomputed compatibility between experiment classes, from the hardware resources each one uses.
+    Experiments which declare resources can run concurrently if they don't share any resources.
+    Experiments which don't declare resources (i.e. resources is None) conflict with all others,
+    unless allowed by config.allowed_concurrent.
+    As before, config.allowed_concurrent is one-directional: allowed_concurrent[name] lists the
+    classes which can be launched while an experiment of class name is running.
+    '''
+
+    def __init__(self, allowed_concurrent=None):
+        self.allowed_concurrent = allowed_concurrent if allowed_concurrent is not None else config.allowed_concurrent
+        self.index = {}
+        # compatible[i] is a bitmask of the classes which can be launched while class i is running
+        self.compatible = []
+        # number of running experiments of each class
+        self._running_counts = {}
+
+    def set_classes(self, resources):
+        '''
+        Build the compatibility matrix.
+        Arguments:
+            resources   (dict)  : the resources (a list of names, or None) of each experiment class, keyed by name.
+        '''
+        names = list(resources.keys())
+        self.index = {name: i for i, name in enumerate(names)}
+        # convert resources to bitmasks
+        resource_bits = {}
+        masks = []
+        for name in names:
+            mask = 0
+            for resource in (resources[name] or []):
+                mask |= 1 << resource_bits.setdefault(resource, len(resource_bits))
+            masks.append(mask)
+
+        self.compatible = []
+        for i, name in enumerate(names):
+            row = 0
+            allowed = set(self.allowed_concurrent.get(name, []))
+            for j, other in enumerate(names):
+                declared = (resources[name] is not None) and (resources[other] is not None)
+                if (declared and not (masks[i] & masks[j])) or (other in allowed):
+                    row |= 1 << j
+            self.compatible.append(row)
+
+    def _mask(self, names):
+        mask = 0
+        for name in names:
+            if name not in self.index:
+                return None
+            mask |= 1 << self.index[name]
+        return mask
+
+    def can_run(self, names):
+        '''
+        Check whether experiments of the given classes can be launched alongside the currently running experiments.
+        '''
+        if not any(self._running_counts.values()):
+            return True
+        mask = self._mask(names)
+        if (mask is None) or (sum(self._running_counts.values()) != self._known_running()):
+            return False
+        # every running class must allow the new classes
+        allowed = mask
+        for name in self._running_counts:
+            allowed &= self.compatible[self.index[name]]
+        return allowed == mask
+
+    def compatible_with(self, names, other_names):
+        '''
+        Check whether experiments of other_names can be launched while experiments of names are running.
+        '''
+        other_mask = self._mask(other_names)
+        if (other_mask is None) or (self._mask(names) is None):
+            return False
+        return all((self.compatible[self.index[name]] & other_mask) == other_mask for name in names)
+
+    def _known_running(self):
+        return sum(count for name, count in self._running_counts.items() if name in self.index)
+
+    def add_running(self, names):
+        for name in names:
+            self._running_counts[name] = self._running_counts.get(name, 0) + 1
+
+    def remove_running(self, names):
+        for name in names:
+            self._running_counts[name] -= 1
+            if self._running_counts[name] == 0:
+                del self._running_counts[name]
+
+
+def scan_class_names(scan):
+    '''
+    Returns the names of the experiment classes used by a scan.
+    '''
+    names = [script_cls.name for script_cls in (getattr(scan, attr, None) for attr in
+             ('script_cls', 'scan_script_cls', 'measure_script_cls')) if script_cls is not None]
+    return names if names else [scan.name]
 
 
 class running_script(object):
@@ -138,6 +265,8 @@ class script_semaphore(object):
         # if was paused, unpause:
         if self.pause_lock.locked:
             self.pause_lock.release()
+        # tell the script to stop (see script_control)
+        self.signals.on_running_control((self.ident, False, True))
 
     def set_pausing(self, should_pause):
         '''
@@ -154,6 +283,7 @@ class script_semaphore(object):
                 self.pause_lock.acquire()
                 self.status = 'Pausing'
                 self.signals.on_running_new_status((self.ident, self.status, self.percentage_complete))
+                self.signals.on_running_control((self.ident, True, self.should_stop))
             else:
                 print('not acquiring because locked')
         else:
@@ -162,6 +292,7 @@ class script_semaphore(object):
             request = Deferred()
             self.continue_requests.append(request)
             self.pause_lock.release()
+            self.signals.on_running_control((self.ident, False, self.should_stop))
         return request
 
     def stop_confirmed(self):
@@ -200,6 +331,8 @@ class scheduler(object):
         # dict[identification] = running_script_instance
         self.running = {}
         self.queue = priority_queue()  # queue of tasks
+        self.resources = resource_table()  # which experiments can run concurrently
+        self.connections = connection_pool()  # labrad connections lent to running experiments
         self._paused_by_script = []
         self.scheduled = {}
         self.scheduled_ID_counter = 0
@@ -237,14 +370,11 @@ class scheduler(object):
         return queue
 
     def remove_queued_script(self, script_ID):
-        removed = False
-        for ident, scan, priority in self.queue.get_all():
-            if script_ID == ident:
-                removed = True
-                self.queue.remove_object((script_ID, scan, priority))
-                self.signals.on_queued_removed(script_ID)
-        if not removed:
+        try:
+            self.queue.remove_id(script_ID)
+        except ValueError:
             raise Exception("Trying to remove script ID {0} from queue but it's not in the queue".format(script_ID))
+        self.signals.on_queued_removed(script_ID)
 
     def add_scan_to_queue(self, scan, priority='Normal'):
         """
@@ -276,42 +406,31 @@ class scheduler(object):
         return scan_id
 
     def is_higher_priority_than_running(self, priority):
-        try:
-            priorities = [running.priority for running in self.running.values()]
-            priorities.sort()
-            highest_running = priorities[0]
-            return priority < highest_running
-        except IndexError:
+        if not self.running:
             return False
+        return priority < min(running.priority for running in self.running.values())
 
-    def get_non_conflicting(self):
+    def set_resources(self, resources):
         '''
-        Returns a list of experiments that can run
-        concurrently with currently running experiments.
+        Sets the hardware resources used by each experiment class.
+        Arguments:
+            resources   (dict)  : the resources (a list of names, or None) of each experiment class, keyed by name.
         '''
-        non_conflicting = []
-        for running, script in self.running.items():
-            cls_name = script.scan.script_cls.name
-            non_conf = config.allowed_concurrent.get(cls_name, None)
-            if non_conf is not None:
-                non_conflicting.append(set(non_conf))
-        if non_conflicting:
-            return set.intersection(*non_conflicting)
-        else:
-            return set()
-        return non_conflicting
+        self.resources.set_classes(resources)
 
     def add_external_scan(self, scan):
         scan_id = self.scan_ID_counter
         self.scan_ID_counter += 1
         status = script_semaphore(scan_id, self.signals)
         self.running[scan_id] = running_script(scan, Deferred(), status, externally_launched=True)
+        self.resources.add_running(scan_class_names(scan))
         self.signals.on_running_new_script((scan_id, scan.name))
         return scan_id
 
     def remove_from_running(self, deferred_result, running_id):
         print('removing from running now', running_id)
-        del self.running[running_id]
+        script = self.running.pop(running_id)
+        self.resources.remove_running(scan_class_names(script.scan))
 
     def remove_if_external(self, running_id):
         if running_id in self.get_running_external():
@@ -357,8 +476,7 @@ class scheduler(object):
             return
         else:
             should_launch = False
-            non_conflicting = self.get_non_conflicting()
-            if (not self.running) or scan.script_cls.name in non_conflicting:
+            if self.resources.can_run(scan_class_names(scan)):
                 # no running experiments or current one has no conflicts
                 should_launch = True
                 pause_running = False
@@ -366,7 +484,7 @@ class scheduler(object):
                 should_launch = True
                 pause_running = True
         if should_launch:
-            self.queue.remove_object((ident, scan, priority))
+            self.queue.pop_next()
             self.signals.on_queued_removed(ident)
             self.do_launch(ident, scan, priority, pause_running)
             self.launch_scripts()
@@ -388,9 +506,10 @@ class scheduler(object):
     def pause_running(self, result, scan, current_ident):
         paused_idents = []
         paused_deferred = []
+        scan_names = scan_class_names(scan)
         for ident, script in self.running.items():
-            non_conf = config.allowed_concurrent.get(script.name, [])
-            if not scan.script_cls.name in non_conf and not script.status.status == 'Paused':
+            conflicting = not self.resources.compatible_with(scan_class_names(script.scan), scan_names)
+            if conflicting and not script.status.status == 'Paused':
                 # don't pause unless it's a conflicting experiment and it's not
                 # already paused
                 if not ident == current_ident:
@@ -418,8 +537,27 @@ class scheduler(object):
         return unpaused_defers
 
     def launch_in_thread(self, result, scan, ident):
-        d = deferToThread(scan.execute, ident)
+        d = deferToThread(self.execute_pooled, scan, ident)
         return d
 
+    def execute_pooled(self, scan, ident):
+        '''
+        Runs an experiment with a connection borrowed from the connection pool.
+        If no connection can be borrowed, the experiment makes its own.
+        Doesn't wait for a connection to be returned, since paused experiments keep theirs.
+        '''
+        try:
+            cxn, context = self.connections.acquire(timeout=0)
+        except Exception as e:
+            print('Unable to get pooled connection:', e)
+            scan.cxn = None
+            return scan.execute(ident)
+        try:
+            scan.cxn, scan.context = cxn, context
+            return scan.execute(ident)
+        finally:
+            self.connections.release(context)
+
     def _add_to_running(self, ident, scan, d, status, priority):
         self.running[ident] = running_script(scan, d, status, priority)
+        self.resources.add_running(scan_class_names(scan))
@@ -0,0 +1,129 @@
+"""
+Experiment-side copy of the pause/stop state of a running script.
+"""
+from time import time
+from threading import Event
+
+from EGGS_labrad.config.scriptscanner_config import config
+
+# ID of the script scanner on_running_control signal
+CONTROL_ID = 200004
+
+
+class script_control(object):
+    '''
+    Keeps a local copy of whether a running script should pause or stop.
+    The script scanner pushes changes with its on_running_control signal,
+    so checking whether to pause or stop doesn't need to talk to the script scanner
+    unless a pause or stop has actually been requested.
+    Progress updates are buffered and sent at a bounded rate.
+    '''
+
+    def __init__(self, sc, cxn, ident, progress_interval=None):
+        '''
+        Arguments:
+            sc                  : the script scanner server wrapper.
+            cxn                 : the synchronous labrad connection.
+            ident               (int)   : the ID of the running script.
+            progress_interval   (float) : the minimum time (in s) between progress updates.
+        '''
+        self.sc = sc
+        self.ident = ident
+        self.progress_interval = progress_interval if progress_interval is not None else config.progress_interval
+        self._pause = Event()
+        self._stop = Event()
+        self._listener = None
+        self._cxn = cxn
+        self.listening = False
+        # progress updates
+        self._progress = None
+        self._last_sent = 0.
+        if cxn is not None:
+            self._subscribe(cxn)
+
+    def _subscribe(self, cxn):
+        try:
+            self._context = cxn.context()
+            # use the underlying asynchronous connection, since synchronous clients don't support listeners
+            self._listener = cxn._backend.cxn
+            self._listener.addListener(self._on_control, source=self.sc.ID, ID=CONTROL_ID, context=self._context)
+            self.sc.signal_on_running_control(CONTROL_ID, context=self._context)
+            self.listening = True
+        except Exception as e:
+            print('Unable to subscribe to script control:', e)
+            self._listener = None
+            return
+        # get any requests made before subscribing
+        status, _ = self.sc.get_progress(self.ident)
+        if status in ('Pausing', 'Paused'):
+            self._pause.set()
+        elif status == 'Stopping':
+            self._stop.set()
+
+    def _on_control(self, c, signal):
+        ident, should_pause, should_stop = signal
+        if ident != self.ident:
+            return
+        if should_pause:
+            self._pause.set()
+        else:
+            self._pause.clear()
+        if should_stop:
+            self._stop.set()
+
+    def close(self):
+        '''
+        Stop listening for changes, and release the signal context.
+            Buffered progress is discarded, since the script has already
+            finished by now (use flush before confirming that it has finished).
+        '''
+        self._progress = None
+        if self._listener is not None:
+            try:
+                self._listener.removeListener(self._on_control, source=self.sc.ID, ID=CONTROL_ID, context=self._context)
+            except Exception:
+                pass
+            try:
+                self.sc.signal_on_running_control(context=self._context)
+                self._cxn.manager.expire_context(self._context)
+            except Exception as e:
+                print('Unable to unsubscribe from script control:', e)
+            self._listener = None
+            self.listening = False
+
+    def pause_or_stop(self):
+        '''
+        Pause if requested (blocking until continued), and check whether to stop.
+            Only talks to the script scanner if a pause or stop has been requested
+            (or if the script control isn't listening for changes).
+        Returns:
+            (bool): whether the script should stop.
+        '''
+        if self.listening and not (self._pause.is_set() or self._stop.is_set()):
+            return False
+        # send progress before pausing so it is up to date
+        self.flush()
+        return self.sc.pause_or_stop(self.ident)
+
+    def set_progress(self, progress):
+        '''
+        Update the progress, sending it if enough time has passed since the last update.
+        Arguments:
+            progress    (float) : the completion percentage.
+        '''
+        self._progress = progress
+        if time() - self._last_sent >= self.progress_interval:
+            self.flush()
+
+    def flush(self):
+        '''
+        Send the latest progress, if it hasn't been sent yet.
+        '''
+        if self._progress is None:
+            return
+        progress, self._progress = self._progress, None
+        self._last_sent = time()
+        try:
+            self.sc.script_set_progress(self.ident, progress)
+        except Exception as e:
+            print('Unable to set progress:', e)
@@ -18,6 +18,7 @@ timeout = 20
 
 from labrad.server import LabradServer, setting, Signal
 from twisted.internet.defer import inlineCallbacks, DeferredList, returnValue
+from twisted.internet.threads import deferToThread
 
 from scheduler import scheduler
 from experiment_classes import *
@@ -66,6 +67,7 @@ class ScriptScanner(LabradServer):
     on_running_new_status = Signal(200001, "signal_on_running_new_status", '(wsv)')
     on_running_script_paused = Signal(200002, "signal_on_running_script_paused", 'wb')
     on_running_script_stopped = Signal(200003, "signal_on_running_script_stopped", 'w')
+    on_running_control = Signal(200004, "signal_on_running_control", '(wbb)')
     on_running_script_finished = Signal(200005, "signal_on_running_script_finished", 'w')
     on_running_script_finished_error = Signal(200006, "signal_on_running_script_finished_error", 'ws')
 
@@ -86,6 +88,8 @@ class ScriptScanner(LabradServer):
         # Instance of a complicated object
         self.scheduler = scheduler(self)
         self.load_scripts()
+        # open the pooled connections in advance
+        deferToThread(self.scheduler.connections.fill)
 
     def load_scripts(self):
         '''
@@ -118,6 +122,9 @@ class ScriptScanner(LabradServer):
                     print(name_not_provided.format(class_name, module))
                 else:
                     self.script_parameters[name] = script_class_parameters(name, cls, parameters)
+        # precompute which experiments can run concurrently
+        resources = {name: getattr(script.cls, 'resources', None) for name, script in self.script_parameters.items()}
+        self.scheduler.set_resources(resources)
 
     @setting(0, "get_available_scripts", returns='*s')
     def get_available_scripts(self, c):
@@ -226,6 +233,57 @@ class ScriptScanner(LabradServer):
         scan_id = self.scheduler.add_scan_to_queue(scan_launch)
         return scan_id
 
+    @setting(16, "new_script_scan_adaptive", script_name='s', collection='s', parameter_name='s',
+             minim='v[]', maxim='v[]', units='s', budget='w', criterion='s', resolution='v[]', returns='w')
+    def new_scan_adaptive(self, c, script_name, collection, parameter_name, minim, maxim, units,
+                          budget, criterion='curvature', resolution=0.):
+        '''
+        Queue a scan which chooses each point based on the results so far.
+
+        Parameter
+        ---------
+        script_name: str, experiment to run. Must return a result.
+        minim, maxim: float, the scan range (in units).
+        budget: int, the maximum number of points.
+        criterion: str, where to add points (curvature, gradient, or peak).
+        resolution: float, the smallest spacing between points (in units).
+        '''
+        if script_name not in self.script_parameters.keys():
+            raise Exception("Script {} Not Found".format(script_name))
+        script = self.script_parameters[script_name]
+        scan_launch = scan_experiment_1D_adaptive(script.cls, (collection, parameter_name), minim, maxim,
+                                                  units, budget, criterion, resolution)
+        scan_id = self.scheduler.add_scan_to_queue(scan_launch)
+        return scan_id
+
+    @setting(17, "new_script_scan_nd", script_name='s', parameters='*(ss)', ranges='*(vvw)', units='*s',
+             move_costs='*v', resume_directory='*s', resume_dataset='s', returns='w')
+    def new_scan_nd(self, c, script_name, parameters, ranges, units, move_costs=None,
+                    resume_directory=None, resume_dataset=None):
+        '''
+        Queue a scan over a grid of several parameters.
+
+        Parameter
+        ---------
+        script_name: str, experiment to run.
+        parameters: list of (collection, parameter name) to scan.
+        ranges: list of (minim, maxim, steps) for each parameter.
+        units: list of the units of each parameter.
+        move_costs: list of the cost of changing each parameter. Expensive parameters are changed the least.
+        resume_directory, resume_dataset: the data vault dataset of an interrupted scan to resume.
+        '''
+        if script_name not in self.script_parameters.keys():
+            raise Exception("Script {} Not Found".format(script_name))
+        if not (len(parameters) == len(ranges) == len(units)):
+            raise Exception("Need a range and units for each scan parameter")
+        script = self.script_parameters[script_name]
+        resume = None
+        if resume_dataset is not None:
+            resume = (resume_directory or [''], resume_dataset)
+        scan_launch = scan_experiment_ND(script.cls, parameters, ranges, units, move_costs or None, resume)
+        scan_id = self.scheduler.add_scan_to_queue(scan_launch)
+        return scan_id
+
     @setting(13, 'new_script_schedule', script_name='s', duration='v[s]',
              priority='s', start_now='b', returns='w')
     def new_script_schedule(self, c, script_name, duration, priority='Normal',
@@ -376,6 +434,7 @@ class ScriptScanner(LabradServer):
             # wait for all deferred to finish
             running = DeferredList(self.scheduler.running_deferred_list())
             yield running
+            self.scheduler.connections.close()
         except AttributeError:
             # if dictionary doesn't exist yet (i.e bad identification error),
             # do nothing
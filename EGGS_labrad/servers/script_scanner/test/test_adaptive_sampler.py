@@ -0,0 +1,62 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# script scanner modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adaptive_sampler import adaptive_sampler
+
+
+CENTER = 3.3
+RESOLUTION = 0.05
+
+
+def resonance(x):
+    """
+    A simulated (deterministic) resonance measurement.
+    """
+    return 1. / (1. + (x - CENTER) ** 2)
+
+
+def run_scan(sampler):
+    while True:
+        x = sampler.next_point()
+        if x is None:
+            return sampler
+        sampler.add(x, resonance(x))
+
+
+@pytest.mark.parametrize('criterion', adaptive_sampler.criteria)
+def test_resolution(criterion):
+    sampler = run_scan(adaptive_sampler(-50, 50, 500, criterion, resolution=RESOLUTION))
+    x, y = np.array(sampler.x), np.array(sampler.y)
+    # a uniform scan needs this many points to reach the resolution
+    uniform_points = int(100 / RESOLUTION) + 1
+    assert len(sampler) < uniform_points / 5
+    assert np.all(np.diff(x) >= RESOLUTION)
+    assert abs(x[np.argmax(y)] - CENTER) <= RESOLUTION
+
+    # more accurate than a uniform scan with the same number of points
+    grid = np.linspace(-50, 50, 10001)
+    uniform = np.linspace(-50, 50, len(sampler))
+    error = np.max(np.abs(np.interp(grid, x, y) - resonance(grid)))
+    uniform_error = np.max(np.abs(np.interp(grid, uniform, resonance(uniform)) - resonance(grid)))
+    assert error < uniform_error / 5
+
+
+def test_budget():
+    sampler = run_scan(adaptive_sampler(-50, 50, 40, 'peak', resolution=RESOLUTION))
+    assert len(sampler) == 40
+    assert sampler.progress() == 1.
+    # the budget is spent around the resonance
+    assert np.sum(np.abs(np.array(sampler.x) - CENTER) < 5) > 20
+
+
+def test_invalid():
+    with pytest.raises(Exception):
+        adaptive_sampler(0, 1, 10, 'random')
+    with pytest.raises(Exception):
+        adaptive_sampler(1, 0, 10)
@@ -0,0 +1,139 @@
+import os
+import sys
+from threading import Thread
+
+import pytest
+
+# script scanner modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_pool import connection_pool
+
+
+class fake_server(object):
+
+    def __init__(self):
+        self.refreshes = 0
+
+    def refresh(self, now=False):
+        self.refreshes += 1
+
+
+class fake_manager(object):
+
+    def __init__(self, cxn):
+        self.cxn = cxn
+
+    def servers(self):
+        if not self.cxn.connected:
+            raise Exception('not connected')
+        return [(1, 'Manager')] + [(i + 2, name) for i, name in enumerate(self.cxn.server_names)]
+
+    def expire_context(self, context):
+        if not self.cxn.connected:
+            raise Exception('not connected')
+        self.cxn.expired.append(context)
+
+
+class fake_client(object):
+    """
+    Stands in for a synchronous labrad connection.
+    """
+
+    def __init__(self, server_names):
+        self.server_names = server_names
+        self.servers = {name: fake_server() for name in server_names}
+        self.manager = fake_manager(self)
+        self.connected = True
+        self.expired = []
+        self._context = 0
+
+    def refresh(self, now=False):
+        pass
+
+    def context(self):
+        self._context += 1
+        return (id(self), self._context)
+
+    def disconnect(self):
+        self.connected = False
+
+
+@pytest.fixture
+def connections():
+    return []
+
+
+@pytest.fixture
+def pool(connections):
+    def connect(name):
+        cxn = fake_client(['Data Vault', 'Parameter Vault'])
+        connections.append(cxn)
+        return cxn
+    return connection_pool(size=2, servers=['Data Vault', 'Script Scanner'], check_interval=0., connect=connect)
+
+
+def test_reuse(pool, connections):
+    with pool.connection() as (cxn, context):
+        pass
+    with pool.connection() as (cxn_2, context_2):
+        pass
+    # same connection, but a new context
+    assert cxn is cxn_2
+    assert context != context_2
+    assert len(connections) == 1
+    # servers are resolved in advance, and contexts are expired after use
+    assert cxn.servers['Data Vault'].refreshes == 1
+    assert cxn.expired == [context, context_2]
+
+
+def test_pool_size(pool, connections):
+    pool.fill()
+    assert pool.stats() == (2, 2, 0)
+    pool.acquire()
+    pool.acquire()
+    with pytest.raises(Exception):
+        pool.acquire(timeout=0.01)
+    assert len(connections) == 2
+
+
+def test_blocking_acquire(pool):
+    cxn, context = pool.acquire()
+    _, context_2 = pool.acquire()
+    acquired = []
+    waiting = Thread(target=lambda: acquired.append(pool.acquire(timeout=5.)))
+    waiting.start()
+    pool.release(context)
+    waiting.join()
+    assert acquired[0][0] is cxn
+    pool.release(context_2)
+    pool.release(acquired[0][1])
+    assert pool.stats() == (2, 2, 0)
+
+
+def test_health_check(pool, connections):
+    with pool.connection() as (cxn, context):
+        pass
+    # broken connections are replaced
+    cxn.disconnect()
+    with pool.connection() as (cxn_2, context):
+        assert cxn_2 is not cxn
+    # connections are re-resolved if the servers change
+    cxn_2.server_names.append('Script Scanner')
+    cxn_2.servers['Script Scanner'] = fake_server()
+    with pool.connection() as (cxn_3, context):
+        assert cxn_3 is cxn_2
+    assert cxn_2.servers['Data Vault'].refreshes == 2
+    assert cxn_2.servers['Script Scanner'].refreshes == 1
+
+
+def test_close(pool, connections):
+    cxn, context = pool.acquire()
+    pool.fill()
+    pool.close()
+    assert not connections[1].connected
+    # borrowed connections are disconnected once returned
+    pool.release(context)
+    assert not cxn.connected
+    with pytest.raises(Exception):
+        pool.acquire()
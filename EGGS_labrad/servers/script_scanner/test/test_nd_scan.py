@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# script scanner modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nd_scan import nd_scan_plan
+
+
+@pytest.fixture
+def plan():
+    # e.g. dds frequency (fast), dc voltage (slow), and a third parameter
+    axes = [np.linspace(100, 110, 6), np.linspace(0, 2, 4), np.arange(3)]
+    return nd_scan_plan(axes, move_costs=[1., 100., 10.])
+
+
+def test_covers_grid(plan):
+    assert len(plan) == 6 * 4 * 3
+    assert len(set(map(tuple, plan.indices))) == len(plan)
+
+
+def test_snake_order(plan):
+    steps = np.abs(np.diff(plan.indices, axis=0))
+    # only one parameter changes between points, by a single step
+    assert np.all(steps.sum(axis=1) == 1)
+    # the most expensive parameter is changed the fewest times
+    changes = (steps != 0).sum(axis=0)
+    assert list(changes) == [4 * 3 * 5, 3, 4 * 2]
+    assert plan.values(0) == [100., 0., 0.]
+
+
+def test_cost(plan):
+    # cheaper than a raster scan in the given parameter order
+    raster = nd_scan_plan(plan.axes, plan.move_costs, snake=False)
+    assert plan.cost() < raster.cost()
+    naive = np.indices(plan.shape).reshape(3, -1).T
+    assert raster.cost() < plan.cost(naive)
+
+
+def test_resume(plan):
+    measured = np.array([plan.values(i) + [1.] for i in range(10)])
+    remaining = plan.remaining(measured)
+    assert remaining == list(range(10, len(plan)))
+    # points measured out of order, and values which aren't on the grid
+    measured = np.array([plan.values(5), plan.values(20), [105.5, 0., 0.]])
+    remaining = plan.remaining(measured)
+    assert len(remaining) == len(plan) - 2
+    assert 5 not in remaining and 20 not in remaining
+    assert plan.remaining([]) == list(range(len(plan)))
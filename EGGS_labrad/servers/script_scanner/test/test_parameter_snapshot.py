@@ -0,0 +1,135 @@
+import os
+import sys
+
+import pytest
+
+# script scanner modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parameter_snapshot import parameter_snapshot, PARAMETER_CHANGE_ID
+
+
+class fake_parameter_vault(object):
+    """
+    Stands in for the parameter vault server wrapper, and counts requests.
+    """
+
+    ID = 5
+
+    def __init__(self, parameters):
+        self.parameters = parameters
+        self.requests = []
+        self.subscribed = set()
+
+    def get_parameters(self, keys):
+        self.requests.append(list(keys))
+        return tuple(self.parameters[tuple(key)] for key in keys)
+
+    def get_collection_parameters(self, collections):
+        self.requests.append(list(collections))
+        return tuple((key[0], key[1], value) for key, value in self.parameters.items() if key[0] in collections)
+
+    def signal__parameter_change(self, ID=None, context=None):
+        if ID is None:
+            self.subscribed.discard(context)
+        else:
+            assert ID == PARAMETER_CHANGE_ID
+            self.subscribed.add(context)
+
+
+class fake_protocol(object):
+
+    def __init__(self):
+        self.listeners = []
+
+    def addListener(self, listener, source, ID, context):
+        self.listeners.append(listener)
+
+    def removeListener(self, listener, source, ID, context):
+        self.listeners.remove(listener)
+
+
+class fake_backend(object):
+
+    def __init__(self):
+        self.cxn = fake_protocol()
+
+
+class fake_manager(object):
+
+    def __init__(self):
+        self.expired = []
+
+    def expire_context(self, context):
+        self.expired.append(context)
+
+
+class fake_client(object):
+
+    def __init__(self):
+        self._backend = fake_backend()
+        self.manager = fake_manager()
+
+    def context(self):
+        return (0, 1)
+
+
+@pytest.fixture
+def pv():
+    parameters = {('Excitation', 'duration'): 10., ('Excitation', 'frequency'): 5., ('Cooling', 'power'): -3.}
+    return fake_parameter_vault(parameters)
+
+
+def test_single_request(pv):
+    snapshot = parameter_snapshot(pv)
+    keys = list(pv.parameters.keys())
+    assert snapshot.get(keys) == pv.parameters
+    assert len(pv.requests) == 1
+    # cached parameters aren't requested again
+    snapshot.get(keys[:1])
+    assert len(pv.requests) == 1 + 1
+
+
+def test_change_signal(pv):
+    cxn = fake_client()
+    snapshot = parameter_snapshot(pv, cxn)
+    listener, = cxn._backend.cxn.listeners
+    snapshot.get(list(pv.parameters.keys()))
+    snapshot.get([('Cooling', 'power')])
+    assert len(pv.requests) == 1
+
+    # only changed parameters are requested again
+    pv.parameters[('Excitation', 'duration')] = 20.
+    listener(None, ('Excitation', 'duration'))
+    assert snapshot.get([('Excitation', 'duration')]) == {('Excitation', 'duration'): 20.}
+    assert pv.requests[-1] == [('Excitation', 'duration')]
+
+    # closing unsubscribes and releases the signal context
+    assert pv.subscribed == {(0, 1)}
+    snapshot.close()
+    assert not cxn._backend.cxn.listeners
+    assert not pv.subscribed
+    assert cxn.manager.expired == [(0, 1)]
+
+
+def test_collections(pv):
+    snapshot = parameter_snapshot(pv, fake_client())
+    values = snapshot.get_collections(['Excitation'])
+    assert set(values.keys()) == {('Excitation', 'duration'), ('Excitation', 'frequency')}
+    snapshot.get(list(values.keys()))
+    assert len(pv.requests) == 1
+
+
+def test_invalidate(pv):
+    snapshot = parameter_snapshot(pv, fake_client())
+    key = ('Excitation', 'duration')
+    snapshot.get([key])
+    # values reloaded by the parameter vault without a change signal
+    pv.parameters[key] = 30.
+    assert snapshot.get([key]) == {key: 10.}
+    # reloading parameters discards them from the snapshot first
+    snapshot.invalidate([key])
+    assert snapshot.get([key]) == {key: 30.}
+    pv.parameters[key] = 40.
+    snapshot.invalidate()
+    assert snapshot.get([key]) == {key: 40.}
@@ -0,0 +1,180 @@
+import os
+import sys
+from time import perf_counter
+
+import pytest
+from twisted.internet.defer import Deferred
+
+# script scanner modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import priority_queue, resource_table, scheduler
+
+
+class fake_signals(object):
+    """
+    Stands in for the script scanner server signals.
+    """
+
+    def __getattr__(self, name):
+        return lambda *args: None
+
+
+class fake_script(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class fake_scan(object):
+
+    def __init__(self, script_cls):
+        self.script_cls = script_cls
+        self.name = script_cls.name
+
+
+class manual_scheduler(scheduler):
+    """
+    A scheduler whose experiments only finish when finish() is called.
+    """
+
+    def __init__(self, signals):
+        super(manual_scheduler, self).__init__(signals)
+        self.executing = {}
+        self.launch_order = []
+
+    def launch_in_thread(self, result, scan, ident):
+        d = Deferred()
+        self.executing[ident] = d
+        self.launch_order.append(ident)
+        return d
+
+    def finish(self, ident):
+        self.executing.pop(ident).callback(None)
+
+
+def test_queue_order():
+    queue = priority_queue()
+    assert queue.put_last(1, (0, 'a', 1)) == 0
+    assert queue.put_last(1, (1, 'b', 1)) == 1
+    assert queue.put_first(1, (2, 'c', 1)) == 0
+    assert queue.put_last(0, (3, 'd', 0)) == 0
+    assert [obj[0] for obj in queue.get_all()] == [3, 2, 0, 1]
+    assert queue.remove_id(2) == (2, 'c', 1)
+    with pytest.raises(ValueError):
+        queue.remove_id(2)
+    assert len(queue) == 3
+    assert [queue.pop_next()[0] for i in range(3)] == [3, 0, 1]
+    with pytest.raises(IndexError):
+        queue.peek_next()
+
+
+def test_resource_table():
+    table = resource_table(allowed_concurrent={'d': ['a']})
+    table.set_classes({'a': ['pulser', 'pmt'], 'b': ['pmt'], 'c': ['wavemeter'], 'd': None})
+    assert table.can_run(['a'])
+    table.add_running(['a'])
+    # shares the pmt
+    assert not table.can_run(['b'])
+    assert table.can_run(['c'])
+    # unknown experiments conflict with everything
+    assert not table.can_run(['e'])
+    table.remove_running(['a'])
+    assert table.can_run(['b'])
+
+
+def test_allowed_concurrent_one_directional():
+    # experiments of class a can be launched while d is running, but not the other way around
+    table = resource_table(allowed_concurrent={'d': ['a', 'c']})
+    table.set_classes({'a': ['pulser'], 'c': None, 'd': None})
+    table.add_running(['a'])
+    assert not table.can_run(['d'])
+    assert not table.compatible_with(['a'], ['d'])
+    table.remove_running(['a'])
+
+    table.add_running(['d'])
+    assert table.can_run(['a'])
+    assert table.compatible_with(['d'], ['a'])
+    # every running experiment has to allow the new one
+    assert table.can_run(['c'])
+    table.add_running(['c'])
+    assert not table.can_run(['a'])
+
+
+def test_scheduler_simulation():
+    """
+    Queue thousands of scans of conflicting and non-conflicting experiments,
+        and check that conflicting experiments never run at the same time.
+    """
+    resources = {'exp_{}'.format(i): ['laser_{}'.format(i % 4)] for i in range(8)}
+    scripts = [fake_script(name) for name in resources]
+    sched = manual_scheduler(fake_signals())
+    sched.set_resources(resources)
+
+    num_scans = 5000
+    start = perf_counter()
+    for i in range(num_scans):
+        sched.add_scan_to_queue(fake_scan(scripts[i % len(scripts)]))
+    queue_time = perf_counter() - start
+
+    start = perf_counter()
+    finished = 0
+    while sched.executing:
+        running = [script.name for script in sched.running.values()]
+        used = [resources[name][0] for name in running]
+        assert len(used) == len(set(used))
+        for ident in sorted(sched.executing):
+            sched.finish(ident)
+            finished += 1
+    run_time = perf_counter() - start
+
+    assert finished == num_scans
+    assert not sched.running and not len(sched.queue)
+    # scans are launched in the order they were queued
+    assert sched.launch_order == sorted(sched.launch_order)
+    # scheduling overhead stays well below the time taken by an experiment
+    assert queue_time / num_scans < 1e-3
+    assert run_time / num_scans < 1e-3
+
+
+def test_priority_launch():
+    sched = manual_scheduler(fake_signals())
+    sched.set_resources({'a': ['pulser'], 'b': ['pulser']})
+    first = sched.add_scan_to_queue(fake_scan(fake_script('a')))
+    waiting = sched.add_scan_to_queue(fake_scan(fake_script('a')))
+    jumped = sched.add_scan_to_queue(fake_scan(fake_script('b')), 'First in Queue')
+    assert [ident for ident, _, _ in sched.get_queue()] == [jumped, waiting]
+    sched.remove_queued_script(jumped)
+    sched.finish(first)
+    assert sched.launch_order == [first, waiting]
+
+
+class exhausted_pool(object):
+    """
+    A connection pool whose connections are all in use.
+    """
+
+    def acquire(self, timeout=None):
+        if timeout is None:
+            raise AssertionError('would wait forever for a connection')
+        raise Exception('Error: timed out waiting for a pooled connection.')
+
+
+class recording_scan(fake_scan):
+
+    def __init__(self, script_cls):
+        super(recording_scan, self).__init__(script_cls)
+        self.cxn = 'stale'
+        self.executed = []
+
+    def execute(self, ident):
+        self.executed.append((ident, self.cxn))
+
+
+def test_execute_pooled_exhausted():
+    sched = scheduler(fake_signals())
+    sched.connections = exhausted_pool()
+    scan = recording_scan(fake_script('a'))
+    # the experiment makes its own connection instead of waiting
+    sched.execute_pooled(scan, 3)
+    assert scan.executed == [(3, None)]
@@ -0,0 +1,143 @@
+import os
+import sys
+
+import pytest
+
+# script scanner modules use sibling imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import script_semaphore
+from script_control import script_control
+
+
+class fake_script_scanner(object):
+    """
+    Stands in for the script scanner server wrapper, and records requests.
+    """
+
+    ID = 7
+
+    def __init__(self, status='Running'):
+        self.status = status
+        self.requests = []
+        self.subscribed = set()
+
+    def signal_on_running_control(self, ID=None, context=None):
+        if ID is None:
+            self.subscribed.discard(context)
+        else:
+            self.subscribed.add(context)
+
+    def get_progress(self, ident):
+        return self.status, 0.
+
+    def pause_or_stop(self, ident):
+        self.requests.append(('pause_or_stop', ident))
+        return self.status == 'Stopping'
+
+    def script_set_progress(self, ident, progress):
+        self.requests.append(('progress', progress))
+
+
+class fake_protocol(object):
+
+    def __init__(self):
+        self.listeners = []
+
+    def addListener(self, listener, source, ID, context):
+        self.listeners.append(listener)
+
+    def removeListener(self, listener, source, ID, context):
+        self.listeners.remove(listener)
+
+
+class fake_client(object):
+
+    def __init__(self):
+        self._backend = type('backend', (object,), {})()
+        self._backend.cxn = fake_protocol()
+        self.manager = type('manager', (object,), {'expired': []})()
+        self.manager.expire_context = self.manager.expired.append
+
+    def context(self):
+        return (0, 1)
+
+
+class signal_recorder(object):
+    """
+    Stands in for the script scanner server signals, and sends control signals to listeners.
+    """
+
+    def __init__(self, listeners):
+        self.listeners = listeners
+
+    def on_running_control(self, signal):
+        for listener in self.listeners:
+            listener(None, signal)
+
+    def __getattr__(self, name):
+        return lambda *args: None
+
+
+@pytest.fixture
+def sc():
+    return fake_script_scanner()
+
+
+@pytest.fixture
+def cxn():
+    return fake_client()
+
+
+def test_no_requests(sc, cxn):
+    control = script_control(sc, cxn, 3, progress_interval=100.)
+    for i in range(1000):
+        assert not control.pause_or_stop()
+        control.set_progress(i / 10.)
+    # only the first progress update is sent, and the rest are buffered
+    assert sc.requests == [('progress', 0.)]
+    control.flush()
+    assert sc.requests == [('progress', 0.), ('progress', 99.9)]
+    # progress set after flushing (e.g. after the script has finished) is never sent
+    control.set_progress(100.)
+    assert sc.subscribed == {(0, 1)}
+    control.close()
+    assert len(sc.requests) == 2
+    # closing unsubscribes and releases the signal context
+    assert not cxn._backend.cxn.listeners
+    assert not sc.subscribed
+    assert cxn.manager.expired == [(0, 1)]
+
+
+def test_pushed_control(sc, cxn):
+    control = script_control(sc, cxn, 3)
+    semaphore = script_semaphore(3, signal_recorder(cxn._backend.cxn.listeners))
+    other = script_semaphore(4, signal_recorder(cxn._backend.cxn.listeners))
+    # requests for other scripts are ignored
+    other.set_pausing(True)
+    assert not control.pause_or_stop()
+    assert sc.requests == []
+
+    semaphore.set_pausing(True)
+    assert not control.pause_or_stop()
+    assert sc.requests == [('pause_or_stop', 3)]
+    semaphore.set_pausing(False)
+    assert not control.pause_or_stop()
+    assert len(sc.requests) == 1
+
+    sc.status = 'Stopping'
+    semaphore.set_stopping()
+    assert control.pause_or_stop()
+
+
+def test_requested_before_launch(cxn):
+    control = script_control(fake_script_scanner('Pausing'), cxn, 3)
+    control.pause_or_stop()
+    assert control.sc.requests == [('pause_or_stop', 3)]
+
+
+def test_not_listening(sc):
+    # without a connection to listen on, the script scanner is always asked
+    control = script_control(sc, None, 3)
+    control.pause_or_stop()
+    assert sc.requests == [('pause_or_stop', 3)]
@@ -1,14 +1,23 @@
 import numpy as np
-from labrad.gpib import GPIBDeviceWrapper
+from EGGS_labrad.servers import GPIBDeviceWrapper
 from twisted.internet.defer import inlineCallbacks, returnValue
 
+from labrad.units import WithUnit
+
 
 class AgilentN9010AWrapper(GPIBDeviceWrapper):
 
+    def __init__(self, guid, name):
+        super().__init__(guid, name)
+        # cached frequency axis; cleared whenever the frequency range is changed
+        self._freq_axis = None
+
+
     # SYSTEM
     @inlineCallbacks
     def reset(self):
         yield self.write('*RST')
+        self._freq_axis = None
 
     @inlineCallbacks
     def clear_buffers(self):
@@ -17,6 +26,7 @@ class AgilentN9010AWrapper(GPIBDeviceWrapper):
     @inlineCallbacks
     def autoset(self):
         yield self.write(':SENS:POW:ATUN')
+        self._freq_axis = None
 
 
     # ATTENUATION
@@ -41,6 +51,7 @@ class AgilentN9010AWrapper(GPIBDeviceWrapper):
         if freq is not None:
             if (freq > 0) and (freq < 7.5e9):
                 yield self.write(':SENS:FREQ:STAR {:f}'.format(freq))
+                self._freq_axis = None
             else:
                 raise Exception('Error: start frequency must be in range: [0, 7.5e9].')
         resp = yield self.query(':SENS:FREQ:STAR?')
@@ -51,6 +62,7 @@ class AgilentN9010AWrapper(GPIBDeviceWrapper):
         if freq is not None:
             if (freq > 0) and (freq < 7.5e9):
                 yield self.write(':SENS:FREQ:STOP {:f}'.format(freq))
+                self._freq_axis = None
             else:
                 raise Exception('Error: stop frequency must be in range: [0, 7.5e9].')
         resp = yield self.query(':SENS:FREQ:STOP?')
@@ -61,6 +73,7 @@ class AgilentN9010AWrapper(GPIBDeviceWrapper):
         if freq is not None:
             if (freq > 0) and (freq < 7.5e9):
                 yield self.write(':SENS:FREQ:CENT {:f}'.format(freq))
+                self._freq_axis = None
             else:
                 raise Exception('Error: center frequency must be in range: [0, 7.5e9].')
         resp = yield self.query(':SENS:FREQ:CENT?')
@@ -71,6 +84,7 @@ class AgilentN9010AWrapper(GPIBDeviceWrapper):
         if span is not None:
             if (span > 0) and (span < 7.5e9):
                 yield self.write(':SENS:FREQ:SPAN {:f}'.format(span))
+                self._freq_axis = None
             else:
                 raise Exception('Error: frequency span must be in range: [0, 7.5e9].')
         resp = yield self.query(':SENS:FREQ:SPAN?')
@@ -262,29 +276,58 @@ class AgilentN9010AWrapper(GPIBDeviceWrapper):
     # TRACE
     @inlineCallbacks
     def getTrace(self, channel):
-        # set data format
-        yield self.write(':FORM:TRAC:DATA ASC')
+        # set data format to little-endian 32-bit floats
+        yield self.write(':FORM:DATA REAL,32')
+        yield self.write(':FORM:BORD SWAP')
 
-        # get data
-        data = yield self.query(':TRAC:DATA? TRACE{:d}'.format(channel))
-        data = self._processData(data)
+        # get data as a binary block
+        data = yield self.query_binary(':TRAC:DATA? TRACE{:d}'.format(channel), dtype='<f4')
 
-        # create x-axis
-        freq_start = yield self.query(':SENS:FREQ:START?')
-        freq_stop = yield self.query(':SENS:FREQ:STOP?')
-        xAxis = np.linspace(int(freq_start), int(freq_stop), len(data))
+        # get x-axis
+        xAxis = yield self._frequencyAxis(len(data))
 
         returnValue((xAxis, data))
 
+    @inlineCallbacks
+    def getTraceSweeps(self, channel, num):
+        """
+        Take a number of single sweeps back-to-back and return the trace from each.
+        Arguments:
+            channel (int): the trace channel.
+            num     (int): the number of sweeps.
+        Returns:
+            Tuple of ((*float) frequency axis, (*2float) traces with one row per sweep).
+        """
+        # ensure *OPC? doesn't time out before a sweep finishes
+        sweep_time = yield self.bandwidthSweepTime(None)
+        timeout_tmp = WithUnit(max(2 * sweep_time, 10), 's')
+
+        # switch to single sweep mode
+        yield self.write(':INIT:CONT OFF')
+        traces = []
+        try:
+            for i in range(num):
+                # start a sweep and wait for it to complete
+                yield self.write(':INIT')
+                yield self.query('*OPC?', timeout=timeout_tmp)
+                xAxis, data = yield self.getTrace(channel)
+                traces.append(data)
+        finally:
+            # return to continuous sweep mode
+            yield self.write(':INIT:CONT ON')
+        returnValue((xAxis, np.array(traces)))
+
 
     # HELPER
-    def _processData(self, data):
+    @inlineCallbacks
+    def _frequencyAxis(self, points):
         """
-        Process data for header and separate data values.
+        Get the frequency axis of the trace.
+        The axis is cached and only recomputed if the frequency range
+        was changed or the number of points differs.
         """
-        # header is in #NXXXXXXXXX format
-        tmc_N = int(data[1])
-
-        # remove header and split data
-        processed_data = np.array(data[2 + tmc_N:].split(', '), dtype=float)
-        return processed_data
+        if (self._freq_axis is None) or (len(self._freq_axis) != points):
+            freq_start = yield self.query(':SENS:FREQ:START?')
+            freq_stop = yield self.query(':SENS:FREQ:STOP?')
+            self._freq_axis = np.linspace(float(freq_start), float(freq_stop), points)
+        returnValue(self._freq_axis)
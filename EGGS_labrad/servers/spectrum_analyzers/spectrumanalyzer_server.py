@@ -2,7 +2,7 @@
 ### BEGIN NODE INFO
 [info]
 name = Spectrum Analyzer Server
-version = 1.1.0
+version = 1.2.0
 description = Talks to spectrum analyzers.
 
 [startup]
@@ -14,6 +14,9 @@ message = 987654321
 timeout = 20
 ### END NODE INFO
 """
+import numpy as np
+from twisted.internet.defer import inlineCallbacks, returnValue
+
 from labrad.server import setting
 from labrad.util import wakeupCall
 from labrad.gpib import GPIBManagedServer
@@ -408,6 +411,138 @@ class SpectrumAnalyzerServer(GPIBManagedServer):
         """
         return self.selectedDevice(c).getTrace(channel)
 
+    @setting(912, "Trace Average", channel='i', num='i', mode='s', returns='(*v*v)')
+    def traceAverage(self, c, channel, num, mode='MEAN'):
+        """
+        Take a number of sweeps back-to-back and combine their traces.
+        Arguments:
+            channel (int): the trace channel.
+            num     (int): the number of sweeps to take.
+            mode    (str): how to combine the sweeps. Must be one of ('MEAN', 'MAX', 'MIN').
+                            'MEAN' averages the power linearly (i.e. in mW, not dBm).
+        Returns:
+                    (*v, *v): the combined trace.
+        """
+        mode = mode.upper()
+        if mode not in ('MEAN', 'MAX', 'MIN'):
+            raise Exception("Error: invalid mode. Must be one of {}.".format(('MEAN', 'MAX', 'MIN')))
+        if num < 1:
+            raise Exception("Error: number of sweeps must be at least 1.")
+        xAxis, traces = yield self.selectedDevice(c).getTraceSweeps(channel, num)
+        returnValue((xAxis, _combineTraces(traces, mode)))
+
+
+    # TRACE PROCESSING
+    @setting(921, "Trace Peaks", channel='i', num='i', threshold='v', averages='i', returns='*(vv)')
+    def tracePeaks(self, c, channel, num=10, threshold=-100., averages=1):
+        """
+        Find the largest peaks in a trace.
+        Arguments:
+            channel     (int)   : the trace channel.
+            num         (int)   : the maximum number of peaks to return.
+            threshold   (float) : the minimum peak amplitude (in dBm).
+            averages    (int)   : the number of sweeps to average over (linearly) before finding peaks.
+        Returns:
+                        *(v, v) : a list of (frequency, amplitude) for each peak, sorted by decreasing amplitude.
+        """
+        xAxis, trace = yield self._getAveragedTrace(c, channel, averages)
+        returnValue(_findPeaks(xAxis, trace, num, threshold))
+
+    @setting(922, "Trace Harmonics", channel='i', fundamental='v', num='i', window='v', averages='i', returns='*(vv)')
+    def traceHarmonics(self, c, channel, fundamental, num=3, window=None, averages=1):
+        """
+        Get the amplitudes of the harmonics of a fundamental frequency.
+        Each harmonic amplitude is the maximum of the trace within +/- window
+        of the harmonic frequency.
+        Arguments:
+            channel     (int)   : the trace channel.
+            fundamental (float) : the fundamental frequency (in Hz).
+            num         (int)   : the number of harmonics (including the fundamental).
+            window      (float) : the search half-width around each harmonic (in Hz).
+                                    Defaults to 10 frequency bins.
+            averages    (int)   : the number of sweeps to average over (linearly) before searching.
+        Returns:
+                        *(v, v) : a list of (frequency, amplitude) for each harmonic.
+                                    Harmonics outside the trace have an amplitude of NaN.
+        """
+        xAxis, trace = yield self._getAveragedTrace(c, channel, averages)
+        if window is None:
+            window = 10 * (xAxis[1] - xAxis[0])
+        returnValue(_findHarmonics(xAxis, trace, fundamental, num, window))
+
+
+    # HELPER
+    @inlineCallbacks
+    def _getAveragedTrace(self, c, channel, averages):
+        """
+        Get a single trace or the linear average of multiple sweeps.
+        """
+        dev = self.selectedDevice(c)
+        if averages > 1:
+            xAxis, traces = yield dev.getTraceSweeps(channel, averages)
+            returnValue((xAxis, _combineTraces(traces, 'MEAN')))
+        xAxis, trace = yield dev.getTrace(channel)
+        returnValue((xAxis, trace))
+
+
+def _combineTraces(traces, mode):
+    """
+    Combine multiple traces (in dBm) into a single trace.
+    Arguments:
+        traces  (*2float)   : the traces, one row per sweep.
+        mode    (str)       : one of ('MEAN', 'MAX', 'MIN').
+    Returns:
+                (*float)    : the combined trace (in dBm).
+    """
+    if mode == 'MAX':
+        return np.max(traces, axis=0)
+    elif mode == 'MIN':
+        return np.min(traces, axis=0)
+    # average power in linear units
+    return 10. * np.log10(np.mean(np.power(10., traces / 10.), axis=0))
+
+
+def _findPeaks(xAxis, trace, num, threshold):
+    """
+    Find the largest local maxima of a trace above a threshold.
+    Arguments:
+        xAxis       (*float)    : the frequency axis.
+        trace       (*float)    : the trace amplitudes.
+        num         (int)       : the maximum number of peaks to return.
+        threshold   (float)     : the minimum peak amplitude.
+    Returns:
+                    *(float, float): (frequency, amplitude) of each peak, sorted by decreasing amplitude.
+    """
+    trace = np.asarray(trace)
+    center = trace[1:-1]
+    is_peak = (center > trace[:-2]) & (center >= trace[2:]) & (center > threshold)
+    indices = np.nonzero(is_peak)[0] + 1
+    indices = indices[np.argsort(trace[indices])[::-1][:num]]
+    return list(zip(xAxis[indices], trace[indices]))
+
+
+def _findHarmonics(xAxis, trace, fundamental, num, window):
+    """
+    Get the maximum amplitude of a trace around each harmonic of a fundamental frequency.
+    Arguments:
+        xAxis       (*float)    : the frequency axis.
+        trace       (*float)    : the trace amplitudes.
+        fundamental (float)     : the fundamental frequency.
+        num         (int)       : the number of harmonics (including the fundamental).
+        window      (float)     : the search half-width around each harmonic.
+    Returns:
+                    *(float, float): (frequency, amplitude) of each harmonic.
+    """
+    harmonics = fundamental * np.arange(1, num + 1)
+    # find all trace points within the window of each harmonic at once
+    in_window = np.abs(xAxis[np.newaxis, :] - harmonics[:, np.newaxis]) <= window
+    masked_trace = np.where(in_window, trace[np.newaxis, :], -np.inf)
+    indices = np.argmax(masked_trace, axis=1)
+    found = np.any(in_window, axis=1)
+    freqs = np.where(found, xAxis[indices], harmonics)
+    ampls = np.where(found, trace[indices], np.nan)
+    return list(zip(freqs, ampls))
+
 
 if __name__ == '__main__':
     from labrad import util
@@ -0,0 +1,72 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# import the ring buffer directly, since the servers package needs the full labrad install
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ring_buffer import RingBuffer
+
+
+def test_append_wraparound():
+    buffer = RingBuffer(4, (2,))
+    for i in range(6):
+        buffer.append([i, -i], timestamp=float(i))
+
+    # only the last 4 records are kept, in chronological order
+    assert len(buffer) == 4
+    assert buffer.count == 6
+    timestamps, records = buffer.latest()
+    assert np.array_equal(timestamps, [2., 3., 4., 5.])
+    assert np.array_equal(records[:, 0], [2, 3, 4, 5])
+    assert np.array_equal(records[:, 1], [-2, -3, -4, -5])
+
+    # partial reads return the newest records
+    timestamps, records = buffer.latest(2)
+    assert np.array_equal(timestamps, [4., 5.])
+    # requests larger than the buffer are clipped
+    assert len(buffer.latest(10)[0]) == 4
+
+
+def test_extend_wraparound():
+    buffer = RingBuffer(5)
+    buffer.extend(np.arange(3), timestamps=np.arange(3))
+    # this block wraps around the end of the buffer
+    buffer.extend(np.arange(3, 7), timestamps=np.arange(3, 7))
+    assert buffer.count == 7
+    timestamps, records = buffer.latest()
+    assert np.array_equal(records, [2, 3, 4, 5, 6])
+    assert np.array_equal(timestamps, records)
+
+
+def test_extend_overflow():
+    buffer = RingBuffer(5)
+    buffer.append(-1., timestamp=-1.)
+    # a block larger than the buffer only keeps its last records
+    buffer.extend(np.arange(12), timestamps=np.arange(12))
+    assert len(buffer) == 5
+    assert buffer.count == 13
+    timestamps, records = buffer.latest()
+    assert np.array_equal(records, np.arange(7, 12))
+    assert np.array_equal(timestamps, records)
+
+    # appends continue from the right position after an overflow
+    buffer.append(12., timestamp=12.)
+    assert np.array_equal(buffer.latest()[1], np.arange(8, 13))
+
+
+def test_clear():
+    buffer = RingBuffer(3)
+    buffer.extend([1., 2.])
+    buffer.clear()
+    assert len(buffer) == 0
+    assert len(buffer.latest()[1]) == 0
+    buffer.append(3.)
+    assert np.array_equal(buffer.latest()[1], [3.])
+
+
+def test_invalid_size():
+    with pytest.raises(Exception):
+        RingBuffer(0)